@@ -1,10 +1,10 @@
 import asyncio
+import bisect
 import json
 import threading
 import time
 import traceback
 from collections import defaultdict
-from copy import deepcopy
 from typing import List
 
 import bittensor as bt
@@ -15,6 +15,7 @@ from tiingo import TiingoWebsocketClient
 from time_util.time_util import TimeUtil, UnifiedMarketCalendar
 from vali_objects.vali_config import TradePair, TradePairCategory
 from vali_objects.vali_dataclasses.recent_event_tracker import RecentEventTracker
+from vali_objects.vali_dataclasses.shared_event_buffer import SharedEventBuffer
 from vali_objects.vali_dataclasses.price_source import PriceSource
 
 POLYGON_PROVIDER_NAME = "Polygon"
@@ -54,13 +55,17 @@ class BaseDataService():
         self.closed_market_prices = {tp: None for tp in TradePair}
         self.latest_websocket_events = {}
         self.using_ipc = ipc_manager is not None
-        self.n_flushes = 0
         self.websocket_manager_thread = None
-        self.trade_pair_to_recent_events_realtime = defaultdict(RecentEventTracker)
         if ipc_manager is None:
+            self.trade_pair_to_recent_events_realtime = defaultdict(RecentEventTracker)
             self.trade_pair_to_recent_events = defaultdict(RecentEventTracker)
         else:
-            self.trade_pair_to_recent_events = ipc_manager.dict()
+            # The websocket process publishes events to shared memory as they arrive and other processes read them
+            # from there directly. Opt in: the validator does not pass an ipc manager to its LivePriceFetcher yet.
+            self.shared_events = SharedEventBuffer([tp.trade_pair for tp in TradePair],
+                                                   sources=(f'{provider_name}_ws',))
+            self.trade_pair_to_recent_events_realtime = self.shared_events.trackers()
+            self.trade_pair_to_recent_events = self.shared_events
         self.trade_pair_category_to_longest_allowed_lag_s = {TradePairCategory.CRYPTO: 30, TradePairCategory.FOREX: 30,
                                                            TradePairCategory.INDICES: 30, TradePairCategory.EQUITIES: 30}
         self.timespan_to_ms = {'second': 1000, 'minute': 1000 * 60, 'hour': 1000 * 60 * 60, 'day': 1000 * 60 * 60 * 24}
@@ -112,22 +117,6 @@ class BaseDataService():
         # Use generator expression for efficiency
         return next((x for x in TradePair if x.trade_pair_category == tpc), None)
 
-    def check_flush(self):
-        t0 = time.time() if self.n_flushes % 500 == 0 else 0
-        # Get a list of keys to avoid dictionary changed size during iteration
-        # By creating a static list of keys first, we avoid the dictionary size change issue
-        keys = list(self.trade_pair_to_recent_events_realtime.keys())
-        c = {}
-        for k in keys:
-            c[k] = deepcopy(self.trade_pair_to_recent_events_realtime[k])
-        # Flush the recent events to shared memory in one go
-        self.trade_pair_to_recent_events.update(c)
-        self.n_flushes += 1
-        if t0:
-            t1 = time.time()
-            bt.logging.info(
-                f"Flushed recent {self.provider_name} events to shared memory in {t1 - t0:.2f} seconds, n_flushes {self.n_flushes}")
-
     def stop_threads(self):
         """
         Stop the threads that are running the websocket clients.
@@ -145,6 +134,9 @@ class BaseDataService():
             else:
                 bt.logging.warning(f"No websocket thread found for {tpc.name.lower()}")
 
+        if self.using_ipc:
+            self.shared_events.close()
+
     def websocket_manager(self):
         """
         This runs in a separate thread. It manages websockets using asyncio tasks
@@ -222,9 +214,6 @@ class BaseDataService():
                                 f"Health check restarting {self.provider_name} websockets for {resets!r}. curr {curr} prev {prev}")
                         last_health_check = now
 
-                    if self.using_ipc:
-                        self.check_flush()
-
                     if now - last_debug > self.DEBUG_LOG_INTERVAL_S:
                         try:
                             self.debug_log()
@@ -325,6 +314,32 @@ class BaseDataService():
 
         return events
 
+    def get_closes_websocket_at_times(self, trade_pair: TradePair, times_ms: List[int]) -> dict[int: PriceSource]:
+        """
+        Same events as get_closes_websocket for many times of one trade pair, reading the recent events once.
+        """
+        symbol = trade_pair.trade_pair
+        if not times_ms or symbol not in self.trade_pair_to_recent_events:
+            return {}
+
+        # The tracker only keeps events this recent, so the window holds every event the closest could be
+        window_ms = RecentEventTracker.OLDEST_ALLOWED_RECORD_MS
+        events = self.trade_pair_to_recent_events[symbol].get_events_in_range(min(times_ms) - window_ms,
+                                                                              max(times_ms) + window_ms)
+        if not events:
+            return {}
+        start_times = [event.start_ms for event in events]
+        closes = {}
+        for time_ms in times_ms:
+            # Ties go to the earlier event, as in RecentEventTracker.get_closest_event
+            idx = bisect.bisect_left(start_times, time_ms)
+            if idx == len(events):
+                idx -= 1
+            elif idx > 0 and not (start_times[idx] - time_ms) < (time_ms - start_times[idx - 1]):
+                idx -= 1
+            closes[time_ms] = events[idx]
+        return closes
+
     def get_closes_rest(self, trade_pairs: List[TradePair]) -> dict[str: float]:
         pass
 
@@ -0,0 +1,160 @@
+import json
+import os
+
+import bittensor as bt
+
+from time_util.time_util import MS_IN_24_HOURS, TimeUtil
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+from vali_objects.vali_config import TradePair
+
+
+class CandleStore:
+    """
+    Local append-only cache of candle closes keyed by (trade pair, timespan, UTC day).
+
+    Every fetch from the data service is appended to the day file as one JSON line holding the covered range(s) and
+    the candles found in them. The union of those ranges is what we know about the day, so later requests only go to
+    the data service for the gaps. Candles newer than settle_ms are returned but never persisted since the provider
+    may still be filling them in. A range that came back without any candles is only recorded once it is older than
+    empty_settle_ms, so a provider outage or backfill lag isn't cached as a range with no candles.
+    """
+    MAX_CHUNKS_PER_DAY_FILE = 64
+
+    def __init__(self, data_service, running_unit_tests=False, settle_ms=600000, empty_settle_ms=MS_IN_24_HOURS):
+        self.data_service = data_service
+        self.running_unit_tests = running_unit_tests
+        self.settle_ms = settle_ms
+        self.empty_settle_ms = empty_settle_ms
+        self.n_fetches = 0
+
+    def get_day_file_path(self, trade_pair_id: str, timespan: str, day_start_ms: int) -> str:
+        day_str = TimeUtil.millis_to_datetime(day_start_ms).strftime("%Y-%m-%d")
+        return ValiBkpUtils.get_candle_store_dir(running_unit_tests=self.running_unit_tests) + \
+            f"{trade_pair_id}/{timespan}/{day_str}.jsonl"
+
+    @staticmethod
+    def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        # Ranges are inclusive. Adjacent ranges are merged too since timestamps are integer ms.
+        ans = []
+        for s, e in sorted(ranges):
+            if ans and s <= ans[-1][1] + 1:
+                ans[-1] = (ans[-1][0], max(ans[-1][1], e))
+            else:
+                ans.append((s, e))
+        return ans
+
+    @staticmethod
+    def missing_ranges(covered: list[tuple[int, int]], start_ms: int, end_ms: int) -> list[tuple[int, int]]:
+        ans = []
+        cursor = start_ms
+        for s, e in covered:  # covered must be merged and sorted
+            if e < cursor:
+                continue
+            if s > end_ms:
+                break
+            if s > cursor:
+                ans.append((cursor, s - 1))
+            cursor = max(cursor, e + 1)
+            if cursor > end_ms:
+                break
+        if cursor <= end_ms:
+            ans.append((cursor, end_ms))
+        return ans
+
+    @staticmethod
+    def split_by_day(start_ms: int, end_ms: int) -> list[tuple[int, int, int]]:
+        ans = []
+        day_start_ms = start_ms - start_ms % MS_IN_24_HOURS
+        while day_start_ms <= end_ms:
+            day_end_ms = day_start_ms + MS_IN_24_HOURS - 1
+            ans.append((day_start_ms, max(start_ms, day_start_ms), min(end_ms, day_end_ms)))
+            day_start_ms += MS_IN_24_HOURS
+        return ans
+
+    def load_day(self, path: str) -> tuple[list[tuple[int, int]], dict[int, float], int]:
+        ranges = []
+        closes = {}
+        n_chunks = 0
+        if not os.path.exists(path):
+            return ranges, closes, n_chunks
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    chunk = json.loads(line)
+                    chunk_ranges = [(int(s), int(e)) for s, e in chunk['ranges']]
+                    chunk_closes = {int(t): float(c) for t, c in chunk['candles']}
+                except (ValueError, KeyError, TypeError):
+                    # Likely a partial write from a crash. The range is simply refetched.
+                    bt.logging.warning(f"Skipping unreadable chunk in candle store file {path}")
+                    continue
+                ranges.extend(chunk_ranges)
+                closes.update(chunk_closes)
+                n_chunks += 1
+        return self.merge_ranges(ranges), closes, n_chunks
+
+    @staticmethod
+    def _chunk_line(ranges: list[tuple[int, int]], closes: dict[int, float]) -> str:
+        candles = [[t, closes[t]] for t in sorted(closes)]
+        return json.dumps({'ranges': [list(r) for r in ranges], 'candles': candles}) + '\n'
+
+    def append_chunk(self, path: str, start_ms: int, end_ms: int, closes: dict[int, float]):
+        ValiBkpUtils.make_dir(os.path.dirname(path))
+        # One unbuffered write per chunk so concurrent ledger workers appending to the same day can't interleave lines.
+        with open(path, 'ab', buffering=0) as f:
+            f.write(self._chunk_line([(start_ms, end_ms)], closes).encode('utf-8'))
+
+    def compact_day(self, path: str, ranges: list[tuple[int, int]], closes: dict[int, float]):
+        ValiBkpUtils.write_to_dir(path, self._chunk_line(ranges, closes).encode('utf-8'), is_binary=True)
+
+    def fetch(self, trade_pair: TradePair, start_ms: int, end_ms: int, timespan: str) -> dict[int, float]:
+        price_info_raw = self.data_service.unified_candle_fetcher(
+            trade_pair=trade_pair, start_timestamp_ms=start_ms, end_timestamp_ms=end_ms, timespan=timespan)
+        self.n_fetches += 1
+        return {a.timestamp: a.close for a in price_info_raw}
+
+    def get_closes(self, trade_pair: TradePair, start_ms: int, end_ms: int, timespan: str,
+                   now_ms: int | None = None) -> dict[int, float]:
+        """
+        Returns {timestamp_ms: close} for all candles in [start_ms, end_ms]. Only ranges not already on disk are
+        requested from the data service, with contiguous gaps spanning several days merged into a single fetch.
+        """
+        if now_ms is None:
+            now_ms = TimeUtil.now_in_millis()
+        persist_cutoff_ms = now_ms - self.settle_ms
+        empty_persist_cutoff_ms = now_ms - self.empty_settle_ms
+        tp_id = trade_pair.trade_pair_id
+
+        ans = {}
+        day_state = {}
+        gaps = []
+        for day_start_ms, s, e in self.split_by_day(start_ms, end_ms):
+            path = self.get_day_file_path(tp_id, timespan, day_start_ms)
+            ranges, closes, n_chunks = self.load_day(path)
+            day_state[day_start_ms] = (path, ranges, closes, n_chunks)
+            for t, c in closes.items():
+                if s <= t <= e:
+                    ans[t] = c
+            gaps.extend(self.missing_ranges(ranges, s, e))
+
+        for gap_start_ms, gap_end_ms in self.merge_ranges(gaps):
+            fetched = self.fetch(trade_pair, gap_start_ms, gap_end_ms, timespan)
+            ans.update(fetched)
+            persist_end_ms = min(gap_end_ms, persist_cutoff_ms)
+            if persist_end_ms < gap_start_ms:
+                continue
+            for day_start_ms, s, e in self.split_by_day(gap_start_ms, persist_end_ms):
+                path, ranges, closes, n_chunks = day_state[day_start_ms]
+                day_closes = {t: c for t, c in fetched.items() if s <= t <= e}
+                if not day_closes and e > empty_persist_cutoff_ms:
+                    continue
+                if n_chunks + 1 >= self.MAX_CHUNKS_PER_DAY_FILE:
+                    ranges = self.merge_ranges(ranges + [(s, e)])
+                    closes.update(day_closes)
+                    self.compact_day(path, ranges, closes)
+                    n_chunks = 1
+                else:
+                    self.append_chunk(path, s, e, day_closes)
+                    ranges = self.merge_ranges(ranges + [(s, e)])
+                    n_chunks += 1
+                day_state[day_start_ms] = (path, ranges, closes, n_chunks)
+        return ans
@@ -329,11 +329,6 @@ class PolygonDataService(BaseDataService):
                     if ps is None:
                         continue
                     self.latest_websocket_events[symbol] = ps
-                    if symbol not in self.trade_pair_to_recent_events:
-                        if self.using_ipc:
-                            self.trade_pair_to_recent_events[symbol] = RecentEventTracker()
-                        else:
-                            self.trade_pair_to_recent_events_realtime[symbol] = RecentEventTracker()
                     if self.using_ipc:
                         self.trade_pair_to_recent_events_realtime[symbol].add_event(ps, tp.is_forex, f"{self.provider_name}:{tp.trade_pair}")
                     else:
@@ -305,8 +305,6 @@ class TiingoDataService(BaseDataService):
         self.latest_websocket_events[symbol] = ps1
         if not self.using_ipc and symbol not in self.trade_pair_to_recent_events:
             self.trade_pair_to_recent_events[symbol] = RecentEventTracker()
-        elif self.using_ipc and symbol not in self.trade_pair_to_recent_events_realtime:
-            self.trade_pair_to_recent_events_realtime[symbol] = RecentEventTracker()
 
         if self.using_ipc:
             self.trade_pair_to_recent_events_realtime[symbol].add_event(ps1, tp.is_forex,
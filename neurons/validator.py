@@ -22,14 +22,13 @@ import traceback
 import time
 import bittensor as bt
 import json
-import gzip
-import base64
 
 from runnable.generate_request_core import RequestCoreManager
 from runnable.generate_request_minerstatistics import MinerStatisticsManager
 from runnable.generate_request_outputs import RequestOutputGenerator
 from vali_objects.utils.auto_sync import PositionSyncer
 from vali_objects.utils.p2p_syncer import P2PSyncer
+from vali_objects.utils.checkpoint_stream import CheckpointWriter
 from shared_objects.rate_limiter import RateLimiter
 from vali_objects.utils.position_lock import PositionLocks
 from vali_objects.utils.timestamp_manager import TimestampManager
@@ -43,10 +42,11 @@ from vali_objects.utils.live_price_fetcher import LivePriceFetcher
 from vali_objects.utils.price_slippage_model import PriceSlippageModel
 from vali_objects.utils.subtensor_weight_setter import SubtensorWeightSetter
 from vali_objects.utils.mdd_checker import MDDChecker
-from vali_objects.utils.vali_bkp_utils import ValiBkpUtils, CustomEncoder
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
 from vali_objects.vali_dataclasses.perf_ledger import PerfLedgerManager
 from vali_objects.utils.position_manager import PositionManager
 from vali_objects.utils.challengeperiod_manager import ChallengePeriodManager
+from vali_objects.scoring.scoring_snapshot import ScoringSnapshot
 from vali_objects.vali_dataclasses.order import Order
 from vali_objects.position import Position
 from vali_objects.enums.order_type_enum import OrderType
@@ -184,7 +184,8 @@ class Validator:
         self.perf_ledger_manager = PerfLedgerManager(self.metagraph, ipc_manager=self.ipc_manager,
                                                      shutdown_dict=shutdown_dict,
                                                      perf_ledger_hks_to_invalidate=self.position_syncer.perf_ledger_hks_to_invalidate,
-                                                     position_manager=None)  # Set after self.pm creation
+                                                     position_manager=None,  # Set after self.pm creation
+                                                     n_ledger_workers=self.config.perf_ledger_workers)
 
 
         self.position_manager = PositionManager(metagraph=self.metagraph,
@@ -195,15 +196,20 @@ class Validator:
                                                 elimination_manager=self.elimination_manager,
                                                 challengeperiod_manager=None,
                                                 secrets=self.secrets,
-                                                shared_queue_websockets=self.shared_queue_websockets)
+                                                shared_queue_websockets=self.shared_queue_websockets,
+                                                position_backend=self.config.position_backend,
+                                                use_startup_snapshot=True)
 
         self.position_locks = PositionLocks(hotkey_to_positions=self.position_manager.get_positions_for_all_miners())
 
 
+        # Metric and penalty values shared by the challenge period, the weight setter and the miner statistics
+        self.scoring_snapshot = ScoringSnapshot(ipc_manager=self.ipc_manager)
         self.challengeperiod_manager = ChallengePeriodManager(self.metagraph,
                                                               perf_ledger_manager=self.perf_ledger_manager,
                                                               position_manager=self.position_manager,
-                                                              ipc_manager=self.ipc_manager)
+                                                              ipc_manager=self.ipc_manager,
+                                                              scoring_snapshot=self.scoring_snapshot)
 
         # Attach the position manager to the other objects that need it
         for idx, obj in enumerate([self.perf_ledger_manager, self.position_manager, self.position_syncer,
@@ -316,17 +322,20 @@ class Validator:
         # Since the mainloop is run synchronously, we just need to lock eliminations when writing to them and when
         # reading outside of the mainloop (validator).
         self.plagiarism_detector = PlagiarismDetector(self.metagraph, shutdown_dict=shutdown_dict,
-                                                      position_manager=self.position_manager)
+                                                      position_manager=self.position_manager, incremental=True)
         # Start the plagiarism detector in its own thread
         self.plagiarism_thread = Process(target=self.plagiarism_detector.run_update_loop, daemon=True)
         self.plagiarism_thread.start()
 
         self.mdd_checker = MDDChecker(self.metagraph, self.position_manager, live_price_fetcher=self.live_price_fetcher,
                                       shutdown_dict=shutdown_dict)
-        self.weight_setter = SubtensorWeightSetter(self.metagraph, position_manager=self.position_manager)
+        self.weight_setter = SubtensorWeightSetter(self.metagraph, position_manager=self.position_manager,
+                                                   scoring_snapshot=self.scoring_snapshot)
 
         self.request_core_manager = RequestCoreManager(self.position_manager, self.weight_setter, self.plagiarism_detector)
-        self.miner_statistics_manager = MinerStatisticsManager(self.position_manager, self.weight_setter, self.plagiarism_detector)
+        self.p2p_syncer.request_core_manager = self.request_core_manager
+        self.miner_statistics_manager = MinerStatisticsManager(self.position_manager, self.weight_setter, self.plagiarism_detector,
+                                                               scoring_snapshot=self.scoring_snapshot)
 
         # Start the perf ledger updater loop in its own process. Make sure it happens after the position manager has chances to make any fixes
 
@@ -352,7 +361,9 @@ class Validator:
                             test_picklability(attr_value, do,f"{obj_name}.{attr_name}")
         do = set()
         """
-        self.perf_ledger_updater_thread = Process(target=self.perf_ledger_manager.run_update_loop, daemon=True)
+        # Daemonic processes can't start the ledger worker pool. The process is joined on shutdown either way.
+        self.perf_ledger_updater_thread = Process(target=self.perf_ledger_manager.run_update_loop,
+                                                  daemon=self.config.perf_ledger_workers <= 1)
         self.perf_ledger_updater_thread.start()
 
         if self.config.start_generate:
@@ -449,6 +460,13 @@ class Validator:
         parser.add_argument("--api-ws-port", type=int, default=8765,
                             help="Port for the WebSocket server")
 
+        parser.add_argument("--perf-ledger-workers", type=int, default=0, dest='perf_ledger_workers',
+                            help="Number of processes used to update perf ledgers. 0 or 1 updates serially.")
+        parser.add_argument("--position-backend", type=str, default=None, choices=['files', 'sqlite'],
+                            dest='position_backend',
+                            help="Where positions are persisted. Defaults to sqlite if validation/positions.db exists, "
+                                 "otherwise one file per position.")
+
         # (developer): Adds your custom arguments to the parser.
         # Adds override arguments for network and netuid.
         parser.add_argument("--netuid", type=int, default=1, help="The chain subnet uid.")
@@ -504,6 +522,11 @@ class Validator:
         if self.api_thread:
             bt.logging.warning("Stopping API manager...")
             self.api_thread.join()
+        bt.logging.warning("Writing startup snapshot...")
+        try:
+            self.position_manager.write_startup_snapshot()
+        except Exception:
+            bt.logging.error(traceback.format_exc())
         signal.alarm(0)
         print("Graceful shutdown completed")
         sys.exit(0)
@@ -516,13 +539,14 @@ class Validator:
             try:
                 current_time = TimeUtil.now_in_millis()
                 self.price_slippage_model.refresh_features_daily()
-                self.position_syncer.sync_positions_with_cooldown(self.auto_sync)
+                self.position_syncer.sync_positions_with_cooldown(self.auto_sync, self.position_locks)
                 self.mdd_checker.mdd_check(self.position_locks)
                 self.challengeperiod_manager.refresh(current_time=current_time)
                 self.elimination_manager.process_eliminations(self.position_locks)
                 self.weight_setter.set_weights(self.wallet, self.config.netuid, self.subtensor, current_time=current_time)
                 #self.position_locks.cleanup_locks(self.metagraph.hotkeys)
                 self.p2p_syncer.sync_positions_with_cooldown()
+                self.position_manager.write_startup_snapshot_with_cooldown()
 
             # In case of unforeseen errors, the miner will log the error and continue operations.
             except Exception:
@@ -894,21 +918,26 @@ class Validator:
                     # reset checkpoint after 10 minutes
                     if TimeUtil.now_in_millis() - self.last_checkpoint_time > 1000 * 60 * 10:
                         self.encoded_checkpoint = ""
-                    # save checkpoint so we only generate it once for all requests
-                    if not self.encoded_checkpoint:
-                        # get our current checkpoint
-                        self.last_checkpoint_time = TimeUtil.now_in_millis()
-                        checkpoint_dict = self.request_core_manager.generate_request_core()
-
-                        # compress json and encode as base64 to keep as a string
-                        checkpoint_str = json.dumps(checkpoint_dict, cls=CustomEncoder)
-                        compressed = gzip.compress(checkpoint_str.encode("utf-8"))
-                        self.encoded_checkpoint = base64.b64encode(compressed).decode("utf-8")
 
                     # only send a checkpoint if we are an up-to-date validator
                     timestamp = self.timestamp_manager.get_last_order_timestamp()
                     if TimeUtil.now_in_millis() - timestamp < 1000 * 60 * 60 * 10:  # validators with no orders processed in 10 hrs are considered stale
-                        synapse.checkpoint = self.encoded_checkpoint
+                        if synapse.digest:
+                            # only send the positions differing from the digest of the requesting validator
+                            checkpoint_writer = CheckpointWriter()
+                            self.request_core_manager.write_checkpoint(checkpoint_writer, digest=synapse.digest)
+                            synapse.checkpoint = checkpoint_writer.finish()
+                            synapse.is_delta = True
+                        else:
+                            # save checkpoint so we only generate it once for all requests
+                            if not self.encoded_checkpoint:
+                                # get our current checkpoint
+                                self.last_checkpoint_time = TimeUtil.now_in_millis()
+                                # compress json and encode as base64 to keep as a string, one section at a time
+                                checkpoint_writer = CheckpointWriter()
+                                self.request_core_manager.write_checkpoint(checkpoint_writer)
+                                self.encoded_checkpoint = checkpoint_writer.finish()
+                            synapse.checkpoint = self.encoded_checkpoint
                     else:
                         error_message = f"Validator is stale, no orders received in 10 hrs, last order timestamp {timestamp}, {round((TimeUtil.now_in_millis() - timestamp)/(1000 * 60 * 60))} hrs ago"
             except Exception as e:
@@ -921,6 +950,8 @@ class Validator:
                 bt.logging.error(error_message)
                 synapse.successfully_processed = False
             synapse.error_message = error_message
+            # no need to send the digest back
+            synapse.digest = {}
             bt.logging.success(f"Sending checkpoint back to validator [{sender_hotkey}]")
         else:
             bt.logging.info(f"Received a checkpoint poke from non validator [{sender_hotkey}]")
@@ -0,0 +1,156 @@
+import asyncio
+from collections import deque
+from multiprocessing import current_process
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import websockets
+
+# What a client's send queue does with a new message while it is full
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # Drop the oldest queued messages
+OVERFLOW_COALESCE = "coalesce"  # Drop queued messages superseded by a newer message of the same position first
+OVERFLOW_DISCONNECT = "disconnect"  # Disconnect the client, which can fill in the gap over REST after reconnecting
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE, OVERFLOW_DISCONNECT)
+
+# Default number of messages queued per client
+CLIENT_QUEUE_SIZE = 1000
+
+
+class ClientSendQueue:
+    """Bounded outbound queue of one WebSocket client, written to its connection by a dedicated task.
+
+    Broadcasting only appends to the queues without awaiting any client, so a slow or stalled client delays its own
+    messages and nobody else's.
+    """
+
+    def __init__(self,
+                 client_id: str,
+                 websocket,
+                 max_size: int = CLIENT_QUEUE_SIZE,
+                 overflow_policy: str = OVERFLOW_DROP_OLDEST,
+                 on_disconnect: Optional[Callable[[str], None]] = None):
+        """Create the queue and start its writer task in the running event loop.
+
+        Args:
+            client_id: Client ID used in logs and passed to on_disconnect
+            websocket: WebSocket connection of the client
+            max_size: Maximum number of queued messages
+            overflow_policy: One of OVERFLOW_POLICIES
+            on_disconnect: Called with the client ID once the client can no longer be sent to
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy}. Expected one of {OVERFLOW_POLICIES}")
+
+        self.client_id = client_id
+        self.websocket = websocket
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.on_disconnect = on_disconnect
+
+        # (message, serialized message) pairs, the message being kept for coalescing
+        self.queue: Deque[Tuple[Dict[str, Any], str]] = deque()
+        self.has_messages = asyncio.Event()
+        self.n_sent = 0
+        self.n_dropped = 0
+        self.stopped = False
+        self.writer_task = asyncio.create_task(self._write_messages())
+
+    @staticmethod
+    def position_uuid(message: Dict[str, Any]) -> Optional[str]:
+        """Position UUID of a sequenced position message, None for any other message."""
+        data = message.get("data")
+        if isinstance(data, dict) and isinstance(data.get("position"), dict):
+            return data["position"].get("position_uuid")
+        return None
+
+    def put(self, message: Dict[str, Any], serialized_message: str) -> bool:
+        """Queue a message for the client without waiting for it.
+
+        Args:
+            message: Message to send
+            serialized_message: The message serialized once for all clients
+
+        Returns:
+            False if the client is disconnected instead
+        """
+        if self.stopped:
+            return False
+
+        if len(self.queue) >= self.max_size:
+            if self.overflow_policy == OVERFLOW_DISCONNECT:
+                print(f"[{current_process().name}] Disconnecting client {self.client_id} with "
+                      f"{len(self.queue)} unsent messages")
+                self._disconnect(close_connection=True)
+                return False
+
+            if self.overflow_policy == OVERFLOW_COALESCE:
+                self._coalesce(message)
+
+            while len(self.queue) >= self.max_size:
+                self.queue.popleft()
+                self.n_dropped += 1
+
+        self.queue.append((message, serialized_message))
+        self.has_messages.set()
+        return True
+
+    def _coalesce(self, new_message: Dict[str, Any]) -> None:
+        """Drop queued position messages for which a newer message of the same position is queued or arriving.
+
+        Position messages hold the full state of the position, so only the latest one of each position matters.
+        """
+        newer_positions = set()
+        new_position_uuid = self.position_uuid(new_message)
+        if new_position_uuid is not None:
+            newer_positions.add(new_position_uuid)
+
+        kept = deque()
+        for message, serialized_message in reversed(self.queue):
+            position_uuid = self.position_uuid(message)
+            if position_uuid is not None:
+                if position_uuid in newer_positions:
+                    self.n_dropped += 1
+                    continue
+                newer_positions.add(position_uuid)
+            kept.appendleft((message, serialized_message))
+        self.queue = kept
+
+    async def _write_messages(self) -> None:
+        """Send the queued messages in order until stopped or disconnected."""
+        try:
+            while True:
+                await self.has_messages.wait()
+                while self.queue:
+                    _, serialized_message = self.queue.popleft()
+                    await self.websocket.send(serialized_message)
+                    self.n_sent += 1
+                self.has_messages.clear()
+        except asyncio.CancelledError:
+            pass
+        except websockets.exceptions.ConnectionClosed:
+            print(f"[{current_process().name}] Client {self.client_id} disconnected while sending")
+            self._disconnect(close_connection=False)
+        except Exception as e:
+            print(f"[{current_process().name}] Error sending to client {self.client_id}: {e}")
+            self._disconnect(close_connection=True)
+
+    def _disconnect(self, close_connection: bool) -> None:
+        self.stop()
+        if close_connection:
+            asyncio.create_task(self._close_connection())
+        if self.on_disconnect:
+            self.on_disconnect(self.client_id)
+
+    async def _close_connection(self) -> None:
+        try:
+            await self.websocket.close()
+        except Exception as e:
+            print(f"[{current_process().name}] Error closing client {self.client_id}: {e}")
+
+    def stop(self) -> None:
+        """Stop sending to the client and drop the unsent messages."""
+        if self.stopped:
+            return
+        self.stopped = True
+        self.queue.clear()
+        if self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
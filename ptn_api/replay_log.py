@@ -0,0 +1,130 @@
+import os
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Optional, Tuple
+
+# Default number of broadcast messages kept in memory for clients resuming after a reconnect
+REPLAY_LOG_SIZE = 10000
+
+
+class ReplayLog:
+    """Recent broadcast messages by sequence number, so reconnecting clients only receive what they missed.
+
+    The latest max_messages are kept in memory. With a spill file, older messages move to the file until it holds
+    max_spilled_messages, after which its oldest half is dropped. The file is emptied on creation since messages of
+    a previous run are not contiguous with the sequence numbers of this one.
+    """
+
+    def __init__(self,
+                 max_messages: int = REPLAY_LOG_SIZE,
+                 spill_file: Optional[str] = None,
+                 max_spilled_messages: Optional[int] = None):
+        """
+        Args:
+            max_messages: Maximum number of messages kept in memory
+            spill_file: Path of the file receiving the messages evicted from memory, None to drop them
+            max_spilled_messages: Maximum number of messages in the spill file, 10 * max_messages by default
+        """
+        self.max_messages = max_messages
+        # (sequence, serialized message) pairs with contiguous sequence numbers
+        self.messages: Deque[Tuple[int, str]] = deque()
+
+        self.spill_file = spill_file
+        self.max_spilled_messages = max_spilled_messages or 10 * max_messages
+        self.n_spilled = 0
+        self.first_spilled_sequence = None
+        self._spill_fh = None
+        if self.spill_file:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spill_file)), exist_ok=True)
+            self._spill_fh = open(self.spill_file, 'w')
+
+    @property
+    def oldest_sequence(self) -> Optional[int]:
+        """Sequence number of the oldest message still available, None if there is none."""
+        if self.n_spilled:
+            return self.first_spilled_sequence
+        return self.messages[0][0] if self.messages else None
+
+    def append(self, sequence: int, serialized_message: str) -> None:
+        """Add the message broadcast with the next sequence number.
+
+        Args:
+            sequence: Sequence number of the message
+            serialized_message: The message as sent to the clients
+        """
+        # A gap in the sequence numbers makes the older messages unusable for replay
+        if self.messages and sequence != self.messages[-1][0] + 1:
+            self.clear()
+
+        self.messages.append((sequence, serialized_message))
+        if len(self.messages) > self.max_messages:
+            evicted = self.messages.popleft()
+            if self._spill_fh:
+                self._spill(*evicted)
+
+    def _spill(self, sequence: int, serialized_message: str) -> None:
+        if not self.n_spilled:
+            self.first_spilled_sequence = sequence
+        self._spill_fh.write(f"{sequence} {serialized_message}\n")
+        self.n_spilled += 1
+
+        if self.n_spilled > self.max_spilled_messages:
+            # Keep the newest half
+            n_kept = self.max_spilled_messages // 2
+            kept = self._read_spilled(sequence - n_kept)
+            self._spill_fh.close()
+            self._spill_fh = open(self.spill_file, 'w')
+            self.n_spilled = 0
+            for kept_sequence, kept_message in kept:
+                self._spill(kept_sequence, kept_message)
+
+    def _read_spilled(self, last_sequence: int) -> List[Tuple[int, str]]:
+        """Spilled messages with a sequence number after last_sequence."""
+        self._spill_fh.flush()
+        ans = []
+        with open(self.spill_file, 'r') as f:
+            for line in f:
+                sequence, _, serialized_message = line.rstrip('\n').partition(' ')
+                if int(sequence) > last_sequence:
+                    ans.append((int(sequence), serialized_message))
+        return ans
+
+    def messages_after(self, last_sequence: int, current_sequence: int) -> Optional[List[str]]:
+        """Messages a client missed since it received last_sequence.
+
+        Args:
+            last_sequence: Last sequence number received by the client
+            current_sequence: Sequence number of the latest broadcast message
+
+        Returns:
+            The serialized messages after last_sequence in order, or None if some are no longer available
+        """
+        if last_sequence == current_sequence:
+            return []
+
+        oldest_sequence = self.oldest_sequence
+        if (last_sequence > current_sequence or oldest_sequence is None or last_sequence + 1 < oldest_sequence
+                or self.messages[-1][0] != current_sequence):
+            return None
+
+        ans = []
+        if self.n_spilled and last_sequence + 1 < self.messages[0][0]:
+            ans.extend(message for _, message in self._read_spilled(last_sequence))
+
+        n_from_memory = min(current_sequence - last_sequence, len(self.messages))
+        ans.extend(message for _, message in islice(self.messages, len(self.messages) - n_from_memory, None))
+        return ans
+
+    def clear(self) -> None:
+        """Drop every message."""
+        self.messages.clear()
+        if self._spill_fh:
+            self._spill_fh.close()
+            self._spill_fh = open(self.spill_file, 'w')
+        self.n_spilled = 0
+        self.first_spilled_sequence = None
+
+    def close(self) -> None:
+        if self._spill_fh:
+            self._spill_fh.close()
+            self._spill_fh = None
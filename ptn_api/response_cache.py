@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from multiprocessing import current_process
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class CachedBody:
+    """Serialized response body with its ETag, compressed once per encoding on first use."""
+
+    def __init__(self, raw: Optional[bytes] = None, gzipped: Optional[bytes] = None):
+        """
+        Args:
+            raw: Uncompressed body
+            gzipped: Gzip compressed body, when it is what was read from disk
+        """
+        if raw is None and gzipped is None:
+            raise ValueError("CachedBody requires a raw or gzipped body")
+        self._raw = raw
+        self._gzip = gzipped
+        self._br = None
+        self.etag = hashlib.blake2b(raw if raw is not None else gzipped, digest_size=16).hexdigest()
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = gzip.decompress(self._gzip)
+        return self._raw
+
+    @property
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self._raw, compresslevel=GZIP_LEVEL)
+        return self._gzip
+
+    @property
+    def br(self) -> Optional[bytes]:
+        if self._br is None and brotli is not None:
+            self._br = brotli.compress(self.raw, quality=BROTLI_QUALITY)
+        return self._br
+
+    def etags(self) -> Tuple[str, ...]:
+        """Strong ETags of every encoding of the body, suffixed with the encoding like Flask-Compress does."""
+        return f'"{self.etag}"', f'"{self.etag}:gzip"', f'"{self.etag}:br"'
+
+
+class CachedArtifact:
+    """Parsed content of one generation of a file, with a per-miner index and the response bodies built from it."""
+
+    def __init__(self, generation: Tuple[int, int, int], content: bytes, data: Any, index: Dict[str, Any]):
+        self.generation = generation
+        self.content = content
+        self.data = data
+        self.index = index
+        self.bodies: Dict[Any, CachedBody] = {}
+
+    def body(self, key: Any, build: Callable[[], Optional[CachedBody]]) -> Optional[CachedBody]:
+        """Body stored under key, built on first use. Missing bodies (None) are not stored."""
+        ans = self.bodies.get(key)
+        if ans is None:
+            ans = build()
+            if ans is not None:
+                self.bodies[key] = ans
+        return ans
+
+
+class ResponseCache:
+    """
+    Output files of the validator kept parsed in memory along with their response bodies.
+
+    A file is only read again once its generation, its modification time, size or inode, changes. Until then
+    requests are answered from memory, including conditional requests matching the ETag of a body.
+    """
+
+    def __init__(self, attempts: int = 3):
+        """
+        Args:
+            attempts: Number of times a file being rewritten is read before giving up
+        """
+        self.attempts = attempts
+        self.artifacts: Dict[str, CachedArtifact] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _generation(file_path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def get(self,
+            file_path: str,
+            parse: Callable[[bytes], Any],
+            build_index: Optional[Callable[[Any], Dict[str, Any]]] = None) -> Optional[CachedArtifact]:
+        """Latest generation of a file, read and parsed again only if it changed.
+
+        Args:
+            file_path: Path of the file
+            parse: Parses the content of the file
+            build_index: Builds the per-miner index of the parsed content, which is the index itself by default
+
+        Returns:
+            The cached artifact, or None if the file does not exist
+        """
+        generation = self._generation(file_path)
+        if generation is None:
+            self.artifacts.pop(file_path, None)
+            return None
+
+        artifact = self.artifacts.get(file_path)
+        if artifact is not None and artifact.generation == generation:
+            return artifact
+
+        # A single request reloads the file while the others wait for it
+        with self.lock:
+            artifact = self.artifacts.get(file_path)
+            if artifact is not None and artifact.generation == generation:
+                return artifact
+
+            for attempt_number in range(self.attempts):
+                try:
+                    with open(file_path, 'rb') as f:
+                        content = f.read()
+                    data = parse(content)
+                    break
+                except Exception as e:
+                    if artifact is not None:
+                        # Most likely caught mid rewrite, keep serving the previous generation until the next request
+                        print(f"[{current_process().name}] Failed to reload {file_path}, serving previous version: {e}")
+                        return artifact
+                    if attempt_number == self.attempts - 1:
+                        print(f"[{current_process().name}] Failed to load {file_path} after multiple attempts: {e}")
+                        raise
+                    print(f"[{current_process().name}] Attempt {attempt_number + 1} to load {file_path} failed, "
+                          f"retrying...")
+                    time.sleep(1)
+                    # The file may have been replaced in between
+                    generation = self._generation(file_path) or generation
+
+            index = build_index(data) if build_index else data
+            artifact = CachedArtifact(generation, content, data, index)
+            self.artifacts[file_path] = artifact
+            return artifact
@@ -21,6 +21,7 @@ from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
 from vali_objects.vali_config import ValiConfig
 from multiprocessing import current_process
 from ptn_api.api_key_refresh import APIKeyMixin
+from ptn_api.response_cache import CachedBody, ResponseCache
 
 
 class APIMetricsTracker:
@@ -216,6 +217,9 @@ class PTNRestServer(APIKeyMixin):
         # Initialize Flask-Compress for GZIP compression
         Compress(self.app)
 
+        # Output files kept in memory with their precompressed response bodies
+        self.response_cache = ResponseCache()
+
         # Initialize metrics tracking
         self._setup_metrics(metrics_interval_minutes)
 
@@ -267,7 +271,6 @@ class PTNRestServer(APIKeyMixin):
 
             # Get the 'tier' query parameter from the request
             requested_tier = str(request.args.get('tier', 100))
-            is_gz_data = True
 
             # Validate the 'tier' parameter
             if requested_tier not in ['0', '30', '50', '100']:
@@ -278,15 +281,13 @@ class PTNRestServer(APIKeyMixin):
                 return jsonify({'error': f'Your API key does not have access to tier {requested_tier} data'}), 403
 
             f = ValiBkpUtils.get_miner_positions_output_path(suffix_dir=requested_tier)
+            artifact = self._get_cached_positions(f)
 
-            # Attempt to retrieve the file
-            data = self._get_file(f, binary=is_gz_data)
-
-            if data is None:
+            if artifact is None:
                 return f"{f} not found", 404
-            return Response(data, content_type='application/json', headers={
-                'Content-Encoding': 'gzip'
-            })
+            # The file is already gzip compressed
+            body = artifact.body(None, lambda: CachedBody(gzipped=artifact.content))
+            return self._cached_response(body)
 
         @self.app.route("/miner-positions/<minerid>", methods=["GET"])
         def get_miner_positions_unique(minerid):
@@ -306,12 +307,14 @@ class PTNRestServer(APIKeyMixin):
             else:
                 requested_tier = str(api_key_tier)
                 f = ValiBkpUtils.get_miner_positions_output_path(suffix_dir=requested_tier)
-                data = self._get_file(f)
+                artifact = self._get_cached_positions(f)
 
-                if data is None:
+                if artifact is None:
                     return f"{f} not found", 404
-                # Filter the data for the specified miner ID
-                filtered_data = data.get(minerid, None)
+                body = artifact.body(minerid, lambda: self._serialize(artifact.index.get(minerid)))
+                if body is None:
+                    return jsonify({'error': f'Miner ID {minerid} not found'}), 404
+                return self._cached_response(body)
 
             if not filtered_data:
                 return jsonify({'error': f'Miner ID {minerid} not found'}), 404
@@ -370,19 +373,21 @@ class PTNRestServer(APIKeyMixin):
                 return jsonify({'error': 'Unauthorized access'}), 401
 
             f = ValiBkpUtils.get_miner_stats_dir()
-            data = self._get_file(f)
-            if data is None:
+            artifact = self._get_cached_statistics(f)
+            if artifact is None:
                 return f"{f} not found", 404
 
             # Grab the optional "checkpoints" query param; default it to "true"
-            show_checkpoints = request.args.get("checkpoints", "true").lower()
+            show_checkpoints = request.args.get("checkpoints", "true").lower() != "false"
 
-            # If checkpoints=false, remove the "checkpoints" key from each element in data
-            if show_checkpoints == "false":
-                for element in data.get("data", []):
-                    element.pop("checkpoints", None)
+            def build():
+                data = artifact.data
+                # If checkpoints=false, remove the "checkpoints" key from each element in data
+                if not show_checkpoints:
+                    data = dict(data, data=[self._without_checkpoints(element) for element in data.get("data", [])])
+                return self._serialize(data)
 
-            return jsonify(data)
+            return self._cached_response(artifact.body((None, show_checkpoints), build))
 
         @self.app.route("/statistics/<minerid>/", methods=["GET"])
         def get_validator_checkpoint_statistics_unique(minerid):
@@ -391,25 +396,27 @@ class PTNRestServer(APIKeyMixin):
                 return jsonify({'error': 'Unauthorized access'}), 401
 
             f = ValiBkpUtils.get_miner_stats_dir()
-            data = self._get_file(f)
-            if data is None:
+            artifact = self._get_cached_statistics(f)
+            if artifact is None:
                 return f"{f} not found", 404
 
-            data_summary = data.get("data", [])
-            if not data_summary:
+            if not artifact.data.get("data", []):
                 return jsonify({'error': 'No data found'}), 404
 
             # Grab the optional "checkpoints" query param; default it to "true"
-            show_checkpoints = request.args.get("checkpoints", "true").lower()
+            show_checkpoints = request.args.get("checkpoints", "true").lower() != "false"
 
-            for element in data_summary:
-                if element.get("hotkey", None) == minerid:
-                    # If the user set checkpoints=false, remove them from this element
-                    if show_checkpoints == "false":
-                        element.pop("checkpoints", None)
-                    return jsonify(element)
+            def build():
+                element = artifact.index.get(minerid)
+                if element is None:
+                    return None
+                # If the user set checkpoints=false, remove them from this element
+                return self._serialize(element if show_checkpoints else self._without_checkpoints(element))
 
-            return jsonify({'error': 'Miner ID not found'}), 404
+            body = artifact.body((minerid, show_checkpoints), build)
+            if body is None:
+                return jsonify({'error': 'Miner ID not found'}), 404
+            return self._cached_response(body)
 
         @self.app.route("/eliminations", methods=["GET"])
         def get_eliminations():
@@ -437,6 +444,72 @@ class PTNRestServer(APIKeyMixin):
                 api_key = api_key.split(' ')[1]  # Remove 'Bearer ' prefix
         return api_key
 
+    def _get_cached_positions(self, f):
+        """Tiered positions output, indexed by miner hotkey."""
+        file_path = os.path.abspath(os.path.join(self.data_path, f))
+        return self.response_cache.get(file_path, lambda content: json.loads(gzip.decompress(content)))
+
+    def _get_cached_statistics(self, f):
+        """Miner statistics output, indexed by miner hotkey."""
+        file_path = os.path.abspath(os.path.join(self.data_path, f))
+        return self.response_cache.get(file_path, json.loads, self._index_statistics)
+
+    @staticmethod
+    def _index_statistics(data):
+        index = {}
+        for element in data.get("data", []):
+            index.setdefault(element.get("hotkey"), element)
+        return index
+
+    @staticmethod
+    def _without_checkpoints(element):
+        return {k: v for k, v in element.items() if k != "checkpoints"}
+
+    def _serialize(self, data):
+        """Body of a JSON response, serialized like jsonify does. None if there is no data."""
+        if not data:
+            return None
+        return CachedBody(raw=self.app.json.dumps(data).encode('utf-8'))
+
+    @staticmethod
+    def _accepted_encodings():
+        """Content encodings accepted by the client, ignoring the ones it refuses with q=0."""
+        ans = set()
+        for encoding in request.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = encoding.partition(';')
+            params = params.replace(' ', '')
+            try:
+                if params.startswith('q=') and float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+            ans.add(name.strip().lower())
+        return ans
+
+    def _cached_response(self, body: CachedBody):
+        """Respond with the best encoding of a cached body the client accepts, or 304 if it has it already."""
+        accepted = self._accepted_encodings()
+        if 'br' in accepted and body.br is not None:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            encoding = None
+        etag = f'"{body.etag}:{encoding}"' if encoding else f'"{body.etag}"'
+        # The representation depends on Accept-Encoding, so shared caches must key on it
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = {e.strip().removeprefix('W/') for e in if_none_match.split(',')}
+            if '*' in etags or etags.intersection(body.etags()):
+                return Response(status=304, headers=headers)
+
+        if encoding is None:
+            return Response(body.raw, content_type='application/json', headers=headers)
+        data = body.br if encoding == 'br' else body.gzip
+        return Response(data, content_type='application/json', headers=dict(headers, **{'Content-Encoding': encoding}))
+
     def _get_file(self, f, attempts=3, binary=False):
         """Read file with multiple attempts and return its contents."""
         file_path = os.path.abspath(os.path.join(self.data_path, f))
@@ -106,7 +106,8 @@ class PTNWebSocketClient:
                  api_key: Optional[str] = None,
                  host: str = "localhost",
                  port: int = 8765,
-                 secure: bool = False):
+                 secure: bool = False,
+                 on_snapshot_required: Optional[Callable[[Dict[str, Any]], None]] = None):
         """Initialize the WebSocket client.
 
         Args:
@@ -114,6 +115,8 @@ class PTNWebSocketClient:
             host: WebSocket server hostname
             port: WebSocket server port
             secure: Whether to use secure WebSocket (wss://) or not
+            on_snapshot_required: Called with the server's snapshot marker when messages missed while disconnected
+                can no longer be replayed, to fetch the current positions over REST
         """
         protocol = "wss" if secure else "ws"
         self.uri = f"{protocol}://{host}:{port}"
@@ -134,6 +137,7 @@ class PTNWebSocketClient:
         # Message processing
         self.message_handlers = []
         self.message_buffer = {}
+        self.on_snapshot_required = on_snapshot_required
 
         # Statistics
         self.messages_received = 0
@@ -268,9 +272,10 @@ class PTNWebSocketClient:
             error_msg = response_data.get("message", "Authentication failed")
             raise Exception(f"Authentication error: {error_msg}")
 
-        # Update sequence if needed
+        # A new client starts from the current sequence. A resuming client keeps its last sequence, which the
+        # server replays the missed messages from once subscribed.
         server_sequence = response_data.get("current_sequence", 0)
-        if server_sequence > self.last_sequence:
+        if self.last_sequence < 0:
             self.last_sequence = server_sequence
             self._save_sequence()
 
@@ -284,12 +289,13 @@ class PTNWebSocketClient:
                 message = await asyncio.wait_for(self.websocket.recv(), timeout=60)
                 data = json.loads(message)
 
-                # Handle batch messages
+                # Handle batch messages, including the messages replayed after a reconnect
                 if data.get("type") == "batch" and "messages" in data:
                     messages = []
                     for item in data["messages"]:
-                        if "sequence" in item:
-                            self.last_sequence = max(self.last_sequence, item["sequence"])
+                        # Skip messages already received
+                        if "sequence" in item and item["sequence"] > self.last_sequence:
+                            self.last_sequence = item["sequence"]
                             messages.append(PTNWebSocketMessage(item, self.clock_offset_estimate_ms))
 
                     # Call handlers with the batch of messages
@@ -299,7 +305,9 @@ class PTNWebSocketClient:
 
                 # Handle single messages
                 elif "sequence" in data:
-                    self.last_sequence = max(self.last_sequence, data["sequence"])
+                    if data["sequence"] <= self.last_sequence:
+                        continue
+                    self.last_sequence = data["sequence"]
                     message_obj = PTNWebSocketMessage(data, self.clock_offset_estimate_ms)
 
                     # Call handlers with a list containing one message
@@ -307,6 +315,23 @@ class PTNWebSocketClient:
                         for handler in self.message_handlers:
                             await self._call_handler(handler, [message_obj])
 
+                # The missed messages can no longer be replayed, live messages continue from the current sequence
+                elif data.get("type") == "snapshot_required":
+                    self.logger.warning("Missed messages after sequence %s are no longer available. "
+                                        "Resuming from sequence %s.", data.get("last_sequence"),
+                                        data.get("current_sequence"))
+                    self.last_sequence = data.get("current_sequence", self.last_sequence)
+                    self._save_sequence()
+                    if self.on_snapshot_required:
+                        try:
+                            if asyncio.iscoroutinefunction(self.on_snapshot_required):
+                                await self.on_snapshot_required(data)
+                            else:
+                                self.on_snapshot_required(data)
+                        except Exception as e:
+                            self.logger.error("Error in snapshot handler: %s", e)
+                            traceback.print_exc()
+
                 # Handle subscription status messages
                 elif data.get("type") == "subscription_status":
                     now_ms = TimeUtil.now_in_millis()
@@ -5,6 +5,7 @@ import websockets
 import traceback
 import argparse
 import os
+import queue
 from multiprocessing import Manager
 from collections import defaultdict, deque
 from multiprocessing import current_process
@@ -17,11 +18,19 @@ from vali_objects.utils.vali_bkp_utils import CustomEncoder, ValiBkpUtils
 
 # Assuming APIKeyMixin is in api.api_key_refresh
 from ptn_api.api_key_refresh import APIKeyMixin
+from ptn_api.client_send_queue import ClientSendQueue, CLIENT_QUEUE_SIZE, OVERFLOW_DROP_OLDEST, OVERFLOW_POLICIES
+from ptn_api.replay_log import ReplayLog, REPLAY_LOG_SIZE
 from vali_objects.vali_config import TradePair
 
 # Maximum number of websocket connections allowed per API key
 MAX_N_WS_PER_API_KEY = 5
 
+# Maximum number of messages taken from the shared queue in one executor call
+SHARED_QUEUE_MAX_BATCH = 100
+
+# Maximum number of missed messages replayed to a resuming client in one batch message
+REPLAY_BATCH_SIZE = 500
+
 
 class WebSocketServer(APIKeyMixin):
     """Handles WebSocket connections with authentication and message broadcasting."""
@@ -35,7 +44,11 @@ class WebSocketServer(APIKeyMixin):
                  max_reconnect_attempts: int = 10,
                  refresh_interval: int = 15,
                  send_test_positions: bool = False,
-                 test_position_interval: int = 5):
+                 test_position_interval: int = 5,
+                 client_queue_size: int = CLIENT_QUEUE_SIZE,
+                 overflow_policy: str = OVERFLOW_DROP_OLDEST,
+                 replay_log_size: int = REPLAY_LOG_SIZE,
+                 replay_spill_file: Optional[str] = None):
         """Initialize the WebSocket server.
 
         Args:
@@ -48,6 +61,10 @@ class WebSocketServer(APIKeyMixin):
             refresh_interval: How often to check for API key changes (seconds)
             send_test_positions: Whether to periodically send test orders (for testing only)
             test_positions_interval: How often to send test orders (seconds)
+            client_queue_size: Maximum number of messages queued for each client
+            overflow_policy: What to do when a client's queue is full, one of OVERFLOW_POLICIES
+            replay_log_size: Number of recent messages kept in memory for resuming clients
+            replay_spill_file: File receiving older messages for resuming clients, None to keep only the recent ones
         """
         # Initialize API key handling
         APIKeyMixin.__init__(self, api_keys_file, refresh_interval)
@@ -69,6 +86,13 @@ class WebSocketServer(APIKeyMixin):
         # API key tracking - maintain a FIFO queue for each API key
         self.api_key_clients: Dict[str, Deque[str]] = defaultdict(deque)
 
+        # Outbound queue of each authenticated client, so broadcasts never wait for a slow client
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow_policy}. Expected one of {OVERFLOW_POLICIES}")
+        self.client_queue_size = client_queue_size
+        self.overflow_policy = overflow_policy
+        self.client_send_queues: Dict[str, ClientSendQueue] = {}
+
         # Message queueing and processing
         self.shared_queue = shared_queue
         self.queue_check_interval = 0.1  # seconds
@@ -79,6 +103,9 @@ class WebSocketServer(APIKeyMixin):
         self.sequence_file = ValiBkpUtils.get_sequence_number_file_path()
         self._load_sequence_number()
 
+        # Recent messages by sequence number, replayed to clients resuming from their last sequence
+        self.replay_log = ReplayLog(max_messages=replay_log_size, spill_file=replay_spill_file)
+
         # Tasks
         self.save_task = None
         self.queue_processor_task = None
@@ -135,13 +162,29 @@ class WebSocketServer(APIKeyMixin):
             except Exception as e:
                 print(f"[{current_process().name}] Error in periodic save: {e}")
 
+    def _get_from_shared_queue(self) -> list:
+        """Wait briefly for a message in the shared queue, then take every other message already there.
+
+        Runs in a thread pool, so the event loop makes one executor call per batch of messages.
+        """
+        try:
+            messages = [self.shared_queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+
+        while len(messages) < SHARED_QUEUE_MAX_BATCH:
+            try:
+                messages.append(self.shared_queue.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
     async def _check_shared_queue(self) -> None:
         """Check the shared queue for messages from other processes."""
         if self.shared_queue is None:
             print(f"[{current_process().name}] No shared queue available")
             return
 
-        # Create an event loop to handle queue notifications
         loop = asyncio.get_running_loop()
 
         while True:
@@ -150,28 +193,12 @@ class WebSocketServer(APIKeyMixin):
                 if self.shutdown_event and self.shutdown_event.is_set():
                     break
 
-                # Use a future to get the next item from the queue without polling
-                future = loop.create_future()
+                # The blocking gets run in a thread pool
+                messages = await loop.run_in_executor(None, self._get_from_shared_queue)
 
-                # Schedule a callback to run in a thread pool to get an item without blocking
-                def get_from_queue():
-                    try:
-                        # This is a blocking call but runs in a thread pool
-                        item = self.shared_queue.get()
-                        # Set the result on the future when an item is available
-                        loop.call_soon_threadsafe(lambda: future.set_result(item))
-                    except Exception as ex:
-                        # Set exception on the future if there's an error
-                        loop.call_soon_threadsafe(lambda exc=ex: future.set_exception(exc))
-
-                # Run the get operation in a thread pool
-                await loop.run_in_executor(None, get_from_queue)
-
-                # Wait for the result from the queue
-                message_data = await future
-
-                # Forward the message immediately to our asyncio queue
-                await self.message_queue.put(message_data)
+                # Forward the messages immediately to our asyncio queue
+                for message_data in messages:
+                    self.message_queue.put_nowait(message_data)
 
             except asyncio.CancelledError:
                 print(f"[{current_process().name}] Shared queue monitor cancelled")
@@ -304,11 +331,13 @@ class WebSocketServer(APIKeyMixin):
         for message_data in messages:
             self.sequence_number += 1
 
-            sequenced_messages.append({
+            message_with_seq = {
                 "sequence": self.sequence_number,
                 "timestamp": TimeUtil.now_in_millis(),
                 "data": message_data
-            })
+            }
+            sequenced_messages.append(message_with_seq)
+            self.replay_log.append(self.sequence_number, json.dumps(message_with_seq, cls=CustomEncoder))
 
         # Create a batch message
         batch_message = {
@@ -318,25 +347,8 @@ class WebSocketServer(APIKeyMixin):
         }
 
         serialized_message = json.dumps(batch_message, cls=CustomEncoder)
-
-        # Send to all subscribed clients
-        disconnected_clients = []
-        for client_id in self.subscribed_clients:
-            if client_id in self.connected_clients:
-                websocket = self.connected_clients[client_id]
-                try:
-                    await websocket.send(serialized_message)
-                except websockets.exceptions.ConnectionClosed:
-                    # Client disconnected, remove from subscribers
-                    disconnected_clients.append(client_id)
-                    print(f"[{current_process().name}] Client {client_id} disconnected while sending batch")
-                except Exception as e:
-                    print(f"[{current_process().name}] Error sending batch to client {client_id}: {e}")
-                    disconnected_clients.append(client_id)
-
-        # Remove disconnected clients
-        for client_id in disconnected_clients:
-            self._remove_client(client_id)
+        self._fan_out(batch_message, serialized_message)
+        await asyncio.sleep(0)
 
         return self.sequence_number
 
@@ -360,27 +372,64 @@ class WebSocketServer(APIKeyMixin):
         }
 
         serialized_message = json.dumps(message_with_seq, cls=CustomEncoder)
+        self.replay_log.append(self.sequence_number, serialized_message)
+        self._fan_out(message_with_seq, serialized_message)
+        # Let the clients' writer tasks take the message before the next one, so a burst of messages only
+        # overflows the queues of clients that are actually behind
+        await asyncio.sleep(0)
 
-        # Send to all subscribed clients
-        disconnected_clients = []
-        for client_id in self.subscribed_clients:
-            if client_id in self.connected_clients:
-                websocket = self.connected_clients[client_id]
-                try:
-                    await websocket.send(serialized_message)
-                except websockets.exceptions.ConnectionClosed:
-                    # Client disconnected, mark for removal
-                    disconnected_clients.append(client_id)
-                    print(f"[{current_process().name}] Client {client_id} disconnected while sending")
-                except Exception as e:
-                    print(f"[{current_process().name}] Error sending to client {client_id}: {e}")
-                    disconnected_clients.append(client_id)
+        return self.sequence_number
 
-        # Remove disconnected clients
-        for client_id in disconnected_clients:
-            self._remove_client(client_id)
+    def _fan_out(self, message: Dict[str, Any], serialized_message: str) -> None:
+        """Queue a message for every subscribed client. The clients' writer tasks do the sending.
 
-        return self.sequence_number
+        Args:
+            message: Message to send
+            serialized_message: The message serialized once for all clients
+        """
+        # Clients disconnected by the overflow policy leave the subscriptions while iterating
+        for client_id in list(self.subscribed_clients):
+            send_queue = self.client_send_queues.get(client_id)
+            if send_queue is not None:
+                send_queue.put(message, serialized_message)
+
+    def _resume_client(self, client_id: str, last_sequence: int) -> None:
+        """Queue the messages a reconnecting client missed since last_sequence, or a snapshot marker if they are no
+        longer available and the client has to fetch positions over REST.
+
+        Called right before subscribing the client, without awaiting in between, so live messages follow the replay.
+
+        Args:
+            client_id: Client ID to resume
+            last_sequence: Last sequence number the client received
+        """
+        send_queue = self.client_send_queues.get(client_id)
+        if send_queue is None or last_sequence < 0:
+            return
+
+        missed_messages = self.replay_log.messages_after(last_sequence, self.sequence_number)
+        if missed_messages is None:
+            marker = {
+                "type": "snapshot_required",
+                "last_sequence": last_sequence,
+                "current_sequence": self.sequence_number,
+                "oldest_sequence": self.replay_log.oldest_sequence,
+                "message": "Missed messages are no longer available. Fetch the current positions over REST."
+            }
+            send_queue.put(marker, json.dumps(marker))
+            print(f"[{current_process().name}] Client {client_id} resuming from sequence {last_sequence} "
+                  f"needs a snapshot. Current sequence: {self.sequence_number}")
+            return
+
+        # Batches of the already serialized messages
+        for i in range(0, len(missed_messages), REPLAY_BATCH_SIZE):
+            chunk = missed_messages[i:i + REPLAY_BATCH_SIZE]
+            batch_message = {"type": "batch", "replay": True, "count": len(chunk)}
+            serialized_batch = json.dumps(batch_message)[:-1] + ', "messages": [' + ", ".join(chunk) + "]}"
+            send_queue.put(batch_message, serialized_batch)
+        if missed_messages:
+            print(f"[{current_process().name}] Replayed {len(missed_messages)} messages to client {client_id} "
+                  f"from sequence {last_sequence}")
 
     def _remove_client(self, client_id: str) -> None:
         """Remove a client from all subscriptions and connected clients.
@@ -388,6 +437,11 @@ class WebSocketServer(APIKeyMixin):
         Args:
             client_id: Client ID to remove
         """
+        # Stop the client's writer task
+        send_queue = self.client_send_queues.pop(client_id, None)
+        if send_queue is not None:
+            send_queue.stop()
+
         # Remove from connected clients
         if client_id in self.connected_clients:
             # Get API key associated with this client
@@ -464,9 +518,10 @@ class WebSocketServer(APIKeyMixin):
 
             api_key = auth_data['api_key']
 
-            # Get last received sequence number from client if provided.
-            # TODO: implement per-sequence recovery. until then, clients can make REST request to fillin detected gaps.
-            # last_sequence = auth_data.get('last_sequence', -1)
+            # Last received sequence number from the client, to replay what it missed once it subscribes
+            last_sequence = auth_data.get('last_sequence', -1)
+            if not isinstance(last_sequence, int):
+                last_sequence = -1
 
             # Validate API key
             try:
@@ -538,11 +593,16 @@ class WebSocketServer(APIKeyMixin):
 
             # Add to connected clients
             self.connected_clients[client_id] = websocket
+            self.client_send_queues[client_id] = ClientSendQueue(client_id, websocket,
+                                                                 max_size=self.client_queue_size,
+                                                                 overflow_policy=self.overflow_policy,
+                                                                 on_disconnect=self._remove_client)
 
             # Store the client's auth information
             self.client_auth[client_id] = {
                 "api_key": api_key,
-                "tier": api_key_tier
+                "tier": api_key_tier,
+                "last_sequence": last_sequence
             }
 
             # Add to API key tracking (FIFO queue)
@@ -575,6 +635,9 @@ class WebSocketServer(APIKeyMixin):
                     elif message_type == "subscribe":
                         # Handle subscription to all data
                         if data.get("all", False):
+                            # Replay the missed messages once, ahead of the live ones
+                            if client_id not in self.subscribed_clients:
+                                self._resume_client(client_id, self.client_auth[client_id].pop("last_sequence", -1))
                             self.subscribed_clients.add(client_id)
                             print(f"[{current_process().name}] Client {client_id} subscribed to all data")
 
@@ -734,7 +797,9 @@ class WebSocketServer(APIKeyMixin):
             except Exception as e:
                 print(f"[{current_process().name}] Error while waiting for server to close: {e}")
 
-        # Close all client connections
+        # Stop the writer tasks and close all client connections
+        for send_queue in list(self.client_send_queues.values()):
+            send_queue.stop()
         for client_id, websocket in list(self.connected_clients.items()):
             try:
                 await websocket.close()
@@ -779,6 +844,7 @@ class WebSocketServer(APIKeyMixin):
         # Final save of sequence number
         print(f"[{current_process().name}] Saving final sequence number: {self.sequence_number}")
         self._save_sequence_number()
+        self.replay_log.close()
         print(f"[{current_process().name}] WebSocket server shutdown complete")
 
     def run(self):
@@ -840,6 +906,14 @@ if __name__ == "__main__":
     parser.add_argument('--port', type=int, help='Port to bind the server to', default=8765)
     parser.add_argument('--test-positions', action='store_true', help='Enable periodic test positions', default=True)
     parser.add_argument('--test-position-interval', type=int, help='Interval in seconds between test positions', default=5)
+    parser.add_argument('--client-queue-size', type=int, help='Maximum number of messages queued per client',
+                        default=CLIENT_QUEUE_SIZE)
+    parser.add_argument('--overflow-policy', type=str, choices=OVERFLOW_POLICIES, default=OVERFLOW_DROP_OLDEST,
+                        help='What to do when a client falls behind by more than its queue size')
+    parser.add_argument('--replay-log-size', type=int, help='Number of recent messages kept for resuming clients',
+                        default=REPLAY_LOG_SIZE)
+    parser.add_argument('--replay-spill-file', type=str, help='File keeping older messages for resuming clients',
+                        default=None)
     parser.set_defaults(test_positions=True)
 
     args = parser.parse_args()
@@ -866,7 +940,11 @@ if __name__ == "__main__":
         host=args.host,
         port=args.port,
         send_test_positions=args.test_positions,
-        test_position_interval=args.test_position_interval
+        test_position_interval=args.test_position_interval,
+        client_queue_size=args.client_queue_size,
+        overflow_policy=args.overflow_policy,
+        replay_log_size=args.replay_log_size,
+        replay_spill_file=args.replay_spill_file
     )
 
     # Run the server
@@ -1,19 +1,26 @@
+import bisect
 import copy
 import gzip
 import json
 import os
 import hashlib
+import struct
+import threading
+import zlib
 
 from google.cloud import storage
 
 from time_util.time_util import TimeUtil
 from vali_objects.utils.challengeperiod_manager import ChallengePeriodManager
+from vali_objects.utils.checkpoint_delta import apply_checkpoint_delta, delta_buckets, miner_digest, n_buckets_for, \
+    parse_miner_digest, position_bucket, position_digest
+from vali_objects.utils.checkpoint_stream import CheckpointWriter
 from vali_objects.utils.elimination_manager import EliminationManager
 from vali_objects.utils.plagiarism_detector import PlagiarismDetector
 from vali_objects.vali_config import ValiConfig
 from vali_objects.decoders.generalized_json_decoder import GeneralizedJSONDecoder
 from vali_objects.position import Position
-from vali_objects.utils.position_manager import PositionManager
+from vali_objects.utils.position_manager import PositionManager, PRICE_SOURCE_RETENTION_MS
 from vali_objects.utils.vali_bkp_utils import ValiBkpUtils, CustomEncoder
 from vali_objects.utils.subtensor_weight_setter import SubtensorWeightSetter
 from vali_objects.vali_dataclasses.perf_ledger import PerfLedgerManager
@@ -24,6 +31,149 @@ from vali_objects.utils.validator_sync_base import AUTO_SYNC_ORDER_LAG_MS
 PERCENT_NEW_POSITIONS_TIERS = [100, 50, 30, 0]
 assert sorted(PERCENT_NEW_POSITIONS_TIERS, reverse=True) == PERCENT_NEW_POSITIONS_TIERS, 'needs to be sorted for efficient pruning'
 
+# Same level as gzip.compress used for the tier files
+GZIP_LEVEL = 9
+# gzip member header without a file name or modification time, flagged as maximum compression
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x02\xff'
+
+
+def deflate_segment(data: bytes) -> bytes:
+    """
+    Raw deflate of data, independent of what precedes it and ending on a byte boundary, so that segments compressed
+    separately can be concatenated into one deflate stream.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+# Final empty block of a deflate stream
+DEFLATE_END = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS).flush(zlib.Z_FINISH)
+JSON_OPEN = (b'{', deflate_segment(b'{'))
+JSON_SEPARATOR = (b', ', deflate_segment(b', '))
+JSON_CLOSE = (b'}', deflate_segment(b'}'))
+
+
+def gzip_segments(segments: list[tuple[bytes, bytes]]) -> bytes:
+    """
+    Single member gzip file of the concatenation of (raw, deflated) segments. Only the checksum goes over the raw
+    bytes again, the compression of each segment is reused.
+    """
+    crc = 0
+    size = 0
+    for raw, _ in segments:
+        crc = zlib.crc32(raw, crc)
+        size += len(raw)
+    return b''.join([GZIP_HEADER, *(deflated for _, deflated in segments), DEFLATE_END,
+                     struct.pack('<II', crc, size & 0xffffffff)])
+
+
+def json_object_segments(members: list[tuple[bytes, bytes]]) -> list[tuple[bytes, bytes]]:
+    """
+    Segments of a json object from the segments of its '"key": value' members.
+    """
+    ans = [JSON_OPEN]
+    for i, member in enumerate(members):
+        if i:
+            ans.append(JSON_SEPARATOR)
+        ans.append(member)
+    ans.append(JSON_CLOSE)
+    return ans
+
+
+class MinerOutput:
+    """
+    Serialized outputs of one miner, built from one version of its positions.
+
+    Besides the positions, the outputs depend on the time through a few thresholds: positions opened in the lookback
+    window count toward the thirty day returns, price sources are stripped from older orders and the tiers withhold
+    the recent orders. The outputs stay valid as long as none of the miner's timestamps crossed a threshold, which the
+    time key captures by counting the timestamps on each side of them.
+    """
+
+    def __init__(self, hotkey: str, version: tuple, positions: list[Position], time_now_ms: int,
+                 acceptable_position_end_ms: int):
+        self.hotkey = hotkey
+        self.version = version
+        self.open_ms = sorted(p.open_ms for p in positions)
+        self.processed_ms = sorted(o.processed_ms for p in positions for o in p.orders)
+        self.close_ms = sorted(p.close_ms for p in positions if p.is_closed_position)
+        self.time_key = self.get_time_key(time_now_ms, acceptable_position_end_ms)
+
+        self.n_orders = len(self.processed_ms)
+        self.youngest_order_processed_ms = self.processed_ms[0] if self.processed_ms else float("inf")
+        self.oldest_order_processed_ms = self.processed_ms[-1] if self.processed_ms else 0
+
+        dashboard_dict = PositionManager.positions_to_dashboard_dict(positions, time_now_ms,
+                                                                     acceptable_position_end_ms)
+        n_orders_dashboard = sum(len(p['orders']) for p in dashboard_dict['positions'])
+        assert self.n_orders == n_orders_dashboard, \
+            f"n_orders_original: {self.n_orders}, n_positions_new: {n_orders_dashboard}"
+        self.thirty_day_returns = dashboard_dict["thirty_day_returns"]
+        # Entry of the miner in a delta checkpoint, without the positions
+        self.summary = {k: v for k, v in dashboard_dict.items() if k != "positions"}
+        # '"hotkey": {...}' member of the positions object
+        self.positions_member = json.dumps({hotkey: dashboard_dict}, cls=CustomEncoder)[1:-1].encode('utf-8')
+        # tier -> (raw, deflated) member of the tier file, built on first use
+        self.tier_members = None
+        # (position_uuid, digest) of each position of the checkpoint, built on first use
+        self.position_digests = None
+
+    def get_time_key(self, time_now_ms: int, acceptable_position_end_ms: int) -> tuple:
+        stale_date_threshold_ms = time_now_ms - AUTO_SYNC_ORDER_LAG_MS
+        return (bisect.bisect_right(self.open_ms, acceptable_position_end_ms),
+                bisect.bisect_left(self.processed_ms, time_now_ms - PRICE_SOURCE_RETENTION_MS),
+                bisect.bisect_left(self.processed_ms, stale_date_threshold_ms),
+                bisect.bisect_left(self.close_ms, stale_date_threshold_ms))
+
+    def dashboard_dict(self) -> dict:
+        """
+        A fresh copy of the dashboard dict of the miner.
+        """
+        return json.loads(b'{' + self.positions_member + b'}')[self.hotkey]
+
+    def get_position_digests(self) -> list[tuple[str, bytes]]:
+        if self.position_digests is None:
+            self.position_digests = [(p['position_uuid'], position_digest(p))
+                                     for p in self.dashboard_dict()['positions']]
+        return self.position_digests
+
+    def get_miner_digest(self) -> str:
+        position_digests = self.get_position_digests()
+        return miner_digest(position_digests, n_buckets_for(len(position_digests)))
+
+    def delta_member(self, digest: str) -> bytes:
+        """
+        '"hotkey": {...}' member of a delta checkpoint answering the miner digest of another validator: only the
+        positions in the buckets that differ are included, along with the indices of these buckets. An invalid digest
+        gets the full member.
+        """
+        try:
+            buckets = delta_buckets(self.get_position_digests(), digest)
+        except ValueError:
+            return self.positions_member
+        positions = []
+        if buckets:
+            n_buckets = len(parse_miner_digest(digest))
+            changed = set(buckets)
+            positions = [p for p in self.dashboard_dict()['positions']
+                         if position_bucket(p['position_uuid'], n_buckets) in changed]
+        dat = {"positions": positions, **self.summary, "delta_buckets": buckets}
+        return json.dumps({self.hotkey: dat}, cls=CustomEncoder)[1:-1].encode('utf-8')
+
+    def get_tier_members(self, filter_positions, time_now_ms: int) -> dict[int, tuple[bytes, bytes]]:
+        if self.tier_members is None:
+            # Each iteration, the number of orders (possibly) decreases
+            hotkey_to_positions = {self.hotkey: self.dashboard_dict()}
+            self.tier_members = {}
+            for t in PERCENT_NEW_POSITIONS_TIERS:
+                if t != 100:  # no filtering
+                    filter_positions(t, hotkey_to_positions, time_now_ms)
+                hotkey_to_positions[self.hotkey]['tier'] = t
+                raw = json.dumps(hotkey_to_positions, cls=CustomEncoder)[1:-1].encode('utf-8')
+                self.tier_members[t] = (raw, deflate_segment(raw))
+        return self.tier_members
+
+
 class RequestCoreManager:
     def __init__(self, position_manager, subtensor_weight_setter, plagiarism_detector):
         self.position_manager = position_manager
@@ -32,6 +182,10 @@ class RequestCoreManager:
         self.challengeperiod_manager = position_manager.challengeperiod_manager
         self.subtensor_weight_setter = subtensor_weight_setter
         self.plagiarism_detector = plagiarism_detector
+        # hotkey -> MinerOutput, rebuilt only for miners whose positions changed or crossed a time threshold
+        # The output thread, get_dash_data and receive_checkpoint all use it, so it is only accessed under the lock
+        self.miner_outputs: dict[str, MinerOutput] = {}
+        self.miner_outputs_lock = threading.Lock()
 
     def hash_string_to_int(self, s: str) -> int:
         # Create a SHA-256 hash object
@@ -105,7 +259,7 @@ class RequestCoreManager:
         data = json.loads(decompressed.decode("utf-8"))
         return data
 
-    def upload_checkpoint_to_gcloud(self, final_dict):
+    def upload_checkpoint_to_gcloud(self, vcp_json: bytes):
         """
         The idea is to upload a zipped, time lagged validator checkpoint to google cloud for auto restoration
         on other validators as well as transparency with the community.
@@ -143,15 +297,18 @@ class RequestCoreManager:
         blob = bucket.blob(blob_name)
 
         # Create a zip file in memory
-        zip_buffer = self.compress_dict(final_dict)
+        zip_buffer = gzip.compress(vcp_json)
         # Upload the content of the zip_buffer to Google Cloud Storage
         blob.upload_from_string(zip_buffer)
         print(f'Uploaded {blob_name} to {bucket_name}')
 
-    def create_and_upload_production_files(self, eliminations, ord_dict_hotkey_position_map, time_now,
+    def create_and_upload_production_files(self, eliminations, miner_outputs: list[MinerOutput], time_now,
                                            youngest_order_processed_ms, oldest_order_processed_ms,
                                            challengeperiod_testing_dictionary, challengeperiod_success_dictionary):
-
+        """
+        Assembles the output files from the members cached by each miner, so only the miners that changed since the
+        last cycle are serialized and compressed again.
+        """
         perf_ledgers = self.perf_ledger_manager.get_perf_ledgers()
         final_dict = {
             'version': ValiConfig.VERSION,
@@ -164,42 +321,70 @@ class RequestCoreManager:
             'eliminations': eliminations,
             'youngest_order_processed_ms': youngest_order_processed_ms,
             'oldest_order_processed_ms': oldest_order_processed_ms,
-            'positions': ord_dict_hotkey_position_map,
-            'perf_ledgers': perf_ledgers
         }
+        positions_json = b'{' + b', '.join(o.positions_member for o in miner_outputs) + b'}'
+        # Same document as json.dumps of final_dict with the positions and perf ledgers as its last keys
+        vcp_json = b''.join([
+            json.dumps(final_dict, cls=CustomEncoder)[:-1].encode('utf-8'),
+            b', "positions": ', positions_json,
+            b', "perf_ledgers": ', json.dumps(perf_ledgers, cls=CustomEncoder).encode('utf-8'),
+            b'}'
+        ])
 
         vcp_output_file_path = ValiBkpUtils.get_vcp_output_path()
+        ValiBkpUtils.write_file(vcp_output_file_path, vcp_json, is_binary=True)
+
+        # Write legacy location as well. no compression
         ValiBkpUtils.write_file(
-            vcp_output_file_path,
-            final_dict,
+            ValiBkpUtils.get_miner_positions_output_path(suffix_dir=None),
+            positions_json, is_binary=True
         )
 
-        # Write positions data (sellable via RN) at the different tiers. Each iteration, the number of orders (possibly) decreases
+        # Write positions data (sellable via RN) at the different tiers
+        tier_members = [o.get_tier_members(self.filter_new_positions_random_sample, time_now) for o in miner_outputs]
         for t in PERCENT_NEW_POSITIONS_TIERS:
-            if t == 100:  # no filtering
-                # Write legacy location as well. no compression
-                ValiBkpUtils.write_file(
-                    ValiBkpUtils.get_miner_positions_output_path(suffix_dir=None),
-                    ord_dict_hotkey_position_map,
-                )
-            else:
-                self.filter_new_positions_random_sample(t, ord_dict_hotkey_position_map, time_now)
-
             # "v2" add a tier. compress the data. This is a location in a subdir
-            for hotkey, dat in ord_dict_hotkey_position_map.items():
-                dat['tier'] = t
-
-            compressed_positions = self.compress_dict(ord_dict_hotkey_position_map)
+            compressed_positions = gzip_segments(json_object_segments([members[t] for members in tier_members]))
             ValiBkpUtils.write_file(
                 ValiBkpUtils.get_miner_positions_output_path(suffix_dir=str(t)),
                 compressed_positions, is_binary=True
             )
 
         # Max filtering
-        self.upload_checkpoint_to_gcloud(final_dict)
+        self.upload_checkpoint_to_gcloud(vcp_json)
 
-    def generate_request_core(self, get_dash_data_hotkey: str | None = None, write_and_upload_production_files=False) -> dict:
-        eliminations = self.elimination_manager.get_eliminations_from_memory()
+    def update_miner_outputs(self, hotkeys: list[str], time_now_ms: int) -> list[MinerOutput]:
+        """
+        Returns the outputs of the miners sorted by thirty day returns, rebuilding only the ones whose positions
+        changed or crossed a time threshold since they were built.
+        """
+        acceptable_position_end_ms = TimeUtil.timestamp_to_millis(
+            TimeUtil.generate_start_timestamp(
+                ValiConfig.SET_WEIGHT_LOOKBACK_RANGE_DAYS
+            ))
+        position_index = self.position_manager.position_cache.hotkey_to_index
+        with self.miner_outputs_lock:
+            miner_outputs = {hotkey: self.miner_outputs.get(hotkey) for hotkey in hotkeys}
+        ans = []
+        rebuilt = {}
+        for hotkey in hotkeys:
+            version = tuple(position_index.get(hotkey, {}).items())
+            miner_output = miner_outputs[hotkey]
+            if (miner_output is None or miner_output.version != version or
+                    miner_output.time_key != miner_output.get_time_key(time_now_ms, acceptable_position_end_ms)):
+                positions = self.position_manager.get_positions_for_one_hotkey(hotkey, sort_positions=True)
+                if not self.position_manager.position_cache.is_ipc:
+                    # Positions are shared by reference, and the dashboard dict strips their old price sources
+                    positions = copy.deepcopy(positions)
+                miner_output = MinerOutput(hotkey, version, positions, time_now_ms, acceptable_position_end_ms)
+                rebuilt[hotkey] = miner_output
+            ans.append(miner_output)
+        with self.miner_outputs_lock:
+            self.miner_outputs.update(rebuilt)
+
+        return sorted(ans, key=lambda o: o.thirty_day_returns, reverse=True)
+
+    def get_miner_hotkeys(self, get_dash_data_hotkey: str | None = None) -> list[str]:
         try:
             if not os.path.exists(ValiBkpUtils.get_miner_dir()):
                 raise FileNotFoundError
@@ -210,58 +395,66 @@ class RequestCoreManager:
             )
 
         if get_dash_data_hotkey:
-            all_miner_hotkeys: list = [get_dash_data_hotkey]
-        else:
-            all_miner_hotkeys: list = ValiBkpUtils.get_directories_in_dir(ValiBkpUtils.get_miner_dir())
+            return [get_dash_data_hotkey]
 
-        # we won't be able to query for eliminated hotkeys from challenge period
-        hotkey_positions = self.position_manager.get_positions_for_hotkeys(
-            all_miner_hotkeys,
-            sort_positions=True
-        )
+        all_miner_hotkeys: list = self.position_manager.get_miner_hotkeys_on_disk()
+        # Forget the miners that are gone
+        with self.miner_outputs_lock:
+            for hotkey in set(self.miner_outputs) - set(all_miner_hotkeys):
+                del self.miner_outputs[hotkey]
+        return all_miner_hotkeys
 
-        time_now_ms = TimeUtil.now_in_millis()
-
-        dict_hotkey_position_map = {}
+    def write_checkpoint(self, writer: CheckpointWriter, digest: dict[str, str] | None = None):
+        """
+        Writes the checkpoint returned by generate_request_core section by section, streaming the serialized positions
+        of each miner instead of building the checkpoint dict.
 
-        youngest_order_processed_ms = float("inf")
-        oldest_order_processed_ms = 0
+        Given the digest of the positions of the requesting validator, the miners it has are only written as a delta
+        of the positions that differ, which apply_checkpoint_delta turns back into the full checkpoint.
+        """
+        miner_outputs = self.update_miner_outputs(self.get_miner_hotkeys(), TimeUtil.now_in_millis())
+        writer.write_section('challengeperiod', {
+            "testing": self.challengeperiod_manager.get_challengeperiod_testing(),
+            "success": self.challengeperiod_manager.get_challengeperiod_success()
+        })
+        writer.begin_section('positions')
+        for miner_output in miner_outputs:
+            if digest and miner_output.hotkey in digest:
+                writer.write_serialized_member(miner_output.delta_member(digest[miner_output.hotkey]))
+            else:
+                writer.write_serialized_member(miner_output.positions_member)
+        writer.end_section()
 
-        for k, original_positions in hotkey_positions.items():
-            dict_hotkey_position_map[k] = self.position_manager.positions_to_dashboard_dict(original_positions, time_now_ms)
-            for p in original_positions:
-                youngest_order_processed_ms = min(youngest_order_processed_ms,
-                                                  min(p.orders, key=lambda o: o.processed_ms).processed_ms)
-                oldest_order_processed_ms = max(oldest_order_processed_ms,
-                                                max(p.orders, key=lambda o: o.processed_ms).processed_ms)
+    def checkpoint_digest(self) -> tuple[dict[str, str], dict[str, MinerOutput]]:
+        """
+        Digest of the positions of each miner in our checkpoint, sent along checkpoint requests, and the miner outputs
+        it was computed from, needed to apply the deltas received in response.
+        """
+        miner_outputs = {o.hotkey: o for o in self.update_miner_outputs(self.get_miner_hotkeys(),
+                                                                         TimeUtil.now_in_millis())}
+        return {hotkey: o.get_miner_digest() for hotkey, o in miner_outputs.items()}, miner_outputs
 
-        ord_dict_hotkey_position_map = dict(
-            sorted(
-                dict_hotkey_position_map.items(),
-                key=lambda item: item[1]["thirty_day_returns"],
-                reverse=True,
-            )
-        )
+    @staticmethod
+    def apply_checkpoint_delta(checkpoint: dict, digest: dict[str, str], miner_outputs: dict[str, MinerOutput]) -> dict:
+        return apply_checkpoint_delta(checkpoint, digest, lambda hotkey: miner_outputs[hotkey].dashboard_dict()['positions'])
 
-        # unfiltered positions dict for checkpoints
-        unfiltered_positions = copy.deepcopy(ord_dict_hotkey_position_map)
+    def generate_request_core(self, get_dash_data_hotkey: str | None = None, write_and_upload_production_files=False) -> dict:
+        eliminations = self.elimination_manager.get_eliminations_from_memory()
+        all_miner_hotkeys = self.get_miner_hotkeys(get_dash_data_hotkey)
 
-        n_orders_original = 0
-        for positions in hotkey_positions.values():
-            n_orders_original += sum([len(position.orders) for position in positions])
+        time_now_ms = TimeUtil.now_in_millis()
 
-        n_positions_new = 0
-        for data in ord_dict_hotkey_position_map.values():
-            positions = data['positions']
-            n_positions_new += sum([len(p['orders']) for p in positions])
+        # we won't be able to query for eliminated hotkeys from challenge period
+        miner_outputs = self.update_miner_outputs(all_miner_hotkeys, time_now_ms)
 
-        assert n_orders_original == n_positions_new, f"n_orders_original: {n_orders_original}, n_positions_new: {n_positions_new}"
+        youngest_order_processed_ms = min((o.youngest_order_processed_ms for o in miner_outputs), default=float("inf"))
+        oldest_order_processed_ms = max((o.oldest_order_processed_ms for o in miner_outputs), default=0)
 
         challengeperiod_testing_dictionary = self.challengeperiod_manager.get_challengeperiod_testing()
         challengeperiod_success_dictionary = self.challengeperiod_manager.get_challengeperiod_success()
 
         if write_and_upload_production_files:
-            self.create_and_upload_production_files(eliminations, ord_dict_hotkey_position_map, time_now_ms,
+            self.create_and_upload_production_files(eliminations, miner_outputs, time_now_ms,
                                            youngest_order_processed_ms, oldest_order_processed_ms,
                                            challengeperiod_testing_dictionary, challengeperiod_success_dictionary)
 
@@ -270,7 +463,8 @@ class RequestCoreManager:
                 "testing": challengeperiod_testing_dictionary,
                 "success": challengeperiod_success_dictionary
             },
-            'positions': unfiltered_positions
+            # unfiltered positions dict for checkpoints
+            'positions': {o.hotkey: o.dashboard_dict() for o in miner_outputs}
         }
         return checkpoint_dict
 
@@ -15,7 +15,9 @@ from vali_objects.utils.position_utils import PositionUtils
 from vali_objects.utils.position_penalties import PositionPenalties
 from vali_objects.utils.ledger_utils import LedgerUtils
 from vali_objects.scoring.scoring import Scoring
+from vali_objects.scoring.scoring_snapshot import ScoringSnapshot
 from vali_objects.utils.metrics import Metrics
+from vali_objects.utils.batch_metrics import BatchMetrics
 from vali_objects.vali_dataclasses.perf_ledger import PerfLedgerManager
 from vali_objects.utils.risk_profiling import RiskProfiling
 from vali_objects.vali_dataclasses.perf_ledger import PerfLedger
@@ -104,26 +106,31 @@ class MetricsCalculator:
         self,
         metric: ScoreMetric,
         data: Dict[str, Dict[str, Any]],
-        weighting: bool = False
+        weighting: bool = False,
+        scoring_snapshot: ScoringSnapshot = None
     ) -> list[tuple[str, float]]:
         """
         Calculate a single metric for all miners.
         """
-        scores = {}
-        for hotkey, miner_data in data.items():
-            log_returns = miner_data.get("log_returns", [])
-            ledger = miner_data.get("ledger", [])
-
-            value = metric.metric_func(
-                log_returns=log_returns,
-                ledger=ledger,
+        if scoring_snapshot is not None:
+            # Only miners whose ledgers changed since the last round are recalculated
+            hotkey_to_ledger = {hotkey: miner_data.get("ledger", []) for hotkey, miner_data in data.items()}
+            return list(scoring_snapshot.metric_values(
+                hotkey_to_ledger,
+                metric.metric_func,
                 weighting=weighting,
                 bypass_confidence=metric.bypass_confidence
-            )
-
-            scores[hotkey] = value
+            ).items())
+
+        values = BatchMetrics.evaluate(
+            metric.metric_func,
+            [miner_data.get("log_returns", []) for miner_data in data.values()],
+            [miner_data.get("ledger", []) for miner_data in data.values()],
+            weighting=weighting,
+            bypass_confidence=metric.bypass_confidence
+        )
 
-        return list(scores.items())
+        return list(zip(data.keys(), values))
 
 
 # ---------------------------------------------------------------------------
@@ -134,7 +141,8 @@ class MinerStatisticsManager:
         self,
         position_manager: PositionManager,
         subtensor_weight_setter: SubtensorWeightSetter,
-        plagiarism_detector: PlagiarismDetector
+        plagiarism_detector: PlagiarismDetector,
+        scoring_snapshot: ScoringSnapshot = None
     ):
         self.position_manager = position_manager
         self.perf_ledger_manager = position_manager.perf_ledger_manager
@@ -142,6 +150,7 @@ class MinerStatisticsManager:
         self.challengeperiod_manager = position_manager.challengeperiod_manager
         self.subtensor_weight_setter = subtensor_weight_setter
         self.plagiarism_detector = plagiarism_detector
+        self.scoring_snapshot = scoring_snapshot
 
         self.metrics_calculator = MetricsCalculator()
 
@@ -244,6 +253,20 @@ class MinerStatisticsManager:
             }
         """
         results = {}
+        if self.scoring_snapshot is not None:
+            breakdowns = self.scoring_snapshot.penalty_values(
+                {hotkey: data.get("ledger", []) for hotkey, data in miner_data.items()},
+                {hotkey: data.get("positions", []) for hotkey, data in miner_data.items()},
+                Scoring.miner_penalty_breakdown
+            )
+            for hotkey, penalties in breakdowns.items():
+                results[hotkey] = {
+                    "drawdown_threshold": penalties["drawdown_threshold"],
+                    "risk_profile": penalties["risk_profile"],
+                    "total": penalties["drawdown_threshold"] * penalties["risk_profile"]
+                }
+            return results
+
         for hotkey, data in miner_data.items():
             ledger = data.get("ledger", [])
             positions = data.get("positions", [])
@@ -296,7 +319,8 @@ class MinerStatisticsManager:
             numeric_scores = self.metrics_calculator.calculate_metric(
                 metric,
                 miner_data,
-                weighting=weighting
+                weighting=weighting,
+                scoring_snapshot=self.scoring_snapshot
             )
 
             ranks = self.rank_dictionary(numeric_scores)
@@ -452,7 +476,8 @@ class MinerStatisticsManager:
             successful_positions,
             evaluation_time_ms=time_now,
             verbose=False,
-            weighting=final_results_weighting
+            weighting=final_results_weighting,
+            scoring_snapshot=self.scoring_snapshot
         )  # returns list of (hotkey, weightVal)
 
         # Only used for testing weight calculation
@@ -465,7 +490,8 @@ class MinerStatisticsManager:
             testing_positions,
             evaluation_time_ms=time_now,
             verbose=False,
-            weighting=final_results_weighting
+            weighting=final_results_weighting,
+            scoring_snapshot=self.scoring_snapshot
         )
 
         challengeperiod_scores = Scoring.score_testing_miners(testing_ledger, testing_checkpoint_results)
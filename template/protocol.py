@@ -36,6 +36,8 @@ class ValidatorCheckpoint(bt.Synapse):
     error_message: str = Field("", title="Error Message", frozen=False)
     validator_receive_hotkey: str = Field("", title="Hotkey set by receiving validator", frozen=False)
     computed_body_hash: str = Field("", title="Computed Body Hash", frozen=False)
+    digest: typing.Dict[str, str] = Field(default_factory=dict, title="Digest of the positions of the requesting validator", frozen=False)
+    is_delta: bool = Field(False, title="Checkpoint only holds the positions differing from the digest", frozen=False)
 ValidatorCheckpoint.required_hash_fields = ["checkpoint"]
 
 class GetDashData(bt.Synapse):
@@ -1,4 +1,5 @@
 import json
+import threading
 from copy import deepcopy
 
 from vali_objects.utils.auto_sync import PositionSyncer
@@ -9,11 +10,28 @@ from vali_objects.vali_config import TradePair
 from vali_objects.decoders.generalized_json_decoder import GeneralizedJSONDecoder
 from vali_objects.enums.order_type_enum import OrderType
 from vali_objects.position import Position
+from vali_objects.utils.position_lock import PositionLocks
 from vali_objects.utils.position_manager import PositionManager
 from vali_objects.utils.validator_sync_base import AUTO_SYNC_ORDER_LAG_MS
 from vali_objects.vali_dataclasses.order import Order
 
 
+class RecordingPositionLocks(PositionLocks):
+    """
+    Records the miner trade pairs locked by a sync and runs on_get_lock before handing over each lock.
+    """
+    def __init__(self, on_get_lock=None):
+        super().__init__(is_backtesting=True)
+        self.locked_keys = []
+        self.on_get_lock = on_get_lock
+
+    def get_lock(self, miner_hotkey: str, trade_pair_id: str):
+        self.locked_keys.append((miner_hotkey, trade_pair_id))
+        if self.on_get_lock:
+            self.on_get_lock(miner_hotkey, trade_pair_id)
+        return super().get_lock(miner_hotkey, trade_pair_id)
+
+
 class TestPositions(TestBase):
 
     def setUp(self):
@@ -801,5 +819,99 @@ class TestPositions(TestBase):
         assert len(self.position_syncer.perf_ledger_hks_to_invalidate) == 1
         assert self.position_syncer.perf_ledger_hks_to_invalidate[self.DEFAULT_MINER_HOTKEY] == order_to_insert.processed_ms
 
-
-
+    def use_lock_mode_syncer(self):
+        # Syncing with position locks pauses orders while writing eliminations and the challenge period
+        signal_sync_lock = threading.Lock()
+        self.position_syncer = PositionSyncer(running_unit_tests=True, position_manager=self.position_manager,
+                                              signal_sync_lock=signal_sync_lock,
+                                              signal_sync_condition=threading.Condition(signal_sync_lock),
+                                              n_orders_being_processed=[0])
+
+    def snapshot_sync_data(self):
+        self.use_lock_mode_syncer()
+        # BTCUSD gets an order inserted by the sync, ETHUSD is already in sync
+        btc_position = deepcopy(self.default_position)
+        inserted_order = deepcopy(self.default_order)
+        inserted_order.order_uuid = "inserted_order"
+        inserted_order.processed_ms = self.DEFAULT_OPEN_MS + 1000
+        candidate_btc_position = deepcopy(btc_position)
+        candidate_btc_position.orders.append(inserted_order)
+        candidate_btc_position.rebuild_position_with_updated_orders()
+
+        eth_order = deepcopy(self.default_order)
+        eth_order.order_uuid = "eth_order"
+        eth_order.trade_pair = TradePair.ETHUSD
+        eth_position = Position(miner_hotkey=self.DEFAULT_MINER_HOTKEY, position_uuid="eth_position",
+                                open_ms=self.DEFAULT_OPEN_MS, trade_pair=TradePair.ETHUSD, orders=[eth_order],
+                                position_type=OrderType.LONG)
+        for p in [btc_position, eth_position]:
+            self.position_manager.save_miner_position(p)
+        return self.positions_to_candidate_data([candidate_btc_position, eth_position])
+
+    def test_snapshot_sync_only_locks_changed_trade_pairs(self):
+        candidate_data = self.snapshot_sync_data()
+        position_locks = RecordingPositionLocks()
+        self.position_syncer.sync_positions(shadow_mode=False, candidate_data=candidate_data,
+                                            position_locks=position_locks)
+
+        # Orders for ETHUSD never wait on the sync
+        self.assertEqual(position_locks.locked_keys, [(self.DEFAULT_MINER_HOTKEY, TradePair.BTCUSD.trade_pair_id)])
+        self.assertEqual(self.position_syncer.global_stats['n_trade_pairs_resolved_again'], 0)
+        btc_position = self.position_manager.get_miner_position_by_uuid(self.DEFAULT_MINER_HOTKEY, self.DEFAULT_POSITION_UUID)
+        self.assertEqual([o.order_uuid for o in btc_position.orders], [self.DEFAULT_ORDER_UUID, "inserted_order"])
+        self.assertEqual(self.position_syncer.perf_ledger_hks_to_invalidate[self.DEFAULT_MINER_HOTKEY],
+                         self.DEFAULT_OPEN_MS + 1000)
+
+    def test_snapshot_sync_keeps_order_processed_during_sync(self):
+        candidate_data = self.snapshot_sync_data()
+
+        def process_order(miner_hotkey, trade_pair_id):
+            # An order for the trade pair is processed after the snapshot was read, before the sync gets the lock
+            position = self.position_manager.get_miner_position_by_uuid(miner_hotkey, self.DEFAULT_POSITION_UUID)
+            new_order = deepcopy(self.default_order)
+            new_order.order_uuid = "new_order"
+            new_order.processed_ms = self.DEFAULT_OPEN_MS + 1000 * 60 * 60
+            position.orders.append(new_order)
+            position.rebuild_position_with_updated_orders()
+            self.position_manager.save_miner_position(position)
+
+        position_locks = RecordingPositionLocks(on_get_lock=process_order)
+        self.position_syncer.sync_positions(shadow_mode=False, candidate_data=candidate_data,
+                                            position_locks=position_locks)
+
+        self.assertEqual(self.position_syncer.global_stats['n_trade_pairs_resolved_again'], 1)
+        btc_position = self.position_manager.get_miner_position_by_uuid(self.DEFAULT_MINER_HOTKEY, self.DEFAULT_POSITION_UUID)
+        self.assertEqual([o.order_uuid for o in btc_position.orders],
+                         [self.DEFAULT_ORDER_UUID, "inserted_order", "new_order"])
+
+    def test_snapshot_sync_dedupe_waits_for_order(self):
+        self.use_lock_mode_syncer()
+        self.position_manager.save_miner_position(deepcopy(self.default_closed_position))
+        # The candidate holds the closed BTCUSD position twice, which the dedupe deletes
+        candidate_data = self.positions_to_candidate_data([self.default_closed_position] * 2)
+        position_locks = PositionLocks(is_backtesting=True)
+
+        with position_locks.get_lock(self.DEFAULT_MINER_HOTKEY, TradePair.BTCUSD.trade_pair_id):
+            # An order is being processed for BTCUSD, the dedupe must wait for it
+            sync_thread = threading.Thread(target=self.position_syncer.sync_positions, args=(False, candidate_data),
+                                           kwargs={'position_locks': position_locks})
+            sync_thread.start()
+            sync_thread.join(0.5)
+            self.assertTrue(sync_thread.is_alive())
+            self.assertIsNotNone(self.position_manager.get_miner_position_by_uuid(self.DEFAULT_MINER_HOTKEY,
+                                                                                  self.DEFAULT_POSITION_UUID))
+
+            new_order = deepcopy(self.default_order)
+            new_order.order_uuid = "new_order"
+            new_order.processed_ms = self.DEFAULT_OPEN_MS + 1000 * 60 * 60
+            new_position = Position(miner_hotkey=self.DEFAULT_MINER_HOTKEY, position_uuid="new_position",
+                                    open_ms=new_order.processed_ms, trade_pair=self.DEFAULT_TRADE_PAIR,
+                                    orders=[new_order], position_type=OrderType.LONG)
+            self.position_manager.save_miner_position(new_position)
+        sync_thread.join()
+
+        # The deleted duplicate is inserted back from the candidate and the order is kept
+        positions = {p.position_uuid: p for p in self.position_manager.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY)}
+        self.assertEqual(sorted(positions), ["new_position", self.DEFAULT_POSITION_UUID])
+        self.assertTrue(positions[self.DEFAULT_POSITION_UUID].is_closed_position)
+        self.assertEqual([o.order_uuid for o in positions["new_position"].orders], ["new_order"])
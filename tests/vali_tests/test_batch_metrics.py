@@ -0,0 +1,83 @@
+import numpy as np
+from scipy.stats import ttest_1samp
+
+from tests.shared_objects.test_utilities import generate_ledger
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.batch_metrics import BatchMetrics
+from vali_objects.utils.ledger_utils import LedgerUtils
+from vali_objects.utils.metrics import Metrics
+from vali_objects.vali_config import ValiConfig
+from vali_objects.vali_dataclasses.perf_ledger import TP_ID_PORTFOLIO
+
+
+class TestBatchMetrics(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        # Miners with no days, too few days for confidence, constant returns and a full window
+        lengths = [0, 1, 2, 5, 30, 59, 60, 61, 90, 120] + list(rng.integers(0, 120, size=20))
+        self.log_returns = [list(rng.normal(0.001, 0.01, size=n)) for n in lengths]
+        self.log_returns.append([0.002] * 70)
+        self.log_returns.append([-0.001] * 70)
+        self.log_returns.append(list(np.abs(rng.normal(0, 0.01, size=70))))
+
+    def assert_matches(self, metric_function, ledgers=None):
+        ledgers = ledgers or [None] * len(self.log_returns)
+        for weighting in [False, True]:
+            for bypass_confidence in [False, True]:
+                expected = [metric_function(log_returns=r, ledger=ledger, weighting=weighting,
+                                            bypass_confidence=bypass_confidence)
+                            for r, ledger in zip(self.log_returns, ledgers)]
+                actual = BatchMetrics.evaluate(metric_function, self.log_returns, ledgers, weighting=weighting,
+                                               bypass_confidence=bypass_confidence)
+                np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12)
+
+    def test_returns_matrix(self):
+        returns, mask = BatchMetrics.returns_matrix([[1.0, 2.0], [], [3.0]])
+        np.testing.assert_array_equal(returns, [[1.0, 2.0], [0.0, 0.0], [3.0, 0.0]])
+        np.testing.assert_array_equal(mask, [[True, True], [False, False], [True, False]])
+
+        returns, mask = BatchMetrics.returns_matrix([])
+        self.assertEqual(returns.shape, (0, 0))
+
+    def test_weighting_distribution(self):
+        _, mask = BatchMetrics.returns_matrix(self.log_returns)
+        weights = BatchMetrics.weighting_distribution(mask)
+        for i, r in enumerate(self.log_returns):
+            np.testing.assert_allclose(weights[i, :len(r)], Metrics.weighting_distribution(r))
+            self.assertTrue(np.all(weights[i, len(r):] == 0))
+
+    def test_metrics_match_per_miner_functions(self):
+        for metric_function in [Metrics.sharpe, Metrics.sortino, Metrics.omega, Metrics.statistical_confidence,
+                                Metrics.base_return_log_percentage]:
+            with self.subTest(metric=metric_function.__name__):
+                self.assert_matches(metric_function)
+
+    def test_calmar_matches_per_miner_function(self):
+        ledgers = [generate_ledger(gain=0.01 * (i % 7 + 1), loss=-0.01 * (i % 5 + 1), mdd=0.99)[TP_ID_PORTFOLIO]
+                   for i in range(len(self.log_returns))]
+        self.assert_matches(Metrics.calmar, ledgers)
+
+    def test_statistical_confidence_is_the_t_statistic(self):
+        returns = [r for r in self.log_returns if len(r) >= ValiConfig.STATISTICAL_CONFIDENCE_MINIMUM_N]
+        actual = BatchMetrics.evaluate(Metrics.statistical_confidence, returns, [None] * len(returns))
+        for value, r in zip(actual, returns):
+            if np.isclose(np.var(r), 0):
+                self.assertEqual(value, ValiConfig.STATISTICAL_CONFIDENCE_NOCONFIDENCE_VALUE)
+            else:
+                self.assertAlmostEqual(value, ttest_1samp(r, 0, alternative='greater').statistic, places=9)
+
+    def test_metric_values_from_ledgers(self):
+        ledgers = {f"miner{i}": generate_ledger(gain=0.02 + 0.01 * i, loss=-0.03)[TP_ID_PORTFOLIO] for i in range(4)}
+        ledgers["empty"] = None
+        actual = BatchMetrics.metric_values(ledgers, Metrics.sharpe, weighting=True)
+        self.assertEqual(list(actual), list(ledgers))
+        for hotkey, ledger in ledgers.items():
+            log_returns = LedgerUtils.daily_return_log(ledger) if ledger else []
+            self.assertAlmostEqual(actual[hotkey], Metrics.sharpe(log_returns, weighting=True), places=9)
+
+    def test_time_weighting(self):
+        _, mask = BatchMetrics.returns_matrix(self.log_returns)
+        expected = [np.sqrt(len(r) / ValiConfig.TARGET_LEDGER_WINDOW_DAYS) for r in self.log_returns]
+        np.testing.assert_allclose(BatchMetrics.time_weighting(mask), expected)
@@ -0,0 +1,126 @@
+import os
+import shutil
+
+from data_generator.candle_store import CandleStore
+from tests.vali_tests.base_objects.test_base import TestBase
+from time_util.time_util import MS_IN_24_HOURS
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+from vali_objects.vali_config import TradePair
+
+
+class FakeCandle:
+    def __init__(self, timestamp, close):
+        self.timestamp = timestamp
+        self.close = close
+
+
+class CountingDataService:
+    def __init__(self):
+        self.requests = []
+        self.tp_to_mfs = {}
+
+    def unified_candle_fetcher(self, trade_pair, start_timestamp_ms, end_timestamp_ms, timespan):
+        self.requests.append((trade_pair.trade_pair_id, start_timestamp_ms, end_timestamp_ms, timespan))
+        step_ms = 1000 if timespan == 'second' else 60000
+        first_ms = start_timestamp_ms + (-start_timestamp_ms) % step_ms
+        return [FakeCandle(t, 100 + (t // step_ms) % 7) for t in range(first_ms, end_timestamp_ms + 1, step_ms)]
+
+
+class EmptyDataService(CountingDataService):
+    def unified_candle_fetcher(self, trade_pair, start_timestamp_ms, end_timestamp_ms, timespan):
+        super().unified_candle_fetcher(trade_pair, start_timestamp_ms, end_timestamp_ms, timespan)
+        return []
+
+
+class TestCandleStore(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.store_dir = ValiBkpUtils.get_candle_store_dir(running_unit_tests=True)
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        self.data_service = CountingDataService()
+        self.store = CandleStore(self.data_service, running_unit_tests=True)
+        self.day_ms = 1700000000000 - 1700000000000 % MS_IN_24_HOURS
+        self.now_ms = self.day_ms + 10 * MS_IN_24_HOURS
+
+    def tearDown(self):
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        super().tearDown()
+
+    def expected_closes(self, start_ms, end_ms):
+        return {a.timestamp: a.close for a in
+                CountingDataService().unified_candle_fetcher(TradePair.BTCUSD, start_ms, end_ms, 'minute')}
+
+    def test_repeat_request_is_served_from_disk(self):
+        start_ms, end_ms = self.day_ms + 3600000, self.day_ms + 7200000
+        first = self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        second = self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        self.assertEqual(first, self.expected_closes(start_ms, end_ms))
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.data_service.requests), 1)
+
+    def test_only_missing_ranges_are_fetched(self):
+        self.store.get_closes(TradePair.BTCUSD, self.day_ms + 3600000, self.day_ms + 7200000, 'minute',
+                              now_ms=self.now_ms)
+        # Overlaps the cached hour on both sides and spans a day boundary.
+        start_ms, end_ms = self.day_ms, self.day_ms + MS_IN_24_HOURS + 3600000
+        closes = self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        self.assertEqual(closes, self.expected_closes(start_ms, end_ms))
+        self.assertEqual(self.data_service.requests[1:], [
+            (TradePair.BTCUSD.trade_pair_id, self.day_ms, self.day_ms + 3600000 - 1, 'minute'),
+            (TradePair.BTCUSD.trade_pair_id, self.day_ms + 7200000 + 1, end_ms, 'minute')])
+
+    def test_store_survives_restart(self):
+        start_ms, end_ms = self.day_ms, self.day_ms + 2 * MS_IN_24_HOURS
+        self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        restarted_store = CandleStore(self.data_service, running_unit_tests=True)
+        closes = restarted_store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        self.assertEqual(closes, self.expected_closes(start_ms, end_ms))
+        self.assertEqual(restarted_store.n_fetches, 0)
+        # Other trade pairs and timespans are keyed separately.
+        restarted_store.get_closes(TradePair.ETHUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        restarted_store.get_closes(TradePair.BTCUSD, start_ms, start_ms + 60000, 'second', now_ms=self.now_ms)
+        self.assertEqual(restarted_store.n_fetches, 2)
+
+    def test_unsettled_candles_are_not_persisted(self):
+        now_ms = self.day_ms + 7200000
+        start_ms, end_ms = self.day_ms + 3600000, now_ms
+        closes = self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=now_ms)
+        self.assertEqual(closes, self.expected_closes(start_ms, end_ms))
+        self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=now_ms)
+        self.assertEqual(self.data_service.requests[1], (TradePair.BTCUSD.trade_pair_id,
+                                                         now_ms - self.store.settle_ms + 1, end_ms, 'minute'))
+
+    def test_empty_fetch_is_only_persisted_once_settled(self):
+        store = CandleStore(EmptyDataService(), running_unit_tests=True)
+        # Settled for candles but recent enough that the provider may still be backfilling
+        now_ms = self.day_ms + 7200000
+        start_ms, end_ms = self.day_ms, self.day_ms + 3600000
+        for _ in range(2):
+            self.assertEqual(store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=now_ms), {})
+        self.assertEqual(store.n_fetches, 2)
+
+        # Older than the empty settle horizon, e.g. a closed market
+        now_ms = self.day_ms + 2 * MS_IN_24_HOURS
+        for _ in range(2):
+            self.assertEqual(store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=now_ms), {})
+        self.assertEqual(store.n_fetches, 3)
+
+    def test_torn_write_is_refetched_and_compaction_keeps_data(self):
+        start_ms = self.day_ms
+        for i in range(CandleStore.MAX_CHUNKS_PER_DAY_FILE + 5):
+            s = start_ms + i * 600000
+            self.store.get_closes(TradePair.BTCUSD, s, s + 599999, 'minute', now_ms=self.now_ms)
+        path = self.store.get_day_file_path(TradePair.BTCUSD.trade_pair_id, 'minute', self.day_ms)
+        with open(path, 'r') as f:
+            n_lines = len(f.readlines())
+        self.assertLess(n_lines, CandleStore.MAX_CHUNKS_PER_DAY_FILE)
+
+        with open(path, 'a') as f:
+            f.write('{"ranges": [[0, 1')
+        end_ms = start_ms + (CandleStore.MAX_CHUNKS_PER_DAY_FILE + 5) * 600000 - 1
+        n_requests = len(self.data_service.requests)
+        closes = self.store.get_closes(TradePair.BTCUSD, start_ms, end_ms, 'minute', now_ms=self.now_ms)
+        self.assertEqual(closes, self.expected_closes(start_ms, end_ms))
+        self.assertEqual(len(self.data_service.requests), n_requests)
+        self.assertTrue(os.path.exists(path))
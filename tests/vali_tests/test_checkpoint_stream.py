@@ -0,0 +1,74 @@
+import base64
+import gzip
+import json
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.checkpoint_stream import CheckpointReader, CheckpointWriter
+
+
+class TestCheckpointStream(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = {
+            'challengeperiod': {'testing': {'miner1': 1718000000000}, 'success': {}},
+            'positions': {
+                f'miner{i}': {
+                    'positions': [{'position_uuid': f'uuid{i}_{j}', 'orders': [{'price': 1.5 * j, 'src': 'é'}]}
+                                  for j in range(i)],
+                    'thirty_day_returns': 1.0 + i / 100,
+                } for i in range(20)
+            },
+            'created_timestamp_ms': 1718000000000123,
+        }
+
+    @staticmethod
+    def legacy_encode(checkpoint: dict) -> str:
+        return base64.b64encode(gzip.compress(json.dumps(checkpoint).encode('utf-8'))).decode('utf-8')
+
+    @staticmethod
+    def legacy_decode(encoded: str) -> dict:
+        return json.loads(gzip.decompress(base64.b64decode(encoded)).decode('utf-8'))
+
+    def write(self, checkpoint: dict) -> str:
+        writer = CheckpointWriter(spool_max_size=1024)
+        writer.write_section('challengeperiod', checkpoint['challengeperiod'])
+        writer.begin_section('positions')
+        for hotkey, dat in checkpoint['positions'].items():
+            writer.write_serialized_member(json.dumps({hotkey: dat})[1:-1].encode('utf-8'))
+        writer.end_section()
+        writer.write_section('created_timestamp_ms', checkpoint['created_timestamp_ms'])
+        return writer.finish()
+
+    def test_writer_matches_legacy_format(self):
+        encoded = self.write(self.checkpoint)
+        self.assertEqual(self.legacy_decode(encoded), self.checkpoint)
+
+        empty = CheckpointWriter()
+        empty.begin_section('positions')
+        empty.end_section()
+        self.assertEqual(self.legacy_decode(empty.finish()), {'positions': {}})
+
+    def test_reader_parses_sections(self):
+        for encoded in [self.write(self.checkpoint), self.legacy_encode(self.checkpoint)]:
+            # Chunks small enough to split keys, values and numbers
+            for chunk_size in [4, 12, 1000, 1 << 20]:
+                self.assertEqual(CheckpointReader(encoded, chunk_size=chunk_size).read(), self.checkpoint)
+
+        paths = [path for path, _ in CheckpointReader(self.write(self.checkpoint), chunk_size=8).sections()]
+        self.assertEqual(paths, [('challengeperiod',)] + [('positions', f'miner{i}') for i in range(20)] +
+                         [('created_timestamp_ms',)])
+
+        # Sections that are not objects are read whole
+        checkpoint = {'positions': None, 'eliminations': [{'hotkey': 'miner1'}]}
+        self.assertEqual(CheckpointReader(self.legacy_encode(checkpoint), chunk_size=8).read(), checkpoint)
+
+    def test_reader_rejects_invalid_checkpoints(self):
+        encoded = self.write(self.checkpoint)
+        with self.assertRaises(ValueError):
+            CheckpointReader(encoded[:len(encoded) // 2 // 4 * 4], chunk_size=8).read()
+
+        for text in ['{"positions": {"miner1": [1, 2}}', '{"positions": {}} {}', '[]']:
+            encoded = base64.b64encode(gzip.compress(text.encode('utf-8'))).decode('utf-8')
+            with self.assertRaises(ValueError):
+                CheckpointReader(encoded, chunk_size=8).read()
@@ -0,0 +1,274 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import zlib
+from copy import deepcopy
+from unittest.mock import patch
+
+from runnable.generate_request_core import PERCENT_NEW_POSITIONS_TIERS, RequestCoreManager
+from template.protocol import ValidatorCheckpoint
+from tests.shared_objects.mock_classes import MockMetagraph
+from tests.vali_tests.base_objects.test_base import TestBase
+from time_util.time_util import TimeUtil
+from vali_objects.enums.order_type_enum import OrderType
+from vali_objects.position import Position
+from vali_objects.utils.challengeperiod_manager import ChallengePeriodManager
+from vali_objects.utils.checkpoint_delta import BUCKET_DIGEST_SIZE, MAX_BUCKETS, POSITIONS_PER_BUCKET
+from vali_objects.utils.checkpoint_stream import CheckpointReader, CheckpointWriter
+from vali_objects.utils.elimination_manager import EliminationManager
+from vali_objects.utils.position_manager import PositionManager
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.order import Order
+from vali_objects.vali_dataclasses.perf_ledger import PerfLedgerManager
+from vali_objects.vali_dataclasses.price_source import PriceSource
+
+MS_IN_HOUR = 1000 * 60 * 60
+
+
+class TestGenerateRequestCore(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.now_ms = TimeUtil.now_in_millis()
+        self.miner_hotkeys = [f"miner{i}" for i in range(5)]
+        self.mock_metagraph = MockMetagraph(self.miner_hotkeys)
+        self.elimination_manager = EliminationManager(self.mock_metagraph, None, None, running_unit_tests=True)
+        self.perf_ledger_manager = PerfLedgerManager(self.mock_metagraph, running_unit_tests=True)
+        self.position_manager = PositionManager(metagraph=self.mock_metagraph, running_unit_tests=True,
+                                                elimination_manager=self.elimination_manager,
+                                                perf_ledger_manager=self.perf_ledger_manager)
+        self.challengeperiod_manager = ChallengePeriodManager(self.mock_metagraph,
+                                                              position_manager=self.position_manager,
+                                                              perf_ledger_manager=self.perf_ledger_manager,
+                                                              running_unit_tests=True)
+        self.position_manager.challengeperiod_manager = self.challengeperiod_manager
+        self.elimination_manager.position_manager = self.position_manager
+        self.elimination_manager.challengeperiod_manager = self.challengeperiod_manager
+        self.position_manager.clear_all_miner_positions()
+
+        for i, hotkey in enumerate(self.miner_hotkeys):
+            self.save_position(hotkey, f"{hotkey}_closed", [-(240 + i) * MS_IN_HOUR, -200 * MS_IN_HOUR], closed=True)
+            self.save_position(hotkey, f"{hotkey}_recently_closed", [-(48 + i) * MS_IN_HOUR, -(2 + i) * MS_IN_HOUR],
+                               closed=True)
+            self.save_position(hotkey, f"{hotkey}_open", [-(72 + i) * MS_IN_HOUR, -(1 + i) * MS_IN_HOUR])
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        get_miner_dir = ValiBkpUtils.get_miner_dir
+        patches = [
+            patch.object(ValiBkpUtils, "get_vcp_output_path",
+                         return_value=os.path.join(self.tmp_dir.name, "validator_checkpoint.json")),
+            patch.object(ValiBkpUtils, "get_miner_positions_output_path", side_effect=self.positions_output_path),
+            # Positions of the unit tests are in their own directory
+            patch.object(ValiBkpUtils, "get_miner_dir",
+                         side_effect=lambda running_unit_tests=False: get_miner_dir(running_unit_tests=True)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.rcm = RequestCoreManager(self.position_manager, None, None)
+
+    def tearDown(self):
+        self.position_manager.clear_all_miner_positions()
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def positions_output_path(self, suffix_dir=None):
+        if suffix_dir is None:
+            return os.path.join(self.tmp_dir.name, "output.json")
+        return os.path.join(self.tmp_dir.name, suffix_dir, "output.json.gz")
+
+    def save_position(self, hotkey, position_uuid, orders_ms, closed=False):
+        orders = [Order(price=100 + k, processed_ms=self.now_ms + t, order_uuid=f"{position_uuid}_{k}",
+                        trade_pair=TradePair.BTCUSD, order_type=OrderType.LONG, leverage=0.1,
+                        price_sources=[PriceSource(source="test", open=100.0, close=100.0, start_ms=self.now_ms + t)])
+                  for k, t in enumerate(orders_ms)]
+        if closed:
+            orders[-1] = Order(price=105, processed_ms=self.now_ms + orders_ms[-1], order_uuid=f"{position_uuid}_flat",
+                               trade_pair=TradePair.BTCUSD, order_type=OrderType.FLAT, leverage=0)
+        position = Position(miner_hotkey=hotkey, position_uuid=position_uuid, open_ms=self.now_ms + orders_ms[0],
+                            trade_pair=TradePair.BTCUSD, orders=orders)
+        position.rebuild_position_with_updated_orders()
+        self.position_manager.save_miner_position(position)
+        return position
+
+    def read_outputs(self):
+        with open(ValiBkpUtils.get_vcp_output_path()) as f:
+            vcp = json.load(f)
+        with open(self.positions_output_path()) as f:
+            legacy = json.load(f)
+        tiers = {}
+        for t in PERCENT_NEW_POSITIONS_TIERS:
+            with open(self.positions_output_path(str(t)), "rb") as f:
+                content = f.read()
+            # A single gzip member
+            decompressor = zlib.decompressobj(wbits=31)
+            tiers[t] = json.loads(decompressor.decompress(content))
+            self.assertTrue(decompressor.eof)
+            self.assertEqual(decompressor.unused_data, b"")
+            self.assertEqual(json.loads(gzip.decompress(content)), tiers[t])
+        return vcp, legacy, tiers
+
+    def assert_outputs_match_full_rebuild(self, checkpoint_dict):
+        vcp, legacy, tiers = self.read_outputs()
+        self.assertEqual(list(legacy), sorted(legacy, key=lambda hk: legacy[hk]["thirty_day_returns"], reverse=True))
+        self.assertEqual(vcp["positions"], legacy)
+        self.assertEqual(checkpoint_dict["positions"], legacy)
+
+        # Tier files as filtered from the unfiltered positions at the time of the outputs
+        expected = deepcopy(legacy)
+        for t in PERCENT_NEW_POSITIONS_TIERS:
+            if t != 100:
+                self.rcm.filter_new_positions_random_sample(t, expected, vcp["created_timestamp_ms"])
+            for dat in expected.values():
+                dat["tier"] = t
+            self.assertEqual(tiers[t], expected)
+        return vcp, legacy, tiers
+
+    def test_outputs_match_full_rebuild(self):
+        checkpoint_dict = self.rcm.generate_request_core(write_and_upload_production_files=True)
+        vcp, legacy, tiers = self.assert_outputs_match_full_rebuild(checkpoint_dict)
+
+        self.assertEqual(set(legacy), set(self.miner_hotkeys))
+        self.assertEqual(vcp["youngest_order_processed_ms"], self.now_ms - 244 * MS_IN_HOUR)
+        self.assertEqual(vcp["oldest_order_processed_ms"], self.now_ms - MS_IN_HOUR)
+        for hotkey in self.miner_hotkeys:
+            n_orders = [sum(len(p["orders"]) for p in dat[hotkey]["positions"]) for dat in (tiers[100], tiers[0])]
+            # The most restrictive tier withholds the orders of the last 24 hours
+            self.assertEqual(n_orders, [6, 4])
+            for order in (o for p in legacy[hotkey]["positions"] for o in p["orders"] if o["leverage"]):
+                # Price sources are only kept for the last week
+                self.assertEqual(bool(order["price_sources"]), order["processed_ms"] > self.now_ms - 168 * MS_IN_HOUR)
+
+        # Callers get their own copy of the positions
+        checkpoint_dict["positions"]["miner0"]["positions"].clear()
+        self.assertTrue(self.rcm.generate_request_core()["positions"]["miner0"]["positions"])
+
+    def test_only_changed_miners_rebuilt(self):
+        self.rcm.generate_request_core(write_and_upload_production_files=True)
+        miner_outputs = dict(self.rcm.miner_outputs)
+
+        # New order on a miner
+        position = self.position_manager.get_miner_position_by_uuid("miner2", "miner2_open")
+        position.add_order(Order(price=110, processed_ms=self.now_ms, order_uuid="miner2_new", leverage=0.1,
+                                 trade_pair=TradePair.BTCUSD, order_type=OrderType.LONG))
+        self.position_manager.save_miner_position(position)
+        checkpoint_dict = self.rcm.generate_request_core(write_and_upload_production_files=True)
+        _, legacy, _ = self.assert_outputs_match_full_rebuild(checkpoint_dict)
+        self.assertEqual(len(legacy["miner2"]["positions"][-1]["orders"]), 3)
+        for hotkey in self.miner_hotkeys:
+            if hotkey == "miner2":
+                self.assertIsNot(self.rcm.miner_outputs[hotkey], miner_outputs[hotkey])
+            else:
+                self.assertIs(self.rcm.miner_outputs[hotkey], miner_outputs[hotkey])
+        miner_outputs = dict(self.rcm.miner_outputs)
+
+        # Later on, the orders of miner0 are still withheld by the tiers while some of the other miners are not anymore
+        with patch.object(TimeUtil, "now_in_millis", return_value=self.now_ms + 21 * MS_IN_HOUR + MS_IN_HOUR // 2):
+            checkpoint_dict = self.rcm.generate_request_core(write_and_upload_production_files=True)
+        self.assert_outputs_match_full_rebuild(checkpoint_dict)
+        rebuilt = {hk for hk in self.miner_hotkeys if self.rcm.miner_outputs[hk] is not miner_outputs[hk]}
+        self.assertEqual(rebuilt, {"miner1", "miner2", "miner3", "miner4"})
+
+        # Gone miners are forgotten
+        self.position_manager.clear_all_miner_positions(target_hotkey="miner4")
+        self.rcm.generate_request_core()
+        self.assertNotIn("miner4", self.rcm.miner_outputs)
+
+    def test_concurrent_readers_share_miner_outputs(self):
+        # The output thread, get_dash_data and receive_checkpoint build outputs at the same time
+        errors = []
+
+        def run(f):
+            try:
+                for _ in range(20):
+                    f()
+            except RuntimeError as e:  # dictionary changed size during iteration
+                errors.append(e)
+
+        self.position_manager.clear_all_miner_positions(target_hotkey="miner4")
+        targets = [lambda: self.rcm.generate_request_core(),
+                   lambda: self.rcm.checkpoint_digest()] + \
+                  [lambda hk=hk: self.rcm.generate_request_core(get_dash_data_hotkey=hk) for hk in self.miner_hotkeys[:4]]
+        threads = [threading.Thread(target=run, args=(f,)) for f in targets]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(set(self.rcm.miner_outputs), set(self.miner_hotkeys[:4]))
+
+    def test_streamed_checkpoint_matches_checkpoint_dict(self):
+        self.challengeperiod_manager.challengeperiod_testing["miner1"] = self.now_ms
+        writer = CheckpointWriter()
+        self.rcm.write_checkpoint(writer)
+        checkpoint = CheckpointReader(writer.finish()).read()
+        self.assertEqual(checkpoint, self.rcm.generate_request_core())
+        self.assertEqual(checkpoint["challengeperiod"]["testing"], {"miner1": self.now_ms})
+        self.assertEqual(set(checkpoint["positions"]), set(self.miner_hotkeys))
+
+    def respond_to_checkpoint_request(self, synapse: ValidatorCheckpoint) -> ValidatorCheckpoint:
+        writer = CheckpointWriter()
+        self.rcm.write_checkpoint(writer, digest=synapse.digest)
+        synapse.checkpoint = writer.finish()
+        synapse.is_delta = bool(synapse.digest)
+        return synapse
+
+    def test_delta_checkpoint_matches_full_checkpoint(self):
+        # Enough positions on a miner for its digest to have several buckets
+        for k in range(3 * POSITIONS_PER_BUCKET):
+            self.save_position("miner0", f"miner0_old{k}", [-(400 + 2 * k) * MS_IN_HOUR, -(300 + k) * MS_IN_HOUR],
+                               closed=True)
+
+        # Digest of the requesting validator
+        digest, miner_outputs = self.rcm.checkpoint_digest()
+        self.assertEqual(set(digest), set(self.miner_hotkeys))
+        self.assertEqual(len(digest["miner0"]), 4 * len(digest["miner1"]))
+
+        # Nothing differs
+        response = self.respond_to_checkpoint_request(ValidatorCheckpoint(digest=digest))
+        delta = CheckpointReader(response.checkpoint).read()
+        self.assertTrue(all(not dat["positions"] for dat in delta["positions"].values()))
+        self.assertEqual(RequestCoreManager.apply_checkpoint_delta(delta, digest, miner_outputs),
+                         self.rcm.generate_request_core())
+
+        # The responding validator has a new order, lost positions and a new miner
+        position = self.position_manager.get_miner_position_by_uuid("miner1", "miner1_open")
+        position.add_order(Order(price=110, processed_ms=self.now_ms, order_uuid="miner1_new", leverage=0.1,
+                                 trade_pair=TradePair.BTCUSD, order_type=OrderType.LONG))
+        self.position_manager.save_miner_position(position)
+        for hotkey, position_uuid in [("miner0", "miner0_old5"), ("miner3", "miner3_closed"), ("miner4", "miner4_closed"),
+                                      ("miner4", "miner4_recently_closed"), ("miner4", "miner4_open")]:
+            self.position_manager.delete_position(self.position_manager.get_miner_position_by_uuid(hotkey,
+                                                                                                   position_uuid))
+        self.save_position("miner5", "miner5_open", [-MS_IN_HOUR])
+        full = self.rcm.generate_request_core()
+
+        response = self.respond_to_checkpoint_request(ValidatorCheckpoint(digest=digest))
+        delta = CheckpointReader(response.checkpoint).read()
+        # Only the positions in the buckets that differ are sent
+        n_sent = {hotkey: len(dat["positions"]) for hotkey, dat in delta["positions"].items()}
+        self.assertEqual(n_sent["miner1"], 3)
+        self.assertEqual(n_sent["miner2"], 0)
+        self.assertEqual(n_sent["miner3"], 2)
+        self.assertEqual(n_sent["miner4"], 0)
+        self.assertEqual(n_sent["miner5"], 1)
+        self.assertLess(n_sent["miner0"], len(full["positions"]["miner0"]["positions"]) // 2)
+        self.assertEqual(RequestCoreManager.apply_checkpoint_delta(delta, digest, miner_outputs), full)
+
+        # Miners with an invalid digest get their full positions
+        bad_digest = dict(digest, miner1="00" * BUCKET_DIGEST_SIZE * 3, miner2="zz" * BUCKET_DIGEST_SIZE,
+                          miner3="00" * BUCKET_DIGEST_SIZE * 2 * MAX_BUCKETS)
+        response = self.respond_to_checkpoint_request(ValidatorCheckpoint(digest=bad_digest))
+        delta = CheckpointReader(response.checkpoint).read()
+        for hotkey in ["miner1", "miner2", "miner3"]:
+            self.assertEqual(delta["positions"][hotkey], full["positions"][hotkey])
+        self.assertEqual(RequestCoreManager.apply_checkpoint_delta(delta, bad_digest, miner_outputs), full)
+
+        # Requests without a digest get the full checkpoint
+        response = self.respond_to_checkpoint_request(ValidatorCheckpoint())
+        self.assertFalse(response.is_delta)
+        self.assertEqual(CheckpointReader(response.checkpoint).read(), full)
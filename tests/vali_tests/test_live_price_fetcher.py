@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from time_util.time_util import TimeUtil
+from vali_objects.utils.live_price_fetcher import LivePriceFetcher
+from vali_objects.utils.vali_utils import ValiUtils
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.price_source import PriceSource
+
+
+class TestLivePriceFetcher(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        secrets = ValiUtils.get_secrets(running_unit_tests=True)
+        self.live_price_fetcher = LivePriceFetcher(secrets=secrets, disable_ws=True)
+        self.now_ms = TimeUtil.now_in_millis()
+
+    def event(self, source, start_ms, price, websocket=True):
+        return PriceSource(source=source, timespan_ms=0 if websocket else 1000, open=price, close=price, high=price,
+                           low=price, vwap=None, start_ms=start_ms, websocket=websocket, lag_ms=0)
+
+    def test_batched_order_price_sources_match_single_lookups(self):
+        # Websocket events every 5 seconds for the last two minutes, with a gap of 30 seconds
+        for data_service, source in [(self.live_price_fetcher.polygon_data_service, 'Polygon_ws'),
+                                     (self.live_price_fetcher.tiingo_data_service, 'Tiingo_ws')]:
+            tracker = data_service.trade_pair_to_recent_events[TradePair.BTCUSD.trade_pair]
+            for k in range(24):
+                if 10 <= k < 16:
+                    continue
+                start_ms = self.now_ms - 120000 + 5000 * k + (700 if source == 'Tiingo_ws' else 0)
+                tracker.add_event(self.event(source, start_ms, 100.0 + k))
+        rest_prices = ({TradePair.BTCUSD: self.event('Polygon_rest', self.now_ms, 90.0, websocket=False)},
+                       {TradePair.BTCUSD: self.event('Tiingo_rest', self.now_ms, 91.0, websocket=False)})
+
+        # Times next to events, in the gap and without any event for the trade pair
+        trade_pair_to_times_ms = {
+            TradePair.BTCUSD: [self.now_ms - 120000 + 2500, self.now_ms - 65000, self.now_ms - 60000, self.now_ms - 5000],
+            TradePair.ETHUSD: [self.now_ms - 1000, self.now_ms - 2000]
+        }
+        with patch.object(self.live_price_fetcher, 'dual_rest_get', return_value=rest_prices) as mock_rest:
+            expected = {tp: {t: self.live_price_fetcher.get_sorted_price_sources_for_trade_pair(tp, t) for t in times_ms}
+                        for tp, times_ms in trade_pair_to_times_ms.items()}
+            n_single_rest_calls = mock_rest.call_count
+            mock_rest.reset_mock()
+            actual = self.live_price_fetcher.get_tp_to_time_to_sorted_price_sources(trade_pair_to_times_ms)
+
+        self.assertEqual(actual, expected)
+        self.assertEqual(n_single_rest_calls, 4)
+        mock_rest.assert_called_once_with([TradePair.BTCUSD, TradePair.ETHUSD])
+        self.assertTrue(all(ps.websocket for ps in actual[TradePair.BTCUSD][self.now_ms - 5000]))
+        self.assertIn('Polygon_rest', {ps.source for ps in actual[TradePair.BTCUSD][self.now_ms - 60000]})
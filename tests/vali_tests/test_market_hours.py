@@ -1,8 +1,12 @@
+import threading
 import time
 import unittest
 
 
-from time_util.time_util import UnifiedMarketCalendar, TimeUtil
+import numpy as np
+
+from time_util.time_util import UnifiedMarketCalendar, TimeUtil, ForexHolidayCalendar, IndicesMarketCalendar, \
+    MarketHoursTable
 from vali_objects.vali_config import TradePair
 from datetime import datetime, timedelta, timezone
 
@@ -155,6 +159,81 @@ class TestMarketHours(unittest.TestCase):
                 self.assertFalse(self.umc.is_market_open(TradePair.AMZN, timestamp))
         print(f'Finished in {time.time() - t0}')
 
+    def test_market_hours_match_calendars(self):
+        forex_calendar = ForexHolidayCalendar()
+        indices_calendar = IndicesMarketCalendar()
+
+        def calendar_answer(trade_pair, timestamp):
+            # Query the calendars without their last answer cache
+            forex_calendar.cache_valid_min_ms, forex_calendar.cache_valid_max_ms = 1, 0
+            indices_calendar.cache_valid_min_ms, indices_calendar.cache_valid_max_ms = 1, 0
+            if trade_pair.is_forex:
+                return forex_calendar.is_forex_market_open(timestamp)
+            return indices_calendar.is_market_open(trade_pair.trade_pair_id, timestamp)
+
+        # Hourly and around the hour through DST transitions, holidays and the Thanksgiving half day
+        timestamps = []
+        for start in [datetime(2024, 3, 8), datetime(2024, 11, 1), datetime(2023, 12, 22), datetime(2024, 11, 26),
+                      datetime(2019, 12, 29)]:
+            start_ms = TimeUtil.timestamp_to_millis(start.replace(tzinfo=timezone.utc))
+            for hour in range(24 * 5):
+                timestamps += [start_ms + hour * 3600000 + offset for offset in (-1, 0, 1800000)]
+
+        for trade_pair in [TradePair.EURUSD, TradePair.NVDA, TradePair.SPX, TradePair.BTCUSD]:
+            with self.subTest(trade_pair=trade_pair.trade_pair_id):
+                expected = [True] * len(timestamps) if trade_pair.is_crypto else \
+                    [calendar_answer(trade_pair, t) for t in timestamps]
+                self.assertEqual([self.umc.is_market_open(trade_pair, t) for t in timestamps], expected)
+                self.assertEqual(self.umc.market_open_mask(trade_pair, np.array(timestamps)).tolist(), expected)
+
+    def test_market_hours_extend_to_queried_years(self):
+        market_hours = self.umc.market_hours(TradePair.EURUSD)
+        # Christmas in 2010 and 2040, far outside the years first built
+        self.assertFalse(self.umc.is_market_open(TradePair.EURUSD, TimeUtil.timestamp_to_millis(
+            datetime(2040, 12, 25, 12, 0, tzinfo=timezone.utc))))
+        self.assertFalse(self.umc.is_market_open(TradePair.EURUSD, TimeUtil.timestamp_to_millis(
+            datetime(2010, 12, 24, 12, 0, tzinfo=timezone.utc))))
+        self.assertTrue(self.umc.is_market_open(TradePair.EURUSD, TimeUtil.timestamp_to_millis(
+            datetime(2010, 12, 23, 12, 0, tzinfo=timezone.utc))))
+        first_year, last_year, _, _, opens, closes = market_hours.sessions
+        self.assertLessEqual(first_year, 2010)
+        self.assertGreaterEqual(last_year, 2040)
+        self.assertTrue(np.all(opens[1:] > closes[:-1]))
+
+    def test_concurrent_first_queries(self):
+        # Tuesday 15:00 UTC, forex is open
+        timestamp = TimeUtil.timestamp_to_millis(datetime.fromisoformat("2024-05-07T15:00:00+00:00"))
+        building = threading.Event()
+        release = threading.Event()
+        n_builds = []
+
+        def build_sessions(first_year, last_year):
+            n_builds.append((first_year, last_year))
+            building.set()
+            release.wait(5)
+            return self.umc.forex_calendar.sessions(first_year, last_year)
+
+        market_hours = MarketHoursTable(build_sessions)
+        results = {}
+
+        def query(name):
+            results[name] = market_hours.is_open(timestamp)
+
+        first = threading.Thread(target=query, args=('first',))
+        first.start()
+        self.assertTrue(building.wait(5))
+        # Queries while the first build is in progress wait for it instead of reading empty sessions
+        second = threading.Thread(target=query, args=('second',))
+        second.start()
+        second.join(0.2)
+        self.assertTrue(second.is_alive())
+        release.set()
+        first.join()
+        second.join()
+        self.assertEqual(results, {'first': True, 'second': True})
+        self.assertEqual(len(n_builds), 1)
+        self.assertEqual(market_hours.open_mask(np.array([timestamp])).tolist(), [True])
+
 
 if __name__ == '__main__':
     unittest.main()
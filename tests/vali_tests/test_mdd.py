@@ -47,6 +47,12 @@ class TestMDDChecker(TestBase):
                              high=3271.26001, low=3268.1001, start_ms=1722389640000, websocket=False, lag_ms=729470,
                              volume=None)]
         }
+        # Batched order lookups get the same sources for every order time
+        cls.batch_patch = patch('vali_objects.utils.live_price_fetcher.LivePriceFetcher.get_tp_to_time_to_sorted_price_sources')
+        cls.mock_fetch_order_prices = cls.batch_patch.start()
+        cls.mock_fetch_order_prices.side_effect = lambda trade_pair_to_times_ms: {
+            tp: {t: cls.mock_fetch_prices.return_value.get(tp) for t in times_ms}
+            for tp, times_ms in trade_pair_to_times_ms.items()}
         cls.position_locks = PositionLocks()
 
 
@@ -56,6 +62,7 @@ class TestMDDChecker(TestBase):
     @classmethod
     def tearDownClass(cls):
         cls.data_patch.stop()
+        cls.batch_patch.stop()
 
     def setUp(self):
         super().setUp()
@@ -151,6 +158,32 @@ class TestMDDChecker(TestBase):
         self.verify_elimination_data_in_memory_and_disk([])
         self.verify_positions_on_disk([relevant_position], assert_all_open=True)
 
+    def test_mdd_price_correction_batched(self):
+        self.mdd_checker.price_correction_enabled = True
+        now_ms = TimeUtil.now_in_millis()
+        for trade_pair in [TradePair.BTCUSD, TradePair.ETHUSD]:
+            position = self.trade_pair_to_default_position[trade_pair]
+            for i in range(3):
+                self.add_order_to_position_and_save_to_disk(position, Order(
+                    order_type=OrderType.LONG, leverage=0.1, price=1000, trade_pair=trade_pair,
+                    processed_ms=now_ms - 1000 * (3 - i), order_uuid=f"{trade_pair.trade_pair_id}{i}"))
+
+        self.mock_fetch_order_prices.reset_mock()
+        with patch.object(self.live_price_fetcher, 'get_sorted_price_sources_for_trade_pair') as mock_single_lookup, \
+                patch.object(self.live_price_fetcher, 'get_quote', return_value=(None, None, 0)):
+            self.mdd_checker.mdd_check(self.position_locks)
+
+        # One lookup for all the orders instead of one per order
+        mock_single_lookup.assert_not_called()
+        self.mock_fetch_order_prices.assert_called_once_with(
+            {tp: [now_ms - 3000, now_ms - 2000, now_ms - 1000] for tp in [TradePair.BTCUSD, TradePair.ETHUSD]})
+        self.assertEqual(self.mdd_checker.n_orders_corrected, 6)
+        for position in self.position_manager.get_positions_for_one_hotkey(self.MINER_HOTKEY):
+            expected_sources = self.mock_fetch_prices.return_value[position.trade_pair]
+            for order in position.orders:
+                self.assertNotEqual(order.price, 1000)
+                self.assertEqual({ps.source for ps in order.price_sources}, {ps.source for ps in expected_sources})
+
     def test_no_mdd_failures(self):
         self.verify_elimination_data_in_memory_and_disk([])
         self.position = self.trade_pair_to_default_position[TradePair.BTCUSD]
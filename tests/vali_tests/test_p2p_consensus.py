@@ -0,0 +1,63 @@
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.p2p_consensus import CheckpointTables
+
+
+def position(miner_hotkey: str, position_uuid: str, orders: list[tuple[str, float, int]]) -> dict:
+    return {"miner_hotkey": miner_hotkey, "position_uuid": position_uuid, "trade_pair": ["BTCUSD"],
+            "orders": [{"order_uuid": order_uuid, "price": price, "processed_ms": processed_ms}
+                       for order_uuid, price, processed_ms in orders]}
+
+
+class TestP2PConsensus(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.checkpoints = {
+            "val1": {"positions": {
+                "miner1": {"positions": [position("miner1", "p1", [("o1", 3.0, 100), ("o2", 1.0, 200)])]},
+                "miner2": {"positions": []},
+            }},
+            "val2": {"positions": {
+                # o2 wrongly combined into a second position
+                "miner1": {"positions": [position("miner1", "p1", [("o1", 1.0, 100)]),
+                                         position("miner1", "p2", [("o2", 1.0, 200), ("o3", 5.0, 300)])]},
+            }},
+            "val3": {"positions": {
+                "miner1": {"positions": [position("miner1", "p1", [("o1", 2.0, 100), ("o2", 2.0, 200)]),
+                                         position("miner1", "p3_val3", [("o4_val3", 4.0, 400)])]},
+            }},
+        }
+        self.tables = CheckpointTables(self.checkpoints)
+
+    def test_counts(self):
+        tables = self.tables
+        self.assertEqual(tables.miner_hotkeys, ["miner1", "miner2"])
+        self.assertEqual(tables.miner_counts.tolist(), [3, 1])
+        self.assertEqual(tables.position_uuids, ["p1", "p2", "p3_val3"])
+        self.assertEqual(tables.position_counts.tolist(), [3, 1, 1])
+
+        # o2 is only kept under p1, counted once more for its removal from p2
+        p1_orders = [(tables.order_uuids[o], count) for o, count in tables.position_orders(0)]
+        self.assertEqual(p1_orders, [("o1", 3), ("o2", 3)])
+        self.assertEqual([tables.order_uuids[o] for o, _ in tables.position_orders(1)], ["o3"])
+
+        # Median price of every row of an order uuid
+        o1 = tables.order_uuids.index("o1")
+        self.assertEqual(tables.orders[tables.order_median_row[o1]]["price"], 2.0)
+        self.assertEqual(tables.majority_position_rows(2).tolist(), [0])
+
+    def test_orders_and_positions_by_validator(self):
+        orders = self.tables.orders_by_validator(0)
+        self.assertEqual(list(orders), ["val1", "val2", "val3"])
+        self.assertEqual([o["order_uuid"] for o in orders["val1"]], ["o1", "o2"])
+
+        # Only the trade pairs with positions left to resolve
+        matrix = self.tables.positions_matrix({"p1", "p2", "p3_val3"})
+        self.assertEqual(matrix, {})
+        matrix = self.tables.positions_matrix({"p1"})
+        self.assertEqual({v: [p["position_uuid"] for p in ps] for v, ps in matrix["miner1"]["BTCUSD"].items()},
+                         {"val1": ["p1"], "val2": ["p1", "p2"], "val3": ["p1", "p3_val3"]})
+
+    def test_legacy_miner_stats(self):
+        stats = list(self.tables.legacy_miner_stats())
+        self.assertEqual(stats, [("miner1", 3, 1, 4, 2, 400, 400, "o4_val3")])
@@ -0,0 +1,152 @@
+import json
+import os
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+from vali_objects.vali_dataclasses.perf_ledger import (
+    TP_ID_PORTFOLIO,
+    PerfCheckpoint,
+    PerfLedger,
+    PerfLedgerManager,
+)
+from vali_objects.vali_dataclasses.perf_ledger_store import PerfLedgerStore
+
+
+def make_ledger(n_cps, start_ms=1700000000000, ret_step=0.001):
+    cps = []
+    ret = 1.0
+    for i in range(n_cps):
+        ret *= 1 + ret_step * (1 if i % 3 else -1)
+        cps.append(PerfCheckpoint(last_update_ms=start_ms + (i + 1) * 43200000, prev_portfolio_ret=ret,
+                                  prev_portfolio_spread_fee=0.9999, prev_portfolio_carry_fee=0.9998,
+                                  accum_ms=43200000, open_ms=40000000 + i, n_updates=i + 1, gain=0.01 * i,
+                                  loss=-0.005 * i, mdd=min(ret, 1.0), mpv=max(ret, 1.0)))
+    return PerfLedger(initialization_time_ms=start_ms, max_return=max([1.0] + [cp.prev_portfolio_ret for cp in cps]),
+                      cps=cps)
+
+
+class TestPerfLedgerStore(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.plm = PerfLedgerManager(metagraph=None, running_unit_tests=True)
+        self.plm.clear_perf_ledgers_from_disk()
+        self.legacy_file_path = ValiBkpUtils.get_perf_ledgers_path(running_unit_tests=True)
+        if os.path.exists(self.legacy_file_path):
+            os.remove(self.legacy_file_path)
+        self.store = PerfLedgerStore(running_unit_tests=True)
+        self.bundles = {
+            'hk_a': {TP_ID_PORTFOLIO: make_ledger(30), 'BTCUSD': make_ledger(20, ret_step=0.002)},
+            'hk_b': {TP_ID_PORTFOLIO: make_ledger(5)},
+            'hk_c': {TP_ID_PORTFOLIO: make_ledger(0)},
+        }
+
+    def tearDown(self):
+        self.store.clear()
+        super().tearDown()
+
+    def assert_bundles_equal(self, actual, expected):
+        self.assertEqual(sorted(actual), sorted(expected))
+        for hk, bundle in expected.items():
+            self.assertEqual({tp_id: pl.to_dict() for tp_id, pl in actual[hk].items()},
+                             {tp_id: pl.to_dict() for tp_id, pl in bundle.items()})
+
+    def test_round_trip(self):
+        self.assertEqual(self.store.save(self.bundles), 3)
+        loaded = self.store.load()
+        self.assert_bundles_equal(loaded, self.bundles)
+        cp = loaded['hk_a']['BTCUSD'].cps[-1]
+        self.assertIsInstance(cp.last_update_ms, int)
+        self.assertIsInstance(cp.prev_portfolio_ret, float)
+        self.assertEqual(cp.lowerbound_time_created_ms, cp.last_update_ms - cp.accum_ms)
+
+    def test_extra_checkpoint_fields_round_trip(self):
+        cp = self.bundles['hk_b'][TP_ID_PORTFOLIO].cps[-1]
+        cp.note = 'tail'
+        self.store.save(self.bundles)
+        loaded_cps = self.store.load()['hk_b'][TP_ID_PORTFOLIO].cps
+        self.assertEqual(loaded_cps[-1].note, 'tail')
+        self.assertFalse(hasattr(loaded_cps[0], 'note'))
+
+    def test_only_changed_bundles_are_written(self):
+        self.store.save(self.bundles)
+        self.assertEqual(self.store.save(self.bundles), 0)
+
+        # In place updates to any checkpoint, appends, and scalar changes are all picked up.
+        self.bundles['hk_a']['BTCUSD'].cps[3].n_updates += 1
+        self.assertEqual(self.store.save(self.bundles), 1)
+        self.bundles['hk_b'][TP_ID_PORTFOLIO].cps.append(PerfCheckpoint(last_update_ms=1800000000000,
+                                                                        prev_portfolio_ret=1.0))
+        self.bundles['hk_c'][TP_ID_PORTFOLIO].max_return = 1.5
+        self.assertEqual(self.store.save(self.bundles), 2)
+        self.assert_bundles_equal(self.store.load(), self.bundles)
+
+    def test_only_dirty_hotkeys_are_checked(self):
+        self.store.save(self.bundles)
+        self.bundles['hk_a']['BTCUSD'].cps[3].n_updates += 1
+        self.bundles['hk_b'][TP_ID_PORTFOLIO].max_return = 1.5
+        self.assertEqual(self.store.save(self.bundles, dirty_hotkeys={'hk_b'}), 1)
+        self.assertEqual(self.store.load()['hk_a']['BTCUSD'].cps[3].n_updates, 4)
+
+        # Hotkeys missing from the store are written even if not dirty
+        self.bundles['hk_d'] = {TP_ID_PORTFOLIO: make_ledger(3)}
+        self.assertEqual(self.store.save(self.bundles, dirty_hotkeys=set()), 1)
+        self.assertEqual(self.store.load()['hk_d'][TP_ID_PORTFOLIO].to_dict(), make_ledger(3).to_dict())
+
+    def test_bundle_not_matching_index_is_rebuilt(self):
+        self.store.save(self.bundles)
+        # A save interrupted after writing the bundle, before writing the index
+        self.bundles['hk_a'][TP_ID_PORTFOLIO].cps.append(PerfCheckpoint(last_update_ms=1800000000000,
+                                                                        prev_portfolio_ret=1.0))
+        self.store.write_bundle('hk_a', self.store.bundle_to_arrays(self.bundles['hk_a']))
+
+        self.assertEqual(sorted(self.store.load()), ['hk_b', 'hk_c'])
+        self.assertEqual(self.store.inconsistent_hotkeys, {'hk_a'})
+        self.assertEqual(sorted(self.plm.get_perf_ledgers(portfolio_only=False, from_disk=True)), ['hk_b', 'hk_c'])
+        self.assertIn('hk_a', self.plm.perf_ledger_hks_to_invalidate)
+
+    def test_unreadable_bundle_is_rebuilt(self):
+        self.store.save(self.bundles)
+        os.remove(self.store.bundle_path('hk_a'))
+        with open(self.store.bundle_path('hk_b'), 'wb') as f:
+            f.write(b'not an npz')
+
+        self.assertEqual(sorted(self.store.load()), ['hk_c'])
+        self.assertEqual(self.store.inconsistent_hotkeys, {'hk_a', 'hk_b'})
+        self.assertEqual(sorted(self.plm.get_perf_ledgers(portfolio_only=False, from_disk=True)), ['hk_c'])
+        self.assertIn('hk_a', self.plm.perf_ledger_hks_to_invalidate)
+        self.assertIn('hk_b', self.plm.perf_ledger_hks_to_invalidate)
+
+    def test_removed_hotkeys_are_deleted(self):
+        self.store.save(self.bundles)
+        del self.bundles['hk_b']
+        self.store.save(self.bundles)
+        self.assertFalse(os.path.exists(self.store.bundle_path('hk_b')))
+        self.assert_bundles_equal(self.store.load(), self.bundles)
+
+        self.store.retain_hotkeys(['hk_c'])
+        self.assertEqual(list(self.store.load()), ['hk_c'])
+
+    def test_migrates_legacy_json_and_exports_it(self):
+        legacy = PerfLedgerStore.to_json_dict(self.bundles)
+        # v1 ledgers were a bare portfolio ledger per hotkey.
+        legacy['hk_v1'] = make_ledger(4).to_dict()
+        ValiBkpUtils.write_to_dir(self.legacy_file_path, legacy)
+
+        expected = dict(self.bundles)
+        expected['hk_v1'] = {TP_ID_PORTFOLIO: make_ledger(4)}
+        self.assert_bundles_equal(self.plm.get_perf_ledgers(portfolio_only=False, from_disk=True), expected)
+        self.assertTrue(self.store.exists())
+        portfolio_ledgers = self.plm.get_perf_ledgers(portfolio_only=True, from_disk=True)
+        self.assertEqual(portfolio_ledgers['hk_v1'].to_dict(), make_ledger(4).to_dict())
+
+        export_path = ValiBkpUtils.get_perf_ledgers_dir(running_unit_tests=True) + 'export.json'
+        self.store.export_json(export_path)
+        with open(export_path, 'r') as f:
+            exported = json.load(f)
+        self.assertEqual(exported, json.loads(json.dumps(PerfLedgerStore.to_json_dict(expected))))
+
+    def test_manager_saves_raw_json_bundles(self):
+        raw = json.loads(json.dumps(PerfLedgerStore.to_json_dict(self.bundles)))
+        self.plm.save_perf_ledgers(raw)
+        self.assert_bundles_equal(self.plm.get_perf_ledgers(portfolio_only=False, from_disk=True), self.bundles)
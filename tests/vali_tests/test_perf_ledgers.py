@@ -1,10 +1,16 @@
+import math
+import shutil
+from copy import deepcopy
 from unittest.mock import patch
 
+import numpy as np
+
 from tests.shared_objects.mock_classes import MockMetagraph
 from tests.vali_tests.base_objects.test_base import TestBase
 from time_util.time_util import TimeUtil
 from vali_objects.utils.elimination_manager import EliminationManager
 from vali_objects.utils.position_manager import PositionManager
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
 from vali_objects.vali_config import TradePair
 from vali_objects.enums.order_type_enum import OrderType
 from vali_objects.position import Position
@@ -12,6 +18,21 @@ from vali_objects.vali_dataclasses.order import Order
 from vali_objects.vali_dataclasses.perf_ledger import PerfLedgerManager, TP_ID_PORTFOLIO
 
 
+class FakeCandle:
+    def __init__(self, timestamp, close):
+        self.timestamp = timestamp
+        self.close = close
+
+
+def fake_unified_candle_fetcher(trade_pair, start_timestamp_ms, end_timestamp_ms, timespan):
+    # Deterministic oscillating prices with periodic gaps so both the price change and no price change paths are hit.
+    step_ms = 1000 if timespan == 'second' else 60000
+    base_price = {TradePair.BTCUSD.trade_pair_id: 60000, TradePair.NVDA.trade_pair_id: 100}.get(trade_pair.trade_pair_id, 156)
+    return [FakeCandle(t, base_price * (1 + 0.03 * math.sin(t / 3.6e6) + 0.01 * math.sin(t / 7.7e4)))
+            for t in range(start_timestamp_ms - start_timestamp_ms % step_ms, end_timestamp_ms + 1, step_ms)
+            if (t // step_ms) % 5]
+
+
 class TestPerfLedgers(TestBase):
 
     def setUp(self):
@@ -260,9 +281,184 @@ class TestPerfLedgers(TestBase):
             self.assertEqual(bundle[tp_id].last_update_ms, expected_last_update, f'last update time off by {expected_last_update - bundle[tp_id].last_update_ms} ms for tp_id {tp_id}')
             self.assertEqual(bundle[tp_id].cps[-1].accum_ms, last_accum_ms_portfolio2, f'accum time off by {last_accum_ms_portfolio - bundle[tp_id].cps[-1].accum_ms} ms for tp_id {tp_id}')
 
+    @patch('data_generator.polygon_data_service.PolygonDataService.unified_candle_fetcher')
+    def test_vectorized_engine_matches_tick_loop(self, mock_unified_candle_fetcher):
+        mock_unified_candle_fetcher.side_effect = fake_unified_candle_fetcher
+        btc_close_order = Order(price=61000, processed_ms=self.default_usdjpy_order.processed_ms + 1000 * 60 * 60 * 24 * 2 + 777,
+                                order_uuid="test_order_btc_close", trade_pair=self.DEFAULT_TRADE_PAIR,
+                                order_type=OrderType.FLAT, leverage=0)
+        self.default_btc_position.add_order(btc_close_order)
+        positions = [self.default_btc_position, self.default_nvda_position, self.default_usdjpy_position]
+        now_ms = TimeUtil.now_in_millis()
+
+        bundles = {}
+        for use_vectorized_engine in (False, True):
+            plm = PerfLedgerManager(metagraph=MockMetagraph(hotkeys=[self.DEFAULT_MINER_HOTKEY]), running_unit_tests=True,
+                                    use_vectorized_engine=use_vectorized_engine)
+            ans = plm.update_all_perf_ledgers({self.DEFAULT_MINER_HOTKEY: deepcopy(positions)}, {}, now_ms)
+            bundles[use_vectorized_engine] = ans[self.DEFAULT_MINER_HOTKEY]
+
+        self.assertEqual(set(bundles[False].keys()), set(bundles[True].keys()))
+        for tp_id, expected_pl in bundles[False].items():
+            actual_pl = bundles[True][tp_id]
+            self.assertAlmostEqual(expected_pl.max_return, actual_pl.max_return, 12)
+            self.assertEqual(len(expected_pl.cps), len(actual_pl.cps), tp_id)
+            for expected_cp, actual_cp in zip(expected_pl.cps, actual_pl.cps):
+                for k, v in expected_cp.to_dict().items():
+                    if isinstance(v, float):
+                        self.assertAlmostEqual(v, getattr(actual_cp, k), 12, f'{tp_id} {k} {expected_cp.last_update_ms}')
+                    else:
+                        self.assertEqual(v, getattr(actual_cp, k), f'{tp_id} {k} {expected_cp.last_update_ms}')
 
+    @patch('data_generator.polygon_data_service.PolygonDataService.unified_candle_fetcher')
+    def test_prices_at_ticks_match_price_info(self, mock_unified_candle_fetcher):
+        mock_unified_candle_fetcher.side_effect = fake_unified_candle_fetcher
+        plm = PerfLedgerManager(metagraph=MockMetagraph(hotkeys=[self.DEFAULT_MINER_HOTKEY]), running_unit_tests=True)
+        # Set per bundle update
+        plm.tp_to_mfs = {}
+        plm.now_ms = TimeUtil.now_in_millis()
+        start_ms = self.DEFAULT_OPEN_MS - self.DEFAULT_OPEN_MS % 60000
+        # Spans several refreshes of the price info, with ticks between candles and on missing candles
+        t_ms = np.arange(start_ms, start_ms + 3 * 1440 * 60000, 30000, dtype=np.int64)
+        prices = plm.prices_at_ticks(self.DEFAULT_TRADE_PAIR, 'minute', t_ms, int(t_ms[-1]) + 1)
+
+        candles = {c.timestamp: c.close for c in fake_unified_candle_fetcher(self.DEFAULT_TRADE_PAIR, start_ms,
+                                                                             int(t_ms[-1]), 'minute')}
+        expected = np.array([candles.get(int(t), np.nan) for t in t_ms])
+        np.testing.assert_array_equal(prices, expected)
+        self.assertTrue(np.isnan(prices).any())
 
+    @patch('data_generator.polygon_data_service.PolygonDataService.unified_candle_fetcher')
+    def test_candle_store_rebuild_matches_and_skips_fetches(self, mock_unified_candle_fetcher):
+        mock_unified_candle_fetcher.side_effect = fake_unified_candle_fetcher
+        shutil.rmtree(ValiBkpUtils.get_candle_store_dir(running_unit_tests=True), ignore_errors=True)
+        positions = [self.default_btc_position, self.default_nvda_position]
+        now_ms = TimeUtil.now_in_millis()
+
+        bundles = []
+        n_api_calls = []
+        for use_candle_store in (False, True, True):
+            plm = PerfLedgerManager(metagraph=MockMetagraph(hotkeys=[self.DEFAULT_MINER_HOTKEY]), running_unit_tests=True,
+                                    use_candle_store=use_candle_store)
+            ans = plm.update_all_perf_ledgers({self.DEFAULT_MINER_HOTKEY: deepcopy(positions)}, {}, now_ms)
+            bundles.append(ans[self.DEFAULT_MINER_HOTKEY])
+            n_api_calls.append(plm.n_api_calls)
+        shutil.rmtree(ValiBkpUtils.get_candle_store_dir(running_unit_tests=True), ignore_errors=True)
+
+        # The second store-backed manager simulates a restart. Only the unsettled tail should be fetched again.
+        self.assertEqual(n_api_calls[0], n_api_calls[1])
+        self.assertLess(n_api_calls[2], n_api_calls[1])
+        for bundle in bundles[1:]:
+            for tp_id, expected_pl in bundles[0].items():
+                self.assertEqual([cp.to_dict() for cp in expected_pl.cps], [cp.to_dict() for cp in bundle[tp_id].cps])
+
+    def test_update_schedule_matches_tick_loop(self):
+        for start_time_ms, end_time_ms in [(1720000000123, 1720000000123 + 1000 * 60 * 60 * 3 + 17),
+                                           (1720000020000, 1720000020000 + 1000 * 60 * 31),
+                                           (1720000059999, 1720000059999 + 1000 * 90),
+                                           (1720000000000, 1720000000000 + 1000 * 60 * 30)]:
+            default_mode = self.perf_ledger_manager.get_default_update_mode(start_time_ms, end_time_ms, 1)
+            expected_t_ms = []
+            expected_modes = []
+            accumulated_time_ms = 0
+            while start_time_ms + accumulated_time_ms < end_time_ms:
+                mode = self.perf_ledger_manager.get_current_update_mode(default_mode, start_time_ms, end_time_ms, accumulated_time_ms)
+                expected_t_ms.append(start_time_ms + accumulated_time_ms)
+                expected_modes.append(mode == 'minute')
+                accumulated_time_ms += 60000 if mode == 'minute' else 1000
+
+            t_ms, is_minute = self.perf_ledger_manager.get_update_schedule(default_mode, start_time_ms, end_time_ms)
+            self.assertEqual(expected_t_ms, t_ms.tolist())
+            self.assertEqual(expected_modes, is_minute.tolist())
+
+    def test_historical_positions_match_rebuild(self):
+        t0 = self.DEFAULT_OPEN_MS
+        orders = [Order(price=60000 + 500 * i, processed_ms=t0 + i * 1000 * 60 * 60, order_uuid=f"replay_order_{i}",
+                        trade_pair=self.DEFAULT_TRADE_PAIR, order_type=order_type, leverage=leverage)
+                  for i, (order_type, leverage) in enumerate([(OrderType.LONG, .5), (OrderType.LONG, .25),
+                                                              (OrderType.SHORT, -.5), (OrderType.LONG, 1.0),
+                                                              (OrderType.FLAT, 0)])]
+        position = Position(miner_hotkey=self.DEFAULT_MINER_HOTKEY, position_uuid="replay_position", open_ms=t0,
+                            trade_pair=self.DEFAULT_TRADE_PAIR, orders=orders, position_type=OrderType.LONG)
+        position.rebuild_position_with_updated_orders()
+
+        def rebuilt(n_orders):
+            p = deepcopy(position)
+            p.orders = p.orders[:n_orders]
+            p.rebuild_position_with_updated_orders()
+            return p.to_dict()
+
+        # In order events are stepped. Revisiting an earlier order forces a rebuild.
+        for i in list(range(len(orders))) + [1, 2]:
+            start, end = self.perf_ledger_manager.get_historical_position(position, orders[i].processed_ms)
+            self.assertEqual(start.to_dict(), rebuilt(i), i)
+            self.assertEqual(end.to_dict(), rebuilt(i + 1), i)
+        self.assertEqual(end.orders, position.orders[:3])
+        self.assertIsNot(end.orders, position.orders)
 
+    @patch('data_generator.polygon_data_service.PolygonDataService.unified_candle_fetcher')
+    def test_failed_update_rolls_back_bundle(self, mock_unified_candle_fetcher):
+        mock_unified_candle_fetcher.side_effect = fake_unified_candle_fetcher
+        positions = [self.default_btc_position, self.default_usdjpy_position]
+        now_ms = TimeUtil.now_in_millis()
+        plm = PerfLedgerManager(metagraph=MockMetagraph(hotkeys=[self.DEFAULT_MINER_HOTKEY]), running_unit_tests=True)
+        existing_perf_ledgers = {}
+        plm.update_one_perf_ledger_bundle(0, 1, self.DEFAULT_MINER_HOTKEY, deepcopy(positions),
+                                          now_ms - 1000 * 60 * 60 * 24 * 3, existing_perf_ledgers)
+        bundle = existing_perf_ledgers[self.DEFAULT_MINER_HOTKEY]
+        expected = {tp_id: deepcopy(pl.to_dict()) for tp_id, pl in bundle.items()}
+
+        # Roll the ledgers part of the way forward and then fail.
+        build_perf_ledger = plm.build_perf_ledger
+        def failing_build_perf_ledger(perf_ledger_bundle, *args):
+            build_perf_ledger(perf_ledger_bundle, *args)
+            perf_ledger_bundle['fake_tp'] = perf_ledger_bundle[TP_ID_PORTFOLIO]
+            raise ValueError('simulated failure')
+
+        with patch.object(plm, 'build_perf_ledger', side_effect=failing_build_perf_ledger):
+            with self.assertRaises(ValueError):
+                plm.update_one_perf_ledger_bundle(0, 1, self.DEFAULT_MINER_HOTKEY, deepcopy(positions), now_ms,
+                                                  existing_perf_ledgers)
+        self.assertIs(existing_perf_ledgers[self.DEFAULT_MINER_HOTKEY], bundle)
+        self.assertEqual({tp_id: pl.to_dict() for tp_id, pl in bundle.items()}, expected)
+
+        # The restored bundle still updates in place like a fresh one would.
+        plm.update_one_perf_ledger_bundle(0, 1, self.DEFAULT_MINER_HOTKEY, deepcopy(positions), now_ms,
+                                          existing_perf_ledgers)
+        self.assertGreater(bundle[TP_ID_PORTFOLIO].last_update_ms, expected[TP_ID_PORTFOLIO]['cps'][-1]['last_update_ms'])
 
-
-
+    @patch('data_generator.polygon_data_service.PolygonDataService.unified_candle_fetcher')
+    def test_worker_pool_matches_serial_update(self, mock_unified_candle_fetcher):
+        mock_unified_candle_fetcher.side_effect = fake_unified_candle_fetcher
+        hotkey_to_positions = {}
+        for i, p in enumerate([self.default_btc_position, self.default_nvda_position, self.default_usdjpy_position]):
+            hotkey = f"{self.DEFAULT_MINER_HOTKEY}_{i}"
+            p = deepcopy(p)
+            p.miner_hotkey = hotkey
+            hotkey_to_positions[hotkey] = [p]
+        now_ms = TimeUtil.now_in_millis()
+
+        results = {}
+        for n_ledger_workers in (0, 2):
+            plm = PerfLedgerManager(metagraph=MockMetagraph(hotkeys=list(hotkey_to_positions)), running_unit_tests=True,
+                                    n_ledger_workers=n_ledger_workers)
+            existing_perf_ledgers = {}
+            # Build part of the way, then roll the existing bundles forward.
+            for t_ms in (now_ms - 1000 * 60 * 60 * 24 * 20, now_ms):
+                plm.update_all_perf_ledgers(deepcopy(hotkey_to_positions), existing_perf_ledgers, t_ms)
+            if n_ledger_workers:
+                self.assertEqual(plm.n_api_calls, 0)  # Nothing fell back to the serial path in this process
+            plm.close_ledger_worker_pool()
+            results[n_ledger_workers] = ({hk: {tp_id: pl.to_dict() for tp_id, pl in bundle.items()}
+                                          for hk, bundle in existing_perf_ledgers.items()},
+                                         plm.hk_to_last_order_processed_ms)
+            self.assertEqual(set(plm.get_perf_ledgers(portfolio_only=False).keys()), set(hotkey_to_positions.keys()))
+        self.assertEqual(results[0], results[2])
+
+    def test_shard_hotkeys_balances_cost(self):
+        now_ms = self.DEFAULT_OPEN_MS + 1000 * 60 * 60 * 24 * 30
+        hotkey_to_positions = {f"hk_{i}": [self.default_btc_position] for i in range(7)}
+        shards = self.perf_ledger_manager.shard_hotkeys(hotkey_to_positions, {}, now_ms, 3)
+        self.assertEqual(sorted(hk for shard in shards for hk in shard), sorted(hotkey_to_positions))
+        self.assertEqual(sorted(len(shard) for shard in shards), [2, 2, 3])
+        self.assertEqual(len(self.perf_ledger_manager.shard_hotkeys(hotkey_to_positions, {}, now_ms, 20)), 7)
@@ -0,0 +1,103 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.plagiarism_events import PlagiarismEvents
+from vali_objects.utils.plagiarism_raster_cache import PlagiarismRasterCache
+from vali_objects.utils.plagiarism_similarity import SimilarityMatrix
+from vali_objects.utils.reporting_utils import ReportingUtils
+from vali_objects.vali_config import ValiConfig
+
+
+class TestPlagiarismRasterCache(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        PlagiarismEvents.clear_plagiarism_events()
+        self.cache = PlagiarismRasterCache(running_unit_tests=True)
+        self.cache.delete()
+        self.resolution = ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS
+        self.current_time = 2 * ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS
+        self.miners = ['victim', 'follower', 'other', 'idle']
+        self.trade_pairs = ['BTCUSD', 'ETHUSD']
+
+        # All states are a day or more away from the edges of the lookback window
+        day = 1000 * 60 * 60 * 24
+        start = self.current_time - ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS + 2 * day
+        victim_states = [{"start": start, "end": start + day, "leverage": 0.5},
+                         {"start": start + day, "end": start + 3 * day, "leverage": -0.2}]
+        self.state_dict = {(m, tp): [] for m in self.miners for tp in self.trade_pairs}
+        self.state_dict[('victim', 'BTCUSD')] = victim_states
+        self.state_dict[('follower', 'BTCUSD')] = [dict(s, start=s["start"] + 30 * self.resolution,
+                                                        end=s["end"] + 30 * self.resolution) for s in victim_states]
+        self.state_dict[('other', 'BTCUSD')] = [{"start": start + day // 2, "end": start + 4 * day, "leverage": 0.1}]
+        self.state_dict[('other', 'ETHUSD')] = [{"start": start, "end": start + 4 * day, "leverage": 0.3}]
+        self.state_dict[('victim', 'ETHUSD')] = [{"start": start + day, "end": start + 2 * day, "leverage": 0.3}]
+
+    def tearDown(self):
+        self.cache.delete()
+        PlagiarismEvents.clear_plagiarism_events()
+        super().tearDown()
+
+    def full_scores(self, current_time):
+        PlagiarismEvents.clear_plagiarism_events()
+        PlagiarismEvents.set_positions(self.state_dict, self.miners, self.trade_pairs, current_time=current_time)
+        SimilarityMatrix.score_all()
+        return (dict(PlagiarismEvents.rasterized_positions), dict(PlagiarismEvents.copy_similarities),
+                dict(PlagiarismEvents.time_differences))
+
+    def cached_scores(self, current_time):
+        PlagiarismEvents.clear_plagiarism_events()
+        self.cache.score(self.state_dict, self.miners, self.trade_pairs, current_time)
+        return (dict(PlagiarismEvents.rasterized_positions), dict(PlagiarismEvents.copy_similarities),
+                dict(PlagiarismEvents.time_differences))
+
+    def assert_same_scores(self, actual, expected):
+        actual_rasters, actual_similarities, actual_differences = actual
+        expected_rasters, expected_similarities, expected_differences = expected
+        self.assertEqual(sorted(actual_rasters), sorted(expected_rasters))
+        for key, raster in expected_rasters.items():
+            np.testing.assert_array_equal(actual_rasters[key], raster)
+        self.assertEqual(actual_differences, expected_differences)
+        self.assertEqual(sorted(actual_similarities), sorted(expected_similarities))
+        for key, similarity in expected_similarities.items():
+            self.assertAlmostEqual(actual_similarities[key], similarity, places=10)
+
+    def test_raster_encoding_round_trip(self):
+        raster = ReportingUtils.rasterize_cumulative_position(self.state_dict[('victim', 'BTCUSD')],
+                                                              current_time=self.current_time)
+        starts, values = PlagiarismRasterCache.encode_raster(raster)
+        self.assertEqual(len(starts), 4)
+        np.testing.assert_array_equal(PlagiarismRasterCache.decode_raster(starts, values, len(raster)), raster)
+
+    def test_only_changed_miners_are_rescored(self):
+        self.assert_same_scores(self.cached_scores(self.current_time), self.full_scores(self.current_time))
+
+        later = self.current_time + 90 * self.resolution
+        self.state_dict[('other', 'BTCUSD')][0]["leverage"] = 0.4
+        with patch.object(ReportingUtils, 'rasterize_cumulative_position',
+                          wraps=ReportingUtils.rasterize_cumulative_position) as rasterize:
+            cached = self.cached_scores(later)
+        # Only the changed miner is rasterized again
+        self.assertEqual(rasterize.call_count, 1)
+        self.assert_same_scores(cached, self.full_scores(later))
+
+    def test_window_not_moving_by_whole_steps_rescores_everything(self):
+        self.cached_scores(self.current_time)
+        later = self.current_time + self.resolution // 2
+        with patch.object(ReportingUtils, 'rasterize_cumulative_position',
+                          wraps=ReportingUtils.rasterize_cumulative_position) as rasterize:
+            cached = self.cached_scores(later)
+        self.assertEqual(rasterize.call_count, 5)
+        self.assert_same_scores(cached, self.full_scores(later))
+
+    def test_states_near_window_edge_are_rescored(self):
+        self.cached_scores(self.current_time)
+        later = self.current_time + ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS // 2
+        # The window moved past most of the states, but the hashes are unchanged
+        with patch.object(ReportingUtils, 'rasterize_cumulative_position',
+                          wraps=ReportingUtils.rasterize_cumulative_position) as rasterize:
+            cached = self.cached_scores(later)
+        self.assertEqual(rasterize.call_count, 5)
+        self.assert_same_scores(cached, self.full_scores(later))
@@ -0,0 +1,75 @@
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.plagiarism_definitions import CopySimilarity
+from vali_objects.utils.plagiarism_events import PlagiarismEvents
+from vali_objects.utils.plagiarism_similarity import SimilarityMatrix
+from vali_objects.vali_config import ValiConfig
+
+
+class TestPlagiarismSimilarity(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        PlagiarismEvents.clear_plagiarism_events()
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        PlagiarismEvents.clear_plagiarism_events()
+        super().tearDown()
+
+    @staticmethod
+    def pairwise_similarity(plagiarist_vector, victim_vector, lag):
+        if lag > 0:
+            return cosine_similarity([plagiarist_vector[lag:]], [victim_vector[:-lag]])[0][0]
+        return cosine_similarity([plagiarist_vector], [victim_vector])[0][0]
+
+    def assert_matches_pairwise(self, matrix, lags):
+        similarities = SimilarityMatrix.lagged_cosine_similarities(matrix, lags)
+        for i in range(len(matrix)):
+            for j in range(len(matrix)):
+                self.assertAlmostEqual(similarities[i, j],
+                                       self.pairwise_similarity(matrix[i], matrix[j], lags[i, j]), places=10)
+
+    def test_matches_pairwise_cosine_similarity(self):
+        matrix = self.rng.normal(size=(6, 200))
+        matrix[2] = 0
+        matrix[4, 150:] = 0
+        lags = self.rng.choice([0, 0, 3, 50], size=(6, 6))
+        self.assert_matches_pairwise(matrix, lags)
+
+    def test_sparse_matches_pairwise_cosine_similarity(self):
+        matrix = np.zeros((5, 500))
+        for row in matrix:
+            start = self.rng.integers(0, 480)
+            row[start:start + 20] = self.rng.choice([-0.5, 0.1, 0.3])
+        self.assertLess(np.count_nonzero(matrix), SimilarityMatrix.SPARSE_DENSITY_THRESHOLD * matrix.size)
+        lags = self.rng.choice([0, 5, 10], size=(5, 5))
+        self.assert_matches_pairwise(matrix, lags)
+
+    def test_score_all_matches_copy_similarity(self):
+        resolution = ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS
+        current_time = ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS
+        miners = ['victim', 'follower', 'other', 'idle']
+        trade_pairs = ['BTCUSD', 'ETHUSD']
+        victim_states = [{"start": 1000 * resolution, "end": 2000 * resolution, "leverage": 0.5},
+                         {"start": 2000 * resolution, "end": 4000 * resolution, "leverage": -0.2}]
+        positions = {(m, tp): [] for m in miners for tp in trade_pairs}
+        positions[('victim', 'BTCUSD')] = victim_states
+        positions[('follower', 'BTCUSD')] = [dict(s, start=s["start"] + 30 * resolution, end=s["end"] + 30 * resolution)
+                                             for s in victim_states]
+        positions[('other', 'BTCUSD')] = [{"start": 500 * resolution, "end": 3000 * resolution, "leverage": 0.1}]
+        positions[('other', 'ETHUSD')] = [{"start": 500 * resolution, "end": 3000 * resolution, "leverage": 0.1}]
+
+        PlagiarismEvents.set_positions(positions, miners, trade_pairs, current_time=current_time)
+        SimilarityMatrix.score_all()
+        batched = dict(PlagiarismEvents.copy_similarities)
+        self.assertEqual(len(batched), len(trade_pairs) * len(miners) * (len(miners) - 1))
+        self.assertGreater(batched[('follower', 'BTCUSD', 'victim', 'BTCUSD')], 0.99)
+
+        PlagiarismEvents.copy_similarities.clear()
+        PlagiarismEvents.time_differences.clear()
+        for (plagiarist_id, trade_pair, victim_id, _), similarity in batched.items():
+            self.assertAlmostEqual(similarity, CopySimilarity.score_direct(plagiarist_id, trade_pair, victim_id, trade_pair),
+                                   places=10)
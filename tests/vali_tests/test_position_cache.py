@@ -0,0 +1,191 @@
+import copy
+from multiprocessing import Manager
+
+from tests.shared_objects.mock_classes import MockMetagraph
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.enums.order_type_enum import OrderType
+from vali_objects.exceptions.vali_records_misalignment_exception import ValiRecordsMisalignmentException
+from vali_objects.position import Position
+from vali_objects.utils.position_cache import PositionCache
+from vali_objects.utils.position_manager import PositionManager
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.order import Order
+
+
+class CountingProxy:
+    def __init__(self, d):
+        self.d = d
+        self.n_gets = 0
+
+    def get(self, key, default=None):
+        self.n_gets += 1
+        return self.d.get(key, default)
+
+
+class TestPositionCache(TestBase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ipc_manager = Manager()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ipc_manager.shutdown()
+
+    def setUp(self):
+        super().setUp()
+        self.DEFAULT_MINER_HOTKEY = "test_miner"
+        self.cache = PositionCache(ipc_manager=self.ipc_manager)
+
+    def make_position(self, position_uuid, trade_pair=TradePair.BTCUSD, open_ms=1000):
+        position = Position(miner_hotkey=self.DEFAULT_MINER_HOTKEY, position_uuid=position_uuid, open_ms=open_ms,
+                            trade_pair=trade_pair)
+        position.add_order(Order(order_type=OrderType.LONG, leverage=0.5, price=1000, trade_pair=trade_pair,
+                                 processed_ms=open_ms, order_uuid=position_uuid + '_o1'))
+        return position
+
+    def make_reader(self):
+        # Another process shares the manager proxies but has its own local cache.
+        reader = copy.copy(self.cache)
+        reader.local_blobs = {}
+        reader.positions = CountingProxy(self.cache.positions)
+        return reader
+
+    def test_save_and_read(self):
+        positions = [self.make_position(f'p{i}', open_ms=1000 + i) for i in range(3)]
+        for p in positions:
+            self.cache.save_position(p)
+        self.cache.save_position(positions[0])  # Most recently saved goes last, like the old per miner list
+        self.assertEqual([p.position_uuid for p in self.cache.get_positions(self.DEFAULT_MINER_HOTKEY)],
+                         ['p1', 'p2', 'p0'])
+        self.assertIn(self.DEFAULT_MINER_HOTKEY, self.cache)
+        self.assertEqual(self.cache.n_positions_by_hotkey(), {self.DEFAULT_MINER_HOTKEY: 3})
+
+        # Reads are copies.
+        read = self.cache.get_positions(self.DEFAULT_MINER_HOTKEY)
+        read[0].orders.clear()
+        self.cache.get_position(self.DEFAULT_MINER_HOTKEY, 'p2').orders.clear()
+        for p in self.cache.get_positions(self.DEFAULT_MINER_HOTKEY):
+            self.assertEqual(len(p.orders), 1)
+
+    def test_reader_only_fetches_changed_positions(self):
+        for i in range(5):
+            self.cache.save_position(self.make_position(f'p{i}', open_ms=1000 + i))
+        reader = self.make_reader()
+        self.assertEqual(len(reader.get_positions(self.DEFAULT_MINER_HOTKEY)), 5)
+        self.assertEqual(reader.positions.n_gets, 5)
+
+        self.assertEqual(len(reader.get_positions(self.DEFAULT_MINER_HOTKEY)), 5)
+        self.assertEqual(reader.positions.n_gets, 5)
+
+        updated = self.make_position('p3', open_ms=1003)
+        updated.add_order(Order(order_type=OrderType.FLAT, leverage=0.0, price=1100, trade_pair=TradePair.BTCUSD,
+                                processed_ms=5000, order_uuid='p3_o2'))
+        self.cache.save_position(updated)
+        self.cache.delete_position(self.DEFAULT_MINER_HOTKEY, 'p1')
+        read = {p.position_uuid: p for p in reader.get_positions(self.DEFAULT_MINER_HOTKEY)}
+        self.assertEqual(reader.positions.n_gets, 6)
+        self.assertEqual(sorted(read), ['p0', 'p2', 'p3', 'p4'])
+        self.assertTrue(read['p3'].is_closed_position)
+
+    def test_versions_by_trade_pair(self):
+        self.cache.save_position(self.make_position('p0'))
+        self.cache.save_position(self.make_position('p1', trade_pair=TradePair.ETHUSD))
+        reader = self.make_reader()
+        versions = reader.get_versions_by_trade_pair(self.DEFAULT_MINER_HOTKEY)
+        self.assertEqual({tp: list(v) for tp, v in versions.items()}, {'BTCUSD': ['p0'], 'ETHUSD': ['p1']})
+
+        # Only the trade pair with a saved position changes
+        self.cache.save_position(self.make_position('p0'))
+        updated = reader.get_versions_by_trade_pair(self.DEFAULT_MINER_HOTKEY)
+        self.assertNotEqual(updated['BTCUSD'], versions['BTCUSD'])
+        self.assertEqual(updated['ETHUSD'], versions['ETHUSD'])
+        self.assertEqual(reader.get_versions_by_trade_pair('unknown_miner'), {})
+
+    def test_delete_set_and_clear(self):
+        self.cache.save_position(self.make_position('p0'))
+        self.cache.delete_position(self.DEFAULT_MINER_HOTKEY, 'p0')
+        self.assertNotIn(self.DEFAULT_MINER_HOTKEY, self.cache)
+        self.assertEqual(len(self.cache.positions), 0)
+
+        self.cache.set_positions(self.DEFAULT_MINER_HOTKEY, [self.make_position('p1'), self.make_position('p2')])
+        self.cache.set_positions(self.DEFAULT_MINER_HOTKEY, [self.make_position('p3')])
+        self.assertEqual([p.position_uuid for p in self.cache.get_positions(self.DEFAULT_MINER_HOTKEY)], ['p3'])
+        self.assertEqual(len(self.cache.positions), 1)
+
+        self.cache.clear()
+        self.assertEqual(self.cache.hotkeys(), [])
+        self.assertIsNone(self.cache.get_position(self.DEFAULT_MINER_HOTKEY, 'p3'))
+
+    def close_position(self, position):
+        position.add_order(Order(order_type=OrderType.FLAT, leverage=0.0, price=1100, trade_pair=position.trade_pair,
+                                 processed_ms=position.open_ms + 1000, order_uuid=position.position_uuid + '_o2'))
+
+    def test_open_position_index(self):
+        for cache in (self.cache, PositionCache()):
+            btc = self.make_position('p_btc')
+            eth = self.make_position('p_eth', trade_pair=TradePair.ETHUSD)
+            cache.save_position(btc)
+            cache.save_position(eth)
+            self.assertEqual(cache.get_open_position_uuids(self.DEFAULT_MINER_HOTKEY, TradePair.BTCUSD.trade_pair_id),
+                             ['p_btc'])
+
+            self.close_position(btc)
+            cache.save_position(btc)
+            self.assertEqual(cache.get_open_position_uuids(self.DEFAULT_MINER_HOTKEY, TradePair.BTCUSD.trade_pair_id),
+                             [])
+            btc_2 = self.make_position('p_btc_2', open_ms=3000)
+            cache.save_position(btc_2)
+            cache.delete_position(self.DEFAULT_MINER_HOTKEY, 'p_eth')
+            self.assertEqual(cache.get_open_position_uuids(self.DEFAULT_MINER_HOTKEY, TradePair.ETHUSD.trade_pair_id),
+                             [])
+            self.assertEqual(cache.check_open_index(), [])
+
+            cache.set_positions(self.DEFAULT_MINER_HOTKEY, [eth])
+            self.assertEqual(cache.check_open_index(), [])
+            self.assertEqual(dict(cache.open_index), {(self.DEFAULT_MINER_HOTKEY, TradePair.ETHUSD.trade_pair_id):
+                                                      ['p_eth']})
+
+            # Bypassing the cache API is caught by the consistency check.
+            del cache.open_index[(self.DEFAULT_MINER_HOTKEY, TradePair.ETHUSD.trade_pair_id)]
+            self.assertEqual(len(cache.check_open_index()), 1)
+
+    def test_position_manager_with_ipc_manager(self):
+        position_manager = PositionManager(metagraph=MockMetagraph([self.DEFAULT_MINER_HOTKEY]), running_unit_tests=True,
+                                           ipc_manager=self.ipc_manager)
+        position_manager.clear_all_miner_positions()
+        open_position = self.make_position('p_open')
+        position_manager.save_miner_position(open_position)
+        position_manager.save_miner_position(self.make_position('p_eth', trade_pair=TradePair.ETHUSD))
+
+        found = position_manager.get_open_position_for_a_miner_trade_pair(self.DEFAULT_MINER_HOTKEY,
+                                                                          TradePair.BTCUSD.trade_pair_id)
+        self.assertEqual(found.position_uuid, 'p_open')
+        position_manager.verify_open_position_index()
+        position_manager.position_cache.save_position(self.make_position('p_open_2', open_ms=2000))
+        with self.assertRaises(ValiRecordsMisalignmentException):
+            position_manager.get_open_position_for_a_miner_trade_pair(self.DEFAULT_MINER_HOTKEY,
+                                                                      TradePair.BTCUSD.trade_pair_id)
+        position_manager.delete_position(self.make_position('p_open_2', open_ms=2000))
+        self.assertEqual(position_manager.get_number_of_miners_with_any_positions(), 1)
+        position_manager.delete_position(open_position)
+        self.assertEqual([p.position_uuid for p in
+                          position_manager.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY)], ['p_eth'])
+        self.assertIsNone(position_manager.get_miner_position_by_uuid(self.DEFAULT_MINER_HOTKEY, 'p_open'))
+
+    def test_trade_pair_mismatch_is_rejected(self):
+        for ipc_manager in (self.ipc_manager, None):
+            position_manager = PositionManager(metagraph=MockMetagraph([self.DEFAULT_MINER_HOTKEY]),
+                                               running_unit_tests=True, ipc_manager=ipc_manager)
+            position_manager.clear_all_miner_positions()
+            position_manager.save_miner_position(self.make_position('p0'))
+            self.assertEqual(position_manager.position_cache.get_trade_pair_id(self.DEFAULT_MINER_HOTKEY, 'p0'),
+                             TradePair.BTCUSD.trade_pair_id)
+            # Also found by a process that never read the position
+            reader = copy.copy(position_manager.position_cache)
+            reader.local_blobs = {}
+            self.assertEqual(reader.get_trade_pair_id(self.DEFAULT_MINER_HOTKEY, 'p0'), TradePair.BTCUSD.trade_pair_id)
+            self.assertIsNone(reader.get_trade_pair_id(self.DEFAULT_MINER_HOTKEY, 'p1'))
+            with self.assertRaises(AssertionError):
+                position_manager.save_miner_position(self.make_position('p0', trade_pair=TradePair.ETHUSD))
+            position_manager.clear_all_miner_positions()
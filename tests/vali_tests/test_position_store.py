@@ -0,0 +1,131 @@
+import os
+from copy import deepcopy
+
+from tests.shared_objects.mock_classes import MockMetagraph
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.enums.order_type_enum import OrderType
+from vali_objects.exceptions.vali_records_misalignment_exception import (
+    ValiRecordsMisalignmentException,
+)
+from vali_objects.position import Position
+from vali_objects.utils.position_manager import PositionManager
+from vali_objects.utils.position_store import (
+    POSITION_BACKEND_FILES,
+    POSITION_BACKEND_SQLITE,
+    PositionStore,
+)
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.order import Order
+
+
+class TestPositionStore(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.DEFAULT_MINER_HOTKEY = "test_miner"
+        self.mock_metagraph = MockMetagraph([self.DEFAULT_MINER_HOTKEY, "test_miner_2"])
+        self.remove_store()
+        self.file_position_manager = PositionManager(metagraph=self.mock_metagraph, running_unit_tests=True,
+                                                     position_backend=POSITION_BACKEND_FILES)
+        self.file_position_manager.clear_all_miner_positions()
+        self.position_manager = self.make_store_position_manager()
+
+    def tearDown(self):
+        self.position_manager.position_store.close()
+        self.remove_store()
+        super().tearDown()
+
+    def remove_store(self):
+        db_path = PositionStore(running_unit_tests=True).db_path
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    def make_store_position_manager(self):
+        return PositionManager(metagraph=self.mock_metagraph, running_unit_tests=True,
+                               position_backend=POSITION_BACKEND_SQLITE)
+
+    def make_position(self, position_uuid, trade_pair=TradePair.BTCUSD, hotkey=None, open_ms=1000):
+        position = Position(miner_hotkey=hotkey or self.DEFAULT_MINER_HOTKEY, position_uuid=position_uuid,
+                            open_ms=open_ms, trade_pair=trade_pair)
+        position.add_order(Order(order_type=OrderType.LONG, leverage=0.5, price=1000, trade_pair=trade_pair,
+                                 processed_ms=open_ms, order_uuid=position_uuid + '_o1'))
+        return position
+
+    def close_position(self, position):
+        position.add_order(Order(order_type=OrderType.FLAT, leverage=0.0, price=1100,
+                                 trade_pair=position.trade_pair, processed_ms=position.open_ms + 1000,
+                                 order_uuid=position.position_uuid + '_o2'))
+
+    def assert_same_positions(self, actual, expected):
+        self.assertEqual(sorted(p.position_uuid for p in actual), sorted(p.position_uuid for p in expected))
+        expected_by_uuid = {p.position_uuid: p for p in expected}
+        for p in actual:
+            is_same, diff = PositionManager.positions_are_the_same(p, expected_by_uuid[p.position_uuid])
+            self.assertTrue(is_same, diff)
+
+    def test_positions_survive_restart(self):
+        open_position = self.make_position('p_open', trade_pair=TradePair.ETHUSD)
+        closed_position = self.make_position('p_closed')
+        self.position_manager.save_miner_position(open_position)
+        self.position_manager.save_miner_position(closed_position)
+        self.close_position(closed_position)
+        self.position_manager.save_miner_position(closed_position)
+
+        disk_positions = self.position_manager.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY, from_disk=True)
+        self.assert_same_positions(disk_positions, [open_position, closed_position])
+        self.assertEqual([p.position_uuid for p in disk_positions if p.is_open_position], ['p_open'])
+
+        restarted = self.make_store_position_manager()
+        self.assert_same_positions(restarted.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY),
+                                   [open_position, closed_position])
+        # Nothing is written to the miner directories.
+        self.assertEqual(self.file_position_manager.get_positions_for_all_miners(from_disk=True), {})
+
+    def test_migrates_position_files(self):
+        positions = [self.make_position('p1'), self.make_position('p2', trade_pair=TradePair.EURUSD),
+                     self.make_position('p3', hotkey='test_miner_2')]
+        self.close_position(positions[0])
+        for p in positions:
+            self.file_position_manager.save_miner_position(p)
+        self.position_manager.position_store.close()
+        self.remove_store()
+
+        migrated = self.make_store_position_manager()
+        self.assertFalse(migrated.position_store.is_empty())
+        self.assertEqual(sorted(migrated.get_miner_hotkeys_on_disk()), [self.DEFAULT_MINER_HOTKEY, 'test_miner_2'])
+        self.assert_same_positions(migrated.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY, from_disk=True),
+                                   positions[:2])
+        self.assert_same_positions(migrated.get_positions_for_one_hotkey('test_miner_2', from_disk=True),
+                                   positions[2:])
+        self.position_manager = migrated
+
+    def test_delete_and_clear(self):
+        p1 = self.make_position('p1')
+        p2 = self.make_position('p2', hotkey='test_miner_2')
+        self.position_manager.save_miner_position(p1)
+        self.position_manager.save_miner_position(p2)
+
+        self.position_manager.delete_position(p1)
+        self.assertEqual(self.position_manager.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY, from_disk=True), [])
+        self.assertEqual(self.position_manager.get_positions_for_one_hotkey(self.DEFAULT_MINER_HOTKEY), [])
+
+        overwritten = deepcopy(p2)
+        self.close_position(overwritten)
+        self.position_manager.overwrite_position_on_disk(overwritten)
+        self.assert_same_positions(self.position_manager.get_positions_for_one_hotkey('test_miner_2', from_disk=True),
+                                   [overwritten])
+
+        self.position_manager.clear_all_miner_positions(target_hotkey='test_miner_2')
+        self.assertTrue(self.position_manager.position_store.is_empty())
+
+    def test_second_open_position_for_trade_pair_is_rejected(self):
+        self.position_manager.save_miner_position(self.make_position('p1'))
+        with self.assertRaises(ValiRecordsMisalignmentException):
+            self.position_manager.save_miner_position(self.make_position('p2', open_ms=2000))
+        # A different trade pair is fine.
+        self.position_manager.save_miner_position(self.make_position('p3', trade_pair=TradePair.ETHUSD))
+
+    def test_recently_updated_hotkeys(self):
+        self.position_manager.save_miner_position(self.make_position('p1', hotkey='test_miner_2'))
+        self.assertIn('test_miner_2', self.position_manager.get_recently_updated_miner_hotkeys())
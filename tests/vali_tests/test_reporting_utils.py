@@ -0,0 +1,49 @@
+import numpy as np
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.reporting_utils import ReportingUtils
+from vali_objects.vali_config import ValiConfig
+
+
+class TestReportingUtils(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.resolution = ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS
+        self.current_time = ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS
+        self.rng = np.random.default_rng(0)
+
+    def masked_rasterize(self, cumulative_leverage):
+        # Straightforward version of the rasterization, one mask over the whole window per state
+        times = np.arange(self.current_time - ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS, self.current_time,
+                          self.resolution)
+        rasterized_positions = np.zeros(len(times))
+        for state in cumulative_leverage:
+            rasterized_positions[(times >= state["start"]) & (times <= state["end"])] = state["leverage"]
+        return rasterized_positions
+
+    def assert_same_raster(self, cumulative_leverage):
+        np.testing.assert_array_equal(
+            ReportingUtils.rasterize_cumulative_position(cumulative_leverage, current_time=self.current_time),
+            self.masked_rasterize(cumulative_leverage))
+
+    def random_times(self, n):
+        # Some times land exactly on raster steps and some are outside the window
+        times = self.rng.integers(-50, self.current_time // self.resolution + 50, size=n) * self.resolution
+        return times + self.rng.choice([0, 0, 1, self.resolution // 2], size=n)
+
+    def test_consecutive_states(self):
+        self.assert_same_raster([])
+        for _ in range(20):
+            times = np.sort(self.random_times(8))
+            # Each state ends where the next one starts, like the states from PositionUtils.to_state_list
+            states = [{"start": int(times[i]), "end": int(times[i + 1]), "leverage": float(self.rng.normal())}
+                      for i in range(len(times) - 1)]
+            self.assert_same_raster(states)
+
+    def test_overlapping_and_unordered_states(self):
+        for _ in range(20):
+            starts = self.random_times(6)
+            states = [{"start": int(start), "end": int(start + self.rng.integers(-5, 500) * self.resolution),
+                       "leverage": float(self.rng.normal())} for start in starts]
+            self.assert_same_raster(states)
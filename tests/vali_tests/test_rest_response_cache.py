@@ -0,0 +1,121 @@
+import gzip
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from ptn_api.rest_server import PTNRestServer
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+
+
+class TestRestResponseCache(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        api_keys_file = os.path.join(self.tmp_dir.name, "api_keys.json")
+        with open(api_keys_file, "w") as f:
+            json.dump({"premium": {"key": "key100", "tier": 100}, "basic": {"key": "key30", "tier": 30}}, f)
+
+        self.stats_file = os.path.join(self.tmp_dir.name, "minerstatistics.json")
+        self.positions_file = os.path.join(self.tmp_dir.name, "output.json.gz")
+        patches = [
+            patch.object(ValiBkpUtils, "get_miner_stats_dir", return_value=self.stats_file),
+            patch.object(ValiBkpUtils, "get_miner_positions_output_path", return_value=self.positions_file),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.server = PTNRestServer(api_keys_file=api_keys_file, refresh_interval=3600)
+        self.client = self.server.app.test_client()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def write_statistics(self, n_miners: int, generation: int):
+        data = {"version": generation, "data": [
+            {"hotkey": f"miner{i}", "score": i * generation, "checkpoints": [{"gain": i}]} for i in range(n_miners)]}
+        with open(self.stats_file, "w") as f:
+            json.dump(data, f)
+        # Distinct generations even within the resolution of the file system clock
+        os.utime(self.stats_file, ns=(generation * 10 ** 9, generation * 10 ** 9))
+        return data
+
+    def get(self, path, api_key="key100", **headers):
+        return self.client.get(path, headers={"Authorization": f"Bearer {api_key}", **headers})
+
+    @staticmethod
+    def decode(response):
+        return json.loads(gzip.decompress(response.data) if response.headers.get("Content-Encoding") == "gzip"
+                          else response.data)
+
+    def test_statistics_served_from_memory_until_file_changes(self):
+        data = self.write_statistics(n_miners=50, generation=1)
+
+        with patch("builtins.open", wraps=open) as mock_open:
+            response = self.get("/statistics", **{"Accept-Encoding": "gzip"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["Content-Encoding"], "gzip")
+            self.assertEqual(self.decode(response), data)
+
+            for _ in range(5):
+                self.assertEqual(self.get("/statistics", **{"Accept-Encoding": "gzip"}).data, response.data)
+                single = self.get("/statistics/miner7/?checkpoints=false")
+                self.assertEqual(single.status_code, 200)
+                self.assertEqual(self.decode(single), {"hotkey": "miner7", "score": 7})
+            self.assertEqual(self.get("/statistics/unknown/").status_code, 404)
+            stripped = self.decode(self.get("/statistics?checkpoints=false"))
+            self.assertTrue(all("checkpoints" not in element for element in stripped["data"]))
+            # Loaded once, and the cached data was not modified by the checkpoints=false requests
+            self.assertEqual(mock_open.call_count, 1)
+            self.assertIn("checkpoints", self.decode(self.get("/statistics/miner7/")))
+
+        # A new generation of the file is loaded on the next request
+        data = self.write_statistics(n_miners=50, generation=2)
+        self.assertEqual(self.decode(self.get("/statistics")), data)
+        self.assertEqual(self.decode(self.get("/statistics/miner7/"))["score"], 14)
+
+    def test_conditional_get_returns_not_modified(self):
+        self.write_statistics(n_miners=5, generation=1)
+        response = self.get("/statistics", **{"Accept-Encoding": "gzip"})
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.endswith(':gzip"'))
+
+        not_modified = self.get("/statistics", **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.data, b"")
+        self.assertEqual(not_modified.headers["ETag"], etag)
+        for r in (response, not_modified):
+            self.assertEqual(r.headers["Vary"], "Accept-Encoding")
+
+        # Other representations have their own ETags
+        identity = self.get("/statistics/miner1/", **{"Accept-Encoding": "identity", "If-None-Match": etag})
+        self.assertEqual(identity.status_code, 200)
+        self.assertNotIn("Content-Encoding", identity.headers)
+        self.assertEqual(identity.headers["Vary"], "Accept-Encoding")
+
+        self.write_statistics(n_miners=5, generation=2)
+        modified = self.get("/statistics", **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(modified.status_code, 200)
+        self.assertNotEqual(modified.headers["ETag"], etag)
+
+    def test_tiered_positions(self):
+        data = {"miner1": {"positions": [{"position_uuid": "a"}]}, "miner2": {"positions": []}}
+        content = gzip.compress(json.dumps(data).encode())
+        with open(self.positions_file, "wb") as f:
+            f.write(content)
+
+        # The file is served as is
+        response = self.get("/miner-positions?tier=30", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, content)
+        self.assertEqual(self.get("/miner-positions?tier=30", **{"If-None-Match": response.headers["ETag"]}).status_code,
+                         304)
+        self.assertEqual(self.decode(self.get("/miner-positions?tier=30", **{"Accept-Encoding": "identity"})), data)
+
+        # Single miner lookups with a lower tier key use the index of the tiered file
+        self.assertEqual(self.decode(self.get("/miner-positions/miner1", api_key="key30")), data["miner1"])
+        self.assertEqual(self.get("/miner-positions/miner3", api_key="key30").status_code, 404)
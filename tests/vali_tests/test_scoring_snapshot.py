@@ -0,0 +1,117 @@
+import copy
+from multiprocessing import Manager
+from unittest.mock import patch
+
+from tests.shared_objects.test_utilities import generate_ledger
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.enums.order_type_enum import OrderType
+from vali_objects.position import Position
+from vali_objects.scoring.scoring import Scoring
+from vali_objects.scoring.scoring_snapshot import ScoringSnapshot
+from vali_objects.utils.ledger_utils import LedgerUtils
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.perf_ledger import TP_ID_PORTFOLIO
+
+
+class TestScoringSnapshot(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.EVALUATION_TIME_MS = 2001
+        self.ledgers = {}
+        self.positions = {}
+        for i in range(6):
+            hotkey = f"miner{i}"
+            self.ledgers[hotkey] = generate_ledger(gain=0.05 + 0.01 * i, loss=-0.04 - 0.005 * i)[TP_ID_PORTFOLIO]
+            position = Position(
+                position_type=OrderType.LONG,
+                miner_hotkey=hotkey,
+                position_uuid=f"position{i}",
+                open_ms=1000,
+                trade_pair=TradePair.BTCUSD,
+            )
+            position.return_at_close = 1 + 0.01 * i
+            self.positions[hotkey] = [position]
+
+    def test_snapshot_matches_uncached_scoring(self):
+        snapshot = ScoringSnapshot()
+        for weighting in [False, True]:
+            expected = Scoring.compute_results_checkpoint(self.ledgers, self.positions,
+                                                          evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                                          weighting=weighting)
+            # The second round is served from the snapshot
+            for _ in range(2):
+                actual = Scoring.compute_results_checkpoint(self.ledgers, self.positions,
+                                                            evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                                            weighting=weighting, scoring_snapshot=snapshot)
+                self.assertEqual(actual, expected)
+
+        expected_scores = Scoring.score_miners(self.ledgers, self.positions, evaluation_time_ms=self.EVALUATION_TIME_MS)
+        actual_scores = Scoring.score_miners(self.ledgers, self.positions, evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                             scoring_snapshot=snapshot)
+        self.assertEqual(actual_scores, expected_scores)
+
+    def test_only_changed_ledgers_are_rescored(self):
+        snapshot = ScoringSnapshot()
+        with patch.object(LedgerUtils, 'daily_return_log', wraps=LedgerUtils.daily_return_log) as daily_return_log:
+            Scoring.score_miners(self.ledgers, self.positions, evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                 scoring_snapshot=snapshot)
+            calls_per_miner = daily_return_log.call_count // len(self.ledgers)
+            self.assertGreater(calls_per_miner, 0)
+
+            daily_return_log.reset_mock()
+            Scoring.score_miners(self.ledgers, self.positions, evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                 scoring_snapshot=snapshot)
+            self.assertEqual(daily_return_log.call_count, 0)
+
+            # A perf ledger update of one miner
+            changed_ledger = copy.deepcopy(self.ledgers["miner2"])
+            changed_ledger.cps[-1].gain += 0.01
+            self.ledgers["miner2"] = changed_ledger
+            daily_return_log.reset_mock()
+            actual = Scoring.score_miners(self.ledgers, self.positions, evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                          scoring_snapshot=snapshot)
+            self.assertEqual(daily_return_log.call_count, calls_per_miner)
+
+        expected = Scoring.score_miners(self.ledgers, self.positions, evaluation_time_ms=self.EVALUATION_TIME_MS)
+        self.assertEqual(actual, expected)
+
+    def test_penalties_follow_position_changes(self):
+        snapshot = ScoringSnapshot()
+        calls = []
+
+        def penalty_function(ledger, positions):
+            calls.append(len(positions))
+            return {"n_positions": len(positions)}
+
+        snapshot.penalty_values(self.ledgers, self.positions, penalty_function)
+        snapshot.penalty_values(self.ledgers, self.positions, penalty_function)
+        self.assertEqual(len(calls), len(self.ledgers))
+
+        new_position = copy.deepcopy(self.positions["miner0"][0])
+        new_position.position_uuid = "new_position"
+        self.positions["miner0"].append(new_position)
+        penalties = snapshot.penalty_values(self.ledgers, self.positions, penalty_function)
+        self.assertEqual(len(calls), len(self.ledgers) + 1)
+        self.assertEqual(penalties["miner0"], {"n_positions": 2})
+        self.assertEqual(penalties["miner1"], {"n_positions": 1})
+
+    def test_values_shared_through_ipc_manager(self):
+        manager = Manager()
+        try:
+            snapshot = ScoringSnapshot(ipc_manager=manager)
+            expected = Scoring.compute_results_checkpoint(self.ledgers, self.positions,
+                                                          evaluation_time_ms=self.EVALUATION_TIME_MS)
+            actual = Scoring.compute_results_checkpoint(self.ledgers, self.positions,
+                                                        evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                                        scoring_snapshot=snapshot)
+            self.assertEqual(actual, expected)
+            self.assertEqual(sorted(snapshot.miner_values.keys()), sorted(self.ledgers))
+
+            with patch.object(LedgerUtils, 'daily_return_log', wraps=LedgerUtils.daily_return_log) as daily_return_log:
+                Scoring.compute_results_checkpoint(self.ledgers, self.positions,
+                                                   evaluation_time_ms=self.EVALUATION_TIME_MS,
+                                                   scoring_snapshot=snapshot)
+            self.assertEqual(daily_return_log.call_count, 0)
+        finally:
+            manager.shutdown()
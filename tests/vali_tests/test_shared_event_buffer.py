@@ -0,0 +1,118 @@
+import multiprocessing
+import pickle
+from unittest.mock import patch
+
+import numpy as np
+
+from tests.vali_tests.base_objects.test_base import TestBase
+from time_util.time_util import TimeUtil
+from vali_objects.vali_dataclasses.price_source import PriceSource
+from vali_objects.vali_dataclasses.recent_event_tracker import RecentEventTracker
+from vali_objects.vali_dataclasses.shared_event_buffer import SharedEventBuffer
+
+
+def read_in_child(buffer, symbol, queue):
+    view = buffer[symbol]
+    queue.put((symbol in buffer, view.count_events(), view.get_closest_event(10_000_000 + 2500)))
+
+
+class TestSharedEventBuffer(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.buffer = SharedEventBuffer(['BTC/USD', 'EUR/USD'], sources=('Polygon_ws',))
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        self.buffer.close()
+        super().tearDown()
+
+    def event(self, start_ms, price, vwap=None):
+        return PriceSource(source='Polygon_ws', timespan_ms=0, open=price, close=price, high=price, low=price,
+                           vwap=vwap, start_ms=start_ms, websocket=True, lag_ms=5, bid=price - 0.01, ask=price + 0.01)
+
+    def assert_same_answers(self, tracker, view, times):
+        self.assertEqual(view.count_events(), tracker.count_events())
+        for t in times:
+            self.assertEqual(view.timestamp_exists(t), tracker.timestamp_exists(t))
+            self.assertEqual(view.get_closest_event(t), tracker.get_closest_event(t))
+            self.assertEqual(view.get_events_in_range(t - 30000, t), tracker.get_events_in_range(t - 30000, t))
+
+    @patch('time_util.time_util.TimeUtil.now_in_millis')
+    def test_matches_recent_event_tracker(self, mock_time):
+        tracker = RecentEventTracker()
+        writer = self.buffer.tracker('EUR/USD')
+        self.assertNotIn('EUR/USD', self.buffer)
+        self.assertIsNone(self.buffer['EUR/USD'].get_closest_event(0))
+
+        start_ms = 10_000_000
+        # Ten minutes of out of order and duplicate events, so the older ones get cleaned up
+        times = start_ms + 1000 * self.rng.integers(0, 600, size=500) + self.rng.choice([0, 999], size=500)
+        times.sort()
+        times[::7] -= 3000
+        mock_time.return_value = start_ms
+        for i, t in enumerate(times.tolist()):
+            mock_time.return_value = max(t, mock_time.return_value)
+            price = float(self.rng.normal(1.1, 0.01))
+            vwap = price if i % 2 else None
+            tracker.add_event(self.event(t, price, vwap), is_forex_quote=True)
+            writer.add_event(self.event(t, price, vwap), is_forex_quote=True)
+            if i % 5 == 0:
+                tracker.update_prices_for_median(t, price + 0.001, price + 0.002)
+                writer.update_prices_for_median(t, price + 0.001, price + 0.002)
+
+        self.assertIn('EUR/USD', self.buffer)
+        self.assertNotIn('BTC/USD', self.buffer)
+        self.assertGreater(tracker.count_events(), 100)
+        query_times = [start_ms - 1, start_ms + 600_000] + list(range(start_ms + 250_000, start_ms + 601_000, 777))
+        self.assert_same_answers(tracker, self.buffer['EUR/USD'], query_times + times.tolist()[-50:])
+
+    @patch('time_util.time_util.TimeUtil.now_in_millis')
+    def test_ring_keeps_latest_events(self, mock_time):
+        mock_time.return_value = 10_000_000
+        buffer = SharedEventBuffer(['BTC/USD'], sources=('Polygon_ws',), capacity=8)
+        try:
+            writer = buffer.tracker('BTC/USD')
+            for k in range(20):
+                writer.add_event(self.event(10_000_000 - 20_000 + 1000 * k, 100.0 + k))
+            view = buffer['BTC/USD']
+            self.assertEqual(view.count_events(), 8)
+            self.assertEqual([e.open for e in view.get_events_in_range(0, 10_000_000)],
+                             [100.0 + k for k in range(12, 20)])
+        finally:
+            buffer.close()
+
+    @patch('time_util.time_util.TimeUtil.now_in_millis')
+    def test_readable_from_other_processes(self, mock_time):
+        mock_time.return_value = 10_000_000
+        writer = self.buffer.tracker('BTC/USD')
+        for k in range(5):
+            writer.add_event(self.event(10_000_000 + 1000 * k, 100.0 + k))
+
+        # Attached by name, as when the buffer is sent to a spawned process
+        attached = pickle.loads(pickle.dumps(self.buffer))
+        self.assertEqual(attached['BTC/USD'].get_events_in_range(0, 20_000_000),
+                         self.buffer['BTC/USD'].get_events_in_range(0, 20_000_000))
+        attached.close()
+
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=read_in_child, args=(self.buffer, 'BTC/USD', queue))
+        process.start()
+        is_in, count, closest = queue.get(timeout=30)
+        process.join(timeout=30)
+        self.assertTrue(is_in)
+        self.assertEqual(count, 5)
+        self.assertEqual(closest, self.event(10_000_000 + 2000, 102.0))
+
+    def test_read_gives_up_on_interrupted_write(self):
+        self.buffer.tracker('BTC/USD').add_event(self.event(TimeUtil.now_in_millis(), 60000.0))
+        self.assertEqual(self.buffer['BTC/USD'].count_events(), 1)
+        reader = pickle.loads(pickle.dumps(self.buffer))
+        try:
+            # A writer that died mid write leaves the sequence odd
+            self.buffer.header[0, 0] += 1
+            self.assertEqual(self.buffer['BTC/USD'].count_events(), 1)
+            with self.assertRaises(TimeoutError):
+                reader['BTC/USD'].count_events()
+        finally:
+            reader.close()
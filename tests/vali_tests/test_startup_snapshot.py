@@ -0,0 +1,124 @@
+import time
+from multiprocessing import Manager
+from unittest.mock import patch
+
+from tests.shared_objects.mock_classes import MockMetagraph
+from tests.vali_tests.base_objects.test_base import TestBase
+from vali_objects.enums.order_type_enum import OrderType
+from vali_objects.position import Position
+from vali_objects.utils.position_manager import PositionManager
+from vali_objects.utils.startup_snapshot import StartupSnapshot
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.order import Order
+
+
+class TestStartupSnapshot(TestBase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ipc_manager = Manager()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ipc_manager.shutdown()
+
+    def setUp(self):
+        super().setUp()
+        self.hotkeys = ["test_miner_1", "test_miner_2", "test_miner_3"]
+        self.mock_metagraph = MockMetagraph(self.hotkeys)
+        StartupSnapshot(running_unit_tests=True).delete()
+        self.writer = self.make_position_manager(use_startup_snapshot=False)
+        self.writer.clear_all_miner_positions()
+        for i, hk in enumerate(self.hotkeys):
+            for j, tp in enumerate([TradePair.BTCUSD, TradePair.ETHUSD, TradePair.EURUSD]):
+                position = self.make_position(hk, f'{hk}_{j}', tp, open_ms=1000 + 10 * i + j)
+                if j != 1:
+                    self.close_position(position)
+                self.writer.save_miner_position(position)
+
+    def tearDown(self):
+        StartupSnapshot(running_unit_tests=True).delete()
+        super().tearDown()
+
+    def make_position_manager(self, use_startup_snapshot=True, ipc_manager=None):
+        pm = PositionManager(metagraph=self.mock_metagraph, running_unit_tests=True, ipc_manager=ipc_manager,
+                             use_startup_snapshot=use_startup_snapshot)
+        if pm.startup_snapshot:
+            pm.startup_snapshot.RECENT_MODIFICATION_MARGIN_NS = 0
+        return pm
+
+    @staticmethod
+    def make_position(hotkey, position_uuid, trade_pair, open_ms):
+        position = Position(miner_hotkey=hotkey, position_uuid=position_uuid, open_ms=open_ms, trade_pair=trade_pair)
+        position.add_order(Order(order_type=OrderType.LONG, leverage=0.5, price=1000, trade_pair=trade_pair,
+                                 processed_ms=open_ms, order_uuid=position_uuid + '_o1'))
+        return position
+
+    @staticmethod
+    def close_position(position):
+        position.add_order(Order(order_type=OrderType.FLAT, leverage=0.0, price=1100, trade_pair=position.trade_pair,
+                                 processed_ms=position.open_ms + 1000, order_uuid=position.position_uuid + '_o2'))
+
+    def assert_matches_disk(self, position_manager):
+        expected = self.writer.get_positions_for_all_miners(from_disk=True)
+        actual = position_manager.get_positions_for_all_miners()
+        self.assertEqual(sorted(actual), sorted(expected))
+        for hk, positions in expected.items():
+            actual_by_uuid = {p.position_uuid: p for p in actual[hk]}
+            self.assertEqual(sorted(actual_by_uuid), sorted(p.position_uuid for p in positions))
+            for p in positions:
+                is_same, diff = PositionManager.positions_are_the_same(actual_by_uuid[p.position_uuid], p)
+                self.assertTrue(is_same, diff)
+        position_manager.verify_open_position_index()
+
+    def test_loads_from_snapshot_without_reading_position_files(self):
+        for ipc_manager in (None, self.ipc_manager):
+            self.make_position_manager(ipc_manager=ipc_manager).write_startup_snapshot()
+            with patch.object(PositionManager, '_get_position_from_disk', side_effect=AssertionError):
+                restarted = self.make_position_manager(ipc_manager=ipc_manager)
+            self.assert_matches_disk(restarted)
+            self.assertEqual(restarted.get_open_position_for_a_miner_trade_pair(
+                'test_miner_2', TradePair.ETHUSD.trade_pair_id).position_uuid, 'test_miner_2_1')
+
+    def restart_recording_file_reads(self):
+        read_files = []
+        original = PositionManager._get_position_from_disk
+
+        def recording_get_position_from_disk(pm, file):
+            read_files.append(file)
+            return original(pm, file)
+
+        with patch.object(PositionManager, '_get_position_from_disk', recording_get_position_from_disk):
+            restarted = self.make_position_manager()
+        return restarted, read_files
+
+    def test_only_changed_hotkeys_are_rescanned(self):
+        self.make_position_manager().write_startup_snapshot()
+        time.sleep(0.05)  # Directory mtimes have coarse resolution
+        position = self.writer.get_open_position_for_a_miner_trade_pair('test_miner_3', TradePair.ETHUSD.trade_pair_id)
+        self.close_position(position)
+        self.writer.save_miner_position(position)
+        self.writer.save_miner_position(self.make_position('test_miner_4', 'new', TradePair.BTCUSD, 5000))
+        self.writer.delete_position(self.writer.get_miner_position_by_uuid('test_miner_1', 'test_miner_1_0'))
+
+        restarted, read_files = self.restart_recording_file_reads()
+        self.assert_matches_disk(restarted)
+        self.assertTrue(read_files)
+        self.assertFalse([f for f in read_files if '/test_miner_2/' in f])
+
+    def test_recent_modifications_are_rescanned(self):
+        pm = self.make_position_manager()
+        pm.startup_snapshot.RECENT_MODIFICATION_MARGIN_NS = 60 * 10**9
+        pm.write_startup_snapshot()
+        restarted, read_files = self.restart_recording_file_reads()
+        self.assertEqual(len(read_files), 9)
+        self.assert_matches_disk(restarted)
+
+    def test_corrupt_snapshot_falls_back_to_full_scan(self):
+        snapshot = StartupSnapshot(running_unit_tests=True)
+        self.make_position_manager().write_startup_snapshot()
+        with open(snapshot.path, 'r+b') as f:
+            f.seek(20)
+            f.write(b'garbage')
+        self.assertIsNone(snapshot.load())
+        self.assert_matches_disk(self.make_position_manager())
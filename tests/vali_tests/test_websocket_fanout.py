@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import time
+
+from ptn_api.client_send_queue import ClientSendQueue, OVERFLOW_COALESCE, OVERFLOW_DISCONNECT
+from ptn_api.websocket_server import WebSocketServer, SHARED_QUEUE_MAX_BATCH
+from tests.vali_tests.base_objects.test_base import TestBase
+
+
+class FakeWebSocket:
+    """In-process client connection recording the sequence numbers it receives."""
+
+    def __init__(self, send_delay_s: float = 0.0, stalled: bool = False):
+        self.send_delay_s = send_delay_s
+        self.stalled = stalled
+        self.received = []
+        self.closed = False
+
+    async def send(self, message):
+        if self.stalled:
+            await asyncio.Event().wait()
+        if self.send_delay_s:
+            await asyncio.sleep(self.send_delay_s)
+        self.received.append(json.loads(message)["sequence"])
+
+    async def close(self):
+        self.closed = True
+
+
+class TestWebSocketFanout(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.api_keys_file = os.path.join(self.tmp_dir.name, "api_keys.json")
+        with open(self.api_keys_file, "w") as f:
+            json.dump({"test_user": "test_key"}, f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def create_server(self, **kwargs) -> WebSocketServer:
+        server = WebSocketServer(api_keys_file=self.api_keys_file, **kwargs)
+        server.sequence_number = 0
+        return server
+
+    @staticmethod
+    def add_client(server: WebSocketServer, websocket: FakeWebSocket) -> str:
+        client_id = str(id(websocket))
+        server.connected_clients[client_id] = websocket
+        server.client_send_queues[client_id] = ClientSendQueue(client_id, websocket,
+                                                               max_size=server.client_queue_size,
+                                                               overflow_policy=server.overflow_policy,
+                                                               on_disconnect=server._remove_client)
+        server.subscribed_clients.add(client_id)
+        return client_id
+
+    @staticmethod
+    def position_message(position_uuid: str, sequence: int) -> dict:
+        return {"sequence": sequence, "data": {"position": {"position_uuid": position_uuid}}}
+
+    def test_slow_clients_do_not_delay_healthy_clients(self):
+        n_messages = 100
+
+        async def run():
+            server = self.create_server(client_queue_size=10)
+            healthy = [FakeWebSocket() for _ in range(300)]
+            slow = [FakeWebSocket(send_delay_s=0.05) for _ in range(20)]
+            stalled = [FakeWebSocket(stalled=True) for _ in range(20)]
+            for websocket in healthy + slow + stalled:
+                self.add_client(server, websocket)
+
+            start = time.time()
+            for i in range(n_messages):
+                await server.broadcast_message({"position": {"position_uuid": f"position{i}"}})
+            broadcast_s = time.time() - start
+
+            deadline = time.time() + 5
+            while time.time() < deadline and any(len(ws.received) < n_messages for ws in healthy):
+                await asyncio.sleep(0.01)
+            delivered_s = time.time() - start
+
+            stalled_queues = [(send_queue.n_dropped, [m["sequence"] for m, _ in send_queue.queue])
+                              for send_queue in (server.client_send_queues[str(id(ws))] for ws in stalled)]
+            for send_queue in list(server.client_send_queues.values()):
+                send_queue.stop()
+            return broadcast_s, delivered_s, healthy, slow, stalled_queues
+
+        broadcast_s, delivered_s, healthy, slow, stalled_queues = asyncio.run(run())
+
+        # Each slow client alone would take seconds to receive every message
+        self.assertLess(broadcast_s, 1)
+        self.assertLess(delivered_s, 1)
+        for websocket in healthy:
+            self.assertEqual(websocket.received, list(range(1, n_messages + 1)))
+        for websocket in slow:
+            self.assertLess(len(websocket.received), n_messages)
+        for n_dropped, queued_sequences in stalled_queues:
+            # The first message is stuck in the stalled send and the queue holds the latest ones
+            self.assertEqual(n_dropped, n_messages - 1 - 10)
+            self.assertEqual(queued_sequences, list(range(n_messages - 9, n_messages + 1)))
+
+    def test_coalesce_keeps_latest_message_of_each_position(self):
+        async def run():
+            send_queue = ClientSendQueue("client", FakeWebSocket(stalled=True), max_size=4,
+                                         overflow_policy=OVERFLOW_COALESCE)
+            # Let the writer take the first message
+            send_queue.put(self.position_message("a", 0), "")
+            await asyncio.sleep(0)
+            for sequence, position_uuid in enumerate(["a", "b", "a", "c", "b", "d"], start=1):
+                send_queue.put(self.position_message(position_uuid, sequence), "")
+            ans = [(m["data"]["position"]["position_uuid"], m["sequence"]) for m, _ in send_queue.queue]
+            send_queue.stop()
+            return ans, send_queue.n_dropped
+
+        queued, n_dropped = asyncio.run(run())
+        self.assertEqual(queued, [("a", 3), ("c", 4), ("b", 5), ("d", 6)])
+        self.assertEqual(n_dropped, 2)
+
+    def test_disconnect_policy_removes_client(self):
+        async def run():
+            server = self.create_server(client_queue_size=5, overflow_policy=OVERFLOW_DISCONNECT)
+            healthy = FakeWebSocket()
+            stalled = FakeWebSocket(stalled=True)
+            self.add_client(server, healthy)
+            stalled_id = self.add_client(server, stalled)
+            for i in range(10):
+                await server.broadcast_message({"position": {"position_uuid": f"position{i}"}})
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            for send_queue in list(server.client_send_queues.values()):
+                send_queue.stop()
+            return server, stalled_id, healthy, stalled
+
+        server, stalled_id, healthy, stalled = asyncio.run(run())
+        self.assertNotIn(stalled_id, server.connected_clients)
+        self.assertNotIn(stalled_id, server.subscribed_clients)
+        self.assertNotIn(stalled_id, server.client_send_queues)
+        self.assertTrue(stalled.closed)
+        self.assertEqual(healthy.received, list(range(1, 11)))
+
+    def test_shared_queue_drained_in_batches(self):
+        server = self.create_server(shared_queue=queue.Queue())
+        n_messages = 2 * SHARED_QUEUE_MAX_BATCH + 7
+        for i in range(n_messages):
+            server.shared_queue.put(i)
+
+        batches = [server._get_from_shared_queue() for _ in range(3)]
+        self.assertEqual([len(batch) for batch in batches], [SHARED_QUEUE_MAX_BATCH, SHARED_QUEUE_MAX_BATCH, 7])
+        self.assertEqual([m for batch in batches for m in batch], list(range(n_messages)))
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import tempfile
+
+import websockets
+
+from ptn_api.client_send_queue import ClientSendQueue
+from ptn_api.replay_log import ReplayLog
+from ptn_api.websocket_client import PTNWebSocketClient
+from ptn_api.websocket_server import WebSocketServer, REPLAY_BATCH_SIZE
+from tests.vali_tests.base_objects.test_base import TestBase
+from time_util.time_util import TimeUtil
+from vali_objects.enums.order_type_enum import OrderType
+from vali_objects.position import Position
+from vali_objects.utils.vali_bkp_utils import CustomEncoder
+from vali_objects.vali_config import TradePair
+from vali_objects.vali_dataclasses.order import Order
+
+
+class RecordingWebSocket:
+    """In-process connection recording what is sent to it and replaying queued messages to a client."""
+
+    def __init__(self, to_receive=None):
+        self.sent = []
+        self.to_receive = list(to_receive or [])
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+    async def recv(self):
+        if not self.to_receive:
+            raise websockets.exceptions.ConnectionClosed(None, None)
+        return self.to_receive.pop(0)
+
+    async def close(self):
+        pass
+
+
+class TestWebSocketReplay(TestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.api_keys_file = os.path.join(self.tmp_dir.name, "api_keys.json")
+        with open(self.api_keys_file, "w") as f:
+            json.dump({"test_user": "test_key"}, f)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    @staticmethod
+    def message(sequence: int) -> str:
+        return json.dumps({"sequence": sequence, "data": sequence})
+
+    def assert_sequences(self, serialized_messages, expected):
+        self.assertEqual([json.loads(m)["sequence"] for m in serialized_messages], list(expected))
+
+    def test_replay_log_in_memory(self):
+        replay_log = ReplayLog(max_messages=10)
+        self.assertEqual(replay_log.messages_after(0, 0), [])
+        self.assertIsNone(replay_log.messages_after(0, 5))
+        for sequence in range(1, 51):
+            replay_log.append(sequence, self.message(sequence))
+
+        self.assertEqual(replay_log.oldest_sequence, 41)
+        self.assert_sequences(replay_log.messages_after(45, 50), range(46, 51))
+        self.assert_sequences(replay_log.messages_after(40, 50), range(41, 51))
+        self.assertEqual(replay_log.messages_after(50, 50), [])
+        # Too far behind, or ahead of a server whose sequence went back
+        self.assertIsNone(replay_log.messages_after(39, 50))
+        self.assertIsNone(replay_log.messages_after(60, 50))
+
+        # A gap in the sequence numbers drops the older messages
+        replay_log.append(60, self.message(60))
+        self.assertEqual(replay_log.oldest_sequence, 60)
+        self.assertIsNone(replay_log.messages_after(50, 60))
+
+    def test_replay_log_spilled_to_disk(self):
+        spill_file = os.path.join(self.tmp_dir.name, "replay", "spill.txt")
+        replay_log = ReplayLog(max_messages=10, spill_file=spill_file, max_spilled_messages=40)
+        for sequence in range(1, 101):
+            replay_log.append(sequence, self.message(sequence))
+
+        # The spill file was compacted to its newest half before exceeding 40 messages
+        oldest_sequence = replay_log.oldest_sequence
+        self.assertLessEqual(90 - oldest_sequence + 1, 40)
+        self.assertGreaterEqual(90 - oldest_sequence + 1, 20)
+        self.assert_sequences(replay_log.messages_after(oldest_sequence - 1, 100), range(oldest_sequence, 101))
+        self.assert_sequences(replay_log.messages_after(85, 100), range(86, 101))
+        self.assertIsNone(replay_log.messages_after(oldest_sequence - 2, 100))
+        replay_log.close()
+
+        # Messages of a previous run are not replayed
+        replay_log = ReplayLog(max_messages=10, spill_file=spill_file)
+        self.assertIsNone(replay_log.oldest_sequence)
+        replay_log.close()
+
+    def resume_client(self, last_sequence: int, n_messages: int, replay_log_size: int = 10000):
+        async def run():
+            server = WebSocketServer(api_keys_file=self.api_keys_file, replay_log_size=replay_log_size)
+            server.sequence_number = 0
+            for i in range(n_messages):
+                await server.broadcast_message({"position": {"position_uuid": f"position{i}"}})
+
+            websocket = RecordingWebSocket()
+            client_id = str(id(websocket))
+            server.connected_clients[client_id] = websocket
+            server.client_send_queues[client_id] = ClientSendQueue(client_id, websocket)
+            server._resume_client(client_id, last_sequence)
+            server.subscribed_clients.add(client_id)
+            await server.broadcast_message({"position": {"position_uuid": "live"}})
+            await asyncio.sleep(0.01)
+            server.client_send_queues[client_id].stop()
+            return websocket.sent
+
+        return asyncio.run(run())
+
+    def test_resume_replays_missed_messages(self):
+        n_messages = 2 * REPLAY_BATCH_SIZE + 5
+        sent = self.resume_client(last_sequence=3, n_messages=n_messages)
+
+        # Missed messages in replay batches, then the live message
+        self.assertEqual([m.get("type") for m in sent], ["batch", "batch", "batch", None])
+        self.assertTrue(all(m["replay"] for m in sent[:3]))
+        replayed = [item["sequence"] for m in sent[:3] for item in m["messages"]]
+        self.assertEqual(replayed, list(range(4, n_messages + 1)))
+        self.assertEqual(sent[0]["messages"][0]["data"], {"position": {"position_uuid": "position3"}})
+        self.assertEqual(sent[-1]["sequence"], n_messages + 1)
+
+        # Nothing to replay for an up to date client or a new one
+        for last_sequence in [n_messages, -1]:
+            sent = self.resume_client(last_sequence=last_sequence, n_messages=n_messages)
+            self.assertEqual([m["sequence"] for m in sent], [n_messages + 1])
+
+    def test_resume_too_far_behind_sends_snapshot_marker(self):
+        sent = self.resume_client(last_sequence=3, n_messages=50, replay_log_size=20)
+        self.assertEqual(sent[0]["type"], "snapshot_required")
+        self.assertEqual(sent[0]["last_sequence"], 3)
+        self.assertEqual(sent[0]["current_sequence"], 50)
+        self.assertEqual(sent[0]["oldest_sequence"], 31)
+        self.assertEqual(sent[1]["sequence"], 51)
+
+    def test_client_skips_replayed_messages_it_already_has(self):
+        now_ms = TimeUtil.now_in_millis()
+        position = Position(miner_hotkey="test_miner", position_uuid="test_position", open_ms=now_ms,
+                            trade_pair=TradePair.BTCUSD)
+        position.add_order(Order(order_type=OrderType.LONG, leverage=0.1, price=100, trade_pair=TradePair.BTCUSD,
+                                 processed_ms=now_ms, order_uuid="test_order"))
+
+        def sequenced(sequence):
+            return {"sequence": sequence, "timestamp": now_ms, "data": position.to_websocket_dict()}
+
+        client = PTNWebSocketClient(api_key="test_key", on_snapshot_required=lambda marker: markers.append(marker))
+        client._sequence_file = os.path.join(self.tmp_dir.name, "client_sequence.txt")
+        client.last_sequence = 5
+        received = []
+        markers = []
+        client.message_handlers.append(lambda messages: received.extend(m.sequence for m in messages))
+        client.websocket = RecordingWebSocket([json.dumps(m, cls=CustomEncoder) for m in [
+            {"type": "batch", "replay": True, "count": 4, "messages": [sequenced(s) for s in range(4, 8)]},
+            sequenced(7),
+            sequenced(8),
+            {"type": "snapshot_required", "last_sequence": 8, "current_sequence": 20},
+            sequenced(20),
+            sequenced(21),
+        ]])
+
+        asyncio.run(client._process_messages())
+        self.assertEqual(received, [6, 7, 8, 21])
+        self.assertEqual(len(markers), 1)
+        self.assertEqual(client.last_sequence, 21)
@@ -2,12 +2,14 @@
 # Copyright © 2024 Taoshi Inc
 import functools
 import re
+import threading
 import time
 from datetime import datetime, timedelta, timezone
-from typing import List, Tuple
+from typing import List, Tuple, Callable
 from functools import lru_cache
 from zoneinfo import ZoneInfo  # Make sure to use Python 3.9 or later
 
+import numpy as np
 import pandas as pd
 
 from vali_objects.vali_config import TradePair
@@ -21,6 +23,101 @@ MS_IN_8_HOURS =  28800000
 MS_IN_24_HOURS = 86400000
 
 
+class MarketHoursTable:
+    """
+    Sorted open and close times in ms of a market's sessions, answered by binary search. A timestamp is open if
+    open <= timestamp < close for one of the sessions.
+
+    Sessions are built a calendar year at a time by build_sessions(first_year, last_year), starting with a few
+    years around the first query. The table is extended whenever a query falls outside the years built so far.
+    """
+    YEARS_BEHIND = 2
+    YEARS_AHEAD = 1
+
+    def __init__(self, build_sessions: Callable[[int, int], tuple[list[int], list[int]]]):
+        self.build_sessions = build_sessions
+        # (first_year, last_year, covered_min_ms, covered_max_ms, opens, closes), replaced as a whole by extend so
+        # queries from other threads never see a coverage that doesn't match the arrays. Sessions of local dates can
+        # start or end a day away from the UTC year boundaries, hence the covered range.
+        self.sessions = (None, None, 0, -1, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self.extend_lock = threading.Lock()
+
+    @staticmethod
+    def utc_year(timestamp_ms: int) -> int:
+        return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=int(timestamp_ms))).year
+
+    @staticmethod
+    def _covers(sessions: tuple, min_ms: int, max_ms: int) -> bool:
+        return sessions[2] <= min_ms and max_ms <= sessions[3]
+
+    def covers(self, min_ms: int, max_ms: int) -> bool:
+        return self._covers(self.sessions, min_ms, max_ms)
+
+    def _get_sessions(self, min_ms: int, max_ms: int) -> tuple:
+        sessions = self.sessions
+        if not self._covers(sessions, min_ms, max_ms):
+            self.extend(min_ms, max_ms)
+            sessions = self.sessions
+        return sessions
+
+    def extend(self, min_ms: int, max_ms: int):
+        with self.extend_lock:
+            # Another thread may have built these years while we waited
+            if self.covers(min_ms, max_ms):
+                return
+            first_year, last_year, _, _, opens, closes = self.sessions
+            query_first_year = self.utc_year(min_ms - MS_IN_24_HOURS)
+            query_last_year = self.utc_year(max_ms + MS_IN_24_HOURS)
+            year_ranges = []
+            if first_year is None:
+                year_ranges.append((min(query_first_year, self.utc_year(time.time() * 1000)) - self.YEARS_BEHIND,
+                                    max(query_last_year, self.utc_year(time.time() * 1000)) + self.YEARS_AHEAD))
+            else:
+                if query_first_year < first_year:
+                    year_ranges.append((query_first_year, first_year - 1))
+                if query_last_year > last_year:
+                    year_ranges.append((last_year + 1, query_last_year))
+
+            opens = [opens]
+            closes = [closes]
+            for start_year, end_year in year_ranges:
+                new_opens, new_closes = self.build_sessions(start_year, end_year)
+                opens.append(np.array(new_opens, dtype=np.int64))
+                closes.append(np.array(new_closes, dtype=np.int64))
+                first_year = start_year if first_year is None else min(first_year, start_year)
+                last_year = end_year if last_year is None else max(last_year, end_year)
+            covered_min_ms = TimeUtil.timestamp_to_millis(datetime(first_year, 1, 1, tzinfo=timezone.utc)) + MS_IN_24_HOURS
+            covered_max_ms = TimeUtil.timestamp_to_millis(datetime(last_year + 1, 1, 1, tzinfo=timezone.utc)) - MS_IN_24_HOURS - 1
+
+            opens = np.concatenate(opens)
+            closes = np.concatenate(closes)
+            order = np.argsort(opens, kind='stable')
+            opens = opens[order]
+            closes = closes[order]
+            # Merge sessions that continue where the previous one closed, such as consecutive forex days
+            starts_new = np.ones(len(opens), dtype=bool)
+            starts_new[1:] = opens[1:] > closes[:-1]
+            merged_closes = np.maximum.reduceat(closes, np.flatnonzero(starts_new)) if len(opens) else closes
+            self.sessions = (first_year, last_year, covered_min_ms, covered_max_ms, opens[starts_new], merged_closes)
+
+    def is_open(self, timestamp_ms: int) -> bool:
+        opens, closes = self._get_sessions(timestamp_ms, timestamp_ms)[4:]
+        i = int(np.searchsorted(opens, timestamp_ms, side='right')) - 1
+        return i >= 0 and timestamp_ms < closes[i]
+
+    def open_mask(self, timestamps_ms: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            bool array of whether the market is open at each of the timestamps
+        """
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        if len(timestamps_ms) == 0:
+            return np.zeros(0, dtype=bool)
+        opens, closes = self._get_sessions(int(timestamps_ms.min()), int(timestamps_ms.max()))[4:]
+        i = np.searchsorted(opens, timestamps_ms, side='right') - 1
+        return (i >= 0) & (timestamps_ms < closes[np.maximum(i, 0)])
+
+
 class ForexHolidayCalendar(USFederalHolidayCalendar):
     """
     Calendar for global Forex trading holidays.
@@ -102,8 +199,36 @@ class ForexHolidayCalendar(USFederalHolidayCalendar):
         self.cache_valid_ans = ans
         return ans
 
+    def sessions(self, first_year: int, last_year: int) -> tuple[list[int], list[int]]:
+        """
+        Open and close ms of each New York day the market is open, by the same rules as is_forex_market_open.
+        """
+        ny_timezone = ZoneInfo('America/New_York')
+        opens = []
+        closes = []
+        day = datetime(first_year, 1, 1, tzinfo=ny_timezone)
+        while day.year <= last_year:
+            next_day = datetime(day.year, day.month, day.day, tzinfo=ny_timezone) + timedelta(days=1)
+            weekday = day.weekday()
+            if weekday == 5 or day.strftime('%Y-%m-%d') in self.get_holidays(day):
+                pass
+            elif weekday < 4:
+                opens.append(TimeUtil.timestamp_to_millis(day))
+                closes.append(TimeUtil.timestamp_to_millis(next_day))
+            elif weekday == 4:  # Market closes at 5 PM Friday NY time
+                opens.append(TimeUtil.timestamp_to_millis(day))
+                closes.append(TimeUtil.timestamp_to_millis(day.replace(hour=17)))
+            else:  # Market opens at 5 PM Sunday NY time
+                opens.append(TimeUtil.timestamp_to_millis(day.replace(hour=17)))
+                closes.append(TimeUtil.timestamp_to_millis(next_day))
+            day = next_day
+        return opens, closes
+
 
 class IndicesMarketCalendar:
+    # Tickers treated as always closed
+    CLOSED_TICKERS = ['SPX', 'DJI', 'NDX', 'VIX', 'GDAXI', 'FTSE']
+
     def __init__(self):
         # Create market calendars for NYSE, NASDAQ, and CBOE
         self.nyse_calendar = mcal.get_calendar('NYSE')
@@ -132,6 +257,9 @@ class IndicesMarketCalendar:
     @lru_cache(maxsize=3000)
     def schedule_from_cache(self, tsn, market_name):
         # Normalize the timestamp to ensure cache consistency
+        return self.schedule_for_dates(tsn, tsn, market_name)
+
+    def schedule_for_dates(self, start_date, end_date, market_name):
         if market_name == 'CBOE_Index_Options':
             market_calendar = self.cboe_calendar
         elif market_name == 'NYSE':
@@ -142,9 +270,20 @@ class IndicesMarketCalendar:
             raise ValueError(f"Market calendar not supported {market_name}")
         #start_date = tsn - timedelta(days=5)
         #end_date = tsn + timedelta(days=5)
-        schedule = market_calendar.schedule(start_date=tsn, end_date=tsn)
+        schedule = market_calendar.schedule(start_date=start_date, end_date=end_date)
         return schedule
 
+    def sessions(self, market_name: str, first_year: int, last_year: int) -> tuple[list[int], list[int]]:
+        """
+        Open and close ms of each session in the schedule of the market calendar. Sessions are within a single UTC
+        day, which is the day is_market_open looks up the schedule for.
+        """
+        schedule = self.schedule_for_dates(pd.Timestamp(f"{first_year}-01-01"), pd.Timestamp(f"{last_year}-12-31"),
+                                           market_name)
+        opens = [TimeUtil.timestamp_to_millis(x) for x in schedule['market_open']]
+        closes = [TimeUtil.timestamp_to_millis(x) for x in schedule['market_close']]
+        return opens, closes
+
 
     def is_market_open(self, ticker, timestamp_ms):
         if self.cache_valid_min_ms <= timestamp_ms <= self.cache_valid_max_ms:
@@ -152,7 +291,7 @@ class IndicesMarketCalendar:
         # Convert millisecond timestamp to pandas Timestamp in UTC
         timestamp = pd.Timestamp(timestamp_ms, unit='ms', tz='UTC')
 
-        if ticker in ['SPX', 'DJI', 'NDX', 'VIX', 'GDAXI', 'FTSE']:
+        if ticker in self.CLOSED_TICKERS:
             return False
 
         # Get the market calendar for the given ticker
@@ -216,26 +355,52 @@ class UnifiedMarketCalendar:
         self.indices_calendar = IndicesMarketCalendar()
         self.forex_calendar = ForexHolidayCalendar()
 
+        # Market hours of the calendars, built on first use
+        self.forex_market_hours = MarketHoursTable(self.forex_calendar.sessions)
+        self.indices_market_hours = {}
+
+    def market_hours(self, trade_pair) -> MarketHoursTable | None:
+        """
+        The market hours table of a trade pair, None if its market is never open.
+        """
+        if trade_pair.is_forex:
+            return self.forex_market_hours
+        ticker = trade_pair.trade_pair_id  # Use the trade_pair_id as the ticker
+        if ticker in IndicesMarketCalendar.CLOSED_TICKERS:
+            return None
+        market_name = self.indices_calendar.get_market_calendar(ticker).name
+        if market_name not in self.indices_market_hours:
+            # setdefault so threads racing on the first query share one table
+            self.indices_market_hours.setdefault(market_name, MarketHoursTable(
+                lambda first_year, last_year: self.indices_calendar.sessions(market_name, first_year, last_year)))
+        return self.indices_market_hours[market_name]
+
     def is_market_open(self, trade_pair, timestamp_ms:int):
-        #t0 = time.time()
         if not trade_pair:
             raise ValueError("Trade pair is required")
         if trade_pair.is_crypto:
             # Crypto markets are assumed to be always open
             return True
-        elif trade_pair.is_forex:
-            ans = self.forex_calendar.is_forex_market_open(timestamp_ms)
-            #tf = time.time()
-            #print(f"found forex {trade_pair.trade_pair_id} in {tf - t0}")
-            # Check if the Forex market is open using the Forex calendar
-            return ans
-        elif trade_pair.is_indices or trade_pair.is_equities:
-            ticker = trade_pair.trade_pair_id  # Use the trade_pair_id as the ticker
-            ans = self.indices_calendar.is_market_open(ticker, timestamp_ms)
-            #tf = time.time()
-            #print(f"found index {ticker} in {tf - t0}")
-            # Check if the index market is open using the indices calendar
-            return ans
+        elif trade_pair.is_forex or trade_pair.is_indices or trade_pair.is_equities:
+            market_hours = self.market_hours(trade_pair)
+            return market_hours is not None and market_hours.is_open(timestamp_ms)
+        else:
+            raise ValueError("Unsupported trade pair category")
+
+    def market_open_mask(self, trade_pair, timestamps_ms: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            bool array of whether the market of the trade pair is open at each of the timestamps
+        """
+        if not trade_pair:
+            raise ValueError("Trade pair is required")
+        if trade_pair.is_crypto:
+            return np.ones(len(timestamps_ms), dtype=bool)
+        elif trade_pair.is_forex or trade_pair.is_indices or trade_pair.is_equities:
+            market_hours = self.market_hours(trade_pair)
+            if market_hours is None:
+                return np.zeros(len(timestamps_ms), dtype=bool)
+            return market_hours.open_mask(timestamps_ms)
         else:
             raise ValueError("Unsupported trade pair category")
 
@@ -2,6 +2,8 @@ import json
 import logging
 from copy import deepcopy
 from typing import Optional, List
+
+import numpy as np
 from pydantic import model_validator, BaseModel, Field
 
 from time_util.time_util import TimeUtil, MS_IN_8_HOURS, MS_IN_24_HOURS
@@ -399,6 +401,28 @@ class Position(BaseModel):
         net_return = 1 + gain
         return net_return
 
+    def calculate_pnl_batch(self, prices: np.ndarray, t_ms: np.ndarray) -> np.ndarray:
+        """
+        Vectorized counterpart of calculate_pnl (no order) for a fixed set of orders. Evaluates the return at every
+        (price, time) pair with the same floating point operation order as the scalar method.
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        if self.initial_entry_price == 0 or self.average_entry_price is None:
+            return np.ones(len(prices), dtype=np.float64)
+
+        initial_entry_price = self.initial_entry_price
+        if ALWAYS_USE_SLIPPAGE is None:
+            use_slippage = np.asarray(t_ms) >= SLIPPAGE_V1_TIME_MS
+        else:
+            use_slippage = np.full(len(prices), bool(ALWAYS_USE_SLIPPAGE))
+
+        unrealized_pnl = (prices - self.average_entry_price) * self.net_leverage
+        gain = np.where(use_slippage,
+                        (self.realized_pnl + unrealized_pnl) / initial_entry_price,
+                        unrealized_pnl / initial_entry_price)
+        # Check if liquidated
+        return np.where(gain <= -1.0, 0.0, 1 + gain)
+
     def _leverage_flipped(self, prev_leverage, cur_leverage):
         return prev_leverage * cur_leverage < 0 or prev_leverage != 0 and cur_leverage == 0
 
@@ -672,35 +696,42 @@ class Position(BaseModel):
         self.realized_pnl = 0.0
         bt.logging.trace(f"Updating position {self.trade_pair.trade_pair_id} with n orders: {len(self.orders)}")
         for order in self.orders:
-            if self.position_type is None:
-                self.initialize_position_from_first_order(order)
-
-            # Check if the new order flattens the position, explicitly or implicitly
-            if (
-                (
-                    self.position_type == OrderType.LONG
-                    and self.net_leverage + order.leverage <= 0
-                )
-                or (
-                    self.position_type == OrderType.SHORT
-                    and self.net_leverage + order.leverage >= 0
-                )
-                or order.order_type == OrderType.FLAT
-            ):
-                #self._position_log(
-                #    f"Flattening {self.position_type.value} position from order {order}"
-                #)
-                self.close_out_position(order.processed_ms)
-
-            # Reflect the current order in the current position's return.
-            adjusted_leverage = (
-                0.0 if self.position_type == OrderType.FLAT else order.leverage
-            )
-            #bt.logging.info(
-            #    f"Updating position state for new order {order} with adjusted leverage {adjusted_leverage}"
-            #)
-            self.update_position_state_for_new_order(order, adjusted_leverage)
+            self.apply_order_to_state(order)
 
             # If the position is already closed, we don't need to process any more orders. break in case there are more orders.
             if self.position_type == OrderType.FLAT:
                 break
+
+    def apply_order_to_state(self, order: Order):
+        """
+        Roll the position state forward by a single order that is already in self.orders. Applying orders one at a
+        time from a freshly rebuilt position gives the same state as _update_position.
+        """
+        if self.position_type is None:
+            self.initialize_position_from_first_order(order)
+
+        # Check if the new order flattens the position, explicitly or implicitly
+        if (
+            (
+                self.position_type == OrderType.LONG
+                and self.net_leverage + order.leverage <= 0
+            )
+            or (
+                self.position_type == OrderType.SHORT
+                and self.net_leverage + order.leverage >= 0
+            )
+            or order.order_type == OrderType.FLAT
+        ):
+            #self._position_log(
+            #    f"Flattening {self.position_type.value} position from order {order}"
+            #)
+            self.close_out_position(order.processed_ms)
+
+        # Reflect the current order in the current position's return.
+        adjusted_leverage = (
+            0.0 if self.position_type == OrderType.FLAT else order.leverage
+        )
+        #bt.logging.info(
+        #    f"Updating position state for new order {order} with adjusted leverage {adjusted_leverage}"
+        #)
+        self.update_position_state_for_new_order(order, adjusted_leverage)
@@ -16,6 +16,7 @@ from time_util.time_util import TimeUtil
 from vali_objects.utils.position_filtering import PositionFiltering
 from vali_objects.utils.ledger_utils import LedgerUtils
 from vali_objects.utils.metrics import Metrics
+from vali_objects.utils.batch_metrics import BatchMetrics
 from vali_objects.utils.position_penalties import PositionPenalties
 
 import bittensor as bt
@@ -75,7 +76,8 @@ class Scoring:
             full_positions: dict[str, list[Position]],
             evaluation_time_ms: int = None,
             verbose=True,
-            weighting=False
+            weighting=False,
+            scoring_snapshot=None
     ) -> List[Tuple[str, float]]:
         if len(ledger_dict) == 0:
             bt.logging.debug("No results to compute, returning empty list")
@@ -96,7 +98,7 @@ class Scoring:
         )
 
         # Compute miner penalties
-        miner_penalties = Scoring.miner_penalties(filtered_positions, ledger_dict)
+        miner_penalties = Scoring.miner_penalties(filtered_positions, ledger_dict, scoring_snapshot=scoring_snapshot)
 
         # Miners with full penalty
         full_penalty_miner_scores: list[tuple[str, float]] = [
@@ -107,7 +109,8 @@ class Scoring:
             ledger_dict=ledger_dict,
             positions=full_positions,
             evaluation_time_ms=evaluation_time_ms,
-            weighting=weighting
+            weighting=weighting,
+            scoring_snapshot=scoring_snapshot
         )
 
         # Combine and penalize scores
@@ -126,7 +129,8 @@ class Scoring:
             ledger_dict: dict[str, PerfLedger],
             positions: dict[str, list[Position]],
             evaluation_time_ms: int= None,
-            weighting: bool = False
+            weighting: bool = False,
+            scoring_snapshot=None
     ):
 
         if evaluation_time_ms is None:
@@ -139,7 +143,7 @@ class Scoring:
         # psuedo_positions = PositionUtils.build_pseudo_positions(filtered_positions)
 
         # Compute miner penalties
-        miner_penalties = Scoring.miner_penalties(filtered_positions, ledger_dict)
+        miner_penalties = Scoring.miner_penalties(filtered_positions, ledger_dict, scoring_snapshot=scoring_snapshot)
         # miner_psuedo_penalties = Scoring.miner_penalties(psuedo_positions, ledger_dict)
 
         # full_miner_penalties = {
@@ -153,28 +157,39 @@ class Scoring:
             miner for miner, penalty in full_miner_penalties.items() if penalty == 0
         ])
 
-        filtered_ledger_returns = LedgerUtils.ledger_returns_log(ledger_dict)
         scores_dict = {"metrics": {}}
-        for config_name, config in Scoring.scoring_config.items():
-            scores = []
-            for miner, returns in filtered_ledger_returns.items():
-                # Get the miner ledger
-                ledger = ledger_dict.get(miner, PerfLedger())
+        if scoring_snapshot is not None:
+            # Metrics of miners whose ledgers did not change since they were last scored are reused
+            scored_ledgers = {miner: ledger for miner, ledger in ledger_dict.items() if miner not in full_penalty_miners}
+            for config_name, config in Scoring.scoring_config.items():
+                metric_values = scoring_snapshot.metric_values(scored_ledgers, config['function'], weighting=weighting)
+                scores_dict["metrics"][config_name] = {
+                    "scores": [(miner, float(score)) for miner, score in metric_values.items()],
+                    "weight": config["weight"]
+                }
+            scores_dict["penalties"] = copy.deepcopy(full_miner_penalties)
+            return scores_dict
 
-                # Check if the miner has full penalty - if not include them in the scoring competition
-                if miner in full_penalty_miners:
-                    continue
+        filtered_ledger_returns = LedgerUtils.ledger_returns_log(ledger_dict)
 
-                score = config['function'](
-                    log_returns=returns,
-                    ledger=ledger,
-                    weighting=weighting
-                )
+        # Check if the miner has full penalty - if not include them in the scoring competition
+        scored_miners = [miner for miner in filtered_ledger_returns if miner not in full_penalty_miners]
+        scored_returns = [filtered_ledger_returns[miner] for miner in scored_miners]
+        scored_ledgers = [ledger_dict.get(miner, PerfLedger()) for miner in scored_miners]
 
-                scores.append((miner, float(score)))
+        # All miners are scored together on one padded matrix of their returns
+        returns_matrix = BatchMetrics.returns_matrix(scored_returns)
+        for config_name, config in Scoring.scoring_config.items():
+            scores = BatchMetrics.evaluate(
+                config['function'],
+                scored_returns,
+                scored_ledgers,
+                returns_matrix=returns_matrix,
+                weighting=weighting
+            )
 
             scores_dict["metrics"][config_name] = {
-                "scores": scores[:],
+                "scores": list(zip(scored_miners, scores)),
                 "weight": config["weight"]
             }
 
@@ -202,32 +217,52 @@ class Scoring:
 
         return combined_scores
 
+    @staticmethod
+    def miner_penalty_breakdown(ledger: PerfLedger, positions: list[Position]) -> dict[str, float]:
+        """
+        Returns:
+            dict[str, float] - the value of each configured penalty for a single miner
+        """
+        penalties = {}
+        for penalty_name, penalty_config in Scoring.penalties_config.items():
+            # Apply penalty based on its input type
+            penalty = 1
+            if penalty_config.input_type == PenaltyInputType.LEDGER:
+                penalty = penalty_config.function(ledger)
+            elif penalty_config.input_type == PenaltyInputType.POSITIONS:
+                penalty = penalty_config.function(positions)
+
+            penalties[penalty_name] = penalty
+
+        return penalties
+
     @staticmethod
     def miner_penalties(
             hotkey_positions: dict[str, list[Position]],
-            ledger_dict: dict[str, PerfLedger]
+            ledger_dict: dict[str, PerfLedger],
+            scoring_snapshot=None
     ) -> dict[str, float]:
         # Compute miner penalties
         miner_penalties = {}
 
         empty_ledger_miners = []
+        miner_ledgers = {}
         for miner, ledger in ledger_dict.items():
-            positions = hotkey_positions.get(miner, [])
-
             if not ledger:
-                empty_ledger_miners.append((miner, len(positions)))
+                empty_ledger_miners.append((miner, len(hotkey_positions.get(miner, []))))
 
-            ledger = ledger if ledger else PerfLedger()
+            miner_ledgers[miner] = ledger if ledger else PerfLedger()
 
-            cumulative_penalty = 1
-            for penalty_name, penalty_config in Scoring.penalties_config.items():
-                # Apply penalty based on its input type
-                penalty = 1
-                if penalty_config.input_type == PenaltyInputType.LEDGER:
-                    penalty = penalty_config.function(ledger)
-                elif penalty_config.input_type == PenaltyInputType.POSITIONS:
-                    penalty = penalty_config.function(positions)
+        if scoring_snapshot is not None:
+            breakdowns = scoring_snapshot.penalty_values(miner_ledgers, hotkey_positions,
+                                                         Scoring.miner_penalty_breakdown)
+        else:
+            breakdowns = {miner: Scoring.miner_penalty_breakdown(ledger, hotkey_positions.get(miner, []))
+                          for miner, ledger in miner_ledgers.items()}
 
+        for miner, penalties in breakdowns.items():
+            cumulative_penalty = 1
+            for penalty in penalties.values():
                 cumulative_penalty *= penalty
 
             miner_penalties[miner] = cumulative_penalty
@@ -0,0 +1,117 @@
+import hashlib
+from typing import Callable
+
+from vali_objects.position import Position
+from vali_objects.utils.batch_metrics import BatchMetrics
+from vali_objects.vali_dataclasses.perf_ledger import PerfLedger
+
+
+class ScoringSnapshot:
+    """
+    Per miner metric and penalty values shared by the weight setter, the challenge period and the miner statistics,
+    which score mostly the same miners from the same ledgers and positions.
+
+    Each miner's values are stored with a stamp of the ledger they were computed from, and penalties also with a stamp
+    of the positions. A value is only recomputed once the perf ledger update or a position change produces a different
+    stamp. Percentiles and combined scores depend on which miners are scored together, so they are still derived from
+    these values by each caller.
+
+    With an ipc manager the values are shared between processes. Each call reads and writes them in a single round trip.
+    """
+    # Penalties kept per miner for different positions with the same ledger
+    MAX_PENALTY_ENTRIES = 4
+
+    def __init__(self, ipc_manager=None):
+        self.miner_values = ipc_manager.dict() if ipc_manager else {}
+
+    @staticmethod
+    def ledger_stamp(ledger: PerfLedger | None) -> tuple | str:
+        # Updates change the latest checkpoints and rebuilds change the cumulative return in them
+        if not isinstance(ledger, PerfLedger):
+            return repr(ledger)
+        cps = ledger.cps
+        return (ledger.initialization_time_ms, ledger.max_return, len(cps),
+                *((cp.last_update_ms, cp.accum_ms, cp.open_ms, cp.n_updates, cp.prev_portfolio_ret, cp.mdd, cp.gain,
+                   cp.loss) for cp in cps[:1] + cps[-2:]))
+
+    @staticmethod
+    def positions_stamp(positions: list[Position]) -> str:
+        content = [(p.position_uuid, len(p.orders), p.orders[-1].order_uuid if p.orders else None,
+                    p.is_closed_position, p.return_at_close) for p in positions]
+        return hashlib.sha256(repr(content).encode()).hexdigest()
+
+    def _get_entries(self, hotkey_to_ledger: dict[str, PerfLedger | None]) -> dict[str, dict]:
+        """
+        Current values of each miner, reset for miners whose ledger changed.
+        """
+        cached = dict(self.miner_values)
+        entries = {}
+        for hotkey, ledger in hotkey_to_ledger.items():
+            stamp = self.ledger_stamp(ledger)
+            entry = cached.get(hotkey)
+            if entry is None or entry['ledger_stamp'] != stamp:
+                entry = {'ledger_stamp': stamp, 'metrics': {}, 'penalties': {}}
+            entries[hotkey] = entry
+        return entries
+
+    def metric_values(
+            self,
+            hotkey_to_ledger: dict[str, PerfLedger | None],
+            metric_function: Callable,
+            weighting: bool = False,
+            bypass_confidence: bool = False
+    ) -> dict[str, float]:
+        """
+        Args:
+            hotkey_to_ledger: ledger of each miner to score
+            metric_function: one of the Metrics functions taking log_returns and ledger
+
+        Returns:
+            dict[str, float] - the metric value of each miner
+        """
+        entries = self._get_entries(hotkey_to_ledger)
+        key = (metric_function.__qualname__, weighting, bypass_confidence)
+        missing = {hotkey: ledger for hotkey, ledger in hotkey_to_ledger.items()
+                   if key not in entries[hotkey]['metrics']}
+        if missing:
+            # Computed together for all the miners not in the snapshot yet
+            values = BatchMetrics.metric_values(missing, metric_function, weighting=weighting,
+                                                bypass_confidence=bypass_confidence)
+            for hotkey, value in values.items():
+                entries[hotkey]['metrics'][key] = value
+            self.miner_values.update({hotkey: entries[hotkey] for hotkey in missing})
+        return {hotkey: entries[hotkey]['metrics'][key] for hotkey in hotkey_to_ledger}
+
+    def penalty_values(
+            self,
+            hotkey_to_ledger: dict[str, PerfLedger | None],
+            hotkey_to_positions: dict[str, list[Position]],
+            penalty_function: Callable[[PerfLedger | None, list[Position]], dict[str, float]]
+    ) -> dict[str, dict[str, float]]:
+        """
+        Args:
+            penalty_function: returns each penalty of a miner by name from its ledger and positions
+
+        Returns:
+            dict[str, dict[str, float]] - the penalties of each miner in hotkey_to_ledger
+        """
+        entries = self._get_entries(hotkey_to_ledger)
+        updated = {}
+        ans = {}
+        for hotkey, ledger in hotkey_to_ledger.items():
+            entry = entries[hotkey]
+            positions = hotkey_to_positions.get(hotkey, [])
+            key = (penalty_function.__qualname__, self.positions_stamp(positions))
+            penalties = entry['penalties']
+            if key not in penalties:
+                penalties[key] = penalty_function(ledger, positions)
+                while len(penalties) > self.MAX_PENALTY_ENTRIES:
+                    del penalties[next(iter(penalties))]
+                updated[hotkey] = entry
+            ans[hotkey] = dict(penalties[key])
+        if updated:
+            self.miner_values.update(updated)
+        return ans
+
+    def clear(self):
+        self.miner_values.clear()
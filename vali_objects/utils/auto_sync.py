@@ -69,29 +69,34 @@ class PositionSyncer(ValidatorSyncBase):
             bt.logging.error(f"An unexpected error occurred: {e}")
         return None
 
-    def perform_sync(self):
-        with self.signal_sync_lock:
-            while self.n_orders_being_processed[0] > 0:
-                self.signal_sync_condition.wait()
-            # Ready to perform in-flight refueling
-            try:
-                candidate_data = self.read_validator_checkpoint_from_gcloud_zip()
-                if not candidate_data:
-                    bt.logging.error("Unable to read validator checkpoint file. Sync canceled")
-                else:
-                    self.sync_positions(False, candidate_data=candidate_data)
-            except Exception as e:
-                bt.logging.error(f"Error syncing positions: {e}")
-                bt.logging.error(traceback.format_exc())
+    def perform_sync(self, position_locks=None):
+        if position_locks is not None:
+            # Orders keep being processed. Only the miner trade pair being written to waits on its lock.
+            self.sync_from_checkpoint(position_locks)
+        else:
+            with self.orders_paused():
+                # Ready to perform in-flight refueling
+                self.sync_from_checkpoint()
 
         self.last_signal_sync_time_ms = TimeUtil.now_in_millis()
 
-    def sync_positions_with_cooldown(self, auto_sync_enabled:bool):
+    def sync_from_checkpoint(self, position_locks=None):
+        try:
+            candidate_data = self.read_validator_checkpoint_from_gcloud_zip()
+            if not candidate_data:
+                bt.logging.error("Unable to read validator checkpoint file. Sync canceled")
+            else:
+                self.sync_positions(False, candidate_data=candidate_data, position_locks=position_locks)
+        except Exception as e:
+            bt.logging.error(f"Error syncing positions: {e}")
+            bt.logging.error(traceback.format_exc())
+
+    def sync_positions_with_cooldown(self, auto_sync_enabled:bool, position_locks=None):
         if not auto_sync_enabled:
             return
 
         if self.force_ran_on_boot == False:  # noqa: E712
-            self.perform_sync()
+            self.perform_sync(position_locks)
             self.force_ran_on_boot = True
 
         # Check if the time is right to sync signals
@@ -104,7 +109,7 @@ class PositionSyncer(ValidatorSyncBase):
         if not (datetime_now.hour == 6 and (8 < datetime_now.minute < 20)):
             return
 
-        self.perform_sync()
+        self.perform_sync(position_locks)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+from typing import Callable
+
+import numpy as np
+
+from vali_objects.vali_config import ValiConfig
+from vali_objects.utils.ledger_utils import LedgerUtils
+from vali_objects.utils.metrics import Metrics
+from vali_objects.vali_dataclasses.perf_ledger import PerfLedger
+
+
+class BatchMetrics:
+    """
+    The Metrics scoring functions computed for all miners at once. Daily log returns are padded into a
+    (miners, days) matrix, with a mask of the days each miner actually has, and every function returns one value
+    per miner. The results match the Metrics functions up to floating point summation order.
+    """
+
+    @staticmethod
+    def returns_matrix(log_returns: list[list[float]]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Args:
+            log_returns: the daily log returns of each miner
+
+        Returns:
+            (miners, days) matrix of the returns padded with zeros at the end and the mask of the valid days
+        """
+        lengths = np.array([len(x) for x in log_returns], dtype=int)
+        n_days = int(lengths.max()) if len(lengths) else 0
+        mask = np.arange(n_days) < lengths[:, None]
+        returns = np.zeros(mask.shape)
+        if n_days:
+            returns[mask] = np.concatenate([np.asarray(x, dtype=float) for x in log_returns])
+        return returns, mask
+
+    @staticmethod
+    def weighting_distribution(mask: np.ndarray) -> np.ndarray:
+        """
+        Same decay as Metrics.weighting_distribution, the most recent valid day of each miner having the max weight.
+        Padded days have weight 0.
+        """
+        max_weight = ValiConfig.WEIGHTED_AVERAGE_DECAY_MAX
+        min_weight = ValiConfig.WEIGHTED_AVERAGE_DECAY_MIN
+        decay_rate = ValiConfig.WEIGHTED_AVERAGE_DECAY_RATE
+
+        # Number of valid days after each day
+        days_from_end = mask.sum(axis=1, keepdims=True) - np.cumsum(mask, axis=1)
+        decay_values = min_weight + ((max_weight - min_weight) * np.exp(-decay_rate * days_from_end))
+        return np.where(mask, decay_values, 0.0)
+
+    @staticmethod
+    def average(returns: np.ndarray, mask: np.ndarray, weighting=False, weights: np.ndarray = None) -> np.ndarray:
+        """
+        Mean of the returns over the mask of each miner, 0 for miners without any valid day.
+        """
+        if weighting:
+            weights = BatchMetrics.weighting_distribution(mask) if weights is None else weights
+            weights = np.where(mask, weights, 0.0)
+        else:
+            weights = mask.astype(float)
+        total_weights = weights.sum(axis=1)
+        return np.divide((returns * weights).sum(axis=1), total_weights, out=np.zeros(len(returns)),
+                         where=total_weights > 0)
+
+    @staticmethod
+    def ann_volatility(returns: np.ndarray, mask: np.ndarray, weighting=False, weights: np.ndarray = None) -> np.ndarray:
+        """
+        Annualized volatility over the mask of each miner, inf for miners with fewer than 2 valid days.
+        """
+        mean = BatchMetrics.average(returns, mask, weighting=weighting, weights=weights)
+        variance = BatchMetrics.average((returns - mean[:, None]) ** 2, mask, weighting=weighting, weights=weights)
+        volatility = np.sqrt(variance * ValiConfig.DAYS_IN_YEAR)
+        return np.where(mask.sum(axis=1) < 2, np.inf, volatility)
+
+    @staticmethod
+    def ann_excess_return(returns: np.ndarray, mask: np.ndarray, weighting=False, weights: np.ndarray = None) -> np.ndarray:
+        excess_return = (BatchMetrics.average(returns, mask, weighting=weighting, weights=weights) *
+                         ValiConfig.DAYS_IN_YEAR) - ValiConfig.ANNUAL_RISK_FREE_DECIMAL
+        return np.where(mask.any(axis=1), excess_return, 0.0)
+
+    @staticmethod
+    def no_confidence(mask: np.ndarray, bypass_confidence: bool) -> np.ndarray:
+        """
+        Miners scored with the no confidence value for not having enough trading days.
+        """
+        if bypass_confidence:
+            return np.zeros(len(mask), dtype=bool)
+        return mask.sum(axis=1) < ValiConfig.STATISTICAL_CONFIDENCE_MINIMUM_N
+
+    @staticmethod
+    def base_return_log_percentage(returns: np.ndarray, mask: np.ndarray, weighting=False, **kwargs) -> np.ndarray:
+        return BatchMetrics.average(returns, mask, weighting=weighting) * ValiConfig.DAYS_IN_YEAR * 100
+
+    @staticmethod
+    def calmar(
+            returns: np.ndarray,
+            mask: np.ndarray,
+            risk_normalization: np.ndarray,
+            bypass_confidence: bool = False,
+            weighting: bool = False,
+            **kwargs
+    ) -> np.ndarray:
+        """
+        Args:
+            risk_normalization: LedgerUtils.risk_normalization of each miner's ledger
+        """
+        base_return_percentage = BatchMetrics.base_return_log_percentage(returns, mask, weighting=weighting)
+        return np.where(BatchMetrics.no_confidence(mask, bypass_confidence), ValiConfig.CALMAR_NOCONFIDENCE_VALUE,
+                        base_return_percentage * risk_normalization)
+
+    @staticmethod
+    def sharpe(returns: np.ndarray, mask: np.ndarray, bypass_confidence: bool = False, weighting: bool = False,
+               **kwargs) -> np.ndarray:
+        weights = BatchMetrics.weighting_distribution(mask) if weighting else None
+        excess_return = BatchMetrics.ann_excess_return(returns, mask, weighting=weighting, weights=weights)
+        volatility = BatchMetrics.ann_volatility(returns, mask, weighting=weighting, weights=weights)
+        sharpe = excess_return / np.maximum(volatility, ValiConfig.SHARPE_STDDEV_MINIMUM)
+        return np.where(BatchMetrics.no_confidence(mask, bypass_confidence), ValiConfig.SHARPE_NOCONFIDENCE_VALUE, sharpe)
+
+    @staticmethod
+    def sortino(returns: np.ndarray, mask: np.ndarray, bypass_confidence: bool = False, weighting: bool = False,
+                **kwargs) -> np.ndarray:
+        # The downside days keep the weights they have among all the days of the miner
+        weights = BatchMetrics.weighting_distribution(mask) if weighting else None
+        excess_return = BatchMetrics.ann_excess_return(returns, mask, weighting=weighting, weights=weights)
+        downside_mask = mask & (returns < ValiConfig.DAILY_LOG_RISK_FREE_RATE)
+        downside_volatility = BatchMetrics.ann_volatility(returns, downside_mask, weighting=weighting, weights=weights)
+        sortino = excess_return / np.maximum(downside_volatility, ValiConfig.SORTINO_DOWNSIDE_MINIMUM)
+        return np.where(BatchMetrics.no_confidence(mask, bypass_confidence), ValiConfig.SORTINO_NOCONFIDENCE_VALUE,
+                        sortino)
+
+    @staticmethod
+    def omega(returns: np.ndarray, mask: np.ndarray, bypass_confidence: bool = False, weighting: bool = False,
+              **kwargs) -> np.ndarray:
+        positive = mask & (returns > 0)
+        negative = mask & (returns <= 0)
+        if weighting:
+            weights = BatchMetrics.weighting_distribution(mask)
+            sum_of_weights_positive = np.maximum((weights * positive).sum(axis=1), ValiConfig.OMEGA_LOSS_MINIMUM)
+            sum_of_weights_negative = np.maximum((weights * negative).sum(axis=1), ValiConfig.OMEGA_LOSS_MINIMUM)
+            positive_sum = (returns * weights * positive).sum(axis=1) * sum_of_weights_negative
+            negative_sum = (returns * weights * negative).sum(axis=1) * sum_of_weights_positive
+        else:
+            positive_sum = (returns * positive).sum(axis=1)
+            negative_sum = (returns * negative).sum(axis=1)
+
+        omega = positive_sum / np.maximum(np.abs(negative_sum), ValiConfig.OMEGA_LOSS_MINIMUM)
+        return np.where(BatchMetrics.no_confidence(mask, bypass_confidence), ValiConfig.OMEGA_NOCONFIDENCE_VALUE, omega)
+
+    @staticmethod
+    def statistical_confidence(returns: np.ndarray, mask: np.ndarray, bypass_confidence: bool = False,
+                               **kwargs) -> np.ndarray:
+        """
+        One sample t statistic of the returns against 0, as computed by ttest_1samp.
+        """
+        n = mask.sum(axis=1)
+        mean = BatchMetrics.average(returns, mask)
+        squared_deviations = np.where(mask, (returns - mean[:, None]) ** 2, 0.0).sum(axis=1)
+        variance = np.divide(squared_deviations, n, out=np.zeros(len(n)), where=n > 0)
+        sample_std = np.sqrt(np.divide(squared_deviations, n - 1, out=np.zeros(len(n)), where=n > 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            statistic = mean / (sample_std / np.sqrt(n))
+
+        no_confidence = BatchMetrics.no_confidence(mask, bypass_confidence) | (n < 2) | np.isclose(variance, 0)
+        return np.where(no_confidence, ValiConfig.STATISTICAL_CONFIDENCE_NOCONFIDENCE_VALUE, statistic)
+
+    @staticmethod
+    def time_weighting(mask: np.ndarray) -> np.ndarray:
+        """
+        Factor of Metrics.time_weighted_scores for each miner from its number of trading days.
+        """
+        return np.sqrt(mask.sum(axis=1) / ValiConfig.TARGET_LEDGER_WINDOW_DAYS)
+
+    @staticmethod
+    def kernel(metric_function: Callable) -> Callable | None:
+        """
+        The batch version of a Metrics function, None if there is none.
+        """
+        return {
+            Metrics.calmar: BatchMetrics.calmar,
+            Metrics.sharpe: BatchMetrics.sharpe,
+            Metrics.omega: BatchMetrics.omega,
+            Metrics.sortino: BatchMetrics.sortino,
+            Metrics.statistical_confidence: BatchMetrics.statistical_confidence,
+            Metrics.base_return_log_percentage: BatchMetrics.base_return_log_percentage
+        }.get(metric_function)
+
+    @staticmethod
+    def evaluate(
+            metric_function: Callable,
+            log_returns: list[list[float]],
+            ledgers: list[PerfLedger | None],
+            returns_matrix: tuple[np.ndarray, np.ndarray] = None,
+            weighting: bool = False,
+            bypass_confidence: bool = False
+    ) -> list[float]:
+        """
+        Args:
+            metric_function: one of the Metrics functions taking log_returns and ledger
+            log_returns: daily log returns of each miner
+            ledgers: ledger of each miner, in the same order
+            returns_matrix: BatchMetrics.returns_matrix(log_returns) if already built
+
+        Returns:
+            list[float] - the value of metric_function for each miner
+        """
+        kernel = BatchMetrics.kernel(metric_function)
+        if kernel is None:
+            return [float(metric_function(log_returns=r, ledger=ledger, weighting=weighting,
+                                          bypass_confidence=bypass_confidence))
+                    for r, ledger in zip(log_returns, ledgers)]
+
+        returns, mask = returns_matrix if returns_matrix is not None else BatchMetrics.returns_matrix(log_returns)
+        risk_normalization = None
+        if metric_function == Metrics.calmar:
+            # Ledgers are only looked at for the miners scored past the confidence check
+            scored = ~BatchMetrics.no_confidence(mask, bypass_confidence)
+            risk_normalization = np.array([LedgerUtils.risk_normalization(ledger) if is_scored else 0.0
+                                           for ledger, is_scored in zip(ledgers, scored)], dtype=float)
+
+        values = kernel(returns, mask, risk_normalization=risk_normalization, weighting=weighting,
+                        bypass_confidence=bypass_confidence)
+        return [float(x) for x in values]
+
+    @staticmethod
+    def metric_values(
+            hotkey_to_ledger: dict[str, PerfLedger | None],
+            metric_function: Callable,
+            weighting: bool = False,
+            bypass_confidence: bool = False
+    ) -> dict[str, float]:
+        """
+        Returns:
+            dict[str, float] - the value of metric_function for each miner from its ledger
+        """
+        hotkeys = list(hotkey_to_ledger.keys())
+        ledgers = list(hotkey_to_ledger.values())
+        log_returns = [LedgerUtils.daily_return_log(ledger) if ledger else [] for ledger in ledgers]
+        values = BatchMetrics.evaluate(metric_function, log_returns, ledgers, weighting=weighting,
+                                       bypass_confidence=bypass_confidence)
+        return dict(zip(hotkeys, values))
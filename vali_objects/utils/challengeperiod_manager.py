@@ -18,11 +18,13 @@ from vali_objects.utils.elimination_manager import EliminationReason
 
 class ChallengePeriodManager(CacheController):
     def __init__(self, metagraph, perf_ledger_manager : PerfLedgerManager =None, running_unit_tests=False,
-                 position_manager: PositionManager =None, ipc_manager=None, is_backtesting=False):
+                 position_manager: PositionManager =None, ipc_manager=None, is_backtesting=False,
+                 scoring_snapshot=None):
         super().__init__(metagraph, running_unit_tests=running_unit_tests, is_backtesting=is_backtesting)
         self.perf_ledger_manager = perf_ledger_manager if perf_ledger_manager else \
             PerfLedgerManager(metagraph, running_unit_tests=running_unit_tests)
         self.position_manager = position_manager
+        self.scoring_snapshot = scoring_snapshot
         self.elimination_manager = self.position_manager.elimination_manager
         self.eliminations_with_reasons: dict[str, tuple[str, float]] = {}
         if self.is_backtesting:
@@ -291,7 +293,8 @@ class ChallengePeriodManager(CacheController):
             success_scores_dict = Scoring.score_miners(ledger_dict=success_ledger,
                                                             positions=success_positions,
                                                             evaluation_time_ms=current_time,
-                                                            weighting=True)
+                                                            weighting=True,
+                                                            scoring_snapshot=self.scoring_snapshot)
         
         miners_not_enough_positions = []
         for hotkey, inspection_time in inspection_hotkeys.items():
@@ -342,7 +345,8 @@ class ChallengePeriodManager(CacheController):
                 inspection_hotkey=hotkey,
                 success_scores_dict=success_scores_dict,
                 current_time=current_time,
-                inspection_scores_dict=inspection_scores_dict
+                inspection_scores_dict=inspection_scores_dict,
+                scoring_snapshot=self.scoring_snapshot
             )
 
             # If they pass here, then they meet the criteria for passing within the challenge period
@@ -371,7 +375,8 @@ class ChallengePeriodManager(CacheController):
         success_scores_dict: dict[str, dict],
         inspection_hotkey: str,
         current_time: int,
-        inspection_scores_dict = None
+        inspection_scores_dict = None,
+        scoring_snapshot = None
     ) -> bool:
         """
         Runs a screening process to eliminate miners who didn't pass the challenge period.
@@ -393,7 +398,8 @@ class ChallengePeriodManager(CacheController):
                 ledger_dict=inspection_ledger,
                 positions=inspection_positions,
                 evaluation_time_ms=current_time,
-                weighting=True)
+                weighting=True,
+                scoring_snapshot=scoring_snapshot)
             
         trial_scores_dict = copy.deepcopy(success_scores_dict)
 
@@ -0,0 +1,96 @@
+import hashlib
+import json
+from typing import Callable, Dict, List, Set, Tuple
+
+from vali_objects.utils.vali_bkp_utils import CustomEncoder
+
+# Average number of positions of the requesting validator in each bucket of a miner's digest
+POSITIONS_PER_BUCKET = 16
+# Bytes of the digest of each bucket, sent as hex
+BUCKET_DIGEST_SIZE = 8
+# Most buckets accepted in a miner digest from another validator, enough for MAX_BUCKETS * POSITIONS_PER_BUCKET positions
+MAX_BUCKETS = 1024
+
+
+def position_digest(position: dict) -> bytes:
+    """
+    Digest of the checkpoint representation of a position, identical on validators holding the same position.
+    """
+    return hashlib.blake2b(json.dumps(position, sort_keys=True, cls=CustomEncoder).encode('utf-8'),
+                           digest_size=16).digest()
+
+
+def position_bucket(position_uuid: str, n_buckets: int) -> int:
+    return int.from_bytes(hashlib.blake2b(position_uuid.encode('utf-8'), digest_size=8).digest(), 'big') % n_buckets
+
+
+def n_buckets_for(n_positions: int) -> int:
+    """
+    Smallest power of two number of buckets holding POSITIONS_PER_BUCKET positions on average, up to MAX_BUCKETS.
+    """
+    n_buckets = 1
+    while n_buckets * POSITIONS_PER_BUCKET < n_positions and n_buckets < MAX_BUCKETS:
+        n_buckets *= 2
+    return n_buckets
+
+
+def miner_digest(position_digests: List[Tuple[str, bytes]], n_buckets: int) -> str:
+    """
+    Hex digests of the buckets of a miner's positions, given as (position_uuid, position digest), concatenated.
+    A bucket digest does not depend on the order of its positions.
+    """
+    buckets = [[] for _ in range(n_buckets)]
+    for position_uuid, digest in position_digests:
+        buckets[position_bucket(position_uuid, n_buckets)].append(digest)
+    return ''.join(hashlib.blake2b(b''.join(sorted(bucket)), digest_size=BUCKET_DIGEST_SIZE).hexdigest()
+                   for bucket in buckets)
+
+
+def parse_miner_digest(digest: str) -> List[str]:
+    """
+    Bucket digests of a miner digest received from another validator. The number of buckets must be a power of two
+    up to MAX_BUCKETS, as n_buckets_for gives.
+    """
+    size = 2 * BUCKET_DIGEST_SIZE
+    n_buckets = len(digest) // size
+    if not digest or len(digest) % size or n_buckets > MAX_BUCKETS or n_buckets & (n_buckets - 1):
+        raise ValueError(f'Invalid miner digest of length {len(digest)}')
+    bytes.fromhex(digest)
+    return [digest[i:i + size] for i in range(0, len(digest), size)]
+
+
+def delta_buckets(position_digests: List[Tuple[str, bytes]], digest: str) -> List[int]:
+    """
+    Buckets of a miner digest received from another validator which differ from the positions held here.
+    """
+    theirs = parse_miner_digest(digest)
+    ours = parse_miner_digest(miner_digest(position_digests, len(theirs)))
+    return [i for i, (a, b) in enumerate(zip(ours, theirs)) if a != b]
+
+
+def sort_by_close_ms(position: dict):
+    # Same order as PositionManager.sort_by_close_ms, in which checkpoints list the positions of each miner
+    return position['close_ms'] if position['is_closed_position'] else float('inf')
+
+
+def apply_miner_delta(miner_dict: dict, own_positions: List[dict], n_buckets: int) -> dict:
+    """
+    Completes the delta of a miner received from another validator with the positions held here in the buckets
+    that did not differ, into the miner's entry of the full checkpoint.
+    """
+    changed: Set[int] = set(miner_dict.pop('delta_buckets'))
+    kept = [p for p in own_positions if position_bucket(p['position_uuid'], n_buckets) not in changed]
+    miner_dict['positions'] = sorted(kept + miner_dict['positions'], key=sort_by_close_ms)
+    return miner_dict
+
+
+def apply_checkpoint_delta(checkpoint: dict, digest: Dict[str, str],
+                           get_own_positions: Callable[[str], List[dict]]) -> dict:
+    """
+    Turns a delta checkpoint, answering the digest of the positions returned by get_own_positions(hotkey), into the
+    full checkpoint of the validator that sent it.
+    """
+    for hotkey, miner_dict in checkpoint.get('positions', {}).items():
+        if 'delta_buckets' in miner_dict:
+            apply_miner_delta(miner_dict, get_own_positions(hotkey), len(parse_miner_digest(digest[hotkey])))
+    return checkpoint
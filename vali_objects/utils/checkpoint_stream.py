@@ -0,0 +1,212 @@
+import base64
+import codecs
+import json
+import tempfile
+import zlib
+from typing import Any, Iterator, Tuple
+
+from vali_objects.utils.vali_bkp_utils import CustomEncoder
+
+# Compressed bytes kept in memory before the writer spills them to a temporary file
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+# Multiple of 3 bytes so the base64 of consecutive chunks concatenates into the base64 of the whole
+ENCODE_CHUNK_SIZE = 3 * 64 * 1024
+# Multiple of 4 characters so each chunk of base64 decodes on its own
+DECODE_CHUNK_SIZE = 4 * 64 * 1024
+# Top level sections whose members are parsed one at a time
+STREAMED_SECTIONS = ('positions',)
+
+JSON_DECODER = json.JSONDecoder()
+WHITESPACE = ' \t\n\r'
+
+
+class CheckpointWriter:
+    """
+    Builds the checkpoint sent to other validators one section at a time, in the same format as the base64 encoding
+    of the gzip compressed json of the whole checkpoint dict.
+
+    Sections go through an incremental gzip compressor into a buffer spilling to a temporary file, so neither the
+    checkpoint dict nor its json string are ever held in memory at once.
+    """
+
+    def __init__(self, spool_max_size: int = SPOOL_MAX_SIZE, compression_level: int = zlib.Z_DEFAULT_COMPRESSION):
+        self.compressor = zlib.compressobj(compression_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+        # Number of members written in each open object, the checkpoint itself first
+        self.n_members = [0]
+        self._write(b'{')
+
+    def _write(self, data: bytes):
+        self.buffer.write(self.compressor.compress(data))
+
+    def _key(self, key: str) -> bytes:
+        separator = b', ' if self.n_members[-1] else b''
+        self.n_members[-1] += 1
+        return separator + json.dumps(key).encode('utf-8') + b': '
+
+    def write_section(self, key: str, value: Any):
+        """
+        Writes a member of the open object, the checkpoint itself if no section is open.
+        """
+        self._write(self._key(key) + json.dumps(value, cls=CustomEncoder).encode('utf-8'))
+
+    def write_serialized_member(self, member: bytes):
+        """
+        Writes an already serialized '"key": value' member of the open object.
+        """
+        separator = b', ' if self.n_members[-1] else b''
+        self.n_members[-1] += 1
+        self._write(separator + member)
+
+    def begin_section(self, key: str):
+        """
+        Opens an object section whose members are written one at a time.
+        """
+        self._write(self._key(key) + b'{')
+        self.n_members.append(0)
+
+    def end_section(self):
+        assert len(self.n_members) > 1, 'no section to end'
+        self.n_members.pop()
+        self._write(b'}')
+
+    def finish(self) -> str:
+        """
+        Returns the base64 encoded checkpoint.
+        """
+        assert len(self.n_members) == 1, 'a section was not ended'
+        self._write(b'}')
+        self.buffer.write(self.compressor.flush())
+        self.buffer.seek(0)
+        parts = []
+        while chunk := self.buffer.read(ENCODE_CHUNK_SIZE):
+            parts.append(base64.b64encode(chunk).decode('ascii'))
+        self.buffer.close()
+        return ''.join(parts)
+
+
+class CheckpointReader:
+    """
+    Parses a checkpoint received from another validator section by section.
+
+    The base64 string is decoded and decompressed in chunks, and the json is parsed as its members complete. Members
+    of the streamed sections, the positions of each miner, are parsed one at a time, so the decompressed text held
+    in memory is bounded by the largest member rather than the whole checkpoint.
+    """
+
+    def __init__(self, encoded_checkpoint: str, chunk_size: int = DECODE_CHUNK_SIZE):
+        self.encoded_checkpoint = encoded_checkpoint
+        self.chunk_size = chunk_size
+        self.chunks = self._decompressed_chunks()
+        self.exhausted = False
+        self.text = ''
+        self.pos = 0
+
+    def _decompressed_chunks(self) -> Iterator[str]:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        for i in range(0, len(self.encoded_checkpoint), self.chunk_size):
+            compressed = base64.b64decode(self.encoded_checkpoint[i:i + self.chunk_size])
+            yield text_decoder.decode(decompressor.decompress(compressed))
+        if not decompressor.eof:
+            raise ValueError('Checkpoint is truncated')
+        yield text_decoder.decode(decompressor.flush(), final=True)
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """
+        Appends decompressed text until at least min_size characters are unparsed. Returns False at the end of the
+        checkpoint.
+        """
+        if self.exhausted:
+            return False
+        # Drop the parsed text
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        parts = [self.text]
+        size = len(self.text)
+        grown = False
+        while not grown or size < min_size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.exhausted = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+            grown = grown or bool(chunk)
+        self.text = ''.join(parts)
+        return grown
+
+    def _next_char(self) -> str:
+        """
+        Next character after any whitespace, without consuming it.
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of checkpoint')
+
+    def _expect(self, chars: str) -> str:
+        c = self._next_char()
+        if c not in chars:
+            raise ValueError(f'Expected one of {chars!r} at {c!r} in checkpoint')
+        self.pos += 1
+        return c
+
+    def _value(self) -> Any:
+        self._next_char()
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self.text, self.pos)
+                # A number may go on in the text not decompressed yet
+                if end < len(self.text) or self.exhausted:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            # Doubling what is buffered keeps the retries of a large value linear in its size
+            self._fill(min_size=2 * (len(self.text) - self.pos))
+
+    def _members(self) -> Iterator[Tuple[str, bool]]:
+        """
+        Keys of the members of the object starting at the current position, leaving each value to the caller.
+        """
+        self._expect('{')
+        if self._next_char() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def sections(self) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        """
+        Yields (path, value) for each top level member of the checkpoint, and for each member of the streamed sections
+        with (section, key) as path.
+        """
+        for key in self._members():
+            if key in STREAMED_SECTIONS and self._next_char() == '{':
+                for member_key in self._members():
+                    yield (key, member_key), self._value()
+            else:
+                yield (key,), self._value()
+        if self._fill() or self.text[self.pos:].strip(WHITESPACE):
+            raise ValueError('Unexpected data after the checkpoint')
+
+    def read(self) -> dict:
+        """
+        Returns the checkpoint dict.
+        """
+        ans = {}
+        for path, value in self.sections():
+            if len(path) == 1:
+                ans[path[0]] = value
+            else:
+                ans.setdefault(path[0], {})[path[1]] = value
+        return ans
@@ -341,10 +341,9 @@ class EliminationManager(CacheController):
         if self.shutdown_dict or self.is_backtesting:
             return
 
-        all_miners_dir = ValiBkpUtils.get_miner_dir(running_unit_tests=self.running_unit_tests)
         all_hotkeys_set = set(self.metagraph.hotkeys)
 
-        for hotkey in CacheController.get_directory_names(all_miners_dir):
+        for hotkey in self.position_manager.get_miner_hotkeys_on_disk():
             corresponding_elimination = self.hotkey_in_eliminations(hotkey)
             elimination_reason = corresponding_elimination.get('reason') if corresponding_elimination else None
             if elimination_reason:
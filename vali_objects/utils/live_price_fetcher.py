@@ -143,6 +143,50 @@ class LivePriceFetcher:
 
         return results
 
+    @timeme
+    def get_tp_to_time_to_sorted_price_sources(
+            self,
+            trade_pair_to_times_ms: Dict[TradePair, List[int]]
+    ) -> Dict[TradePair, Dict[int, List[PriceSource] | None]]:
+        """
+        get_sorted_price_sources_for_trade_pair for many times of each trade pair. The websocket events of a trade pair
+        are read once for all of its times and a single dual_rest_get covers every trade pair with a time that needs
+        REST data, so the number of lookups scales with the trade pairs rather than the times.
+        """
+        tp_to_time_to_ws_polygon = {}
+        tp_to_time_to_ws_tiingo = {}
+        trade_pairs_needing_rest_data = []
+        results = {}
+        for trade_pair, times_ms in trade_pair_to_times_ms.items():
+            times_ms = sorted(set(times_ms))
+            tp_to_time_to_ws_polygon[trade_pair] = self.polygon_data_service.get_closes_websocket_at_times(trade_pair, times_ms)
+            tp_to_time_to_ws_tiingo[trade_pair] = self.tiingo_data_service.get_closes_websocket_at_times(trade_pair, times_ms)
+            results[trade_pair] = {}
+            for time_ms in times_ms:
+                events = [tp_to_time_to_ws_polygon[trade_pair].get(time_ms), tp_to_time_to_ws_tiingo[trade_pair].get(time_ms)]
+                results[trade_pair][time_ms] = self.sorted_valid_price_sources(events, time_ms, filter_recent_only=True)
+            if not all(results[trade_pair].values()):
+                trade_pairs_needing_rest_data.append(trade_pair)
+
+        if not trade_pairs_needing_rest_data:
+            return results
+
+        # REST closes are the latest ones, so one fetch per trade pair serves all of its times
+        rest_prices_polygon, rest_prices_tiingo_data = self.dual_rest_get(trade_pairs_needing_rest_data)
+
+        for trade_pair in trade_pairs_needing_rest_data:
+            for time_ms, sources in results[trade_pair].items():
+                if sources:
+                    continue
+                results[trade_pair][time_ms] = self.sorted_valid_price_sources([
+                    tp_to_time_to_ws_polygon[trade_pair].get(time_ms),
+                    tp_to_time_to_ws_tiingo[trade_pair].get(time_ms),
+                    rest_prices_polygon.get(trade_pair),
+                    rest_prices_tiingo_data.get(trade_pair)
+                ], time_ms, filter_recent_only=False)
+
+        return results
+
     def time_since_last_ws_ping_s(self, trade_pair: TradePair) -> float | None:
         if trade_pair in self.polygon_data_service.UNSUPPORTED_TRADE_PAIRS:
             return None
@@ -2,6 +2,7 @@
 # Copyright © 2024 Taoshi Inc
 import time
 import traceback
+from collections import defaultdict
 from typing import List, Dict
 
 from time_util.time_util import TimeUtil
@@ -75,6 +76,38 @@ class MDDChecker(CacheController):
             bt.logging.error(traceback.format_exc())
             return {}
 
+    def get_order_price_sources(self, hotkey_positions) -> Dict[TradePair, Dict[int, List[PriceSource] | None]]:
+        """
+        Price sources of every order that may get a price correction, looked up together for all miners. Orders are
+        grouped by trade pair so each trade pair needs one websocket lookup and at most one REST fetch.
+        """
+        if not self.price_correction_enabled:
+            return {}
+        try:
+            trade_pair_to_times_ms = defaultdict(set)
+            now_ms = TimeUtil.now_in_millis()
+            for sorted_positions in hotkey_positions.values():
+                for position in sorted_positions:
+                    if not self._position_is_candidate_for_price_correction(position, now_ms):
+                        continue
+                    for order in reversed(position.orders):
+                        if now_ms - order.processed_ms > RecentEventTracker.OLDEST_ALLOWED_RECORD_MS:
+                            break
+                        trade_pair_to_times_ms[position.trade_pair].add(order.processed_ms)
+
+            if not trade_pair_to_times_ms:
+                return {}
+            tp_to_time_to_price_sources = self.live_price_fetcher.get_tp_to_time_to_sorted_price_sources(
+                {tp: sorted(times_ms) for tp, times_ms in trade_pair_to_times_ms.items()})
+            for time_to_sources in tp_to_time_to_price_sources.values():
+                if any(sources and any(x and not x.websocket for x in sources) for sources in time_to_sources.values()):
+                    self.n_poly_api_requests += 1
+            return tp_to_time_to_price_sources
+        except Exception as e:
+            bt.logging.error(f"Error in get_order_price_sources: {e}")
+            bt.logging.error(traceback.format_exc())
+            return {}
+
     
     def mdd_check(self, position_locks):
         self.n_poly_api_requests = 0
@@ -93,10 +126,12 @@ class MDDChecker(CacheController):
             eliminations=self.elimination_manager.get_eliminations_from_memory(),
         )
         tp_to_price_sources = self.get_sorted_price_sources(hotkey_to_positions)
+        tp_to_order_price_sources = self.get_order_price_sources(hotkey_to_positions)
         for hotkey, sorted_positions in hotkey_to_positions.items():
             if self.shutdown_dict:
                 return
-            self.perform_price_corrections(hotkey, sorted_positions, tp_to_price_sources, position_locks)
+            self.perform_price_corrections(hotkey, sorted_positions, tp_to_price_sources, position_locks,
+                                           tp_to_order_price_sources=tp_to_order_price_sources)
 
         bt.logging.info(f"mdd checker completed."
                         f" n orders corrected: {self.n_orders_corrected}. n miners corrected: {len(self.miners_corrected)}."
@@ -162,7 +197,8 @@ class MDDChecker(CacheController):
         return False
 
 
-    def _update_position_returns_and_persist_to_disk(self, hotkey, position, tp_to_price_sources_for_realtime_price: Dict[TradePair, List[PriceSource]], position_locks):
+    def _update_position_returns_and_persist_to_disk(self, hotkey, position, tp_to_price_sources_for_realtime_price: Dict[TradePair, List[PriceSource]], position_locks,
+                                                     tp_to_order_price_sources: Dict[TradePair, Dict[int, List[PriceSource] | None]] = None):
         """
         Setting the latest returns and persisting to disk for accurate MDD calculation and logging in get_positions
 
@@ -171,6 +207,10 @@ class MDDChecker(CacheController):
         """
 
         def _get_sources_for_order(order, trade_pair: TradePair):
+            time_to_price_sources = (tp_to_order_price_sources or {}).get(trade_pair, {})
+            if order.processed_ms in time_to_price_sources:
+                return time_to_price_sources[order.processed_ms]
+            # Orders placed after the batched lookup in mdd_check
             # Only fall back to REST if the order is the latest. Don't want to get slowed down
             # By a flurry of recent orders.
             #ws_only = not is_last_order
@@ -236,7 +276,8 @@ class MDDChecker(CacheController):
                 self.miners_corrected.add(hotkey)
 
 
-    def perform_price_corrections(self, hotkey, sorted_positions, tp_to_price_sources: Dict[TradePair, List[PriceSource]], position_locks) -> bool:
+    def perform_price_corrections(self, hotkey, sorted_positions, tp_to_price_sources: Dict[TradePair, List[PriceSource]], position_locks,
+                                  tp_to_order_price_sources: Dict[TradePair, Dict[int, List[PriceSource] | None]] = None) -> bool:
         if len(sorted_positions) == 0:
             return False
 
@@ -246,7 +287,8 @@ class MDDChecker(CacheController):
                 return False
             # Perform needed updates
             if self._position_is_candidate_for_price_correction(position, now_ms):
-                self._update_position_returns_and_persist_to_disk(hotkey, position, tp_to_price_sources, position_locks)
+                self._update_position_returns_and_persist_to_disk(hotkey, position, tp_to_price_sources, position_locks,
+                                                                  tp_to_order_price_sources=tp_to_order_price_sources)
 
 
 
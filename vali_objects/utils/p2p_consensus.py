@@ -0,0 +1,214 @@
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+
+def intern(ids: Dict[str, int], key: str) -> int:
+    ans = ids.get(key)
+    if ans is None:
+        ans = ids[key] = len(ids)
+    return ans
+
+
+def group_boundaries(sorted_keys: np.ndarray, n_keys: int) -> np.ndarray:
+    """
+    start of the group of each key in sorted_keys, followed by the end of the last group
+    """
+    return np.searchsorted(sorted_keys, np.arange(n_keys + 1), side='left')
+
+
+class CheckpointTables:
+    """
+    flat tables of the positions and orders of the checkpoints received from the other validators, with uuids,
+    validators, miners and trade pairs interned to integer ids in order of first appearance.
+
+    rows are in the order P2PSyncer used to walk the checkpoints (validator, miner, position, order), and the
+    position and order dicts are referenced rather than copied, so the consensus counts and medians are computed
+    with grouped array operations and only the positions that make it into the golden are materialized.
+    """
+
+    def __init__(self, valid_checkpoints: dict):
+        self.validator_hotkeys = list(valid_checkpoints)
+        miner_ids: Dict[str, int] = {}
+        position_ids: Dict[str, int] = {}
+        order_ids: Dict[str, int] = {}
+        trade_pair_ids: Dict[str, int] = {}
+
+        miner_entries = []                  # miner id of each miner in each checkpoint
+        self.positions: List[dict] = []     # position dict of each position row
+        pos_validator, pos_miner, pos_uuid, pos_trade_pair = [], [], [], []
+        self.orders: List[dict] = []        # order dict of each order row
+        ord_pos_row, ord_uuid, ord_processed_ms, ord_price = [], [], [], []
+
+        for validator_id, checkpoint in enumerate(valid_checkpoints.values()):
+            for miner_hotkey, miner_positions in checkpoint.get("positions", {}).items():
+                miner_id = intern(miner_ids, miner_hotkey)
+                miner_entries.append(miner_id)
+                for position in miner_positions["positions"]:
+                    pos_row = len(self.positions)
+                    self.positions.append(position)
+                    pos_validator.append(validator_id)
+                    pos_miner.append(miner_id)
+                    pos_uuid.append(intern(position_ids, position["position_uuid"]))
+                    pos_trade_pair.append(intern(trade_pair_ids, position["trade_pair"][0]))
+                    for order in position["orders"]:
+                        self.orders.append(order)
+                        ord_pos_row.append(pos_row)
+                        ord_uuid.append(intern(order_ids, order["order_uuid"]))
+                        ord_processed_ms.append(order["processed_ms"])
+                        ord_price.append(order["price"])
+
+        self.miner_hotkeys = list(miner_ids)
+        self.position_uuids = list(position_ids)
+        self.order_uuids = list(order_ids)
+        self.trade_pair_ids = list(trade_pair_ids)
+        n_positions = len(self.position_uuids)
+        n_orders = len(self.order_uuids)
+
+        self.pos_validator = np.array(pos_validator, dtype=np.int64)
+        self.pos_miner = np.array(pos_miner, dtype=np.int64)
+        self.pos_uuid = np.array(pos_uuid, dtype=np.int64)
+        self.pos_trade_pair = np.array(pos_trade_pair, dtype=np.int64)
+        self.ord_pos_row = np.array(ord_pos_row, dtype=np.int64)
+        self.ord_uuid = np.array(ord_uuid, dtype=np.int64)
+        self.ord_processed_ms = np.array(ord_processed_ms, dtype=np.int64)
+        self.ord_price = np.array(ord_price, dtype=np.float64)
+        # position uuid and miner of each order row
+        self.ord_position = self.pos_uuid[self.ord_pos_row]
+        self.ord_miner = self.pos_miner[self.ord_pos_row]
+
+        # number of checkpoints each miner and position uuid appear in
+        self.miner_counts = np.bincount(np.array(miner_entries, dtype=np.int64), minlength=len(self.miner_hotkeys))
+        self.position_counts = np.bincount(self.pos_uuid, minlength=n_positions)
+
+        # order rows of each order uuid, first row and the row with the median price (ties in row order)
+        self.order_row_counts = np.bincount(self.ord_uuid, minlength=n_orders)
+        rows = np.arange(len(self.orders))
+        by_price = np.lexsort((rows, self.ord_price, self.ord_uuid))
+        starts = group_boundaries(self.ord_uuid[by_price], n_orders)[:-1]
+        self.order_median_row = by_price[starts + self.order_row_counts // 2]
+        self.order_first_row = np.full(n_orders, len(self.orders), dtype=np.int64)
+        np.minimum.at(self.order_first_row, self.ord_uuid, rows)
+
+        # position rows and order rows of each position uuid, in row order
+        self.pos_rows_by_position = np.argsort(self.pos_uuid, kind='stable')
+        self.pos_rows_by_position_bounds = group_boundaries(self.pos_uuid[self.pos_rows_by_position], n_positions)
+        self.rows_by_position = np.argsort(self.ord_position, kind='stable')
+        self.rows_by_position_bounds = group_boundaries(self.ord_position[self.rows_by_position], n_positions)
+
+        self._count_position_orders(n_positions, n_orders)
+
+    def _count_position_orders(self, n_positions: int, n_orders: int):
+        """
+        count each (position uuid, order uuid) pair across checkpoints. some validators may incorrectly combine
+        multiple positions into one, so an order uuid may appear under multiple position uuids. only the pair the
+        order appears the most in is kept, the first position uuid to appear on ties, and it gets one more count
+        for each pair removed.
+        """
+        pair_keys = self.ord_position * max(n_orders, 1) + self.ord_uuid
+        unique_keys, first_rows, counts = np.unique(pair_keys, return_index=True, return_counts=True)
+        # pairs in order of first appearance
+        by_appearance = np.argsort(first_rows, kind='stable')
+        pair_position = unique_keys[by_appearance] // max(n_orders, 1)
+        pair_order = unique_keys[by_appearance] % max(n_orders, 1)
+        pair_count = counts[by_appearance]
+
+        # position uuids rank in order of their first order
+        position_rank = np.full(n_positions, len(self.orders), dtype=np.int64)
+        np.minimum.at(position_rank, self.ord_position, np.arange(len(self.orders)))
+        best_first = np.lexsort((position_rank[pair_position], -pair_count, pair_order))
+        is_best = np.zeros(len(pair_order), dtype=bool)
+        if len(best_first):
+            is_group_start = np.r_[True, pair_order[best_first][1:] != pair_order[best_first][:-1]]
+            is_best[best_first[is_group_start]] = True
+        n_pairs_per_order = np.bincount(pair_order, minlength=n_orders)
+
+        # kept pairs grouped by position uuid, in order of first appearance
+        kept = np.flatnonzero(is_best)
+        kept = kept[np.argsort(pair_position[kept], kind='stable')]
+        self.pair_order = pair_order[kept]
+        self.pair_count = (pair_count + n_pairs_per_order[pair_order] - 1)[kept]
+        self.pair_bounds = group_boundaries(pair_position[kept], n_positions)
+
+    def position_orders(self, position_id: int) -> Iterator[Tuple[int, int]]:
+        """
+        (order id, count) of the orders kept under a position uuid, in order of first appearance
+        """
+        start, end = self.pair_bounds[position_id], self.pair_bounds[position_id + 1]
+        return zip(self.pair_order[start:end].tolist(), self.pair_count[start:end].tolist())
+
+    def orders_by_validator(self, position_id: int) -> Dict[str, List[dict]]:
+        """
+        {validator hotkey: [orders of the position uuid on the validator sorted by processed_ms]}
+        """
+        ans = {}
+        rows = self.rows_by_position[self.rows_by_position_bounds[position_id]:self.rows_by_position_bounds[position_id + 1]]
+        pos_rows = self.pos_rows_by_position[
+            self.pos_rows_by_position_bounds[position_id]:self.pos_rows_by_position_bounds[position_id + 1]]
+        for validator_id in dict.fromkeys(self.pos_validator[pos_rows].tolist()):
+            validator_rows = rows[self.pos_validator[self.ord_pos_row[rows]] == validator_id]
+            validator_rows = validator_rows[np.argsort(self.ord_processed_ms[validator_rows], kind='stable')]
+            ans[self.validator_hotkeys[validator_id]] = [self.orders[r] for r in validator_rows.tolist()]
+        return ans
+
+    def majority_position_rows(self, threshold: int) -> np.ndarray:
+        """
+        first row of each position uuid appearing in at least threshold checkpoints, under a miner appearing in at
+        least threshold checkpoints
+        """
+        eligible = np.flatnonzero((self.position_counts[self.pos_uuid] >= threshold) &
+                                  (self.miner_counts[self.pos_miner] >= threshold))
+        _, first = np.unique(self.pos_uuid[eligible], return_index=True)
+        return np.sort(eligible[first])
+
+    def positions_matrix(self, seen_positions: set) -> dict:
+        """
+        {miner hotkey: {trade pair: {validator hotkey: [all positions on validator]}}} of the miner trade pairs
+        with a position uuid not in seen_positions
+        """
+        unseen = np.ones(len(self.position_uuids), dtype=bool)
+        unseen[[i for i, position_uuid in enumerate(self.position_uuids) if position_uuid in seen_positions]] = False
+        group_keys = self.pos_miner * max(len(self.trade_pair_ids), 1) + self.pos_trade_pair
+        rows = np.flatnonzero(np.isin(group_keys, group_keys[unseen[self.pos_uuid]]))
+
+        ans = {}
+        for row in rows.tolist():
+            miner_hotkey = self.miner_hotkeys[self.pos_miner[row]]
+            trade_pair = self.trade_pair_ids[self.pos_trade_pair[row]]
+            validator_hotkey = self.validator_hotkeys[self.pos_validator[row]]
+            ans.setdefault(miner_hotkey, {}).setdefault(trade_pair, {}).setdefault(validator_hotkey, []).append(
+                self.positions[row])
+        return ans
+
+    def legacy_miner_stats(self) -> Iterator[tuple]:
+        """
+        (miner hotkey, # position uuids, # position uuids on multiple validators, # order uuids, # order uuids
+        on multiple validators, newest order timestamp, newest timestamp of an order on a single validator, uuid of
+        that order) of each miner with positions
+        """
+        n_miners = len(self.miner_hotkeys)
+        miner_positions = np.unique(self.pos_miner * len(self.position_uuids) + self.pos_uuid)
+        position_miner, position_id = np.divmod(miner_positions, max(len(self.position_uuids), 1))
+        n_positions = np.bincount(position_miner, minlength=n_miners)
+        n_repeated_pos = np.bincount(position_miner, weights=self.position_counts[position_id] > 1, minlength=n_miners)
+
+        miner_orders = np.unique(self.ord_miner * len(self.order_uuids) + self.ord_uuid)
+        order_miner, order_id = np.divmod(miner_orders, max(len(self.order_uuids), 1))
+        is_unique = self.order_row_counts[order_id] == 1
+        n_orders = np.bincount(order_miner, minlength=n_miners)
+        n_repeated_orders = np.bincount(order_miner, weights=~is_unique, minlength=n_miners)
+        # timestamps of the first appearance of the orders
+        timestamps = self.ord_processed_ms[self.order_first_row[order_id]]
+        newest = np.full(n_miners, -1, dtype=np.int64)
+        np.maximum.at(newest, order_miner, timestamps)
+        newest_unique = np.full(n_miners, -1, dtype=np.int64)
+        np.maximum.at(newest_unique, order_miner[is_unique], timestamps[is_unique])
+        newest_unique_uuid = {}
+        for miner_id, order in zip(order_miner[is_unique].tolist(), order_id[is_unique].tolist()):
+            if self.ord_processed_ms[self.order_first_row[order]] == newest_unique[miner_id]:
+                newest_unique_uuid.setdefault(miner_id, self.order_uuids[order])
+
+        for miner_id in np.flatnonzero(n_positions).tolist():
+            yield (self.miner_hotkeys[miner_id], int(n_positions[miner_id]), int(n_repeated_pos[miner_id]),
+                   int(n_orders[miner_id]), int(n_repeated_orders[miner_id]), int(newest[miner_id]),
+                   int(newest_unique[miner_id]), newest_unique_uuid.get(miner_id, ""))
@@ -1,13 +1,12 @@
-import base64
-import gzip
 import json
 import math
 import statistics
 import traceback
 from collections import defaultdict
-from typing import List, Set
+from typing import Iterable, List, Set
 
 import bittensor as bt
+import numpy as np
 from bittensor import AxonInfo, NeuronInfo
 
 import template
@@ -16,6 +15,8 @@ from vali_objects.vali_config import TradePair
 from vali_objects.vali_config import ValiConfig
 from vali_objects.position import Position
 from vali_objects.vali_dataclasses.order import Order
+from vali_objects.utils.checkpoint_stream import CheckpointReader
+from vali_objects.utils.p2p_consensus import CheckpointTables
 from vali_objects.utils.validator_sync_base import ValidatorSyncBase
 
 class P2PSyncer(ValidatorSyncBase):
@@ -35,6 +36,8 @@ class P2PSyncer(ValidatorSyncBase):
         self.created_golden = False
         self.last_signal_sync_time_ms = 0
         self.running_unit_tests = running_unit_tests
+        # Used to request delta checkpoints from the other validators. Set after the request core manager creation
+        self.request_core_manager = None
 
     def send_checkpoint_requests(self):
         """
@@ -51,8 +54,12 @@ class P2PSyncer(ValidatorSyncBase):
 
         try:
             bt.logging.info(f"Validator {self.wallet.hotkey.ss58_address} requesting checkpoints")
+            # send the digest of our positions so validators only respond with the positions that differ
+            digest, miner_outputs = {}, {}
+            if self.request_core_manager is not None:
+                digest, miner_outputs = self.request_core_manager.checkpoint_digest()
             # create dendrite and transmit synapse
-            checkpoint_synapse = template.protocol.ValidatorCheckpoint()
+            checkpoint_synapse = template.protocol.ValidatorCheckpoint(digest=digest)
             validator_responses = dendrite.query(axons=validator_axons,  synapse=checkpoint_synapse, timeout=60 * 5)
 
             n_failures = 0
@@ -66,10 +73,11 @@ class P2PSyncer(ValidatorSyncBase):
 
             for i, response in enumerate(validator_responses):
                 if response.successfully_processed:
-                    # Decode from base64 and decompress back into json
-                    decoded = base64.b64decode(response.checkpoint)
-                    decompressed = gzip.decompress(decoded).decode('utf-8')
-                    recv_checkpoint = json.loads(decompressed)
+                    # Decode from base64 and decompress back into json, one section at a time
+                    recv_checkpoint = CheckpointReader(response.checkpoint).read()
+                    if response.is_delta:
+                        # Fill in the positions that matched our digest
+                        self.request_core_manager.apply_checkpoint_delta(recv_checkpoint, digest, miner_outputs)
 
                     hotkey = response.validator_receive_hotkey
                     hotkey_to_received_checkpoint[hotkey] = [hotkey_to_v_trust[hotkey], recv_checkpoint]
@@ -188,44 +196,38 @@ class P2PSyncer(ValidatorSyncBase):
             If a position’s uuid exists on the majority of validators, that position is kept.
             If an order uuid exists in the majority of positions, that order is kept.
                 Choose the order with the median price.
+
+        the checkpoints are loaded into flat tables where the counts and medians are computed as array operations,
+        and only the positions kept in the golden are built.
         """
         golden_positions = defaultdict(lambda: defaultdict(list))
-
-        position_counts = defaultdict(int)                      # {position_uuid: count}
-        order_counts = defaultdict(lambda: defaultdict(int))    # {position_uuid: {order_uuid: count}}
-        order_data = defaultdict(list)                          # {order_uuid: [{order}]}
-        miner_to_uuids = defaultdict(lambda: defaultdict(set))  # {miner_hotkey: {positions:[position_uuid], orders:[order_uuid]}
-        miner_counts = defaultdict(int)                         # {miner_hotkey: count}
-
-        positions_matrix = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))  # {miner hotkey: {trade pair: {validator hotkey: [all positions on validator]}}}
-        orders_matrix = defaultdict(lambda: defaultdict(list))                          # {position_uuid: {validator hotkey: [all orders on validator]}}
-
-        # parse each checkpoint to count occurrences of each position and order
-        for hotkey, checkpoint in valid_checkpoints.items():
-            self.parse_checkpoint_positions(hotkey, checkpoint, position_counts, order_counts, order_data, miner_to_uuids, miner_counts, positions_matrix, orders_matrix)
-        self.prune_position_orders(order_counts, orders_matrix)
+        tables = CheckpointTables(valid_checkpoints)
 
         # miners who are still running legacy code. do not want to include them in checkpoint
-        self.find_legacy_miners(len(valid_checkpoints), order_counts, miner_to_uuids, position_counts, order_data)
+        self.find_legacy_miners_from_stats(len(valid_checkpoints), tables.legacy_miner_stats())
 
         # get the set of position_uuids that appear in the majority of checkpoints
         positions_threshold = self.consensus_threshold(len(valid_checkpoints))
-        majority_positions = {position_uuid for position_uuid, count in position_counts.items() if count >= positions_threshold}
         seen_positions = set()
         seen_orders = set()
 
-        for validator_hotkey, checkpoint in valid_checkpoints.items():
-            positions = checkpoint.get("positions", {})
-            for miner_hotkey, miner_positions in positions.items():
-                if miner_counts[miner_hotkey] < positions_threshold:
-                    continue
-
-                # combinations where the position_uuid appears in the majority
-                uuid_matched_positions = self.construct_positions_uuid_in_majority(miner_positions, majority_positions, seen_positions, seen_orders, position_counts, order_counts, order_data, orders_matrix, validator_hotkey)
-                golden_positions[miner_hotkey]["positions"].extend(uuid_matched_positions)
+        for miner_id in np.flatnonzero(tables.miner_counts >= positions_threshold).tolist():
+            golden_positions[tables.miner_hotkeys[miner_id]]["positions"] = []
+
+        # combinations where the position_uuid appears in the majority
+        miner_entry = None
+        for row in tables.majority_position_rows(positions_threshold).tolist():
+            # orders matched by the heuristic are resolved once per miner of each checkpoint
+            if (tables.pos_validator[row], tables.pos_miner[row]) != miner_entry:
+                miner_entry = (tables.pos_validator[row], tables.pos_miner[row])
+                resolved_orders = set()  # separate from seen_orders, because we want to be able to match with seen orders
+            seen_positions.add(tables.positions[row]["position_uuid"])
+            position_dict = self.construct_majority_position(tables, row, seen_orders, resolved_orders)
+            if position_dict is not None:
+                golden_positions[tables.miner_hotkeys[tables.pos_miner[row]]]["positions"].append(position_dict)
 
         # combinations where the position_uuid does not appear in the majority, instead we use a heuristic match to combine positions
-        for position in self.heuristic_resolve_positions(positions_matrix, len(valid_checkpoints), seen_positions):
+        for position in self.heuristic_resolve_positions(tables.positions_matrix(seen_positions), len(valid_checkpoints), seen_positions):
             bt.logging.info(f"Position {position['position_uuid']} on miner {position['miner_hotkey']} matched, adding back in")
             miner_hotkey = position["miner_hotkey"]
             golden_positions[miner_hotkey]["positions"].append(position)
@@ -233,66 +235,61 @@ class P2PSyncer(ValidatorSyncBase):
         # convert defaultdict to dict
         return {miner: dict(golden_positions[miner]) for miner in golden_positions}
 
+    def construct_majority_position(self, tables: CheckpointTables, row: int, seen_orders: Set[str],
+                                    resolved_orders: Set[str]) -> dict | None:
+        """
+        return the position at a row of the tables to add to golden, when its position_uuid appears in the majority
+        of checkpoints. construct the position from its orders. if the order appears in the majority then the one with
+        the median price is taken, otherwise the order is attempted to be matched to other orders using a heuristic.
+        """
+        position = tables.positions[row]
+        position_id = tables.pos_uuid[row]
+        position_uuid = position["position_uuid"]
+        position_count = int(tables.position_counts[position_id])
+        new_position = Position(**position)
+        new_position.orders = []
+        trade_pair = TradePair.from_trade_pair_id(position["trade_pair"][0])
+
+        # order_uuids that appear in the majority of positions for a position_uuid
+        orders_threshold = self.consensus_threshold(position_count)
+        orders_matrix = None
+        for order_id, count in tables.position_orders(position_id):
+            order_uuid = tables.order_uuids[order_id]
+            if order_uuid in seen_orders:
+                continue
+            # combinations where the order_uuid appears in the majority
+            if count >= orders_threshold:
+                median_order = dict(tables.orders[tables.order_median_row[order_id]])
+                median_order["trade_pair"] = trade_pair
+                new_position.orders.append(Order(**median_order))
+                seen_orders.add(order_uuid)
+                continue
 
-    def construct_positions_uuid_in_majority(self, miner_positions: dict, majority_positions: Set[str], seen_positions: Set[str], seen_orders: Set[str], position_counts: dict, order_counts: dict, order_data: dict, orders_matrix: dict, validator_hotkey: str) -> List[dict]:
-        """
-        return the positions to add to golden, when the position_uuid appears in the majority of checkpoints.
-        construct each position from its orders. if the order appears in the majority then it is taken, otherwise
-        the order is attempted to be matched to other orders using a heuristic.
-
-        position_counts = defaultdict(int)                      # {position_uuid: count}
-        order_counts = defaultdict(lambda: defaultdict(int))    # {position_uuid: {order_uuid: count}}
-        order_data = defaultdict(list)                          # {order_uuid: [{order}]}
-
-        orders_matrix = defaultdict(lambda: defaultdict(list))  # {position_uuid: {validator hotkey: [all orders on validator]}}
-        """
-        uuid_matched_positions = []
-        resolved_orders = set()  # separate from seen_orders, because we want to be able to match with seen orders
+            # combinations where the order_uuid does not appear in the majority, instead we use a heuristic to combine orders
+            if orders_matrix is None:
+                orders_matrix = tables.orders_by_validator(position_id)
+            orders = self.find_matching_orders(tables.orders[tables.order_first_row[order_id]], orders_matrix, resolved_orders)
+            # order has matched with another order that has already been inserted
+            if not set([o["order_uuid"] for o in orders]).isdisjoint(seen_orders):
+                seen_orders.update([o["order_uuid"] for o in orders])
+                continue
 
-        for position in miner_positions["positions"]:
-            position_uuid = position["position_uuid"]
-            # position exists on majority of validators
-            if position_uuid in majority_positions and position_uuid not in seen_positions:
-                seen_positions.add(position_uuid)
-                new_position = Position(**position)
-                new_position.orders = []
+            if len(orders) > self.consensus_threshold(position_count, heuristic_match=True):
+                bt.logging.info(f"Order {order_uuid} with Position {position_uuid} on miner {position['miner_hotkey']} matched with {[o['order_uuid'] for o in orders]}, adding back in")
+            else:
+                bt.logging.info(f"Order {order_uuid} with Position {position_uuid} only matched [{len(orders)}/{position_count}] times on miner {position['miner_hotkey']} with with {[o['order_uuid'] for o in orders]}. Skipping")
+                continue
 
-                # get the set of order_uuids that appear in the majority of positions for a position_uuid
-                orders_threshold = self.consensus_threshold(position_counts[position_uuid])
-                majority_orders = {order_uuid for order_uuid, count in order_counts[position_uuid].items() if count >= orders_threshold}
+            new_position.orders.append(self.get_median_order(orders, trade_pair))
+            seen_orders.update([o["order_uuid"] for o in orders])
 
-                for order_uuid in order_counts[position_uuid].keys():
-                    if order_uuid not in seen_orders:
-                        # combinations where the order_uuid appears in the majority
-                        if order_uuid in majority_orders:
-                            orders = order_data[order_uuid]
-                        # combinations where the order_uuid does not appear in the majority, instead we use a heuristic to combine orders
-                        else:
-                            orders = self.find_matching_orders(order_data[order_uuid][0], orders_matrix[position_uuid], resolved_orders)
-                            # order has matched with another order that has already been inserted
-                            if not set([o["order_uuid"] for o in orders]).isdisjoint(seen_orders):
-                                seen_orders.update([o["order_uuid"] for o in orders])
-                                continue
-
-                            if len(orders) > self.consensus_threshold(position_counts[position_uuid], heuristic_match=True):
-                                bt.logging.info(f"Order {order_uuid} with Position {position_uuid} on miner {position['miner_hotkey']} matched with {[o['order_uuid'] for o in orders]}, adding back in")
-                            else:
-                                bt.logging.info(f"Order {order_uuid} with Position {position_uuid} only matched [{len(orders)}/{position_counts[position_uuid]}] times on miner {position['miner_hotkey']} with with {[o['order_uuid'] for o in orders]}. Skipping")
-                                continue
-
-                        trade_pair = TradePair.from_trade_pair_id(position["trade_pair"][0])
-                        median_order = self.get_median_order(orders, trade_pair)
-                        new_position.orders.append(median_order)
-                        seen_orders.update([o["order_uuid"] for o in orders])
-
-                new_position.orders.sort(key=lambda o: o.processed_ms)
-                try:
-                    new_position.rebuild_position_with_updated_orders()
-                    position_dict = json.loads(new_position.to_json_string())
-                    uuid_matched_positions.append(position_dict)
-                except ValueError as v:
-                    bt.logging.info(f"Miner [{new_position.miner_hotkey}] Position [{new_position.position_uuid}] Orders {[o.order_uuid for o in new_position.orders]} ValueError {v}")
-        return uuid_matched_positions
+        new_position.orders.sort(key=lambda o: o.processed_ms)
+        try:
+            new_position.rebuild_position_with_updated_orders()
+            return json.loads(new_position.to_json_string())
+        except ValueError as v:
+            bt.logging.info(f"Miner [{new_position.miner_hotkey}] Position [{new_position.position_uuid}] Orders {[o.order_uuid for o in new_position.orders]} ValueError {v}")
+            return None
 
     def find_matching_orders(self, order: dict, validator_to_orders: dict, resolved_orders: Set[str]) -> List[dict] | None:
         """
@@ -349,68 +346,6 @@ class P2PSyncer(ValidatorSyncBase):
                     latest_order_ms = max(latest_order_ms, order["processed_ms"])
         return latest_order_ms
 
-    def parse_checkpoint_positions(self, validator_hotkey: str, checkpoint: dict, position_counts: dict, order_counts: dict, order_data: dict, miner_to_uuids: dict, miner_counts: dict, positions_matrix: dict, orders_matrix: dict):
-        """
-        parse checkpoint data
-
-        position_counts = defaultdict(int)                      # {position_uuid: count}
-        order_counts = defaultdict(lambda: defaultdict(int))    # {position_uuid: {order_uuid: count}}
-        order_data = defaultdict(list)                          # {order_uuid: [{order}]}
-        miner_to_uuids = defaultdict(lambda: defaultdict(set))  # {miner_hotkey: {positions:[position_uuid], orders:[order_uuid]}
-        miner_counts = defaultdict(int)                         # {miner_hotkey: count}
-
-        positions_matrix = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))  # {miner hotkey: {trade pair: {validator hotkey: [all positions on validator]}}}
-        orders_matrix = defaultdict(lambda: defaultdict(list))                          # {position_uuid: {validator_hotkey: [all orders]}}
-        """
-        # get positions for each miner
-        positions = checkpoint.get("positions", {})
-        for miner_hotkey, miner_positions in positions.items():
-            miner_counts[miner_hotkey] += 1
-            for position in miner_positions["positions"]:
-                position_uuid = position["position_uuid"]
-                position_counts[position_uuid] += 1
-                miner_to_uuids[miner_hotkey]["positions"].add(position_uuid)
-
-                # count and save orders
-                for order in position["orders"]:
-                    order_uuid = order["order_uuid"]
-                    order_counts[position_uuid][order_uuid] += 1
-                    order_data[order_uuid].append(dict(order))
-                    miner_to_uuids[miner_hotkey]["orders"].add(order_uuid)
-                    orders_matrix[position_uuid][validator_hotkey].append(order)
-
-                orders_matrix[position_uuid][validator_hotkey].sort(key=lambda o: o["processed_ms"])
-                positions_matrix[miner_hotkey][position["trade_pair"][0]][validator_hotkey].append(position)
-
-    def prune_position_orders(self, order_counts: dict, orders_matrix: dict):
-        """
-        some validators may incorrectly combine multiple positions into one, so an order_uuid may appear under
-        multiple positions. We will only keep the order_uuid in the position that it appears the most in.
-
-        order_counts = defaultdict(lambda: defaultdict(int))    # {position_uuid: {order_uuid: count}}
-        orders_matrix = defaultdict(lambda: defaultdict(list))  # {position_uuid: {validator hotkey: [all orders on validator]}}
-        """
-        order_max_count_appears_in_position = defaultdict(tuple)       # {order_uuid: (position_uuid, count)}
-        # find the position_uuid with the max count for each order_uuid
-        for position, orders in order_counts.items():
-            for order, count in orders.items():
-                if order not in order_max_count_appears_in_position:
-                    order_max_count_appears_in_position[order] = (position, count)
-                else:
-                    if count > order_max_count_appears_in_position[order][1]:
-                        order_max_count_appears_in_position[order] = (position, count)
-
-        # remove order_uuid from all other position_uuids
-        for position, orders in order_counts.items():
-            for order in list(orders.keys()):
-                max_position = order_max_count_appears_in_position[order][0]
-                if position != max_position:
-                    del orders[order]
-                    order_counts[max_position][order] += 1
-
-                    for vali_orders in orders_matrix[position].values():
-                        vali_orders.remove(order) if order in vali_orders else None
-
     def find_legacy_miners(self, num_checkpoints: int, order_counts: dict, miner_to_uuids: dict, position_counts: dict, order_data: dict) -> Set[str]:
         """
         detect miners running legacy code. miner with legacy code will have all unique uuid's across validators
@@ -424,10 +359,7 @@ class P2PSyncer(ValidatorSyncBase):
             for order_uuid, count in order_count_dict.items():
                 all_order_counts[order_uuid] += count
 
-        legacy_miners = set()            # position/order uuids are all unique across validators
-        legacy_miner_candidates = set()  # at least one position/order uuid is unique across validators
-
-        if num_checkpoints > 1:
+        def miner_stats():
             for miner_hotkey, uuids in miner_to_uuids.items():
                 # number of repeated position_uuids and order_uuids
                 num_repeated_pos = sum(1 for pos_uuid in uuids["positions"] if position_counts[pos_uuid] > 1)
@@ -436,15 +368,30 @@ class P2PSyncer(ValidatorSyncBase):
                 newest_unique_order_timestamp = max([order_data[order_uuid][0]["processed_ms"] for order_uuid in uuids["orders"] if all_order_counts[order_uuid] == 1], default=-1)
                 newest_unique_order_uuid = next((order_uuid for order_uuid in uuids["orders"]
                                                 if all_order_counts[order_uuid] == 1 and order_data[order_uuid][0]["processed_ms"] == newest_unique_order_timestamp), "")
+                yield (miner_hotkey, len(uuids["positions"]), num_repeated_pos, len(uuids["orders"]), num_repeated_orders,
+                       newest_order_timestamp, newest_unique_order_timestamp, newest_unique_order_uuid)
+
+        return self.find_legacy_miners_from_stats(num_checkpoints, miner_stats())
 
+    def find_legacy_miners_from_stats(self, num_checkpoints: int, miner_stats: Iterable[tuple]) -> Set[str]:
+        """
+        miner_stats: (miner hotkey, # position_uuids, # repeated position_uuids, # order_uuids, # repeated order_uuids,
+            newest order timestamp, newest unique order timestamp, newest unique order_uuid) for each miner
+        """
+        legacy_miners = set()            # position/order uuids are all unique across validators
+        legacy_miner_candidates = set()  # at least one position/order uuid is unique across validators
+
+        if num_checkpoints > 1:
+            for (miner_hotkey, num_pos, num_repeated_pos, num_orders, num_repeated_orders, newest_order_timestamp,
+                 newest_unique_order_timestamp, newest_unique_order_uuid) in miner_stats:
                 # if there are positions or orders that only appear once across all validators
-                if num_repeated_pos != len(uuids["positions"]) or num_repeated_orders != len(uuids["orders"]):
+                if num_repeated_pos != num_pos or num_repeated_orders != num_orders:
                     if (num_repeated_pos == 0) and (num_repeated_orders == 0):
                         legacy_miners.add(miner_hotkey)
                     elif newest_unique_order_timestamp == newest_order_timestamp:
                         legacy_miner_candidates.add(miner_hotkey)
                     bt.logging.info(
-                        f"Miner {miner_hotkey} has [{(len(uuids['positions']) - num_repeated_pos)}/{len(uuids['positions'])} legacy positions, {(len(uuids['orders']) - num_repeated_orders)}/{len(uuids['orders'])} legacy orders]. Newest legacy order {newest_unique_order_uuid} at timestamp {newest_unique_order_timestamp}")
+                        f"Miner {miner_hotkey} has [{(num_pos - num_repeated_pos)}/{num_pos} legacy positions, {(num_orders - num_repeated_orders)}/{num_orders} legacy orders]. Newest legacy order {newest_unique_order_uuid} at timestamp {newest_unique_order_timestamp}")
                 else:
                     bt.logging.info(f"Miner {miner_hotkey} has 0 legacy positions or orders")
         bt.logging.info(f"legacy_miners: {legacy_miners}")
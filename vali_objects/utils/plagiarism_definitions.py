@@ -24,9 +24,9 @@ class FollowPercentage(PlagiarismEvents):
     
     if event_key in self.time_differences:
       differences = self.time_differences[event_key]
-
-    differences = FollowPercentage.compute_time_differences(plagiarist_orders, victim_orders)
-    self.time_differences[event_key] = differences
+    else:
+      differences = FollowPercentage.compute_time_differences(plagiarist_orders, victim_orders)
+      self.time_differences[event_key] = differences
     percent_of_follow = FollowPercentage.compute_follow_percentage(differences, victim_orders)
     
     plagiarism_key = (self.plagiarist_id, plagiarist_trade_pair, victim_key[0], victim_key[1])
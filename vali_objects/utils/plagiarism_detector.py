@@ -19,10 +19,11 @@ import traceback
 import bittensor as bt
 
 from vali_objects.utils.plagiarism_pipeline import PlagiarismPipeline
+from vali_objects.utils.plagiarism_raster_cache import PlagiarismRasterCache
 
 class PlagiarismDetector(CacheController):
     def __init__(self, metagraph, running_unit_tests=False, shutdown_dict=None,
-                 position_manager: PositionManager=None):
+                 position_manager: PositionManager=None, incremental=False):
         super().__init__(metagraph, running_unit_tests=running_unit_tests)
         self.plagiarism_data = {}
         self.plagiarism_raster = {}
@@ -35,6 +36,8 @@ class PlagiarismDetector(CacheController):
         self.position_manager = position_manager if position_manager else PositionManager(metagraph=metagraph, running_unit_tests=running_unit_tests)
         self.plagiarism_pipeline = PlagiarismPipeline(self.plagiarism_classes)
         self.shutdown_dict = shutdown_dict
+        # Reuses rasters and scores of miners that didn't trade since the last run
+        self.raster_cache = PlagiarismRasterCache(running_unit_tests=running_unit_tests) if incremental else None
 
         plagiarism_dir = ValiBkpUtils.get_plagiarism_dir(running_unit_tests=self.running_unit_tests)
         if not os.path.exists(plagiarism_dir):
@@ -65,6 +68,9 @@ class PlagiarismDetector(CacheController):
             current_time = ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS
         else:
             current_time = TimeUtil.now_in_millis()
+        if self.raster_cache:
+            # The cache can only be reused when the window moves by whole raster steps
+            current_time -= current_time % ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS
         if hotkeys is None:
             hotkeys = self.metagraph.hotkeys
             assert hotkeys, f"No hotkeys found in metagraph {self.metagraph}"
@@ -78,7 +84,8 @@ class PlagiarismDetector(CacheController):
         #bt.logging.error(
         #    f'$$$$$$$ {len(hotkey_positions)} {len(self.position_manager.elimination_manager.get_eliminations_from_memory())} {len(self.metagraph.hotkeys)} {id(self.metagraph)} {type(self.metagraph)} {self.metagraph}')
 
-        plagiarism_data, raster_positions, positions = self.plagiarism_pipeline.run_reporting(positions=hotkey_positions, current_time=current_time)
+        plagiarism_data, raster_positions, positions = self.plagiarism_pipeline.run_reporting(positions=hotkey_positions, current_time=current_time,
+                                                                                            raster_cache=self.raster_cache)
 
 
         self.write_plagiarism_scores_to_disk(plagiarism_data)
@@ -89,6 +96,8 @@ class PlagiarismDetector(CacheController):
 
     def clear_plagiarism_from_disk(self, target_hotkey=None):
         # Clear all files and directories in the directory specified by dir
+        if self.raster_cache and not target_hotkey:
+            self.raster_cache.delete()
         dir = ValiBkpUtils.get_plagiarism_scores_dir(running_unit_tests=self.running_unit_tests)
         for file in os.listdir(dir):
             if target_hotkey and file != target_hotkey:
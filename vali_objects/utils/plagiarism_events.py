@@ -35,16 +35,19 @@ class PlagiarismEvents:
     return self.metadata
 
   @staticmethod
-  def set_positions(positions: dict, miner_ids: list[str], trade_pairs: list[str], current_time=None, lookback_window=None, time_resolution=None):
+  def set_positions(positions: dict, miner_ids: list[str], trade_pairs: list[str], current_time=None, lookback_window=None, time_resolution=None, rasterized_positions=None):
     """
     Args:
         positions: cumulative leverage positions for each miner as a dictionary with (miner hotkey, miner trade pair) as the key
+        rasterized_positions: already rasterized positions with the same keys, rasterized from positions if not given
     """
 
     PlagiarismEvents.positions = positions
     PlagiarismEvents.miner_ids = miner_ids
     PlagiarismEvents.trade_pairs = trade_pairs
-    PlagiarismEvents.rasterized_positions = ReportingUtils.rasterize(positions, current_time=current_time, lookback_window=lookback_window, time_resolution=time_resolution)
+    if rasterized_positions is None:
+      rasterized_positions = ReportingUtils.rasterize(positions, current_time=current_time, lookback_window=lookback_window, time_resolution=time_resolution)
+    PlagiarismEvents.rasterized_positions = rasterized_positions
 
   
   
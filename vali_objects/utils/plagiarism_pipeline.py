@@ -1,4 +1,5 @@
 from vali_objects.utils.plagiarism_events import PlagiarismEvents
+from vali_objects.utils.plagiarism_similarity import SimilarityMatrix
 from vali_objects.utils.reporting_utils import ReportingUtils
 from vali_objects.utils.position_utils import PositionUtils
 from vali_objects.vali_config import ValiConfig
@@ -172,10 +173,11 @@ class PlagiarismPipeline:
     return new_positions
 
 
-  def run_reporting(self, positions, current_time) -> tuple[list[dict], dict, dict]:
+  def run_reporting(self, positions, current_time, raster_cache=None) -> tuple[list[dict], dict, dict]:
     """
     Args:
         positions: hotkey positions of all miners
+        raster_cache: PlagiarismRasterCache to only rescore miners whose positions changed since the last run
     """
     flattened_positions = PositionUtils.flatten(positions)
     positions_list_translated = PositionUtils.translate_current_leverage(flattened_positions)
@@ -184,7 +186,11 @@ class PlagiarismPipeline:
     state_dict = self.state_list_to_dict(miners, trade_pairs, state_list)
     self.current_time = current_time
 
-    PlagiarismEvents.set_positions(state_dict, miners, trade_pairs, current_time=current_time)
+    if raster_cache is None:
+      PlagiarismEvents.set_positions(state_dict, miners, trade_pairs, current_time=current_time)
+      SimilarityMatrix.score_all()
+    else:
+      raster_cache.score(state_dict, miners, trade_pairs, current_time)
     rasterized_positions = {}
     positions_data = {}
     plagiarists_data = []
@@ -204,12 +210,11 @@ class PlagiarismPipeline:
         victim_tp = pipeline.max_victim["victim_trade_pair"]
 
         positions = PlagiarismEvents.positions[(victim_id, victim_tp)]
-        raster_vector = ReportingUtils.rasterize_cumulative_position(positions, current_time=current_time)
 
-        pipeline.rasterized_positions[(victim_id, victim_tp)] = raster_vector
+        pipeline.rasterized_positions[(victim_id, victim_tp)] = PlagiarismEvents.rasterized_positions[(victim_id, victim_tp)]
         pipeline.order_lists[(victim_id, victim_tp)] = positions
 
-        pipeline.rasterized_positions[(miner_id, pipeline.max_trade_pair)] = ReportingUtils.rasterize_cumulative_position(PlagiarismEvents.positions[(miner_id, pipeline.max_trade_pair)], current_time=current_time)
+        pipeline.rasterized_positions[(miner_id, pipeline.max_trade_pair)] = PlagiarismEvents.rasterized_positions[(miner_id, pipeline.max_trade_pair)]
         pipeline.order_lists[(miner_id, pipeline.max_trade_pair)] = PlagiarismEvents.positions[(miner_id, pipeline.max_trade_pair)]
 
       
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import pickle
+
+import bittensor as bt
+import numpy as np
+
+from vali_objects.utils.plagiarism_events import PlagiarismEvents
+from vali_objects.utils.plagiarism_similarity import SimilarityMatrix
+from vali_objects.utils.reporting_utils import ReportingUtils
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+from vali_objects.vali_config import ValiConfig
+
+
+class PlagiarismRasterCache:
+  """
+  Keeps each miner's rasterized states per trade pair between plagiarism runs, keyed by a hash of the
+  states, along with the copy similarities and time differences between miners.
+
+  A miner is unchanged if its states hash the same as last run and all of them lie far enough inside both
+  the previous and the current lookback window that no time lag reaches the window edges. Its raster is then
+  the previous one shifted by the number of steps the window moved, and its scores with other unchanged
+  miners are the previous ones. Everything else is recomputed. Nothing is reused unless the window moved by
+  a whole number of raster steps.
+  """
+  FORMAT_VERSION = 1
+
+  def __init__(self, running_unit_tests=False):
+    self.path = ValiBkpUtils.get_plagiarism_raster_cache_file_location(running_unit_tests=running_unit_tests)
+
+  @staticmethod
+  def states_hash(states: list[dict]) -> str:
+    content = [(s["start"], s["end"], s["leverage"]) for s in states]
+    return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+  @staticmethod
+  def encode_raster(raster: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Rasters are piecewise constant, so only the indices where the value changes are stored
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(raster)) + 1))
+    return starts, raster[starts]
+
+  @staticmethod
+  def decode_raster(starts: np.ndarray, values: np.ndarray, n_times: int) -> np.ndarray:
+    return np.repeat(values, np.diff(np.append(starts, n_times)))
+
+  @staticmethod
+  def n_times(current_time: int) -> int:
+    return len(np.arange(current_time - ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS, current_time,
+                         ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS))
+
+  def load(self) -> dict | None:
+    if not os.path.exists(self.path):
+      return None
+    try:
+      with open(self.path, 'rb') as f:
+        payload = pickle.load(f)
+      if (payload['format_version'] != self.FORMAT_VERSION or
+              payload['lookback'] != ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS or
+              payload['resolution'] != ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS):
+        return None
+      return payload
+    except Exception as e:
+      bt.logging.warning(f"Ignoring unreadable plagiarism raster cache {self.path}: {e}")
+      return None
+
+  def delete(self):
+    if os.path.exists(self.path):
+      os.remove(self.path)
+
+  def rasterize(self, state_dict: dict, current_time: int, previous: dict | None) -> tuple[dict, dict, dict]:
+    """
+    Returns the rasterized positions, the cache entries to save and the unchanged miners of each trade pair.
+    """
+    resolution = ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS
+    n_times = self.n_times(current_time)
+
+    shift = None
+    if previous is not None and previous['n_times'] == n_times:
+      elapsed = current_time - previous['current_time']
+      if 0 <= elapsed < n_times * resolution and elapsed % resolution == 0:
+        shift = elapsed // resolution
+    if shift is not None:
+      # Time lags are at most the order time window
+      margin = ValiConfig.PLAGIARISM_ORDER_TIME_WINDOW_MS + 2 * resolution
+      unchanged_start = current_time - ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS + margin
+      unchanged_end = previous['current_time'] - margin
+
+    rasterized_positions = {}
+    entries = {}
+    unchanged_ids_by_trade_pair = {}
+    for (miner_id, trade_pair), states in state_dict.items():
+      if not states:
+        rasterized_positions[(miner_id, trade_pair)] = np.zeros(n_times)
+        continue
+      states_hash = self.states_hash(states)
+      cached = previous['rasters'].get((miner_id, trade_pair)) if shift is not None else None
+      if (cached is not None and cached[0] == states_hash and
+              min(s["start"] for s in states) >= unchanged_start and max(s["end"] for s in states) <= unchanged_end):
+        raster = np.zeros(n_times)
+        raster[:n_times - shift] = self.decode_raster(cached[1], cached[2], n_times)[shift:]
+        unchanged_ids_by_trade_pair.setdefault(trade_pair, set()).add(miner_id)
+      else:
+        raster = ReportingUtils.rasterize_cumulative_position(states, current_time=current_time)
+      rasterized_positions[(miner_id, trade_pair)] = raster
+      entries[(miner_id, trade_pair)] = (states_hash, *self.encode_raster(raster))
+    return rasterized_positions, entries, unchanged_ids_by_trade_pair
+
+  @staticmethod
+  def restore_scores(previous: dict, unchanged_ids_by_trade_pair: dict[str, set[str]]):
+    """
+    Copies the previous scores between unchanged miners into PlagiarismEvents. A trade pair missing any of
+    them is recomputed in full.
+    """
+    for trade_pair, miner_ids in unchanged_ids_by_trade_pair.items():
+      keys = [(p, trade_pair, v, trade_pair) for p in miner_ids for v in miner_ids if p != v]
+      if not all(key in previous['pairs'] for key in keys):
+        miner_ids.clear()
+        continue
+      for key in keys:
+        PlagiarismEvents.copy_similarities[key], PlagiarismEvents.time_differences[key] = previous['pairs'][key]
+
+  def score(self, state_dict: dict, miner_ids: list[str], trade_pairs: list[str], current_time: int):
+    """
+    Sets PlagiarismEvents positions and fills in the copy similarities and time differences of every pair,
+    only recomputing those involving miners whose states changed. Then saves the cache for the next run.
+    """
+    previous = self.load()
+    rasterized_positions, entries, unchanged_ids_by_trade_pair = self.rasterize(state_dict, current_time, previous)
+    PlagiarismEvents.set_positions(state_dict, miner_ids, trade_pairs, current_time=current_time,
+                                   rasterized_positions=rasterized_positions)
+    if previous is not None:
+      self.restore_scores(previous, unchanged_ids_by_trade_pair)
+    n_unchanged = sum(len(x) for x in unchanged_ids_by_trade_pair.values())
+    bt.logging.info(f"Plagiarism raster cache reused {n_unchanged}/{len(entries)} miner trade pairs")
+
+    SimilarityMatrix.score_all(unchanged_ids_by_trade_pair)
+
+    pairs = {}
+    for trade_pair in trade_pairs:
+      active_ids = [m for m in miner_ids if (m, trade_pair) in entries]
+      for p in active_ids:
+        for v in active_ids:
+          if p != v:
+            key = (p, trade_pair, v, trade_pair)
+            pairs[key] = (PlagiarismEvents.copy_similarities[key], PlagiarismEvents.time_differences[key])
+    payload = {'format_version': self.FORMAT_VERSION,
+               'lookback': ValiConfig.PLAGIARISM_LOOKBACK_RANGE_MS,
+               'resolution': ValiConfig.PLAGIARISM_MATCHING_TIME_RESOLUTION_MS,
+               'current_time': current_time,
+               'n_times': self.n_times(current_time),
+               'rasters': entries,
+               'pairs': pairs}
+    ValiBkpUtils.write_to_dir(self.path, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), is_binary=True)
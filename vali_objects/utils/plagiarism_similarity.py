@@ -0,0 +1,102 @@
+import numpy as np
+from scipy import sparse
+
+from vali_objects.utils.plagiarism_definitions import FollowPercentage
+from vali_objects.utils.plagiarism_events import PlagiarismEvents
+
+
+class SimilarityMatrix:
+  """
+  Computes the copy similarity of every pair of miners in a trade pair at once instead of one
+  cosine_similarity call per pair. The results go into PlagiarismEvents.copy_similarities, which
+  CopySimilarity.score_direct and everything built on it already read from.
+  """
+
+  # Below this fraction of nonzero entries the rasters are multiplied as sparse matrices
+  SPARSE_DENSITY_THRESHOLD = 0.1
+
+  @staticmethod
+  def lagged_cosine_similarities(matrix: np.ndarray, lags: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        matrix: (n miners, n times) rasterized positions
+        lags: (n miners, n miners) time lag in raster steps between plagiarist (row) and victim (column)
+
+    Returns:
+        (n miners, n miners) array where entry (i, j) is the cosine similarity of matrix[i, lag:] and
+        matrix[j, :-lag], or of the full rows if lag is 0. Similarities with a zero vector are 0.
+    """
+    n_miners, n_times = matrix.shape
+    ans = np.zeros((n_miners, n_miners))
+    if n_miners == 0 or n_times == 0:
+      return ans
+
+    is_sparse = np.count_nonzero(matrix) < SimilarityMatrix.SPARSE_DENSITY_THRESHOLD * matrix.size
+    source = sparse.csr_matrix(matrix) if is_sparse else matrix
+
+    # One matrix product per distinct lag, over only the rows and columns using that lag
+    for lag in np.unique(lags):
+      if lag >= n_times:
+        continue
+      rows, cols = np.nonzero(lags == lag)
+      plagiarists = np.unique(rows)
+      victims = np.unique(cols)
+
+      dots = source[plagiarists][:, lag:] @ source[victims][:, :n_times - lag].T
+      if is_sparse:
+        dots = dots.toarray()
+      plagiarist_norms = np.linalg.norm(matrix[plagiarists, lag:], axis=1)
+      victim_norms = np.linalg.norm(matrix[victims, :n_times - lag], axis=1)
+      norms = np.outer(plagiarist_norms, victim_norms)
+      similarities = np.divide(dots, norms, out=np.zeros_like(norms), where=norms > 0)
+
+      ans[rows, cols] = similarities[np.searchsorted(plagiarists, rows), np.searchsorted(victims, cols)]
+    return ans
+
+  @staticmethod
+  def score_trade_pair(trade_pair: str, unchanged_ids: set[str] = frozenset()):
+    """
+    Fills PlagiarismEvents.copy_similarities and PlagiarismEvents.time_differences for every pair of
+    miners in the trade pair from the current PlagiarismEvents positions.
+
+    Args:
+        unchanged_ids: miners whose scores with each other are already filled in and are skipped
+    """
+    miner_ids = PlagiarismEvents.miner_ids
+    active_ids = [m for m in miner_ids if PlagiarismEvents.positions.get((m, trade_pair))]
+    active_set = set(active_ids)
+
+    # Miners without states in the trade pair have a zero raster, so their similarities are 0
+    for plagiarist_id in miner_ids:
+      for victim_id in miner_ids:
+        if plagiarist_id != victim_id and (plagiarist_id not in active_set or victim_id not in active_set):
+          PlagiarismEvents.copy_similarities[(plagiarist_id, trade_pair, victim_id, trade_pair)] = 0.0
+
+    if len(active_ids) < 2:
+      return
+
+    # Lags past the end of the raster are skipped, which covers the diagonal and unchanged pairs
+    n_times = len(PlagiarismEvents.rasterized_positions[(active_ids[0], trade_pair)])
+    lags = np.full((len(active_ids), len(active_ids)), n_times, dtype=int)
+    is_scored = np.zeros(lags.shape, dtype=bool)
+    for i, plagiarist_id in enumerate(active_ids):
+      plagiarist_orders = PlagiarismEvents.positions[(plagiarist_id, trade_pair)]
+      for j, victim_id in enumerate(active_ids):
+        if i == j or (plagiarist_id in unchanged_ids and victim_id in unchanged_ids):
+          continue
+        differences = FollowPercentage.compute_time_differences(plagiarist_orders,
+                                                                PlagiarismEvents.positions[(victim_id, trade_pair)])
+        PlagiarismEvents.time_differences[(plagiarist_id, trade_pair, victim_id, trade_pair)] = differences
+        lags[i, j] = FollowPercentage.average_time_lag(differences=differences)
+        is_scored[i, j] = True
+
+    matrix = np.array([PlagiarismEvents.rasterized_positions[(m, trade_pair)] for m in active_ids], dtype=float)
+    similarities = SimilarityMatrix.lagged_cosine_similarities(matrix, lags)
+    for i, j in zip(*np.nonzero(is_scored)):
+      PlagiarismEvents.copy_similarities[(active_ids[i], trade_pair, active_ids[j], trade_pair)] = float(similarities[i, j])
+
+  @staticmethod
+  def score_all(unchanged_ids_by_trade_pair: dict[str, set[str]] | None = None):
+    unchanged_ids_by_trade_pair = unchanged_ids_by_trade_pair or {}
+    for trade_pair in PlagiarismEvents.trade_pairs:
+      SimilarityMatrix.score_trade_pair(trade_pair, unchanged_ids_by_trade_pair.get(trade_pair, frozenset()))
@@ -0,0 +1,248 @@
+import itertools
+import os
+import pickle
+from copy import deepcopy
+
+from vali_objects.position import Position
+
+
+class PositionCache:
+    """
+    In memory positions shared across processes with one entry per position instead of one list per miner.
+
+    positions maps (hotkey, position_uuid) -> (version, trade_pair_id, position) and hotkey_to_index maps hotkey -> {position_uuid:
+    version} in save order. With an ipc manager, positions are stored pickled, so saving one position only sends that
+    position and the miner's small index through the manager. Readers keep the pickled positions they already fetched
+    and only request entries whose version changed. Each read unpickles fresh copies so callers can't mutate shared
+    state, same as reading from a manager dict.
+
+    Without an ipc manager (unit tests, backtesting) positions are stored as objects and returned by reference, as the
+    plain dict used to.
+
+    open_index maps (hotkey, trade_pair_id) -> [position_uuid] for open positions so the open position for a trade pair
+    is found without scanning the miner's history. More than one uuid means the records are misaligned.
+    """
+    _version_counter = itertools.count()
+
+    def __init__(self, ipc_manager=None):
+        self.is_ipc = ipc_manager is not None
+        if self.is_ipc:
+            self.positions = ipc_manager.dict()
+            self.hotkey_to_index = ipc_manager.dict()
+            self.open_index = ipc_manager.dict()
+        else:
+            self.positions = {}
+            self.hotkey_to_index = {}
+            self.open_index = {}
+        # hotkey -> {position_uuid: (version, trade_pair_id, pickled position)} already fetched by this process.
+        self.local_blobs = {}
+
+    @classmethod
+    def _next_version(cls) -> tuple[int, int]:
+        # Unique across processes writing to the same manager.
+        return os.getpid(), next(cls._version_counter)
+
+    def __contains__(self, hotkey: str) -> bool:
+        return hotkey in self.hotkey_to_index
+
+    def hotkeys(self) -> list[str]:
+        return list(self.hotkey_to_index.keys())
+
+    def n_positions_by_hotkey(self) -> dict[str, int]:
+        return {hk: len(index) for hk, index in self.hotkey_to_index.items()}
+
+    def _get_blobs(self, hotkey: str, index: dict) -> dict:
+        cached = self.local_blobs.get(hotkey, {})
+        blobs = {}
+        for position_uuid, version in index.items():
+            entry = cached.get(position_uuid)
+            if entry is None or entry[0] != version:
+                entry = self.positions.get((hotkey, position_uuid))
+                if entry is None:  # Deleted since the index was read
+                    continue
+            blobs[position_uuid] = entry
+        self.local_blobs[hotkey] = blobs
+        return blobs
+
+    def get_positions(self, hotkey: str) -> list[Position]:
+        index = self.hotkey_to_index.get(hotkey)
+        if not index:
+            return []
+        if not self.is_ipc:
+            return [self.positions[(hotkey, position_uuid)][2] for position_uuid in index]
+        return [pickle.loads(blob) for _, _, blob in self._get_blobs(hotkey, index).values()]
+
+    def get_position(self, hotkey: str, position_uuid: str) -> Position | None:
+        """
+        Returns a copy of a single position.
+        """
+        entry = self.positions.get((hotkey, position_uuid))
+        if entry is None:
+            return None
+        if not self.is_ipc:
+            return deepcopy(entry[2])
+        self.local_blobs.setdefault(hotkey, {})[position_uuid] = entry
+        return pickle.loads(entry[2])
+
+    def get_trade_pair_id(self, hotkey: str, position_uuid: str) -> str | None:
+        """
+        Trade pair of a cached position. Uses the entry this process already fetched when there is one since the trade
+        pair of a position never changes.
+        """
+        entry = self.local_blobs.get(hotkey, {}).get(position_uuid) or self.positions.get((hotkey, position_uuid))
+        return None if entry is None else entry[1]
+
+    def get_versions_by_trade_pair(self, hotkey: str) -> dict[str, dict[str, tuple[int, int]]]:
+        """
+        trade_pair_id -> {position_uuid: version} of a miner's positions. Equal results mean none of the positions of
+        that trade pair were saved or deleted in between.
+        """
+        index = self.hotkey_to_index.get(hotkey)
+        if not index:
+            return {}
+        if self.is_ipc:
+            entries = self._get_blobs(hotkey, index)
+        else:
+            entries = {position_uuid: self.positions[(hotkey, position_uuid)] for position_uuid in index}
+        ans = {}
+        for position_uuid, (version, trade_pair_id, _) in entries.items():
+            ans.setdefault(trade_pair_id, {})[position_uuid] = version
+        return ans
+
+    def get_open_position_uuids(self, hotkey: str, trade_pair_id: str) -> list[str]:
+        return self.open_index.get((hotkey, trade_pair_id), [])
+
+    def _update_open_index(self, hotkey: str, trade_pair_id: str, position_uuid: str, is_open: bool):
+        key = (hotkey, trade_pair_id)
+        open_uuids = self.open_index.get(key, [])
+        if is_open and position_uuid not in open_uuids:
+            self.open_index[key] = open_uuids + [position_uuid]
+        elif not is_open and position_uuid in open_uuids:
+            open_uuids = [x for x in open_uuids if x != position_uuid]
+            if open_uuids:
+                self.open_index[key] = open_uuids
+            else:
+                del self.open_index[key]
+
+    def save_position(self, position: Position):
+        hotkey = position.miner_hotkey
+        position_uuid = position.position_uuid
+        trade_pair_id = position.trade_pair.trade_pair_id
+        version = self._next_version()
+        if self.is_ipc:
+            entry = (version, trade_pair_id, pickle.dumps(position, protocol=pickle.HIGHEST_PROTOCOL))
+            self.local_blobs.setdefault(hotkey, {})[position_uuid] = entry
+        else:
+            entry = (version, trade_pair_id, deepcopy(position))
+        # Position first so a reader that sees the new index version also finds the new position.
+        self.positions[(hotkey, position_uuid)] = entry
+        index = dict(self.hotkey_to_index.get(hotkey, {}))
+        index.pop(position_uuid, None)  # Most recently saved goes last
+        index[position_uuid] = version
+        self.hotkey_to_index[hotkey] = index
+        self._update_open_index(hotkey, trade_pair_id, position_uuid, position.is_open_position)
+
+    def set_positions(self, hotkey: str, positions: list[Position]):
+        for position_uuid in list(self.hotkey_to_index.get(hotkey, {})):
+            self.delete_position(hotkey, position_uuid)
+        self.local_blobs.pop(hotkey, None)
+        records = []
+        for p in positions:
+            payload = pickle.dumps(p, protocol=pickle.HIGHEST_PROTOCOL) if self.is_ipc else deepcopy(p)
+            records.append((p.position_uuid, p.trade_pair.trade_pair_id, p.is_open_position, payload))
+        self._load_entries(hotkey, records)
+
+    def _load_entries(self, hotkey: str, records: list[tuple[str, str, bool, object]]):
+        # Batched so loading a miner costs a few round trips to the ipc manager rather than a few per position.
+        # The miner must not have any positions in the cache yet.
+        entries = {}
+        index = {}
+        open_index = {}
+        for position_uuid, trade_pair_id, is_open, payload in records:
+            version = self._next_version()
+            entries[(hotkey, position_uuid)] = (version, trade_pair_id, payload)
+            index.pop(position_uuid, None)
+            index[position_uuid] = version
+            if is_open:
+                open_index.setdefault((hotkey, trade_pair_id), []).append(position_uuid)
+            else:
+                uuids = open_index.get((hotkey, trade_pair_id), [])
+                if position_uuid in uuids:
+                    uuids.remove(position_uuid)
+        open_index = {k: v for k, v in open_index.items() if v}
+        if self.is_ipc:
+            self.local_blobs[hotkey] = {position_uuid: entries[(hotkey, position_uuid)] for position_uuid in index}
+        self.positions.update(entries)
+        if open_index:
+            self.open_index.update(open_index)
+        if index:
+            self.hotkey_to_index[hotkey] = index
+
+    def delete_position(self, hotkey: str, position_uuid: str):
+        index = self.hotkey_to_index.get(hotkey)
+        if index is None or position_uuid not in index:
+            return
+        index = dict(index)
+        del index[position_uuid]
+        # Index first so readers never look up a deleted entry they would still return.
+        if index:
+            self.hotkey_to_index[hotkey] = index
+        else:
+            del self.hotkey_to_index[hotkey]
+        entry = self.positions.pop((hotkey, position_uuid), None)
+        self.local_blobs.get(hotkey, {}).pop(position_uuid, None)
+        if entry is not None:
+            self._update_open_index(hotkey, entry[1], position_uuid, False)
+
+    def get_raw_records(self, hotkey: str, open_uuids: set[str]) -> list[tuple[str, str, bool, bytes]]:
+        """
+        (position_uuid, trade_pair_id, is_open, pickled position) for each of the miner's positions in save order.
+        """
+        index = self.hotkey_to_index.get(hotkey)
+        if not index:
+            return []
+        if self.is_ipc:
+            entries = self._get_blobs(hotkey, index)
+        else:
+            entries = {position_uuid: self.positions[(hotkey, position_uuid)] for position_uuid in index}
+        ans = []
+        for position_uuid, (_, trade_pair_id, payload) in entries.items():
+            blob = payload if self.is_ipc else pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+            ans.append((position_uuid, trade_pair_id, position_uuid in open_uuids, blob))
+        return ans
+
+    def load_raw_records(self, hotkey: str, records: list[tuple[str, str, bool, bytes]]):
+        """
+        Inverse of get_raw_records. With an ipc manager the positions stay pickled until they are first read.
+        """
+        self.local_blobs.pop(hotkey, None)
+        if not self.is_ipc:
+            records = [(position_uuid, trade_pair_id, is_open, pickle.loads(blob))
+                       for position_uuid, trade_pair_id, is_open, blob in records]
+        self._load_entries(hotkey, records)
+
+    def clear(self):
+        self.hotkey_to_index.clear()
+        self.positions.clear()
+        self.open_index.clear()
+        self.local_blobs.clear()
+
+    def check_open_index(self, hotkeys: list[str] | None = None) -> list[str]:
+        """
+        Compares the open position index against a full scan of the cached positions. Returns a description of every
+        mismatch found.
+        """
+        errors = []
+        hotkeys = self.hotkeys() if hotkeys is None else hotkeys
+        expected = {}
+        for hotkey in hotkeys:
+            for p in self.get_positions(hotkey):
+                if p.is_open_position:
+                    expected.setdefault((hotkey, p.trade_pair.trade_pair_id), set()).add(p.position_uuid)
+        hotkeys_set = set(hotkeys)
+        actual = {k: set(v) for k, v in self.open_index.items() if k[0] in hotkeys_set}
+        for key in expected.keys() | actual.keys():
+            if expected.get(key, set()) != actual.get(key, set()):
+                errors.append(f"Open position index mismatch for {key}. Index: {sorted(actual.get(key, set()))}, "
+                              f"positions: {sorted(expected.get(key, set()))}")
+        return errors
@@ -6,6 +6,7 @@ import shutil
 import time
 import traceback
 from collections import defaultdict
+from contextlib import nullcontext
 from pickle import UnpicklingError
 from typing import List, Dict
 import bittensor as bt
@@ -18,7 +19,15 @@ from vali_objects.decoders.generalized_json_decoder import GeneralizedJSONDecode
 from vali_objects.exceptions.corrupt_data_exception import ValiBkpCorruptDataException
 from vali_objects.exceptions.vali_bkp_file_missing_exception import ValiFileMissingException
 from vali_objects.utils.live_price_fetcher import LivePriceFetcher
+from vali_objects.utils.position_cache import PositionCache
+from vali_objects.utils.position_store import (
+    POSITION_BACKEND_FILES,
+    POSITION_BACKEND_SQLITE,
+    POSITION_BACKENDS,
+    PositionStore,
+)
 from vali_objects.utils.positions_to_snap import positions_to_snap
+from vali_objects.utils.startup_snapshot import StartupSnapshot
 from vali_objects.vali_config import TradePair, ValiConfig
 from vali_objects.enums.order_type_enum import OrderType
 from vali_objects.exceptions.vali_records_misalignment_exception import ValiRecordsMisalignmentException
@@ -29,6 +38,9 @@ from vali_objects.utils.position_filtering import PositionFiltering
 
 TARGET_MS = 1742577204000 + (1000 * 60 * 60 * 3)  # + 3 hours
 
+# Price sources of orders older than this are stripped from dashboard outputs
+PRICE_SOURCE_RETENTION_MS = 1000 * 60 * 60 * 24 * 7
+
 
 class PositionManager(CacheController):
     def __init__(self, metagraph=None, running_unit_tests=False,
@@ -41,7 +53,9 @@ class PositionManager(CacheController):
                  ipc_manager=None,
                  live_price_fetcher=None,
                  is_backtesting=False,
-                 shared_queue_websockets=None):
+                 shared_queue_websockets=None,
+                 position_backend=None,
+                 use_startup_snapshot=False):
 
         super().__init__(metagraph=metagraph, running_unit_tests=running_unit_tests, is_backtesting=is_backtesting)
         # Populate memory with positions
@@ -56,11 +70,23 @@ class PositionManager(CacheController):
         self.is_mothership = is_mothership
         self.perform_compaction = perform_compaction
         self.perform_order_corrections = perform_order_corrections
-        if ipc_manager:
-            self.hotkey_to_positions = ipc_manager.dict()
-        else:
-            self.hotkey_to_positions = {}
+        # Shared per position so saving an order doesn't resend the miner's whole history through the ipc manager.
+        self.position_cache = PositionCache(ipc_manager=ipc_manager)
         self.secrets = secrets
+        # Follow whatever backend the validator chose unless one is requested explicitly.
+        if position_backend is None:
+            use_store = not running_unit_tests and PositionStore(running_unit_tests=running_unit_tests).exists()
+            position_backend = POSITION_BACKEND_SQLITE if use_store else POSITION_BACKEND_FILES
+        assert position_backend in POSITION_BACKENDS, position_backend
+        self.position_backend = position_backend
+        self.position_store = None
+        if position_backend == POSITION_BACKEND_SQLITE:
+            self.position_store = PositionStore(running_unit_tests=running_unit_tests)
+        # The snapshot tracks position file directories. The position store is already a single sequential read.
+        self.startup_snapshot = None
+        if use_startup_snapshot and not self.position_store:
+            self.startup_snapshot = StartupSnapshot(running_unit_tests=running_unit_tests)
+        self.last_startup_snapshot_ms = 0
         self._populate_memory_positions_for_first_time()
         self.live_price_fetcher = live_price_fetcher
 
@@ -69,10 +95,16 @@ class PositionManager(CacheController):
         if self.is_backtesting:
             return
 
+        if self.position_store and self.position_store.is_empty():
+            self.migrate_positions_to_store()
+
+        if self.startup_snapshot and self._populate_memory_positions_from_snapshot():
+            return
+
         initial_hk_to_positions = self.get_positions_for_all_miners(from_disk=True)
         for hk, positions in initial_hk_to_positions.items():
             if positions:  # Only populate if there are no positions in the miner dir
-                self.hotkey_to_positions[hk] = positions
+                self.position_cache.set_positions(hk, positions)
 
     def filtered_positions_for_scoring(
             self,
@@ -148,7 +180,7 @@ class PositionManager(CacheController):
     @staticmethod
     def strip_old_price_sources(position: Position, time_now_ms: int) -> int:
         n_removed = 0
-        one_week_ago_ms = time_now_ms - 1000 * 60 * 60 * 24 * 7
+        one_week_ago_ms = time_now_ms - PRICE_SOURCE_RETENTION_MS
         for o in position.orders:
             if o.processed_ms < one_week_ago_ms:
                 if o.price_sources:
@@ -238,7 +270,10 @@ class PositionManager(CacheController):
 
         bt.logging.info(f'Removed {n_price_sources_removed} price sources from old data.')
 
-    def dedupe_positions(self, positions, miner_hotkey):
+    def dedupe_positions(self, positions, miner_hotkey, position_locks=None):
+        """
+        With position_locks, the changes to each trade pair are written under its lock so they don't race an order.
+        """
         positions_by_trade_pair = defaultdict(list)
         n_positions_deleted = 0
         n_orders_deleted = 0
@@ -248,20 +283,19 @@ class PositionManager(CacheController):
 
         for trade_pair, positions in positions_by_trade_pair.items():
             position_uuid_to_dedupe = {}
+            positions_to_delete = []
             for p in positions:
                 if p.position_uuid in position_uuid_to_dedupe:
                     # Replace if it has more orders
                     if len(p.orders) > len(position_uuid_to_dedupe[p.position_uuid].orders):
-                        old_position = position_uuid_to_dedupe[p.position_uuid]
-                        self.delete_position(old_position)
+                        positions_to_delete.append(position_uuid_to_dedupe[p.position_uuid])
                         position_uuid_to_dedupe[p.position_uuid] = p
-                        n_positions_deleted += 1
                     else:
-                        self.delete_position(p)
-                        n_positions_deleted += 1
+                        positions_to_delete.append(p)
                 else:
                     position_uuid_to_dedupe[p.position_uuid] = p
 
+            positions_to_save = []
             for position in position_uuid_to_dedupe.values():
                 order_uuid_to_dedup = {}
                 new_orders = []
@@ -276,8 +310,17 @@ class PositionManager(CacheController):
                 if any_orders_deleted:
                     position.orders = new_orders
                     position.rebuild_position_with_updated_orders()
-                    self.save_miner_position(position, delete_open_position_if_exists=False)
-                    n_positions_rebuilt_with_new_orders += 1
+                    positions_to_save.append(position)
+
+            if not positions_to_delete and not positions_to_save:
+                continue
+            with position_locks.get_lock(miner_hotkey, trade_pair.trade_pair_id) if position_locks else nullcontext():
+                for p in positions_to_delete:
+                    self.delete_position(p)
+                for p in positions_to_save:
+                    self.save_miner_position(p, delete_open_position_if_exists=False)
+            n_positions_deleted += len(positions_to_delete)
+            n_positions_rebuilt_with_new_orders += len(positions_to_save)
         if n_positions_deleted or n_orders_deleted or n_positions_rebuilt_with_new_orders:
             bt.logging.warning(
                 f"Hotkey {miner_hotkey}: Deleted {n_positions_deleted} duplicate positions and {n_orders_deleted} "
@@ -682,10 +725,62 @@ class PositionManager(CacheController):
                 return False, f"{attr} is different. {value1} != {value2}"
         return True, ""
 
+    def _populate_memory_positions_from_snapshot(self) -> bool:
+        snapshot = self.startup_snapshot.load()
+        if snapshot is None:
+            return False
+        disk_fingerprint = self.startup_snapshot.get_disk_fingerprint()
+        snapshot_fingerprint = snapshot['disk_fingerprint']
+        hotkey_to_records = snapshot['hotkey_to_records']
+        n_rescanned = 0
+        for hk, dir_to_mtime in disk_fingerprint.items():
+            if snapshot_fingerprint.get(hk) == dir_to_mtime:
+                records = hotkey_to_records.get(hk)
+                if records:
+                    self.position_cache.load_raw_records(hk, records)
+            else:
+                positions = self.get_positions_for_one_hotkey(hk, from_disk=True)
+                if positions:
+                    self.position_cache.set_positions(hk, positions)
+                n_rescanned += 1
+        bt.logging.info(f"Loaded positions from startup snapshot created at "
+                        f"{TimeUtil.millis_to_formatted_date_str(snapshot['created_ms'])}. "
+                        f"Rescanned {n_rescanned}/{len(disk_fingerprint)} hotkeys that changed on disk.")
+        return True
+
+    def write_startup_snapshot(self):
+        if not self.startup_snapshot or self.is_backtesting:
+            return
+        # Fingerprint first. A write landing after this point changes a directory mtime and gets rescanned on load.
+        disk_fingerprint = self.startup_snapshot.get_disk_fingerprint()
+        self.startup_snapshot.mark_recent_modifications(disk_fingerprint, time.time_ns())
+        hotkey_to_open_uuids = defaultdict(set)
+        for (hk, _), uuids in dict(self.position_cache.open_index).items():
+            hotkey_to_open_uuids[hk].update(uuids)
+        hotkey_to_records = {hk: self.position_cache.get_raw_records(hk, hotkey_to_open_uuids[hk])
+                             for hk in self.position_cache.hotkeys()}
+        self.startup_snapshot.write(disk_fingerprint, hotkey_to_records)
+        self.last_startup_snapshot_ms = TimeUtil.now_in_millis()
+
+    def write_startup_snapshot_with_cooldown(self):
+        if TimeUtil.now_in_millis() - self.last_startup_snapshot_ms < ValiConfig.STARTUP_SNAPSHOT_REFRESH_TIME_MS:
+            return
+        self.write_startup_snapshot()
+
+    def migrate_positions_to_store(self):
+        """
+        One time import of the per position files into the position store. The files are left in place.
+        """
+        positions = []
+        for hotkey in ValiBkpUtils.get_directories_in_dir(ValiBkpUtils.get_miner_dir(self.running_unit_tests)):
+            positions.extend(self._get_positions_from_files(hotkey))
+        if positions:
+            self.position_store.save_positions(positions)
+            bt.logging.info(f"Migrated {len(positions)} positions from {ValiBkpUtils.get_miner_dir(self.running_unit_tests)}"
+                            f" to {self.position_store.db_path}")
+
     def get_miner_position_by_uuid(self, hotkey:str, position_uuid: str) -> Position | None:
-        if hotkey not in self.hotkey_to_positions:
-            return None
-        return self._position_from_list_of_position(hotkey, position_uuid)
+        return self.position_cache.get_position(hotkey, position_uuid)
 
     def get_recently_updated_miner_hotkeys(self):
         """
@@ -709,6 +804,12 @@ class PositionManager(CacheController):
             if current_time - latest_modification_time_s < 259200:  # 3 days in seconds
                 updated_directory_names.append(item)
 
+        if self.position_store:
+            since_ms = int((current_time - 259200) * 1000)
+            for hotkey in self.position_store.get_recently_updated_hotkeys(since_ms):
+                if hotkey not in updated_directory_names:
+                    updated_directory_names.append(hotkey)
+
         return updated_directory_names
 
     def _get_latest_file_modification_time_s(self, dir_path, root_last_modified_time):
@@ -738,9 +839,15 @@ class PositionManager(CacheController):
             self.delete_position(open_position)
 
     def verify_open_position_write(self, miner_dir, updated_position):
-        all_files = ValiBkpUtils.get_all_files_in_dir(miner_dir)
-        # Print all files found for dir
-        positions = [self._get_position_from_disk(file) for file in all_files]
+        if self.position_store:
+            all_files = []
+            positions = self.position_store.get_positions(updated_position.miner_hotkey,
+                                                          trade_pair_id=updated_position.trade_pair.trade_pair_id,
+                                                          is_open=True)
+        else:
+            all_files = ValiBkpUtils.get_all_files_in_dir(miner_dir)
+            # Print all files found for dir
+            positions = [self._get_position_from_disk(file) for file in all_files]
         if len(positions) == 0:
             return  # First time open position is being saved
         if len(positions) > 1:
@@ -760,10 +867,15 @@ class PositionManager(CacheController):
         if not self.running_unit_tests:
             return
 
-        cdf = miner_dir[:-5] + 'closed/'
-        positions.extend([self._get_position_from_disk(file) for file in ValiBkpUtils.get_all_files_in_dir(cdf)])
+        if self.position_store:
+            positions.extend(self.position_store.get_positions(updated_position.miner_hotkey,
+                                                               trade_pair_id=updated_position.trade_pair.trade_pair_id,
+                                                               is_open=False))
+        else:
+            cdf = miner_dir[:-5] + 'closed/'
+            positions.extend([self._get_position_from_disk(file) for file in ValiBkpUtils.get_all_files_in_dir(cdf)])
 
-        temp = self.hotkey_to_positions.get(updated_position.miner_hotkey, [])
+        temp = self.position_cache.get_positions(updated_position.miner_hotkey)
         positions_memory_by_position_uuid = {}
         for position in temp:
             if position.trade_pair == updated_position.trade_pair:
@@ -795,34 +907,23 @@ class PositionManager(CacheController):
                 errors.append(
                     f"Position {position_uuid} for miner {updated_position.miner_hotkey} and trade_pair {updated_position.trade_pair.trade_pair_id} "
                     f"found on disk but does not match the position in memory. {diff}")
+        errors.extend(self.position_cache.check_open_index([updated_position.miner_hotkey]))
         if errors:
             raise ValiRecordsMisalignmentException(
                 f"Found errors in miner {updated_position.miner_hotkey} and trade_pair {updated_position.trade_pair.trade_pair_id}. Errors: {errors}."
                 f" Disk positions: {positions_disk_by_uuid.keys()}. Memory positions: {positions_memory_by_position_uuid.keys()}. all files {all_files}")
         # -------------------------------------------------------------------------------------
 
-    def _position_from_list_of_position(self, hotkey, position_uuid):
-        for p in self.hotkey_to_positions.get(hotkey, []):
-            if p.position_uuid == position_uuid:
-                return deepcopy(p)  # for unit tests we deepcopy. ipc cache never returns a reference.
-        return None
-
     def get_existing_positions(self, hotkey: str):
-        return self.hotkey_to_positions.get(hotkey, [])
+        return self.position_cache.get_positions(hotkey)
 
     def _save_miner_position_to_memory(self, position: Position):
-        # Multiprocessing-safe
-        hk = position.miner_hotkey
-        existing_positions = self.get_existing_positions(hk)
-
-        # Santiy check
-        if position.miner_hotkey in self.hotkey_to_positions and position.position_uuid in existing_positions:
-            existing_pos = self._position_from_list_of_position(position.miner_hotkey, position.position_uuid)
-            assert existing_pos.trade_pair == position.trade_pair, f"Trade pair mismatch for position {position.position_uuid}. Existing: {existing_pos.trade_pair}, New: {position.trade_pair}"
-
-        new_positions = [p for p in existing_positions if p.position_uuid != position.position_uuid]
-        new_positions.append(deepcopy(position))
-        self.hotkey_to_positions[hk] = new_positions  # Trigger the update on the multiprocessing Manager
+        # Multiprocessing-safe. Only this position and the miner's index go through the ipc manager.
+        # Sanity check
+        existing_trade_pair_id = self.position_cache.get_trade_pair_id(position.miner_hotkey, position.position_uuid)
+        if existing_trade_pair_id is not None:
+            assert existing_trade_pair_id == position.trade_pair.trade_pair_id, f"Trade pair mismatch for position {position.position_uuid}. Existing: {existing_trade_pair_id}, New: {position.trade_pair.trade_pair_id}"
+        self.position_cache.save_position(position)
 
 
     def save_miner_position(self, position: Position, delete_open_position_if_exists=True) -> None:
@@ -837,9 +938,15 @@ class PositionManager(CacheController):
                 self.verify_open_position_write(miner_dir, position)
 
             #print(f'Saving position {position.position_uuid} for miner {position.miner_hotkey} and trade pair {position.trade_pair.trade_pair_id} is_open {position.is_open_position}')
-            ValiBkpUtils.write_file(miner_dir + position.position_uuid, position)
+            self._write_position_to_disk(miner_dir, position)
         self._save_miner_position_to_memory(position)
 
+    def _write_position_to_disk(self, miner_dir: str, position: Position) -> None:
+        if self.position_store:
+            self.position_store.save_position(position)
+        else:
+            ValiBkpUtils.write_file(miner_dir + position.position_uuid, position)
+
     def overwrite_position_on_disk(self, position: Position) -> None:
         # delete the position from disk. Try the open position dir and the closed position dir
         self.delete_position(position, check_open_and_closed_dirs=True)
@@ -847,11 +954,16 @@ class PositionManager(CacheController):
                                                                      position.trade_pair.trade_pair_id,
                                                                      order_status=OrderStatus.OPEN if position.is_open_position else OrderStatus.CLOSED,
                                                                      running_unit_tests=self.running_unit_tests)
-        ValiBkpUtils.write_file(miner_dir + position.position_uuid, position)
+        self._write_position_to_disk(miner_dir, position)
         self._save_miner_position_to_memory(position)
 
     def clear_all_miner_positions(self, target_hotkey=None):
-        self.hotkey_to_positions = {}
+        self.position_cache.clear()
+        if self.position_store:
+            if target_hotkey:
+                self.position_store.delete_hotkey(target_hotkey)
+            else:
+                self.position_store.clear()
         # Clear all files and directories in the directory specified by dir
         dir = ValiBkpUtils.get_miner_dir(running_unit_tests=self.running_unit_tests)
         for file in os.listdir(dir):
@@ -868,21 +980,26 @@ class PositionManager(CacheController):
 
     def get_number_of_miners_with_any_positions(self):
         ans = 0
-        for k, v in self.hotkey_to_positions.items():
-            if len(v) > 0:
+        for k, n_positions in self.position_cache.n_positions_by_hotkey().items():
+            if n_positions > 0:
                 ans += 1
         return ans
 
+    def get_miner_hotkeys_on_disk(self) -> list[str]:
+        """
+        Hotkeys with a miner directory or, when using the position store, any stored position.
+        """
+        hotkeys = ValiBkpUtils.get_directories_in_dir(ValiBkpUtils.get_miner_dir(self.running_unit_tests))
+        if self.position_store:
+            hotkeys_set = set(hotkeys)
+            hotkeys.extend(hk for hk in self.position_store.get_hotkeys() if hk not in hotkeys_set)
+        return hotkeys
+
     def get_extreme_position_order_processed_on_disk_ms(self):
-        dir = ValiBkpUtils.get_miner_dir(running_unit_tests=self.running_unit_tests)
         min_time = float("inf")
         max_time = 0
-        for file in os.listdir(dir):
-            file_path = os.path.join(dir, file)
-            if os.path.isfile(file_path):
-                continue
-            hotkey = file
-            # Read all positions in this directory
+        for hotkey in self.get_miner_hotkeys_on_disk():
+            # Read all positions for this hotkey
             positions = self.get_positions_for_one_hotkey(hotkey)
             for p in positions:
                 for o in p.orders:
@@ -891,15 +1008,21 @@ class PositionManager(CacheController):
         return min_time, max_time
 
     def get_open_position_for_a_miner_trade_pair(self, hotkey: str, trade_pair_id: str) -> Position | None:
-        temp = self.hotkey_to_positions.get(hotkey, [])
-        positions = []
-        for p in temp:
-            if p.trade_pair.trade_pair_id == trade_pair_id and p.is_open_position:
-                positions.append(p)
-        if len(positions) > 1:
+        # Constant time regardless of the miner's history. See PositionCache.open_index
+        open_position_uuids = self.position_cache.get_open_position_uuids(hotkey, trade_pair_id)
+        if len(open_position_uuids) > 1:
+            positions = [self.position_cache.get_position(hotkey, x) for x in open_position_uuids]
             raise ValiRecordsMisalignmentException(f"More than one open position for miner {hotkey} and trade_pair."
                                                    f" {trade_pair_id}. Please restore cache. Positions: {positions}")
-        return deepcopy(positions[0]) if len(positions) == 1 else None
+        return self.position_cache.get_position(hotkey, open_position_uuids[0]) if open_position_uuids else None
+
+    def verify_open_position_index(self, hotkeys: List[str] = None) -> None:
+        """
+        Checks the open position index against a full scan of the in memory positions.
+        """
+        errors = self.position_cache.check_open_index(hotkeys)
+        if errors:
+            raise ValiRecordsMisalignmentException(f"Open position index is inconsistent. Errors: {errors}")
 
     def get_filepath_for_position(self, hotkey, trade_pair_id, position_uuid, is_open):
         order_status = OrderStatus.CLOSED if not is_open else OrderStatus.OPEN
@@ -916,6 +1039,12 @@ class PositionManager(CacheController):
                           self.get_filepath_for_position(hotkey, trade_pair_id, position_uuid, False)]
         else:
             file_paths = [self.get_filepath_for_position(hotkey, trade_pair_id, position_uuid, is_open)]
+        if self.position_store:
+            # Rows are keyed by hotkey and position uuid so open and closed are covered at once.
+            if not self.is_backtesting and self.position_store.delete_position(hotkey, position_uuid):
+                bt.logging.info(f"Deleted position from disk: {hotkey} {position_uuid}")
+            self._delete_position_from_memory(hotkey, position_uuid)
+            return
         for fp in file_paths:
             if not self.is_backtesting:
                 if os.path.exists(fp):
@@ -924,12 +1053,10 @@ class PositionManager(CacheController):
             self._delete_position_from_memory(hotkey, position_uuid)
 
     def _delete_position_from_memory(self, hotkey, position_uuid):
-        if hotkey in self.hotkey_to_positions:
-            new_positions = [p for p in self.hotkey_to_positions[hotkey] if p.position_uuid != position_uuid]
-            if new_positions:
-                self.hotkey_to_positions[hotkey] = new_positions
-            else:
-                del self.hotkey_to_positions[hotkey]
+        self.position_cache.delete_position(hotkey, position_uuid)
+
+    def get_position_versions(self, hotkey: str) -> dict[str, dict[str, tuple[int, int]]]:
+        return self.position_cache.get_versions_by_trade_pair(hotkey)
 
     def calculate_net_portfolio_leverage(self, hotkey: str) -> float:
         """
@@ -947,15 +1074,14 @@ class PositionManager(CacheController):
     @timeme
     def get_positions_for_all_miners(self, from_disk=False, **args):
         if from_disk:
-            all_miner_hotkeys: list = ValiBkpUtils.get_directories_in_dir(
-                ValiBkpUtils.get_miner_dir(self.running_unit_tests)
-            )
+            all_miner_hotkeys: list = self.get_miner_hotkeys_on_disk()
         else:
-            all_miner_hotkeys = list(self.hotkey_to_positions.keys())
+            all_miner_hotkeys = self.position_cache.hotkeys()
         return self.get_positions_for_hotkeys(all_miner_hotkeys, from_disk=from_disk, **args)
 
     @staticmethod
-    def positions_to_dashboard_dict(original_positions: list[Position], time_now_ms) -> dict:
+    def positions_to_dashboard_dict(original_positions: list[Position], time_now_ms,
+                                    acceptable_position_end_ms: int = None) -> dict:
         ans = {
             "positions": [],
             "thirty_day_returns": 1.0,
@@ -963,10 +1089,11 @@ class PositionManager(CacheController):
             "n_positions": 0,
             "percentage_profitable": 0.0
         }
-        acceptable_position_end_ms = TimeUtil.timestamp_to_millis(
-            TimeUtil.generate_start_timestamp(
-                ValiConfig.SET_WEIGHT_LOOKBACK_RANGE_DAYS
-            ))
+        if acceptable_position_end_ms is None:
+            acceptable_position_end_ms = TimeUtil.timestamp_to_millis(
+                TimeUtil.generate_start_timestamp(
+                    ValiConfig.SET_WEIGHT_LOOKBACK_RANGE_DAYS
+                ))
         positions_30_days = [
             position
             for position in original_positions
@@ -1067,13 +1194,12 @@ class PositionManager(CacheController):
                                      from_disk: bool = False
                                      ) -> List[Position]:
 
-        if from_disk:
-            miner_dir = ValiBkpUtils.get_miner_all_positions_dir(miner_hotkey,
-                                                                 running_unit_tests=self.running_unit_tests)
-            all_files = ValiBkpUtils.get_all_files_in_dir(miner_dir)
-            positions = [self._get_position_from_disk(file) for file in all_files]
+        if from_disk and self.position_store:
+            positions = self.position_store.get_positions(miner_hotkey)
+        elif from_disk:
+            positions = self._get_positions_from_files(miner_hotkey)
         else:
-            positions = self.hotkey_to_positions.get(miner_hotkey, [])
+            positions = self.position_cache.get_positions(miner_hotkey)
 
         if acceptable_position_end_ms is not None:
             positions = [
@@ -1092,6 +1218,12 @@ class PositionManager(CacheController):
 
         return positions
 
+    def _get_positions_from_files(self, miner_hotkey: str) -> List[Position]:
+        miner_dir = ValiBkpUtils.get_miner_all_positions_dir(miner_hotkey,
+                                                             running_unit_tests=self.running_unit_tests)
+        all_files = ValiBkpUtils.get_all_files_in_dir(miner_dir)
+        return [self._get_position_from_disk(file) for file in all_files]
+
     def get_positions_for_hotkeys(self, hotkeys: List[str], eliminations: List = None, **args) -> Dict[
         str, List[Position]]:
         eliminated_hotkeys = set(x['hotkey'] for x in eliminations) if eliminations is not None else set()
@@ -1103,7 +1235,7 @@ class PositionManager(CacheController):
         }
 
     def get_miner_hotkeys_with_at_least_one_position(self) -> set[str]:
-        return set(self.hotkey_to_positions.keys())
+        return set(self.position_cache.hotkeys())
 
 if __name__ == '__main__':
     from vali_objects.utils.challengeperiod_manager import ChallengePeriodManager
@@ -0,0 +1,125 @@
+import os
+import sqlite3
+
+import bittensor as bt
+
+from time_util.time_util import TimeUtil
+from vali_objects.exceptions.corrupt_data_exception import ValiBkpCorruptDataException
+from vali_objects.position import Position
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+
+POSITION_BACKEND_FILES = 'files'
+POSITION_BACKEND_SQLITE = 'sqlite'
+POSITION_BACKENDS = (POSITION_BACKEND_FILES, POSITION_BACKEND_SQLITE)
+
+
+class PositionStore:
+    """
+    Positions kept in a single SQLite database in WAL mode instead of one JSON file per position.
+
+    Rows are keyed by (miner_hotkey, position_uuid) so saving a position that was closed replaces its open row in the
+    same statement. Readers never block the writer, startup is one indexed scan, and crash recovery is handled by
+    SQLite replaying the WAL.
+    """
+
+    def __init__(self, running_unit_tests=False):
+        self.running_unit_tests = running_unit_tests
+        self.db_path = ValiBkpUtils.get_position_store_path(running_unit_tests=running_unit_tests)
+        self._conn = None
+        self._conn_pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_conn_pid'] = None
+        return state
+
+    def exists(self) -> bool:
+        return os.path.exists(self.db_path)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Connections can't be shared across a fork. Each process opens its own.
+        if self._conn is None or self._conn_pid != os.getpid():
+            ValiBkpUtils.make_dir(os.path.dirname(self.db_path))
+            self._conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS positions (
+                                      miner_hotkey TEXT NOT NULL,
+                                      position_uuid TEXT NOT NULL,
+                                      trade_pair_id TEXT NOT NULL,
+                                      is_open INTEGER NOT NULL,
+                                      updated_ms INTEGER NOT NULL,
+                                      position_json TEXT NOT NULL,
+                                      PRIMARY KEY (miner_hotkey, position_uuid))""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS positions_by_trade_pair "
+                               "ON positions (miner_hotkey, trade_pair_id, is_open)")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._conn_pid = None
+
+    @staticmethod
+    def _position_to_row(position: Position, updated_ms: int) -> tuple:
+        return (position.miner_hotkey, position.position_uuid, position.trade_pair.trade_pair_id,
+                int(position.is_open_position), updated_ms, position.to_json_string())
+
+    @staticmethod
+    def _row_to_position(position_json: str) -> Position:
+        try:
+            ans = Position.model_validate_json(position_json)
+        except Exception as e:
+            raise ValiBkpCorruptDataException(f"Error {e} position_json: {position_json[:2000]}")
+        if not ans.orders:
+            bt.logging.warning(f"Anomalous position has no orders: {ans.to_dict()}")
+        return ans
+
+    def save_position(self, position: Position):
+        self.conn.execute("INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?)",
+                          self._position_to_row(position, TimeUtil.now_in_millis()))
+
+    def save_positions(self, positions: list[Position]):
+        now_ms = TimeUtil.now_in_millis()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?)",
+                                  [self._position_to_row(p, now_ms) for p in positions])
+
+    def delete_position(self, miner_hotkey: str, position_uuid: str) -> bool:
+        cursor = self.conn.execute("DELETE FROM positions WHERE miner_hotkey = ? AND position_uuid = ?",
+                                   (miner_hotkey, position_uuid))
+        return cursor.rowcount > 0
+
+    def delete_hotkey(self, miner_hotkey: str):
+        self.conn.execute("DELETE FROM positions WHERE miner_hotkey = ?", (miner_hotkey,))
+
+    def clear(self):
+        self.conn.execute("DELETE FROM positions")
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM positions LIMIT 1").fetchone() is None
+
+    def get_positions(self, miner_hotkey: str, trade_pair_id: str | None = None, is_open: bool | None = None) -> list[Position]:
+        query = "SELECT position_json FROM positions WHERE miner_hotkey = ?"
+        params = [miner_hotkey]
+        if trade_pair_id is not None:
+            query += " AND trade_pair_id = ?"
+            params.append(trade_pair_id)
+        if is_open is not None:
+            query += " AND is_open = ?"
+            params.append(int(is_open))
+        # Open positions first, matching the order positions are read from the miner directories.
+        query += " ORDER BY is_open DESC, rowid"
+        return [self._row_to_position(row[0]) for row in self.conn.execute(query, params)]
+
+    def get_hotkeys(self) -> list[str]:
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT miner_hotkey FROM positions")]
+
+    def get_recently_updated_hotkeys(self, since_ms: int) -> list[str]:
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT miner_hotkey FROM positions WHERE updated_ms >= ?", (since_ms,))]
@@ -35,8 +35,24 @@ class ReportingUtils:
         start_time = current_time - lookback_window
         times = np.arange(start_time, end_time, time_resolution)
         rasterized_positions = np.zeros(len(times))
-        
-        for state in cumulative_leverage:
-          time_criteria = (times >= state["start"]) & (times <= state["end"])
-          rasterized_positions[time_criteria] = state["leverage"]
+        if len(cumulative_leverage) == 0:
+            return rasterized_positions
+
+        # Each state covers the raster steps in [start, end]. Later states overwrite earlier ones.
+        starts = np.searchsorted(times, [state["start"] for state in cumulative_leverage], side="left")
+        ends = np.searchsorted(times, [state["end"] for state in cumulative_leverage], side="right")
+        leverages = np.array([state["leverage"] for state in cumulative_leverage], dtype=float)
+        is_nonempty = ends > starts
+        starts, ends, leverages = starts[is_nonempty], ends[is_nonempty], leverages[is_nonempty]
+
+        if np.all(np.diff(starts) >= 0) and np.all(np.diff(ends) >= 0):
+            # States in time order only overlap the next state, which wins, so cut each state off where the
+            # next one starts and fill all of them in one pass
+            ends[:-1] = np.minimum(ends[:-1], starts[1:])
+            lengths = ends - starts
+            offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+            rasterized_positions[np.arange(lengths.sum()) + offsets] = np.repeat(leverages, lengths)
+        else:
+            for start, end, leverage in zip(starts, ends, leverages):
+                rasterized_positions[start:end] = leverage
         return rasterized_positions
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import pickle
+
+import bittensor as bt
+
+from time_util.time_util import TimeUtil
+from vali_objects.position import Position
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+
+
+class StartupSnapshot:
+    """
+    Single pickle holding the raw in memory position records of every miner so the validator doesn't have to parse
+    one file per position on startup.
+
+    Alongside the records it stores the mtime of every directory under each miner's dir. Position files are always
+    written with a rename and removed with unlink, both of which bump the parent directory's mtime, so any hotkey whose
+    directories changed since the snapshot (or that is missing from it) is rescanned from disk. Anything else wrong with
+    the snapshot falls back to the full disk scan.
+    """
+    FORMAT_VERSION = 1
+    # Directory mtimes are only as precise as the filesystem clock. Directories modified this close to the snapshot
+    # are rescanned on load rather than trusted.
+    RECENT_MODIFICATION_MARGIN_NS = 2 * 10**9
+
+    def __init__(self, running_unit_tests=False):
+        self.running_unit_tests = running_unit_tests
+        self.path = ValiBkpUtils.get_startup_snapshot_path(running_unit_tests=running_unit_tests)
+        self.miner_dir = ValiBkpUtils.get_miner_dir(running_unit_tests=running_unit_tests)
+
+    @staticmethod
+    def schema_fingerprint() -> str:
+        # Pickled positions from an incompatible version of the code must not be loaded.
+        return hashlib.sha256(json.dumps(Position.model_json_schema(), sort_keys=True).encode()).hexdigest()
+
+    def get_disk_fingerprint(self) -> dict[str, dict[str, int]]:
+        ans = {}
+        if not os.path.exists(self.miner_dir):
+            return ans
+        for hotkey in ValiBkpUtils.get_directories_in_dir(self.miner_dir):
+            hotkey_dir = os.path.join(self.miner_dir, hotkey)
+            ans[hotkey] = {os.path.relpath(dirpath, hotkey_dir): os.stat(dirpath).st_mtime_ns
+                           for dirpath, _, _ in os.walk(hotkey_dir)}
+        return ans
+
+    def mark_recent_modifications(self, disk_fingerprint: dict[str, dict[str, int]], now_ns: int):
+        for dir_to_mtime in disk_fingerprint.values():
+            for d, mtime_ns in dir_to_mtime.items():
+                if now_ns - mtime_ns < self.RECENT_MODIFICATION_MARGIN_NS:
+                    dir_to_mtime[d] = -1
+
+    def write(self, disk_fingerprint: dict[str, dict[str, int]], hotkey_to_records: dict[str, list[tuple]]):
+        payload = {'format_version': self.FORMAT_VERSION,
+                   'schema_fingerprint': self.schema_fingerprint(),
+                   'created_ms': TimeUtil.now_in_millis(),
+                   'disk_fingerprint': disk_fingerprint,
+                   'hotkey_to_records': hotkey_to_records}
+        ValiBkpUtils.write_to_dir(self.path, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), is_binary=True)
+
+    def load(self) -> dict | None:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                payload = pickle.load(f)
+            if payload['format_version'] != self.FORMAT_VERSION:
+                bt.logging.warning(f"Ignoring startup snapshot with format version {payload['format_version']}")
+                return None
+            if payload['schema_fingerprint'] != self.schema_fingerprint():
+                bt.logging.warning("Ignoring startup snapshot written with a different position schema")
+                return None
+            return payload
+        except Exception as e:
+            bt.logging.warning(f"Ignoring unreadable startup snapshot {self.path}: {e}")
+            return None
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
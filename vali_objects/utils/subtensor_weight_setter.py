@@ -11,10 +11,11 @@ from vali_objects.scoring.scoring import Scoring
 
 class SubtensorWeightSetter(CacheController):
     def __init__(self, metagraph, position_manager: PositionManager,
-                 running_unit_tests=False, is_backtesting=False):
+                 running_unit_tests=False, is_backtesting=False, scoring_snapshot=None):
         super().__init__(metagraph, running_unit_tests=running_unit_tests, is_backtesting=is_backtesting)
         self.position_manager = position_manager
         self.perf_ledger_manager = position_manager.perf_ledger_manager
+        self.scoring_snapshot = scoring_snapshot
         self.subnet_version = 200
         # Store weights for use in backtesting
         self.checkpoint_results = []
@@ -78,7 +79,8 @@ class SubtensorWeightSetter(CacheController):
                 filtered_ledger,
                 filtered_positions,
                 evaluation_time_ms=current_time,
-                weighting=True
+                weighting=True,
+                scoring_snapshot=self.scoring_snapshot
             ), key=lambda x: x[1], reverse=True)
 
             bt.logging.info(f"Sorted results for weight setting for {miner_group}: [{checkpoint_results}]")
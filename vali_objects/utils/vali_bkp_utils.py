@@ -64,6 +64,16 @@ class ValiBkpUtils:
     def get_miner_all_positions_dir(miner_hotkey, running_unit_tests=False) -> str:
         return f"{ValiBkpUtils.get_miner_dir(running_unit_tests=running_unit_tests)}{miner_hotkey}/positions/"
 
+    @staticmethod
+    def get_position_store_path(running_unit_tests=False) -> str:
+        suffix = "/tests" if running_unit_tests else ""
+        return ValiConfig.BASE_DIR + f"{suffix}/validation/positions.db"
+
+    @staticmethod
+    def get_startup_snapshot_path(running_unit_tests=False) -> str:
+        suffix = "/tests" if running_unit_tests else ""
+        return ValiConfig.BASE_DIR + f"{suffix}/validation/startup_snapshot.pkl"
+
     @staticmethod
     def get_eliminations_dir(running_unit_tests=False) -> str:
         suffix = "/tests" if running_unit_tests else ""
@@ -79,6 +89,16 @@ class ValiBkpUtils:
         suffix = "/tests" if running_unit_tests else ""
         return ValiConfig.BASE_DIR + f"{suffix}/validation/perf_ledgers.json"
 
+    @staticmethod
+    def get_perf_ledgers_dir(running_unit_tests=False) -> str:
+        suffix = "/tests" if running_unit_tests else ""
+        return ValiConfig.BASE_DIR + f"{suffix}/validation/perf_ledgers/"
+
+    @staticmethod
+    def get_candle_store_dir(running_unit_tests=False) -> str:
+        suffix = "/tests" if running_unit_tests else ""
+        return ValiConfig.BASE_DIR + f"{suffix}/validation/candles/"
+
     @staticmethod
     def get_plagiarism_dir(running_unit_tests=False) -> str:
         suffix = "/tests" if running_unit_tests else ""
@@ -93,6 +113,11 @@ class ValiBkpUtils:
         suffix = "/tests" if running_unit_tests else ""
         return ValiConfig.BASE_DIR + f"{suffix}/validation/plagiarism/positions"
 
+    @staticmethod
+    def get_plagiarism_raster_cache_file_location(running_unit_tests=False) -> str:
+        suffix = "/tests" if running_unit_tests else ""
+        return ValiConfig.BASE_DIR + f"{suffix}/validation/plagiarism/raster_cache.pkl"
+
     @staticmethod
     def get_plagiarism_scores_dir(running_unit_tests=False) -> str:
         suffix = "/tests" if running_unit_tests else ""
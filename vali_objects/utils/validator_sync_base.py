@@ -1,5 +1,6 @@
 import time
 import traceback
+from contextlib import contextmanager, nullcontext
 from copy import deepcopy
 from enum import Enum
 from collections import defaultdict
@@ -57,7 +58,14 @@ class ValidatorSyncBase():
         self.miners_with_position_kept = set()
         self.perf_ledger_hks_to_invalidate.clear()
 
-    def sync_positions(self, shadow_mode, candidate_data=None, disk_positions=None) -> dict[str: list[Position]]:
+    def sync_positions(self, shadow_mode, candidate_data=None, disk_positions=None,
+                       position_locks=None) -> dict[str: list[Position]]:
+        """
+        Without position_locks, the caller must keep orders from being processed during the whole sync. With
+        position_locks, positions are resolved against a snapshot while orders keep being processed and the changes
+        of each miner trade pair are written under its lock, resolved again if an order changed it in the meantime.
+        Eliminations and the challenge period are still written with orders paused.
+        """
         t0 = time.time()
         self.init_data()
         assert candidate_data, "Candidate data must be provided"
@@ -82,30 +90,45 @@ class ValidatorSyncBase():
         if self.is_mothership:
             bt.logging.info("Mothership detected")
 
-        if disk_positions is None:
+        if disk_positions is None and position_locks is None:
             disk_positions = self.position_manager.get_positions_for_all_miners(sort_positions=True)
 
         eliminations = candidate_data['eliminations']
-        if not self.is_mothership:
-            removed = self.position_manager.elimination_manager.sync_eliminations(eliminations)
-            for hk in removed:
-                self.perf_ledger_hks_to_invalidate[hk] = 0
-
-
-        challenge_period_data = candidate_data.get('challengeperiod')
-        if challenge_period_data:  # Only in autosync as of now.
-            orig_testing_keys = set(self.position_manager.challengeperiod_manager.challengeperiod_testing.keys())
-            orig_success_keys = set(self.position_manager.challengeperiod_manager.challengeperiod_success.keys())
-            new_testing_keys = set(challenge_period_data.get('testing').keys())
-            new_success_keys = set(challenge_period_data.get('success').keys())
-            bt.logging.info(f"Challengeperiod testing sync keys added: {new_testing_keys-orig_testing_keys}\n"
-                            f"Challengeperiod testing sync keys removed: {orig_testing_keys - new_testing_keys}\n"
-                            f"Challengeperiod success sync keys added: {new_success_keys - orig_success_keys}\n"
-                            f"Challengeperiod success sync keys removed: {orig_success_keys - new_success_keys}")
-            if not shadow_mode:
-                self.position_manager.challengeperiod_manager.sync_challenege_period_data(challenge_period_data.get('testing', {}),
-                                                                                          challenge_period_data.get('success', {}))
+        # Orders must not see eliminations and challenge period changes half applied
+        with self.orders_paused() if position_locks is not None else nullcontext():
+            if not self.is_mothership:
+                removed = self.position_manager.elimination_manager.sync_eliminations(eliminations)
+                for hk in removed:
+                    self.perf_ledger_hks_to_invalidate[hk] = 0
+
+
+            challenge_period_data = candidate_data.get('challengeperiod')
+            if challenge_period_data:  # Only in autosync as of now.
+                orig_testing_keys = set(self.position_manager.challengeperiod_manager.challengeperiod_testing.keys())
+                orig_success_keys = set(self.position_manager.challengeperiod_manager.challengeperiod_success.keys())
+                new_testing_keys = set(challenge_period_data.get('testing').keys())
+                new_success_keys = set(challenge_period_data.get('success').keys())
+                bt.logging.info(f"Challengeperiod testing sync keys added: {new_testing_keys-orig_testing_keys}\n"
+                                f"Challengeperiod testing sync keys removed: {orig_testing_keys - new_testing_keys}\n"
+                                f"Challengeperiod success sync keys added: {new_success_keys - orig_success_keys}\n"
+                                f"Challengeperiod success sync keys removed: {orig_success_keys - new_success_keys}")
+                if not shadow_mode:
+                    self.position_manager.challengeperiod_manager.sync_challenege_period_data(challenge_period_data.get('testing', {}),
+                                                                                              challenge_period_data.get('success', {}))
         eliminated_hotkeys = set([e['hotkey'] for e in eliminations])
+
+        snapshot_versions = None
+        if position_locks is not None:
+            # Dedupe before the snapshot so it doesn't hold positions the dedupe deletes
+            for hotkey, positions in candidate_hk_to_positions.items():
+                if hotkey not in eliminated_hotkeys:
+                    self.position_manager.dedupe_positions(positions, hotkey, position_locks)
+            if not shadow_mode:
+                # Read before the positions so a position saved in between shows up as changed since the snapshot
+                snapshot_versions = {hk: self.position_manager.get_position_versions(hk) for hk in candidate_hk_to_positions}
+            if disk_positions is None:
+                disk_positions = self.position_manager.get_positions_for_all_miners(sort_positions=True)
+
         # For a healthy validator, the existing positions will always be a superset of the candidate positions
         for hotkey, positions in candidate_hk_to_positions.items():
             if self.shutdown_dict:
@@ -113,7 +136,8 @@ class ValidatorSyncBase():
             if hotkey in eliminated_hotkeys:
                 self.global_stats['n_miners_skipped_eliminated'] += 1
                 continue
-            self.position_manager.dedupe_positions(positions, hotkey)
+            if position_locks is None:
+                self.position_manager.dedupe_positions(positions, hotkey)
             self.global_stats['n_miners_synced'] += 1
             candidate_positions_by_trade_pair = self.partition_positions_by_trade_pair(positions)
             existing_positions_by_trade_pair = self.partition_positions_by_trade_pair(disk_positions.get(hotkey, []))
@@ -126,12 +150,21 @@ class ValidatorSyncBase():
 
                 try:
                     position_to_sync_status, min_timestamp_of_change, stats = self.resolve_positions(candidate_positions, existing_positions, trade_pair, hotkey, hard_snap_cutoff_ms)
-                    if min_timestamp_of_change != float('inf'):
-                        self.perf_ledger_hks_to_invalidate[hotkey] = (
-                            min_timestamp_of_change) if hotkey not in self.perf_ledger_hks_to_invalidate else (
-                            min(self.perf_ledger_hks_to_invalidate[hotkey], min_timestamp_of_change))
-                        if not shadow_mode:
-                            self.write_modifications(position_to_sync_status, stats)
+                    if min_timestamp_of_change == float('inf'):
+                        continue
+                    if snapshot_versions is None:
+                        self.apply_resolution(hotkey, position_to_sync_status, min_timestamp_of_change, stats, shadow_mode)
+                    else:
+                        with position_locks.get_lock(hotkey, trade_pair.trade_pair_id):
+                            current_versions = self.position_manager.get_position_versions(hotkey)
+                            if current_versions.get(trade_pair.trade_pair_id) != snapshot_versions[hotkey].get(trade_pair.trade_pair_id):
+                                # An order came in for this trade pair since the snapshot. Resolve against the current positions.
+                                self.global_stats['n_trade_pairs_resolved_again'] += 1
+                                existing_positions = [deepcopy(p) for p in self.position_manager.get_positions_for_one_hotkey(hotkey, sort_positions=True)
+                                                      if p.trade_pair == trade_pair]
+                                position_to_sync_status, min_timestamp_of_change, stats = self.resolve_positions(deepcopy(candidate_positions), existing_positions, trade_pair, hotkey, hard_snap_cutoff_ms)
+                            if min_timestamp_of_change != float('inf'):
+                                self.apply_resolution(hotkey, position_to_sync_status, min_timestamp_of_change, stats, shadow_mode)
                 except Exception as e:
                     full_traceback = traceback.format_exc()
                     # Slice the last 1000 characters of the traceback
@@ -161,6 +194,23 @@ class ValidatorSyncBase():
             bt.logging.info(f"  {k}: {v}")
         bt.logging.info(f"Position sync took {time.time() - t0} seconds")
 
+    @contextmanager
+    def orders_paused(self):
+        """
+        Waits for the orders being processed to finish and keeps new ones from starting until exited.
+        """
+        with self.signal_sync_lock:
+            while self.n_orders_being_processed[0] > 0:
+                self.signal_sync_condition.wait()
+            yield
+
+    def apply_resolution(self, hotkey, position_to_sync_status, min_timestamp_of_change, stats, shadow_mode):
+        self.perf_ledger_hks_to_invalidate[hotkey] = (
+            min_timestamp_of_change) if hotkey not in self.perf_ledger_hks_to_invalidate else (
+            min(self.perf_ledger_hks_to_invalidate[hotkey], min_timestamp_of_change))
+        if not shadow_mode:
+            self.write_modifications(position_to_sync_status, stats)
+
     def write_modifications(self, position_to_sync_status, stats):
         # Ensure the enums align with the global stats
         kept_and_matched = stats['kept'] + stats['matched']
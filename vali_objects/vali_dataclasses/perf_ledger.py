@@ -1,24 +1,29 @@
+import heapq
 import json
 import math
 import os
 import time
 import traceback
 from collections import defaultdict
-from copy import deepcopy
 from enum import Enum
+from multiprocessing import Pool
 from typing import List
 import bittensor as bt
+import numpy as np
 from pydantic import BaseModel, ConfigDict
 from setproctitle import setproctitle
 from shared_objects.sn8_multiprocessing import ParallelizationMode, get_spark_session, get_multiprocessing_pool
 from time_util.time_util import MS_IN_8_HOURS, MS_IN_24_HOURS, timeme
 
+from data_generator.candle_store import CandleStore
 from shared_objects.cache_controller import CacheController
 from time_util.time_util import TimeUtil, UnifiedMarketCalendar
 from vali_objects.utils.elimination_manager import EliminationManager, EliminationReason
 from vali_objects.utils.position_manager import PositionManager
 from vali_objects.vali_config import ValiConfig
 from vali_objects.position import Position
+from vali_objects.vali_dataclasses.order import Order, ORDER_SRC_ELIMINATION_FLAT
+from vali_objects.vali_dataclasses import perf_ledger_store
 from vali_objects.utils.live_price_fetcher import LivePriceFetcher
 from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
 from vali_objects.utils.vali_utils import ValiUtils
@@ -78,6 +83,72 @@ class FeeCache():
         self.carry_fee_next_increase_time_ms = next_update_time_ms
         return self.carry_fee, True
 
+class PositionReplayState():
+    """
+    Rolls a copy of a position forward one order at a time so historical snapshots of it can be produced without a
+    deepcopy and full rebuild for every order event. Snapshots share Order objects with the source position and only
+    own their orders list.
+    """
+    def __init__(self, position: Position):
+        self.position = position
+        self.state = self.rebuild([])
+
+    def rebuild(self, orders: list[Order]) -> Position:
+        p = self.position.model_copy(update={'orders': list(orders)})
+        p.rebuild_position_with_updated_orders()
+        return p
+
+    def snapshot(self) -> Position:
+        return self.state.model_copy(update={'orders': list(self.state.orders)})
+
+    def _is_prefix(self, orders: list[Order]) -> bool:
+        return len(self.state.orders) == len(orders) and all(a is b for a, b in zip(self.state.orders, orders))
+
+    def advance(self, new_orders: list[Order]) -> (Position, Position):
+        """
+        Returns the position before and after the last order in new_orders. Falls back to a rebuild whenever
+        stepping could diverge from it: out of order events, closed or liquidated state, and elimination orders
+        (which skip return recalculation and so depend on the fees of the full order list).
+        """
+        if not self._is_prefix(new_orders[:-1]):
+            self.state = self.rebuild(new_orders[:-1])
+        position_at_start = self.snapshot()
+
+        order = new_orders[-1]
+        if self.state.is_closed_position or order.src == ORDER_SRC_ELIMINATION_FLAT:
+            self.state = self.rebuild(new_orders)
+        else:
+            self.state.orders.append(order)
+            self.state.apply_order_to_state(order)
+        return position_at_start, self.snapshot()
+
+
+class PerfLedgerJournal():
+    """
+    Undo log for an in place ledger bundle update. Updates only append checkpoints, modify the tail checkpoint,
+    swap the cps list on purge, and change a couple of scalars, so that is all we need to record.
+    """
+    def __init__(self, perf_ledger_bundle: dict[str, 'PerfLedger']):
+        self.perf_ledger_bundle = perf_ledger_bundle
+        self.entries = {}
+        for tp_id, pl in perf_ledger_bundle.items():
+            last_cp = pl.cps[-1].model_copy() if pl.cps else None
+            self.entries[tp_id] = (pl, pl.cps, len(pl.cps), last_cp, pl.max_return, pl.initialization_time_ms)
+
+    def rollback(self):
+        for tp_id in list(self.perf_ledger_bundle.keys()):
+            if tp_id not in self.entries:
+                del self.perf_ledger_bundle[tp_id]
+        for tp_id, (pl, cps, n_cps, last_cp, max_return, initialization_time_ms) in self.entries.items():
+            del cps[n_cps:]
+            if last_cp is not None:
+                cps[-1] = last_cp
+            pl.cps = cps
+            pl.max_return = max_return
+            pl.initialization_time_ms = initialization_time_ms
+            self.perf_ledger_bundle[tp_id] = pl
+
+
 # Enum class TradePairReturnStatus with 3 options 1. TP_MARKET_NOT_OPEN, TP_MARKET_OPEN_NO_PRICE_CHANGE, TP_MARKET_OPEN_PRICE_CHANGE
 class TradePairReturnStatus(Enum):
     TP_NO_OPEN_POSITIONS = 0
@@ -335,6 +406,79 @@ class PerfLedger():
                                  current_portfolio_carry, miner_hotkey, any_open)
         self.update_accumulated_time(current_cp, now_ms, miner_hotkey, any_open, tp_debug)
 
+    def update_pl_batch(self, t_ms: np.ndarray, portfolio_values: np.ndarray, any_open: np.ndarray,
+                        spread_fees: np.ndarray, carry_fees: np.ndarray, miner_hotkey: str):
+        """
+        Equivalent to calling update_pl once per tick but applies every tick that lands in the same checkpoint as a
+        single array operation. Only ticks that roll over into a new checkpoint go through the scalar path.
+
+        t_ms must be sorted. any_open holds TradePairReturnStatus values.
+        """
+        n_ticks = len(t_ms)
+        i = 0
+        while i < n_ticks:
+            if not self.cps or t_ms[i] < self.cps[-1].last_update_ms:
+                # Scalar path handles initialization and raises on time travel like update_pl does.
+                self._update_pl_tick(t_ms, portfolio_values, any_open, spread_fees, carry_fees, miner_hotkey, i)
+                i += 1
+                continue
+
+            cp = self.cps[-1]
+            cp_end_ms = cp.lowerbound_time_created_ms + self.target_cp_duration_ms
+            j = i + int(np.searchsorted(t_ms[i:], cp_end_ms, side='right'))
+            if j > i:
+                self._update_cp_with_ticks(cp, t_ms[i:j], portfolio_values[i:j], any_open[i:j],
+                                           spread_fees[i:j], carry_fees[i:j])
+            if j < n_ticks:
+                self._update_pl_tick(t_ms, portfolio_values, any_open, spread_fees, carry_fees, miner_hotkey, j)
+            i = j + 1
+
+    def _update_pl_tick(self, t_ms, portfolio_values, any_open, spread_fees, carry_fees, miner_hotkey, i):
+        self.update_pl(float(portfolio_values[i]), int(t_ms[i]), miner_hotkey, TradePairReturnStatus(int(any_open[i])),
+                       float(spread_fees[i]), float(carry_fees[i]))
+
+    @staticmethod
+    def _sequential_sum(initial: float, values: np.ndarray) -> float:
+        # cumsum accumulates left to right, matching repeated "+=" on a python float.
+        if len(values) == 0:
+            return initial
+        return float(np.cumsum(np.concatenate(([initial], values)))[-1])
+
+    def _update_cp_with_ticks(self, cp: PerfCheckpoint, t_ms, portfolio_values, any_open, spread_fees, carry_fees):
+        running_max = np.maximum.accumulate(np.concatenate(([self.max_return], portfolio_values)))[1:]
+        point_in_time_dd = 1.0 + ((portfolio_values - running_max) / running_max)
+        if not np.all(point_in_time_dd):
+            idx = int(np.argmin(point_in_time_dd != 0))
+            time_formatted = TimeUtil.millis_to_verbose_formatted_date_str(int(t_ms[idx]))
+            raise Exception(f'point_in_time_dd is {point_in_time_dd[idx]} at time {time_formatted}. '
+                            f'any_open: {TradePairReturnStatus(int(any_open[idx]))}, '
+                            f'current_portfolio_value: {portfolio_values[idx]}, self.max_return: {running_max[idx]}')
+        cp.mdd = float(min(cp.mdd, point_in_time_dd.min()))
+
+        prev_values = np.concatenate(([cp.prev_portfolio_ret], portfolio_values[:-1]))
+        delta_return = np.log(portfolio_values / prev_values)
+        cp.gain = self._sequential_sum(cp.gain, delta_return[delta_return > 0])
+        cp.loss = self._sequential_sum(cp.loss, delta_return[delta_return < 0])
+        cp.n_updates += int(np.count_nonzero(delta_return))
+
+        prev_carry = np.concatenate(([cp.prev_portfolio_carry_fee], carry_fees[:-1]))
+        changed = prev_carry != carry_fees
+        cp.carry_fee_loss = self._sequential_sum(cp.carry_fee_loss, np.log(carry_fees[changed] / prev_carry[changed]))
+        prev_spread = np.concatenate(([cp.prev_portfolio_spread_fee], spread_fees[:-1]))
+        changed = prev_spread != spread_fees
+        cp.spread_fee_loss = self._sequential_sum(cp.spread_fee_loss, np.log(spread_fees[changed] / prev_spread[changed]))
+
+        cp.prev_portfolio_ret = float(portfolio_values[-1])
+        cp.prev_portfolio_spread_fee = float(spread_fees[-1])
+        cp.prev_portfolio_carry_fee = float(carry_fees[-1])
+        cp.mpv = float(max(cp.mpv, portfolio_values.max()))
+
+        accumulated_time = np.diff(np.concatenate(([cp.last_update_ms], t_ms)))
+        cp.accum_ms += int(accumulated_time.sum())
+        cp.open_ms += int(accumulated_time[any_open >= TradePairReturnStatus.TP_MARKET_OPEN_NO_PRICE_CHANGE.value].sum())
+        cp.last_update_ms = int(t_ms[-1])
+        self.max_return = float(running_max[-1])
+
 
     def count_events(self):
         # Return the number of events currently stored
@@ -360,7 +504,8 @@ class PerfLedgerManager(CacheController):
     def __init__(self, metagraph, ipc_manager=None, running_unit_tests=False, shutdown_dict=None,
                  perf_ledger_hks_to_invalidate=None, live_price_fetcher=None, position_manager=None,
                  enable_rss=True, is_backtesting=False, parallel_mode=ParallelizationMode.SERIAL, secrets=None,
-                 build_portfolio_ledgers_only=False, target_ledger_window_ms=TARGET_LEDGER_WINDOW_MS):
+                 build_portfolio_ledgers_only=False, target_ledger_window_ms=TARGET_LEDGER_WINDOW_MS,
+                 use_vectorized_engine=True, use_candle_store=None, n_ledger_workers=0):
         super().__init__(metagraph=metagraph, running_unit_tests=running_unit_tests, is_backtesting=is_backtesting)
 
         self.shutdown_dict = shutdown_dict
@@ -371,6 +516,14 @@ class PerfLedgerManager(CacheController):
         bt.logging.info(f"Running performance ledger manager with parallel_mode {self.parallel_mode.name}")
 
         self.build_portfolio_ledgers_only = build_portfolio_ledgers_only
+        # Compute returns over whole windows with numpy instead of stepping one tick at a time.
+        self.use_vectorized_engine = use_vectorized_engine
+        # Persist settled candles on disk so rebuilds and restarts only fetch missing ranges.
+        self.use_candle_store = not running_unit_tests if use_candle_store is None else use_candle_store
+        self.candle_store = None
+        # Shard hotkeys across a local process pool when > 1. Created lazily inside the ledger process.
+        self.n_ledger_workers = n_ledger_workers
+        self.ledger_worker_pool = None
         if perf_ledger_hks_to_invalidate is None:
             self.perf_ledger_hks_to_invalidate = {}
         else:
@@ -389,6 +542,8 @@ class PerfLedgerManager(CacheController):
 
         # Every update, pick a hotkey to rebuild in case polygon 1s candle data changed.
         self.trade_pair_to_price_info = {'second':{}, 'minute':{}}
+        # Sorted (ms, close) arrays of trade_pair_to_price_info, rebuilt after each refresh
+        self.trade_pair_to_price_arrays = {'second': {}, 'minute': {}}
         self.trade_pair_to_position_ret = {}
 
         self.random_security_screenings = set()
@@ -410,6 +565,7 @@ class PerfLedgerManager(CacheController):
         self.mode_to_n_updates = {}
         self.update_to_n_open_positions = {}
         self.position_uuid_to_cache = defaultdict(FeeCache)
+        self.position_uuid_to_replay_state = {}
         self.target_ledger_window_ms = target_ledger_window_ms
         if self.is_backtesting or self.parallel_mode != ParallelizationMode.SERIAL:
             initial_perf_ledgers = {}
@@ -458,33 +614,47 @@ class PerfLedgerManager(CacheController):
         return ans
 
 
-    def get_perf_ledgers(self, portfolio_only=True, from_disk=False) -> dict[str, dict[str, PerfLedger]] | dict[str, PerfLedger]:
+    def parse_legacy_perf_ledgers(self, data: dict, portfolio_only=True) -> dict[str, dict[str, PerfLedger]] | dict[str, PerfLedger]:
         ret = {}
-        if from_disk:
-            file_path = ValiBkpUtils.get_perf_ledgers_path(self.running_unit_tests)
-            if not os.path.exists(file_path):
-                return ret
+        for hk, possible_bundles in data.items():
+            if self._is_v1_perf_ledger(possible_bundles):
+                if portfolio_only:
+                    ret[hk] = PerfLedger.from_dict(possible_bundles)  # v1 is portfolio ledgers. Fake it.
+                else:
+                    # Incompatible but we can fake it for now.
+                    if 'initialization_time_ms' in possible_bundles:
+                        ret[hk] = {TP_ID_PORTFOLIO: PerfLedger.from_dict(possible_bundles)}
+                    elif TP_ID_PORTFOLIO in possible_bundles:
+                        ret[hk] = {TP_ID_PORTFOLIO: PerfLedger.from_dict(possible_bundles[TP_ID_PORTFOLIO])}
 
-            with open(file_path, 'r') as file:
+            else:
+                if portfolio_only:
+                    ret[hk] = PerfLedger.from_dict(possible_bundles[TP_ID_PORTFOLIO])
+                else:
+                    ret[hk] = {k: PerfLedger.from_dict(v) for k, v in possible_bundles.items()}
+        return ret
+
+    def get_perf_ledger_store(self):
+        store = perf_ledger_store.PerfLedgerStore(running_unit_tests=self.running_unit_tests)
+        legacy_file_path = ValiBkpUtils.get_perf_ledgers_path(self.running_unit_tests)
+        if not store.exists() and os.path.exists(legacy_file_path):
+            with open(legacy_file_path, 'r') as file:
                 data = json.load(file)
+            n_written = store.save(self.parse_legacy_perf_ledgers(data, portfolio_only=False))
+            bt.logging.info(f"Migrated {n_written} perf ledger bundles from {legacy_file_path} to {store.store_dir}. "
+                            f"The json file is no longer updated.")
+        return store
 
-            for hk, possible_bundles in data.items():
-                if self._is_v1_perf_ledger(possible_bundles):
-                    if portfolio_only:
-                        ret[hk] = PerfLedger.from_dict(possible_bundles)  # v1 is portfolio ledgers. Fake it.
-                    else:
-                        # Incompatible but we can fake it for now.
-                        if 'initialization_time_ms' in possible_bundles:
-                            ret[hk] = {TP_ID_PORTFOLIO: PerfLedger.from_dict(possible_bundles)}
-                        elif TP_ID_PORTFOLIO in possible_bundles:
-                            ret[hk] = {TP_ID_PORTFOLIO: PerfLedger.from_dict(possible_bundles[TP_ID_PORTFOLIO])}
-
-                else:
-                    if portfolio_only:
-                        ret[hk] = PerfLedger.from_dict(possible_bundles[TP_ID_PORTFOLIO])
-                    else:
-                        ret[hk] = {k: PerfLedger.from_dict(v) for k, v in possible_bundles.items()}
-            return ret
+    def get_perf_ledgers(self, portfolio_only=True, from_disk=False) -> dict[str, dict[str, PerfLedger]] | dict[str, PerfLedger]:
+        if from_disk:
+            store = self.get_perf_ledger_store()
+            bundles = store.load()
+            for hk in store.inconsistent_hotkeys:
+                # Rebuilt from scratch on the next update and left out of scoring until then
+                self.perf_ledger_hks_to_invalidate[hk] = 0
+            if portfolio_only:
+                return {hk: bundle[TP_ID_PORTFOLIO] for hk, bundle in bundles.items() if TP_ID_PORTFOLIO in bundle}
+            return bundles
 
         # Everything here is in v2 format
         if portfolio_only:
@@ -529,6 +699,7 @@ class PerfLedgerManager(CacheController):
     def clear_perf_ledgers_from_disk(self):
         assert self.running_unit_tests, 'this is only valid for unit tests'
         self.hotkey_to_perf_bundle = {}
+        perf_ledger_store.PerfLedgerStore(running_unit_tests=self.running_unit_tests).clear()
         file_path = ValiBkpUtils.get_perf_ledgers_path(self.running_unit_tests)
         if os.path.exists(file_path):
             ValiBkpUtils.write_file(file_path, {})
@@ -538,6 +709,10 @@ class PerfLedgerManager(CacheController):
 
     @staticmethod
     def clear_perf_ledgers_from_disk_autosync(hotkeys:list):
+        store = perf_ledger_store.PerfLedgerStore()
+        if store.exists():
+            store.retain_hotkeys(hotkeys)
+
         file_path = ValiBkpUtils.get_perf_ledgers_path()
         filtered_data = {}
         if os.path.exists(file_path):
@@ -566,21 +741,21 @@ class PerfLedgerManager(CacheController):
                 bt.logging.error(traceback.format_exc())
                 time.sleep(30)
             time.sleep(1)
+        self.close_ledger_worker_pool()
 
     def get_historical_position(self, position: Position, timestamp_ms: int):
         hk = position.miner_hotkey  # noqa: F841
 
         new_orders = []
-        position_at_start_timestamp = deepcopy(position)
-        position_at_end_timestamp = deepcopy(position)
         for o in position.orders:
             if o.processed_ms <= timestamp_ms:
                 new_orders.append(o)
 
-        position_at_start_timestamp.orders = new_orders[:-1]
-        position_at_start_timestamp.rebuild_position_with_updated_orders()
-        position_at_end_timestamp.orders = new_orders
-        position_at_end_timestamp.rebuild_position_with_updated_orders()
+        replay_state = self.position_uuid_to_replay_state.get(position.position_uuid)
+        if replay_state is None or replay_state.position is not position:
+            replay_state = PositionReplayState(position)
+            self.position_uuid_to_replay_state[position.position_uuid] = replay_state
+        position_at_start_timestamp, position_at_end_timestamp = replay_state.advance(new_orders)
         # Handle position that was forced closed due to realtime data (liquidated)
         if len(new_orders) == len(position.orders) and position.return_at_close == 0:
             position_at_end_timestamp.return_at_close = 0
@@ -743,9 +918,8 @@ class PerfLedgerManager(CacheController):
             raise Exception(f"Unknown mode: {mode}")
 
     def refresh_price_info(self, t_ms, end_time_ms, tp, mode):
-        def populate_price_info(pi, price_info_raw):
-            for a in price_info_raw:
-                pi[a.timestamp] = a.close
+        def populate_price_info(pi, closes):
+            pi.update(closes)
 
         min_candles_per_request = 3600 if mode == 'second' else 1440
         existing_lb_ms = None
@@ -778,10 +952,18 @@ class PerfLedgerManager(CacheController):
             live_price_fetcher = LivePriceFetcher(self.secrets, disable_ws=True)
             self.pds = live_price_fetcher.polygon_data_service
 
-        price_info_raw = self.pds.unified_candle_fetcher(
-            trade_pair=tp, start_timestamp_ms=start_time_ms, end_timestamp_ms=end_time_ms, timespan=mode)
+        if self.use_candle_store:
+            if self.candle_store is None:
+                self.candle_store = CandleStore(self.pds, running_unit_tests=self.running_unit_tests,
+                                                settle_ms=self.UPDATE_LOOKBACK_MS)
+            n_fetches_before = self.candle_store.n_fetches
+            price_info_raw = self.candle_store.get_closes(tp, start_time_ms, end_time_ms, mode)
+            self.n_api_calls += self.candle_store.n_fetches - n_fetches_before
+        else:
+            price_info_raw = {a.timestamp: a.close for a in self.pds.unified_candle_fetcher(
+                trade_pair=tp, start_timestamp_ms=start_time_ms, end_timestamp_ms=end_time_ms, timespan=mode)}
+            self.n_api_calls += 1
         self.tp_to_mfs.update(self.pds.tp_to_mfs)
-        self.n_api_calls += 1
         #print(f'Fetched candles for tp {tp.trade_pair} for window {TimeUtil.millis_to_formatted_date_str(start_time_ms)} to {TimeUtil.millis_to_formatted_date_str(end_time_ms)}')
         #print(f'Got {len(price_info)} candles after request of {requested_seconds} candles for tp {tp.trade_pair} in {time.time() - t0}s')
 
@@ -808,6 +990,7 @@ class PerfLedgerManager(CacheController):
             self.trade_pair_to_price_info[mode][tp.trade_pair_id]['ub_ms'] = max(existing_ub_ms, end_time_ms)
             self.trade_pair_to_price_info[mode][tp.trade_pair_id]['lb_ms'] = min(existing_lb_ms, start_time_ms)
             populate_price_info(self.trade_pair_to_price_info[mode][tp.trade_pair_id], price_info_raw)
+        self.trade_pair_to_price_arrays[mode].pop(tp.trade_pair_id, None)
 
         #print(f'Fetched {requested_seconds} s of candles for tp {tp.trade_pair} in {time.time() - t0}s')
         #print('22222', tp.trade_pair, trade_pair_to_price_info.keys())
@@ -976,6 +1159,253 @@ class PerfLedgerManager(CacheController):
                     print(f'        position {p} ')
 
 
+    def get_update_schedule(self, default_mode, start_time_ms, end_time_ms) -> (np.ndarray, np.ndarray):
+        """
+        Returns every tick time visited by the build_perf_ledger loop between start_time_ms (inclusive) and
+        end_time_ms (exclusive) along with a mask of which ticks are processed in minute mode.
+        Mirrors get_current_update_mode / inc_accumulated_time.
+        """
+        if default_mode == 'second':
+            t_ms = np.arange(start_time_ms, end_time_ms, 1000, dtype=np.int64)
+            return t_ms, np.zeros(len(t_ms), dtype=bool)
+        elif default_mode != 'minute':
+            raise Exception(f"Unknown mode: {default_mode}")
+
+        # Seconds until the candidate time reaches a minute boundary
+        n_leading_seconds = (-(start_time_ms // 1000)) % 60
+        minute_start_ms = start_time_ms + n_leading_seconds * 1000
+        leading = np.arange(start_time_ms, min(minute_start_ms, end_time_ms), 1000, dtype=np.int64)
+        if minute_start_ms >= end_time_ms:
+            return leading, np.zeros(len(leading), dtype=bool)
+
+        # Minutes while the candidate is more than one minute from the end. Then seconds until the end.
+        minute_candidate_ms = (minute_start_ms // 1000) * 1000
+        n_minutes = max(0, -(-(end_time_ms - 60000 - minute_candidate_ms) // 60000))
+        minutes = minute_start_ms + np.arange(n_minutes, dtype=np.int64) * 60000
+        trailing = np.arange(minute_start_ms + n_minutes * 60000, end_time_ms, 1000, dtype=np.int64)
+        t_ms = np.concatenate((leading, minutes, trailing))
+        is_minute = np.zeros(len(t_ms), dtype=bool)
+        is_minute[len(leading):len(leading) + n_minutes] = True
+        return t_ms, is_minute
+
+    def market_open_mask(self, positions: list[Position], t_ms: np.ndarray) -> list[np.ndarray]:
+        return [self.market_calendar.market_open_mask(p.trade_pair, t_ms) for p in positions]
+
+    def prices_at_ticks(self, trade_pair, mode, t_ms: np.ndarray, end_time_ms: int) -> np.ndarray:
+        """
+        Candle close at each (aligned, sorted) tick or NaN if no candle exists. Refreshes the price info exactly when
+        the tick loop would.
+        """
+        ans = np.full(len(t_ms), np.nan)
+        i = 0
+        while i < len(t_ms):
+            self.refresh_price_info(int(t_ms[i]), end_time_ms, trade_pair, mode)
+            price_info = self.trade_pair_to_price_info[mode][trade_pair.trade_pair_id]
+            j = i + max(1, int(np.searchsorted(t_ms[i:], price_info['ub_ms'], side='right')))
+            candle_ms, closes = self.price_arrays(trade_pair, mode)
+            if len(candle_ms):
+                idx = np.minimum(np.searchsorted(candle_ms, t_ms[i:j]), len(candle_ms) - 1)
+                found = candle_ms[idx] == t_ms[i:j]
+                ans[i:j][found] = closes[idx[found]]
+            i = j
+        return ans
+
+    def price_arrays(self, trade_pair, mode) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Sorted candle times and closes of the trade pair's price info. Built once per refresh.
+        """
+        tp_id = trade_pair.trade_pair_id
+        arrays = self.trade_pair_to_price_arrays[mode].get(tp_id)
+        if arrays is None:
+            price_info = self.trade_pair_to_price_info[mode][tp_id]
+            items = sorted((t, c) for t, c in price_info.items() if t not in ('lb_ms', 'ub_ms'))
+            arrays = (np.array([t for t, _ in items], dtype=np.int64), np.array([c for _, c in items], dtype=float))
+            self.trade_pair_to_price_arrays[mode][tp_id] = arrays
+        return arrays
+
+    def carry_fees_at_ticks(self, position: Position, t_ms: np.ndarray) -> np.ndarray:
+        # Carry fees are piecewise constant. Only query the fee cache when a tick crosses into a new interval.
+        fee_cache = self.position_uuid_to_cache[position.position_uuid]
+        ans = np.empty(len(t_ms))
+        i = 0
+        while i < len(t_ms):
+            carry_fee, _ = fee_cache.get_carry_fee(int(t_ms[i]), position)
+            j = max(i + 1, int(np.searchsorted(t_ms, fee_cache.carry_fee_next_increase_time_ms, side='left')))
+            ans[i:j] = carry_fee
+            i = j
+        return ans
+
+    def positions_to_portfolio_returns_vectorized(self, tp_ids_to_build, tp_to_historical_positions_dense: dict[str: Position],
+                                                  t_ms: np.ndarray, is_minute: np.ndarray, end_time_ms,
+                                                  tp_to_initial_return, tp_to_initial_spread_fee, tp_to_initial_carry_fee):
+        """
+        Answers "What is the portfolio return at each of these times?" for a window with no new orders.
+        Equivalent to calling positions_to_portfolio_return once per tick. Each dense position is left in the state it
+        would have after the final tick. Returns the per tp_id arrays and the index of the first tick where the
+        portfolio is liquidated (or None).
+        """
+        n_ticks = len(t_ms)
+        aligned_t_ms = np.where(is_minute, t_ms - t_ms % 60000, t_ms - t_ms % 1000)
+        tp_to_any_open = {x: np.full(n_ticks, TradePairReturnStatus.TP_NO_OPEN_POSITIONS.value) for x in tp_ids_to_build}
+        tp_to_return = {x: np.full(n_ticks, v) for x, v in tp_to_initial_return.items()}
+        tp_to_spread_fee = {x: np.full(n_ticks, v) for x, v in tp_to_initial_spread_fee.items()}
+        tp_to_carry_fee = {x: np.full(n_ticks, v) for x, v in tp_to_initial_carry_fee.items()}
+
+        dense = [(tp_id, p) for tp_id, historical_positions in tp_to_historical_positions_dense.items()
+                 for p in historical_positions]
+        for tp_id, historical_positions in tp_to_historical_positions_dense.items():
+            assert len(historical_positions) < 2, ('maybe a recently opened position?', historical_positions)
+        market_open = self.market_open_mask([p for _, p in dense], aligned_t_ms)
+
+        position_states = []
+        for (tp_id, historical_position), is_open in zip(dense, market_open):
+            tp_ids = [TP_ID_PORTFOLIO] if self.build_portfolio_ledgers_only else [tp_id, TP_ID_PORTFOLIO]
+            position_spread_fee, _ = self.position_uuid_to_cache[historical_position.position_uuid].get_spread_fee(
+                historical_position, int(aligned_t_ms[0]))
+            position_carry_fee = self.carry_fees_at_ticks(historical_position, aligned_t_ms)
+            total_fees = position_spread_fee * position_carry_fee
+
+            prices = np.full(n_ticks, np.nan)
+            for mode, mode_mask in (('second', ~is_minute), ('minute', is_minute)):
+                idx = np.flatnonzero(is_open & mode_mask)
+                if len(idx):
+                    prices[idx] = self.prices_at_ticks(historical_position.trade_pair, mode, aligned_t_ms[idx], end_time_ms)
+
+            # A price only moves the position when it differs from the last seen price for the trade pair.
+            has_price = ~np.isnan(prices)
+            price_idx = np.flatnonzero(has_price)
+            last_price = self.tp_to_last_price.get(tp_id, None)
+            previous_prices = np.concatenate(([np.nan if last_price is None else last_price], prices[price_idx[:-1]]))
+            changed_idx = price_idx[prices[price_idx] != previous_prices]
+
+            current_returns = historical_position.calculate_pnl_batch(prices[changed_idx], aligned_t_ms[changed_idx])
+            # Forward fill returns between price changes and between open ticks
+            current_return = np.full(n_ticks, float(historical_position.current_return))
+            if len(changed_idx):
+                current_return[changed_idx[0]:] = np.repeat(current_returns, np.diff(np.append(changed_idx, n_ticks)))
+            return_at_close = current_return * total_fees
+            open_idx = np.maximum.accumulate(np.where(is_open, np.arange(n_ticks), -1))
+            return_at_close = np.where(open_idx >= 0, return_at_close[np.maximum(open_idx, 0)],
+                                       float(historical_position.return_at_close))
+
+            status = np.where(is_open, TradePairReturnStatus.TP_MARKET_OPEN_NO_PRICE_CHANGE.value,
+                              TradePairReturnStatus.TP_MARKET_NOT_OPEN.value)
+            status[changed_idx] = TradePairReturnStatus.TP_MARKET_OPEN_PRICE_CHANGE.value
+            for x in tp_ids:
+                tp_to_spread_fee[x] *= position_spread_fee
+                tp_to_carry_fee[x] *= position_carry_fee
+                tp_to_return[x] *= return_at_close
+                tp_to_any_open[x] = np.maximum(tp_to_any_open.get(x, TradePairReturnStatus.TP_NO_OPEN_POSITIONS.value), status)
+            position_states.append((tp_id, historical_position, prices, has_price, changed_idx, current_return,
+                                    return_at_close, is_open))
+
+        zero_idx = np.flatnonzero(tp_to_return[TP_ID_PORTFOLIO] == 0)
+        liquidation_idx = int(zero_idx[0]) if len(zero_idx) else None
+        last_idx = n_ticks - 1 if liquidation_idx is None else liquidation_idx
+        for tp_id, historical_position, prices, has_price, changed_idx, current_return, return_at_close, is_open in position_states:
+            changed_idx = changed_idx[changed_idx <= last_idx]
+            if len(changed_idx):
+                historical_position.current_return = float(current_return[changed_idx[-1]])
+                self.trade_pair_to_position_ret[tp_id] = float(return_at_close[changed_idx[-1]])
+            if is_open[:last_idx + 1].any():
+                historical_position.return_at_close = float(return_at_close[last_idx])
+            price_idx = np.flatnonzero(has_price[:last_idx + 1])
+            if len(price_idx):
+                self.tp_to_last_price[tp_id] = float(prices[price_idx[-1]])
+            if len(changed_idx) and historical_position.current_return == 0:
+                historical_position._handle_liquidation(int(aligned_t_ms[changed_idx[-1]]))
+
+        return tp_to_return, tp_to_any_open, tp_to_spread_fee, tp_to_carry_fee, liquidation_idx
+
+    def log_significant_portfolio_drops(self, is_minute, portfolio_returns, perf_ledger_bundle, t_ms, miner_hotkey,
+                                        open_positions_tp_ids, start_time_ms, end_time_ms):
+        portfolio_pl = perf_ledger_bundle[TP_ID_PORTFOLIO]
+        prev_returns = np.concatenate(([portfolio_pl.cps[-1].prev_portfolio_ret], portfolio_returns[:-1]))
+        ratio_drop = portfolio_returns / prev_returns
+        for i in np.flatnonzero(np.where(is_minute, ratio_drop < .90, ratio_drop < 0.98)):
+            print(f'perf ledger for hk {miner_hotkey} significant return drop on {TimeUtil.millis_to_formatted_date_str(int(t_ms[i]))} '
+                  f'from {prev_returns[i]} to {portfolio_returns[i]} when building up to {TimeUtil.millis_to_formatted_date_str(start_time_ms)} '
+                  f'and {TimeUtil.millis_to_formatted_date_str(end_time_ms)} with open_positions_tp_ids {open_positions_tp_ids} ',
+                  self.trade_pair_to_position_ret, 'minute' if is_minute[i] else 'second')
+
+    def build_perf_ledger_vectorized(self, perf_ledger_bundle, tp_ids_to_build, tp_to_historical_positions,
+                                     tp_to_historical_positions_dense, open_positions_tp_ids, default_mode, start_time_ms,
+                                     end_time_ms, miner_hotkey, tp_to_initial_return, tp_to_initial_spread_fee,
+                                     tp_to_initial_carry_fee):
+        """
+        Vectorized replacement for the tick loop in build_perf_ledger. Returns (eliminated, tp_to_current_return,
+        tp_to_any_open, tp_to_current_spread_fee, tp_to_current_carry_fee) where the dicts hold the last tick's values.
+        """
+        t_ms, is_minute = self.get_update_schedule(default_mode, start_time_ms, end_time_ms)
+        assert len(t_ms) and t_ms[0] >= perf_ledger_bundle[TP_ID_PORTFOLIO].last_update_ms, \
+            (start_time_ms, end_time_ms, perf_ledger_bundle[TP_ID_PORTFOLIO].last_update_ms)
+
+        tp_to_return, tp_to_any_open, tp_to_spread_fee, tp_to_carry_fee, liquidation_idx = \
+            self.positions_to_portfolio_returns_vectorized(tp_ids_to_build, tp_to_historical_positions_dense, t_ms,
+                                                           is_minute, end_time_ms, tp_to_initial_return,
+                                                           tp_to_initial_spread_fee, tp_to_initial_carry_fee)
+        n_ticks = len(t_ms) if liquidation_idx is None else liquidation_idx
+        n_minute_ticks = int(np.count_nonzero(is_minute[:n_ticks]))
+        self.mode_to_n_updates['minute'] += n_minute_ticks
+        self.mode_to_n_updates['second'] += n_ticks - n_minute_ticks
+
+        self.log_significant_portfolio_drops(is_minute[:n_ticks], tp_to_return[TP_ID_PORTFOLIO][:n_ticks],
+                                             perf_ledger_bundle, t_ms[:n_ticks], miner_hotkey, open_positions_tp_ids,
+                                             start_time_ms, end_time_ms)
+        for tp_id in [TP_ID_PORTFOLIO] if self.build_portfolio_ledgers_only else list(open_positions_tp_ids) + [TP_ID_PORTFOLIO]:
+            perf_ledger_bundle[tp_id].update_pl_batch(t_ms[:n_ticks], tp_to_return[tp_id][:n_ticks],
+                                                      tp_to_any_open[tp_id][:n_ticks], tp_to_spread_fee[tp_id][:n_ticks],
+                                                      tp_to_carry_fee[tp_id][:n_ticks], miner_hotkey)
+
+        if liquidation_idx is not None:
+            self.check_liquidated(miner_hotkey, 0.0, int(t_ms[liquidation_idx]), tp_to_historical_positions)
+            return True, None, None, None, None
+
+        return (False,
+                {x: float(v[-1]) for x, v in tp_to_return.items()},
+                {x: TradePairReturnStatus(int(v[-1])) for x, v in tp_to_any_open.items()},
+                {x: float(v[-1]) for x, v in tp_to_spread_fee.items()},
+                {x: float(v[-1]) for x, v in tp_to_carry_fee.items()})
+
+    def _build_perf_ledger_tick_loop(self, perf_ledger_bundle, tp_ids_to_build, tp_to_historical_positions,
+                                     tp_to_historical_positions_dense, open_positions_tp_ids, default_mode, start_time_ms,
+                                     end_time_ms, miner_hotkey, tp_to_initial_return, tp_to_initial_spread_fee,
+                                     tp_to_initial_carry_fee):
+        """
+        Legacy engine of build_perf_ledger, calling positions_to_portfolio_return once per tick. Same arguments and
+        return value as build_perf_ledger_vectorized.
+        """
+        portfolio_pl = perf_ledger_bundle[TP_ID_PORTFOLIO]
+        accumulated_time_ms = 0
+        while start_time_ms + accumulated_time_ms < end_time_ms:
+            # Need high resolution at the start and end of the time window
+            mode = self.get_current_update_mode(default_mode, start_time_ms, end_time_ms, accumulated_time_ms)
+            t_ms = start_time_ms + accumulated_time_ms
+
+            #if t_ms + 60000 > 1737496980446:
+            #    print('snare')
+
+            assert t_ms >= portfolio_pl.last_update_ms, (f"t_ms: {t_ms}, "
+                                                         f"last_update_ms: {TimeUtil.millis_to_formatted_date_str(portfolio_pl.last_update_ms)},"
+                                                         f"mode: {mode},"
+                                                         f" delta_ms: {(t_ms - portfolio_pl.last_update_ms)} s. perf ledger {portfolio_pl}")
+
+            tp_to_current_return, tp_to_any_open, tp_to_current_spread_fee, tp_to_current_carry_fee = \
+                self.positions_to_portfolio_return(tp_ids_to_build, tp_to_historical_positions_dense, t_ms, mode, end_time_ms, tp_to_initial_return, tp_to_initial_spread_fee, tp_to_initial_carry_fee)
+            portfolio_return = tp_to_current_return[TP_ID_PORTFOLIO]
+
+            if portfolio_return == 0 and self.check_liquidated(miner_hotkey, portfolio_return, t_ms, tp_to_historical_positions):
+                return True, None, None, None, None
+
+            self.debug_significant_portfolio_drop(mode, portfolio_return, perf_ledger_bundle, t_ms, miner_hotkey, tp_to_historical_positions, open_positions_tp_ids, start_time_ms, end_time_ms)
+
+            for tp_id in [TP_ID_PORTFOLIO] if self.build_portfolio_ledgers_only else list(open_positions_tp_ids) + [TP_ID_PORTFOLIO]:
+                perf_ledger_bundle[tp_id].update_pl(tp_to_current_return[tp_id], t_ms, miner_hotkey, tp_to_any_open[tp_id], tp_to_current_spread_fee[tp_id], tp_to_current_carry_fee[tp_id], tp_debug=tp_id)
+
+            accumulated_time_ms = self.inc_accumulated_time(mode, accumulated_time_ms)
+
+        return False, tp_to_current_return, tp_to_any_open, tp_to_current_spread_fee, tp_to_current_carry_fee
+
     def inc_accumulated_time(self, mode, accumulated_time_ms):
         if mode == 'second':
             accumulated_time_ms += 1000
@@ -1062,13 +1492,6 @@ class PerfLedgerManager(CacheController):
         self.update_to_n_open_positions[n_open_positions] += 1
         default_mode = self.get_default_update_mode(start_time_ms, end_time_ms, n_open_positions)
 
-
-        #time_list = list(range(start_time_ms, end_time_ms, step_ms))
-        accumulated_time_ms = 0
-        #mode_to_ticks = {'second': 0, 'minute': 0}
-        #snarey = False
-
-
         # closed positions have the same stats throughout the interval. lets do a single update now
         # so that filling the void using the current state of those position(s)
         for tp_id in tp_ids_to_build:
@@ -1079,32 +1502,19 @@ class PerfLedgerManager(CacheController):
             perf_ledger.update_pl(tp_to_initial_return[tp_id], start_time_ms, miner_hotkey, TradePairReturnStatus.TP_NO_OPEN_POSITIONS,
                                   tp_to_initial_spread_fee[tp_id], tp_to_initial_carry_fee[tp_id])
 
-        while start_time_ms + accumulated_time_ms < end_time_ms:
-            # Need high resolution at the start and end of the time window
-            mode = self.get_current_update_mode(default_mode, start_time_ms, end_time_ms, accumulated_time_ms)
-            t_ms = start_time_ms + accumulated_time_ms
-
-            #if t_ms + 60000 > 1737496980446:
-            #    print('snare')
-
-            assert t_ms >= portfolio_pl.last_update_ms, (f"t_ms: {t_ms}, "
-                                                         f"last_update_ms: {TimeUtil.millis_to_formatted_date_str(portfolio_pl.last_update_ms)},"
-                                                         f"mode: {mode},"
-                                                         f" delta_ms: {(t_ms - portfolio_pl.last_update_ms)} s. perf ledger {portfolio_pl}")
-
-            tp_to_current_return, tp_to_any_open, tp_to_current_spread_fee, tp_to_current_carry_fee = \
-                self.positions_to_portfolio_return(tp_ids_to_build, tp_to_historical_positions_dense, t_ms, mode, end_time_ms, tp_to_initial_return, tp_to_initial_spread_fee, tp_to_initial_carry_fee)
-            portfolio_return = tp_to_current_return[TP_ID_PORTFOLIO]
-
-            if portfolio_return == 0 and self.check_liquidated(miner_hotkey, portfolio_return, t_ms, tp_to_historical_positions):
-                return True
-
-            self.debug_significant_portfolio_drop(mode, portfolio_return, perf_ledger_bundle, t_ms, miner_hotkey, tp_to_historical_positions, open_positions_tp_ids, start_time_ms, end_time_ms)
-
-            for tp_id in [TP_ID_PORTFOLIO] if self.build_portfolio_ledgers_only else list(open_positions_tp_ids) + [TP_ID_PORTFOLIO]:
-                perf_ledger_bundle[tp_id].update_pl(tp_to_current_return[tp_id], t_ms, miner_hotkey, tp_to_any_open[tp_id], tp_to_current_spread_fee[tp_id], tp_to_current_carry_fee[tp_id], tp_debug=tp_id)
-
-            accumulated_time_ms = self.inc_accumulated_time(mode, accumulated_time_ms)
+        if self.use_vectorized_engine:
+            if self.shutdown_dict:
+                return False
+            build_engine = self.build_perf_ledger_vectorized
+        else:
+            build_engine = self._build_perf_ledger_tick_loop
+        eliminated, tp_to_current_return, tp_to_any_open, tp_to_current_spread_fee, tp_to_current_carry_fee = \
+            build_engine(perf_ledger_bundle, tp_ids_to_build, tp_to_historical_positions,
+                         tp_to_historical_positions_dense, open_positions_tp_ids, default_mode, start_time_ms,
+                         end_time_ms, miner_hotkey, tp_to_initial_return, tp_to_initial_spread_fee,
+                         tp_to_initial_carry_fee)
+        if eliminated:
+            return True
 
         # Get last sliver of time for open positions and fill the void for closed positions.
         # This also ensures return aligns with the price baked into the Order object.
@@ -1133,8 +1543,25 @@ class PerfLedgerManager(CacheController):
     def update_one_perf_ledger_bundle(self, hotkey_i: int, n_hotkeys: int, hotkey: str, positions: List[Position],
                                       now_ms: int,
                                       existing_perf_ledger_bundles: dict[str, dict[str, PerfLedger]]) -> None | dict[str, PerfLedger]:
+        # Existing ledgers are rolled forward in place. Undo a partial update so the bundle is left as it was.
+        existing_bundle = existing_perf_ledger_bundles.get(hotkey)
+        journal = None
+        if existing_bundle and not self._is_v1_perf_ledger(existing_bundle):
+            journal = PerfLedgerJournal(existing_bundle)
+        try:
+            return self._update_one_perf_ledger_bundle(hotkey_i, n_hotkeys, hotkey, positions, now_ms,
+                                                       existing_perf_ledger_bundles)
+        except Exception:
+            if journal:
+                journal.rollback()
+            raise
+
+    def _update_one_perf_ledger_bundle(self, hotkey_i: int, n_hotkeys: int, hotkey: str, positions: List[Position],
+                                       now_ms: int,
+                                       existing_perf_ledger_bundles: dict[str, dict[str, PerfLedger]]) -> None | dict[str, PerfLedger]:
 
         eliminated = False
+        self.position_uuid_to_replay_state = {}
         self.n_api_calls = 0
         self.mode_to_n_updates = {'second': 0, 'minute': 0}
         self.tp_to_mfs = {}
@@ -1151,7 +1578,6 @@ class PerfLedgerManager(CacheController):
             perf_ledger_bundle_candidate = {TP_ID_PORTFOLIO: PerfLedger(initialization_time_ms=first_order_time_ms, target_ledger_window_ms=self.target_ledger_window_ms)}
             verbose = True
         else:
-            perf_ledger_bundle_candidate = deepcopy(perf_ledger_bundle_candidate)
             verbose = False
 
         for tp_id, perf_ledger in perf_ledger_bundle_candidate.items():
@@ -1255,7 +1681,7 @@ class PerfLedgerManager(CacheController):
         if self.parallel_mode != ParallelizationMode.SERIAL:
             return perf_ledger_bundle_candidate
         else:
-            # Write candidate at the very end in case an exception leads to a partial update
+            # New bundles are only published once complete. Partial updates of existing ones are rolled back.
             existing_perf_ledger_bundles[hotkey] = perf_ledger_bundle_candidate
 
     @timeme
@@ -1279,7 +1705,12 @@ class PerfLedgerManager(CacheController):
         self.now_ms = now_ms
         self.candidate_pl_elimination_rows = []
         n_hotkeys = len(hotkey_to_positions)
+        hotkeys_to_update = set(hotkey_to_positions.keys())
+        if self.n_ledger_workers > 1 and n_hotkeys > 1:
+            hotkeys_to_update = self.update_perf_ledgers_in_worker_pool(hotkey_to_positions, existing_perf_ledgers, now_ms)
         for hotkey_i, (hotkey, positions) in enumerate(hotkey_to_positions.items()):
+            if hotkey not in hotkeys_to_update:
+                continue
             try:
                 self.update_one_perf_ledger_bundle(hotkey_i, n_hotkeys, hotkey, positions, now_ms, existing_perf_ledgers)
             except Exception as e:
@@ -1301,10 +1732,92 @@ class PerfLedgerManager(CacheController):
         if self.shutdown_dict:
             return
 
-        self.save_perf_ledgers(existing_perf_ledgers)
+        # Only the hotkeys with positions were updated, trimmed or rebuilt
+        self.save_perf_ledgers(existing_perf_ledgers, dirty_hotkeys=set(hotkey_to_positions))
         return existing_perf_ledgers
 
 
+    def get_ledger_worker_pool(self):
+        if self.ledger_worker_pool is None:
+            plm_kwargs = {'running_unit_tests': self.running_unit_tests,
+                          'secrets': self.secrets,
+                          'is_backtesting': self.is_backtesting,
+                          'build_portfolio_ledgers_only': self.build_portfolio_ledgers_only,
+                          'target_ledger_window_ms': self.target_ledger_window_ms,
+                          'use_vectorized_engine': self.use_vectorized_engine,
+                          'use_candle_store': self.use_candle_store}
+            self.ledger_worker_pool = Pool(self.n_ledger_workers, initializer=init_perf_ledger_worker,
+                                           initargs=(plm_kwargs,))
+        return self.ledger_worker_pool
+
+    def close_ledger_worker_pool(self):
+        if self.ledger_worker_pool is not None:
+            self.ledger_worker_pool.terminate()
+            self.ledger_worker_pool.join()
+            self.ledger_worker_pool = None
+
+    def shard_hotkeys(self, hotkey_to_positions: dict[str, List[Position]],
+                      existing_perf_ledgers: dict[str, dict[str, PerfLedger]], now_ms: int, n_shards: int) -> list[list[str]]:
+        # Cost is dominated by the time span left to replay. Assign the most expensive hotkeys first, each onto the
+        # currently lightest shard.
+        def estimated_cost(hotkey):
+            positions = hotkey_to_positions[hotkey]
+            bundle = existing_perf_ledgers.get(hotkey)
+            start_ms = min(p.orders[0].processed_ms for p in positions)
+            if bundle and TP_ID_PORTFOLIO in bundle:
+                start_ms = max(start_ms, bundle[TP_ID_PORTFOLIO].last_update_ms)
+            n_new_orders = sum(1 for p in positions for o in p.orders if o.processed_ms >= start_ms)
+            return max(now_ms - start_ms, 0) + 60000 * n_new_orders
+
+        shards = [[] for _ in range(n_shards)]
+        heap = [(0, i) for i in range(n_shards)]
+        for hotkey in sorted(hotkey_to_positions, key=estimated_cost, reverse=True):
+            load, i = heapq.heappop(heap)
+            shards[i].append(hotkey)
+            heapq.heappush(heap, (load + estimated_cost(hotkey), i))
+        return [x for x in shards if x]
+
+    def update_perf_ledgers_in_worker_pool(self, hotkey_to_positions: dict[str, List[Position]],
+                                           existing_perf_ledgers: dict[str, dict[str, PerfLedger]], now_ms: int) -> set[str]:
+        """
+        Update ledgers across the worker pool. Each shard only carries the positions and existing bundles of its own
+        hotkeys. Results are merged into existing_perf_ledgers once every shard has returned. Returns the hotkeys
+        that still need a serial update because the pool failed.
+        """
+        t0 = time.time()
+        n_hotkeys = len(hotkey_to_positions)
+        hotkey_to_i = {hotkey: i for i, hotkey in enumerate(hotkey_to_positions)}
+        shards = []
+        for hotkeys in self.shard_hotkeys(hotkey_to_positions, existing_perf_ledgers, now_ms, self.n_ledger_workers * 4):
+            shards.append((now_ms, [(hotkey_to_i[hk], n_hotkeys, hk, hotkey_to_positions[hk], existing_perf_ledgers.get(hk))
+                                    for hk in hotkeys]))
+
+        pending = set(hotkey_to_positions.keys())
+        updated_bundles = {}
+        elimination_rows = []
+        hk_to_last_order_processed_ms = {}
+        try:
+            pool = self.get_ledger_worker_pool()
+            for shard_bundles, shard_failures, shard_elimination_rows, shard_last_order_ms in \
+                    pool.imap_unordered(update_perf_ledger_shard, shards):
+                updated_bundles.update(shard_bundles)
+                elimination_rows.extend(shard_elimination_rows)
+                hk_to_last_order_processed_ms.update(shard_last_order_ms)
+                pending -= shard_bundles.keys()
+                pending -= shard_failures
+        except Exception as e:
+            bt.logging.error(f"Perf ledger worker pool failed: {e}. Updating {len(pending)} remaining hotkeys serially.")
+            bt.logging.error(traceback.format_exc())
+            self.close_ledger_worker_pool()
+
+        for hotkey, bundle in updated_bundles.items():
+            existing_perf_ledgers[hotkey] = bundle
+        self.candidate_pl_elimination_rows.extend(elimination_rows)
+        self.hk_to_last_order_processed_ms.update(hk_to_last_order_processed_ms)
+        bt.logging.info(f"Updated {len(updated_bundles)} perf ledger bundles across {self.n_ledger_workers} workers "
+                        f"in {time.time() - t0} s")
+        return pending
+
     def get_positions_perf_ledger(self, testing_one_hotkey=None):
         #testing_one_hotkey = '5GzYKUYSD5d7TJfK4jsawtmS2bZDgFuUYw8kdLdnEDxSykTU'
         hotkeys_with_no_positions = set()
@@ -1516,12 +2029,17 @@ class PerfLedgerManager(CacheController):
             for z in zip(returns, returns_muled, n_contributing_tps):
                 print(z, z[0] - z[1])
 
-    def save_perf_ledgers_to_disk(self, perf_ledgers: dict[str, dict[str, PerfLedger]] | dict[str, dict[str, dict]], raw_json=False):
-        file_path = ValiBkpUtils.get_perf_ledgers_path(self.running_unit_tests)
-        ValiBkpUtils.write_to_dir(file_path, perf_ledgers)
+    def save_perf_ledgers_to_disk(self, perf_ledgers: dict[str, dict[str, PerfLedger]] | dict[str, dict[str, dict]], raw_json=False,
+                                  dirty_hotkeys=None):
+        # Only bundles that changed since the last save are rewritten. dirty_hotkeys limits which ones are checked.
+        bundles = {hk: {tp_id: PerfLedger.from_dict(dict(pl)) if raw_json or isinstance(pl, dict) else pl
+                        for tp_id, pl in bundle.items()}
+                   for hk, bundle in perf_ledgers.items()}
+        self.get_perf_ledger_store().save(bundles, dirty_hotkeys=dirty_hotkeys)
 
     @timeme
-    def save_perf_ledgers(self, perf_ledgers_copy: dict[str, dict[str, PerfLedger]] | dict[str, dict[str, dict]], raw_json=False):
+    def save_perf_ledgers(self, perf_ledgers_copy: dict[str, dict[str, PerfLedger]] | dict[str, dict[str, dict]], raw_json=False,
+                          dirty_hotkeys=None):
         # We may have items in perf_ledger_hks_to_invalidate added after the iteration began.
         # Let's nuke them to allow freed hotkeys to escape elimination.
         for hk, t in self.perf_ledger_hks_to_invalidate.items():
@@ -1530,7 +2048,7 @@ class PerfLedgerManager(CacheController):
                 del perf_ledgers_copy[hk]
 
         if not self.is_backtesting:
-            self.save_perf_ledgers_to_disk(perf_ledgers_copy, raw_json=raw_json)
+            self.save_perf_ledgers_to_disk(perf_ledgers_copy, raw_json=raw_json, dirty_hotkeys=dirty_hotkeys)
 
         # Update memory
         for k in list(self.hotkey_to_perf_bundle.keys()):
@@ -1575,11 +2093,10 @@ class PerfLedgerManager(CacheController):
     def update_one_perf_ledger_parallel(self, data_tuple):
         t0 = time.time()
         hotkey_i, n_hotkeys, hotkey, positions, existing_bundle, now_ms, is_backtesting = data_tuple
-        from tests.shared_objects.mock_classes import MockMetagraph
         # Create a temporary manager for processing
-        # This is to avoid sharing state between executors
+        # This is to avoid sharing state between executors. Ledger updates don't read the metagraph.
         worker_plm = PerfLedgerManager(
-            metagraph=MockMetagraph(hotkeys=[hotkey]),
+            metagraph=None,
             parallel_mode=self.parallel_mode,
             secrets=self.secrets,
             build_portfolio_ledgers_only=self.build_portfolio_ledgers_only,
@@ -1653,6 +2170,36 @@ class PerfLedgerManager(CacheController):
         return updated_perf_ledgers
 
 
+# Per process manager for the live worker pool. Kept between shards so price windows and fee caches stay warm.
+worker_perf_ledger_manager = None
+
+def init_perf_ledger_worker(plm_kwargs):
+    global worker_perf_ledger_manager
+    setproctitle("vali_PerfLedgerWorker")
+    worker_perf_ledger_manager = PerfLedgerManager(metagraph=None, enable_rss=False,
+                                                   parallel_mode=ParallelizationMode.MULTIPROCESSING, **plm_kwargs)
+
+def update_perf_ledger_shard(shard):
+    now_ms, items = shard
+    plm = worker_perf_ledger_manager
+    plm.now_ms = now_ms
+    plm.candidate_pl_elimination_rows = []
+    hotkey_to_bundle = {}
+    failures = set()
+    for hotkey_i, n_hotkeys, hotkey, positions, existing_bundle in items:
+        try:
+            existing_perf_ledger_bundles = {hotkey: existing_bundle} if existing_bundle else {}
+            hotkey_to_bundle[hotkey] = plm.update_one_perf_ledger_bundle(hotkey_i, n_hotkeys, hotkey, positions,
+                                                                         now_ms, existing_perf_ledger_bundles)
+        except Exception as e:
+            bt.logging.error(f"Error updating perf ledger for {hotkey}: {e}. Please alert a team member ASAP!")
+            bt.logging.error(traceback.format_exc())
+            failures.add(hotkey)
+    hk_to_last_order_processed_ms = {hk: plm.hk_to_last_order_processed_ms[hk] for hk in hotkey_to_bundle
+                                     if hk in plm.hk_to_last_order_processed_ms}
+    return hotkey_to_bundle, failures, plm.candidate_pl_elimination_rows, hk_to_last_order_processed_ms
+
+
 if __name__ == "__main__":
     from tests.shared_objects.mock_classes import MockMetagraph
     bt.logging.enable_info()
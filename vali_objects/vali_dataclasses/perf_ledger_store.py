@@ -0,0 +1,191 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import bittensor as bt
+import numpy as np
+
+from vali_objects.utils.vali_bkp_utils import ValiBkpUtils
+from vali_objects.vali_dataclasses import perf_ledger
+
+
+class PerfLedgerStore:
+    """
+    Columnar on-disk storage for perf ledger bundles.
+
+    Each hotkey gets one uncompressed .npz holding, for every trade pair ledger in its bundle, the checkpoint fields as
+    typed arrays. index.json holds the ledger metadata (initialization time, max return, window sizes) and a
+    fingerprint per hotkey so saves only rewrite bundles that changed. Loading reads arrays directly and builds
+    checkpoints without pydantic validation.
+
+    Bundles are written before the index, so a crash in between can leave a bundle that doesn't match its index
+    entry. Such bundles are not loaded and their hotkeys are listed in inconsistent_hotkeys.
+    """
+    FORMAT_VERSION = 1
+    INT_FIELDS = ('last_update_ms', 'accum_ms', 'open_ms', 'n_updates')
+    FLOAT_FIELDS = ('prev_portfolio_ret', 'prev_portfolio_spread_fee', 'prev_portfolio_carry_fee', 'gain', 'loss',
+                    'spread_fee_loss', 'carry_fee_loss', 'mdd', 'mpv')
+    EXTRAS_FIELD = 'extras'
+
+    def __init__(self, running_unit_tests=False):
+        self.running_unit_tests = running_unit_tests
+        self.store_dir = ValiBkpUtils.get_perf_ledgers_dir(running_unit_tests=running_unit_tests)
+        self.inconsistent_hotkeys = set()
+
+    @property
+    def index_path(self) -> str:
+        return self.store_dir + 'index.json'
+
+    def bundle_path(self, hotkey: str) -> str:
+        return self.store_dir + f'{hotkey}.npz'
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    def read_index(self) -> dict:
+        # Not cached. The ledger process and the main process can both write to the store.
+        if not self.exists():
+            return {'format_version': self.FORMAT_VERSION, 'hotkeys': {}}
+        with open(self.index_path, 'r') as f:
+            index = json.load(f)
+        assert index['format_version'] == self.FORMAT_VERSION, index['format_version']
+        return index
+
+    def clear(self):
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    @staticmethod
+    def ledger_metas(bundle: 'dict[str, perf_ledger.PerfLedger]') -> dict[str, dict]:
+        return {tp_id: {'n_cps': len(pl.cps),
+                        'initialization_time_ms': pl.initialization_time_ms,
+                        'max_return': pl.max_return,
+                        'target_cp_duration_ms': pl.target_cp_duration_ms,
+                        'target_ledger_window_ms': pl.target_ledger_window_ms}
+                for tp_id, pl in bundle.items()}
+
+    @staticmethod
+    def fingerprint(ledger_metas: dict[str, dict], arrays: dict[str, np.ndarray]) -> str:
+        # Covers every checkpoint. Hashing the raw columns is cheap next to the disk write it saves.
+        h = hashlib.sha256(json.dumps(ledger_metas, sort_keys=True).encode())
+        for key in sorted(arrays):
+            h.update(key.encode())
+            h.update(arrays[key].tobytes())
+        return h.hexdigest()
+
+    def bundle_to_arrays(self, bundle: 'dict[str, perf_ledger.PerfLedger]') -> dict[str, np.ndarray]:
+        arrays = {}
+        for tp_id, pl in bundle.items():
+            for field in self.INT_FIELDS:
+                arrays[f'{tp_id}/{field}'] = np.array([getattr(cp, field) for cp in pl.cps], dtype=np.int64)
+            for field in self.FLOAT_FIELDS:
+                arrays[f'{tp_id}/{field}'] = np.array([getattr(cp, field) for cp in pl.cps], dtype=np.float64)
+            if any(cp.model_extra for cp in pl.cps):
+                arrays[f'{tp_id}/{self.EXTRAS_FIELD}'] = np.array([json.dumps(cp.model_extra or {}) for cp in pl.cps])
+        return arrays
+
+    def arrays_to_bundle(self, arrays, ledger_metas: dict[str, dict]) -> 'dict[str, perf_ledger.PerfLedger]':
+        bundle = {}
+        for tp_id, meta in ledger_metas.items():
+            columns = {field: arrays[f'{tp_id}/{field}'].tolist() for field in self.INT_FIELDS + self.FLOAT_FIELDS}
+            extras_key = f'{tp_id}/{self.EXTRAS_FIELD}'
+            extras = [json.loads(x) for x in arrays[extras_key].tolist()] if extras_key in arrays else None
+            cps = []
+            for i in range(meta['n_cps']):
+                cp_kwargs = {field: values[i] for field, values in columns.items()}
+                if extras:
+                    cp_kwargs.update(extras[i])
+                cps.append(perf_ledger.PerfCheckpoint.model_construct(**cp_kwargs))
+            bundle[tp_id] = perf_ledger.PerfLedger(initialization_time_ms=meta['initialization_time_ms'],
+                                       max_return=meta['max_return'],
+                                       target_cp_duration_ms=meta['target_cp_duration_ms'],
+                                       target_ledger_window_ms=meta['target_ledger_window_ms'],
+                                       cps=cps)
+        return bundle
+
+    def write_bundle(self, hotkey: str, arrays: dict[str, np.ndarray]):
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        ValiBkpUtils.write_to_dir(self.bundle_path(hotkey), buffer.getvalue(), is_binary=True)
+
+    def save(self, hotkey_to_bundle: 'dict[str, dict[str, perf_ledger.PerfLedger]]', dirty_hotkeys=None) -> int:
+        """
+        Make the store match hotkey_to_bundle. Only bundles whose fingerprint changed are rewritten and hotkeys that
+        are no longer present are removed. Returns the number of bundles written.
+
+        dirty_hotkeys, if given, are the only hotkeys whose bundles may have changed since the last save. The other
+        bundles are not converted or fingerprinted unless they are missing from the store.
+        """
+        index = self.read_index()
+        hotkey_metas = index['hotkeys']
+        n_written = 0
+        for hotkey, bundle in hotkey_to_bundle.items():
+            meta = hotkey_metas.get(hotkey)
+            is_stored = meta is not None and os.path.exists(self.bundle_path(hotkey))
+            if is_stored and dirty_hotkeys is not None and hotkey not in dirty_hotkeys:
+                continue
+            ledger_metas = self.ledger_metas(bundle)
+            arrays = self.bundle_to_arrays(bundle)
+            fingerprint = self.fingerprint(ledger_metas, arrays)
+            if is_stored and meta['fingerprint'] == fingerprint:
+                continue
+            self.write_bundle(hotkey, arrays)
+            hotkey_metas[hotkey] = {'fingerprint': fingerprint, 'ledgers': ledger_metas}
+            n_written += 1
+
+        removed_hotkeys = [hk for hk in hotkey_metas if hk not in hotkey_to_bundle]
+        for hotkey in removed_hotkeys:
+            del hotkey_metas[hotkey]
+        # Index goes last. Bundle files it doesn't reference are ignored and cleaned up below.
+        ValiBkpUtils.write_to_dir(self.index_path, index)
+        for hotkey in removed_hotkeys:
+            if os.path.exists(self.bundle_path(hotkey)):
+                os.remove(self.bundle_path(hotkey))
+        return n_written
+
+    def matches_index(self, arrays, ledger_metas: dict[str, dict]) -> bool:
+        """
+        Whether the arrays of a bundle hold exactly the ledgers and checkpoint counts of its index entry.
+        """
+        expected_keys = set()
+        for tp_id, meta in ledger_metas.items():
+            keys = [f'{tp_id}/{field}' for field in self.INT_FIELDS + self.FLOAT_FIELDS]
+            extras_key = f'{tp_id}/{self.EXTRAS_FIELD}'
+            if extras_key in arrays:
+                keys.append(extras_key)
+            for key in keys:
+                if key not in arrays or len(arrays[key]) != meta['n_cps']:
+                    return False
+            expected_keys.update(keys)
+        return set(arrays.keys()) == expected_keys
+
+    def load(self, hotkeys=None) -> 'dict[str, dict[str, perf_ledger.PerfLedger]]':
+        ans = {}
+        self.inconsistent_hotkeys = set()
+        for hotkey, meta in self.read_index()['hotkeys'].items():
+            if hotkeys is not None and hotkey not in hotkeys:
+                continue
+            try:
+                with np.load(self.bundle_path(hotkey)) as arrays:
+                    if not self.matches_index(arrays, meta['ledgers']):
+                        bt.logging.error(f"Perf ledger bundle for {hotkey} at {self.bundle_path(hotkey)} doesn't match "
+                                         f"the index, likely from a save that was interrupted. It needs a rebuild.")
+                        self.inconsistent_hotkeys.add(hotkey)
+                        continue
+                    ans[hotkey] = self.arrays_to_bundle(arrays, meta['ledgers'])
+            except Exception as e:
+                bt.logging.error(f"Unable to load perf ledger bundle for {hotkey} from {self.bundle_path(hotkey)}: {e}. "
+                                 f"It needs a rebuild.")
+                self.inconsistent_hotkeys.add(hotkey)
+        return ans
+
+    def retain_hotkeys(self, hotkeys):
+        self.save({hk: bundle for hk, bundle in self.load(hotkeys=set(hotkeys)).items()})
+
+    @staticmethod
+    def to_json_dict(hotkey_to_bundle: dict[str, 'dict[str, perf_ledger.PerfLedger]']) -> dict[str, dict[str, dict]]:
+        return {hk: {tp_id: pl.to_dict() for tp_id, pl in bundle.items()} for hk, bundle in hotkey_to_bundle.items()}
+
+    def export_json(self, file_path: str):
+        ValiBkpUtils.write_to_dir(file_path, self.to_json_dict(self.load()))
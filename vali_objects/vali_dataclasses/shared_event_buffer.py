@@ -0,0 +1,242 @@
+import math
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import bittensor as bt
+import numpy as np
+
+from vali_objects.vali_dataclasses.price_source import PriceSource
+from vali_objects.vali_dataclasses.recent_event_tracker import RecentEventTracker
+
+# Header fields of each trade pair
+SEQUENCE = 0  # Odd while the writer is changing the records
+COUNT = 1  # Number of records ever written
+OLDEST_VALID_MS = 2  # Records starting before this were cleaned up by the writer
+
+# Integer and float fields of each record
+INT_FIELDS = ('start_ms', 'timespan_ms', 'lag_ms', 'websocket', 'source')
+FLOAT_FIELDS = ('open', 'close', 'high', 'low', 'vwap', 'bid', 'ask')
+
+
+class SharedEventBuffer:
+    """
+    Recent price events of each trade pair in a ring buffer in shared memory, written by the websocket process
+    and read by any process without going through the ipc manager.
+
+    Each trade pair has a single writer. Readers use a sequence number per trade pair, odd while a write is in
+    progress, and retry if it changed while they copied the records. The records hold the same events a
+    RecentEventTracker would, so the reader views answer the same queries.
+    """
+    CAPACITY = 1024
+    HEADER_SIZE = 4
+    # Reads of a trade pair whose sequence stays odd this long, e.g. a writer that died mid write, give up
+    MAX_READ_ATTEMPTS = 1000
+
+    def __init__(self, symbols: list[str], sources: tuple[str, ...], name: str = None, capacity: int = None):
+        """
+        Args:
+            symbols: trade pair symbols with a ring each
+            sources: price source names the records can refer to
+            name: attach to an existing buffer instead of creating one
+            capacity: records kept per trade pair, CAPACITY by default
+        """
+        self.symbols = list(symbols)
+        self.sources = tuple(sources)
+        self.symbol_to_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.capacity = capacity or self.CAPACITY
+        n_symbols = len(self.symbols)
+        self.shapes = [(n_symbols, self.HEADER_SIZE), (n_symbols, self.capacity, len(INT_FIELDS)),
+                       (n_symbols, self.capacity, len(FLOAT_FIELDS))]
+        size = sum(8 * math.prod(shape) for shape in self.shapes)
+        if name is None:
+            self.shm = SharedMemory(create=True, size=size)
+            self.is_owner = True
+        else:
+            # Processes started by multiprocessing share the resource tracker of the creator, so attaching does not
+            # add another registration and only the creating process unlinks the memory
+            self.shm = SharedMemory(name=name)
+            self.is_owner = False
+        self._map_arrays()
+        # index -> last consistent read of this process, returned if the records can't be read consistently
+        self.last_reads = {}
+        if self.is_owner:
+            self.header[:] = 0
+            self.header[:, OLDEST_VALID_MS] = np.iinfo(np.int64).min
+
+    def _map_arrays(self):
+        header_shape, ints_shape, floats_shape = self.shapes
+        offset = 0
+        self.header = np.ndarray(header_shape, dtype=np.int64, buffer=self.shm.buf, offset=offset)
+        offset += 8 * math.prod(header_shape)
+        self.ints = np.ndarray(ints_shape, dtype=np.int64, buffer=self.shm.buf, offset=offset)
+        offset += 8 * math.prod(ints_shape)
+        self.floats = np.ndarray(floats_shape, dtype=np.float64, buffer=self.shm.buf, offset=offset)
+
+    def __getstate__(self):
+        return {'symbols': self.symbols, 'sources': self.sources, 'name': self.shm.name, 'capacity': self.capacity}
+
+    def __setstate__(self, state):
+        self.__init__(state['symbols'], state['sources'], name=state['name'], capacity=state['capacity'])
+
+    def close(self):
+        # The arrays have to be released before the memory can be closed
+        self.header = self.ints = self.floats = None
+        self.shm.close()
+        if self.is_owner:
+            self.shm.unlink()
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.symbol_to_index and self.header[self.symbol_to_index[symbol], COUNT] > 0
+
+    def __getitem__(self, symbol: str) -> 'SharedEventView':
+        if symbol not in self.symbol_to_index:
+            raise KeyError(symbol)
+        return SharedEventView(self, self.symbol_to_index[symbol])
+
+    def tracker(self, symbol: str) -> 'SharedRecentEventTracker':
+        return SharedRecentEventTracker(self, self.symbol_to_index[symbol])
+
+    def trackers(self) -> dict[str, 'SharedRecentEventTracker']:
+        """
+        A writing tracker for every symbol, to be used by the single process receiving the events.
+        """
+        return {symbol: self.tracker(symbol) for symbol in self.symbols}
+
+    # -------------------------------------------
+    # Writer side
+    # -------------------------------------------
+    def _record(self, event: PriceSource) -> tuple[list[int], list[float]]:
+        source = self.sources.index(event.source) if event.source in self.sources else -1
+        ints = [event.start_ms, event.timespan_ms, event.lag_ms, int(event.websocket), source]
+        floats = [np.nan if getattr(event, field) is None else getattr(event, field) for field in FLOAT_FIELDS]
+        return ints, floats
+
+    def append(self, index: int, event: PriceSource, oldest_valid_ms: int):
+        ints, floats = self._record(event)
+        header = self.header[index]
+        count = int(header[COUNT])
+        slot = count % self.capacity
+        header[SEQUENCE] += 1
+        self.ints[index, slot] = ints
+        self.floats[index, slot] = floats
+        header[COUNT] = count + 1
+        header[OLDEST_VALID_MS] = oldest_valid_ms
+        header[SEQUENCE] += 1
+
+    def replace(self, index: int, event: PriceSource):
+        """
+        Rewrites the record starting at the same time as event, if it is still in the ring.
+        """
+        count = int(self.header[index, COUNT])
+        for k in range(count - 1, max(count - self.capacity, 0) - 1, -1):
+            slot = k % self.capacity
+            if self.ints[index, slot, 0] == event.start_ms:
+                ints, floats = self._record(event)
+                self.header[index, SEQUENCE] += 1
+                self.ints[index, slot] = ints
+                self.floats[index, slot] = floats
+                self.header[index, SEQUENCE] += 1
+                return
+
+    # -------------------------------------------
+    # Reader side
+    # -------------------------------------------
+    def read(self, index: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            the integer and float fields of the valid records of a trade pair sorted by start time
+        """
+        header = self.header[index]
+        for _ in range(self.MAX_READ_ATTEMPTS):
+            sequence = int(header[SEQUENCE])
+            if sequence % 2 == 0:
+                count = int(header[COUNT])
+                oldest_valid_ms = int(header[OLDEST_VALID_MS])
+                n = min(count, self.capacity)
+                ints = self.ints[index, :n].copy()
+                floats = self.floats[index, :n].copy()
+                if int(header[SEQUENCE]) == sequence:
+                    break
+            # Let the writer finish
+            time.sleep(0)
+        else:
+            if index in self.last_reads:
+                bt.logging.warning(f'Shared price events of {self.symbols[index]} stayed inconsistent for '
+                                   f'{self.MAX_READ_ATTEMPTS} reads. Using the last consistent read.')
+                return self.last_reads[index]
+            raise TimeoutError(f'Shared price events of {self.symbols[index]} stayed inconsistent for '
+                               f'{self.MAX_READ_ATTEMPTS} reads')
+
+        valid = ints[:, 0] >= oldest_valid_ms
+        ints = ints[valid]
+        floats = floats[valid]
+        order = np.argsort(ints[:, 0], kind='stable')
+        self.last_reads[index] = (ints[order], floats[order])
+        return self.last_reads[index]
+
+    def to_price_source(self, ints: np.ndarray, floats: np.ndarray) -> PriceSource:
+        start_ms, timespan_ms, lag_ms, websocket, source = (int(x) for x in ints)
+        values = {field: None if math.isnan(x) else float(x) for field, x in zip(FLOAT_FIELDS, floats)}
+        return PriceSource(source=self.sources[source] if source >= 0 else 'unknown', timespan_ms=timespan_ms,
+                           start_ms=start_ms, websocket=bool(websocket), lag_ms=lag_ms, **values)
+
+
+class SharedEventView:
+    """
+    Read only RecentEventTracker queries over the records of one trade pair in a SharedEventBuffer.
+    """
+
+    def __init__(self, buffer: SharedEventBuffer, index: int):
+        self.buffer = buffer
+        self.index = index
+
+    def count_events(self):
+        ints, _ = self.buffer.read(self.index)
+        return len(ints)
+
+    def timestamp_exists(self, timestamp_ms):
+        ints, _ = self.buffer.read(self.index)
+        return bool(np.any(ints[:, 0] == timestamp_ms))
+
+    def get_events_in_range(self, start_time_ms, end_time_ms):
+        ints, floats = self.buffer.read(self.index)
+        start_idx = np.searchsorted(ints[:, 0], start_time_ms, side='left')
+        # Same bounds as RecentEventTracker, which bisects right of end_time_ms + 1
+        end_idx = np.searchsorted(ints[:, 0], end_time_ms + 1, side='right')
+        return [self.buffer.to_price_source(ints[i], floats[i]) for i in range(start_idx, end_idx)]
+
+    def get_closest_event(self, timestamp_ms):
+        ints, floats = self.buffer.read(self.index)
+        if len(ints) == 0:
+            return None
+        times = ints[:, 0]
+        idx = int(np.searchsorted(times, timestamp_ms, side='left'))
+        if idx == len(times):
+            idx -= 1
+        elif idx > 0 and not (times[idx] - timestamp_ms) < (timestamp_ms - times[idx - 1]):
+            idx -= 1
+        return self.buffer.to_price_source(ints[idx], floats[idx])
+
+
+class SharedRecentEventTracker(RecentEventTracker):
+    """
+    RecentEventTracker of the writing process that also publishes its events to a SharedEventBuffer.
+    """
+
+    def __init__(self, buffer: SharedEventBuffer, index: int):
+        super().__init__()
+        self.buffer = buffer
+        self.index = index
+
+    def add_event(self, event, is_forex_quote=False, tp_debug_str: str = None):
+        if self.timestamp_exists(event.start_ms):
+            return
+        super().add_event(event, is_forex_quote=is_forex_quote, tp_debug_str=tp_debug_str)
+        oldest_valid_ms = self.events[0][0] if self.events else np.iinfo(np.int64).max
+        self.buffer.append(self.index, event, oldest_valid_ms)
+
+    def update_prices_for_median(self, t_ms, bid_price, ask_price):
+        super().update_prices_for_median(t_ms, bid_price, ask_price)
+        existing_event, prices = self.get_event_by_timestamp(t_ms)
+        if prices:
+            self.buffer.replace(self.index, existing_event)